@@ -0,0 +1,280 @@
+# ---------------------------------------------------------------------------
+# backfill_years.py
+#
+# Description: Rebuilds the deliverables of earlier years, several years at the
+#              same time, to compare them with the current ones. Every script
+#              takes the year from its run date, so each year is given with the
+#              workspace snapshot holding its inputs:
+#                  2017=T:\FRA\Snapshots\Workspace_2017
+#                  2018-08-24=T:\FRA\Snapshots\Workspace_2018
+#              A bare year runs as of December 31 of that year, a date also sets
+#              the month written to the SOURCEFIRE fields.
+#
+#              The stages of every year go into one dependency graph, named
+#              <year>/<stage>, and run on one pool of worker processes. The
+#              outputs of a year land in its snapshot with the same names as a
+#              run in that year. The EDW extract and the USGS/NOAA/FWS downloads
+#              are not run, they would pull today's data into an old snapshot;
+#              the snapshots have to hold them already.
+#
+#              Inputs that do not change between years are prepared once:
+#                  ownership    years whose ownership feature class has the same
+#                               content load it from the first of them, the in
+#                               memory copy keeps the name of the year's own layer
+#                               so the FID_ field of its deliverables is unchanged
+#                  local data   the Shasta crayfish and MYLF study areas are
+#                               projected once into <backfill_root>\Shared and
+#                               every year merges that copy, taken from the
+#                               newest <year>_<name>_CAALB83.gdb of --local-data
+#                               or of the newest snapshot
+#
+#              The run manifest, memory estimates and stage timings of the
+#              backfill are kept in <backfill_root>\Output.
+#
+# Usage: backfill_years.py <backfill_root> <year>=<snapshot> [<year>=<snapshot> ...] [--region NAME]
+#                          [--local-data FOLDER] [--processes N] [--stages name ...] [--force]
+#                          [--memory-mb MB] [--plan]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import os
+import re
+import sys
+
+import pipeline_runner
+import region_profile
+import run_manifest
+import stage_costs
+from select_tes_layer import localDataDict
+
+# Stages that pull from outside sources instead of the snapshot
+sourceStageList = ["edw_extract_data", "hydro_download"]
+
+localDataStage = "shared/local_data"
+
+
+def parse_year(spec):
+    """Splits <year or date>=<snapshot> into the run date and the snapshot workspace."""
+
+    if "=" not in spec:
+        raise ValueError("Expected <year>=<snapshot> but got " + spec)
+
+    when, workspace = spec.split("=", 1)
+    if re.match(r"^\d{4}$", when):
+        runDate = datetime.datetime(int(when), 12, 31)
+        if runDate > datetime.datetime.today():
+            runDate = datetime.datetime.today()
+    else:
+        runDate = datetime.datetime.strptime(when, pipeline_runner.dateFormat)
+
+    return runDate, workspace.rstrip("\\")
+
+
+def shared_folder(backfill_root):
+
+    return backfill_root + "\\" + "Shared"
+
+
+def newest_local_data_gdb(folder, name):
+    """Newest <year>_<name>_CAALB83.gdb in folder, None when there is none."""
+
+    localFolder = folder.replace("\\", os.sep)
+    if not os.path.isdir(localFolder):
+        return None
+
+    gdbList = sorted(gdb for gdb in os.listdir(localFolder)
+                     if re.match(r"^\d{4}_" + name + r"_CAALB83\.gdb$", gdb))
+    if not gdbList:
+        return None
+
+    return folder + "\\" + gdbList[-1]
+
+
+def prepare_local_data(source_gdbs, shared_folder, region=None):
+    """Projects the local study area GDBs once into <name>_CAALB83.gdb of shared_folder, returns the GDBs.
+
+    source_gdbs is a list of [name, GDB] pairs, for example ["MYLF", "...\\2018_MYLF_CAALB83.gdb"].
+    """
+
+    arcpy.env.overwriteOutput = True
+
+    profile = region_profile.get_profile(region)
+    sr = region_profile.spatial_reference(profile)
+
+    if not os.path.exists(shared_folder.replace("\\", os.sep)):
+        os.makedirs(shared_folder.replace("\\", os.sep))
+
+    outputList = []
+    for name, sourceGDB in source_gdbs:
+        sharedGDB = name + "_CAALB83.gdb"
+
+        arcpy.AddMessage("Preparing " + name + " from " + sourceGDB)
+        if arcpy.Exists(shared_folder + "\\" + sharedGDB):
+            arcpy.Delete_management(shared_folder + "\\" + sharedGDB)
+        arcpy.CreateFileGDB_management(shared_folder, sharedGDB)
+
+        arcpy.env.workspace = sourceGDB
+        for fc in arcpy.ListFeatureClasses():
+            outFC = shared_folder + "\\" + sharedGDB + "\\" + fc
+            if arcpy.Describe(fc).spatialReference.name != profile["spatialReferenceName"]:
+                arcpy.AddMessage("Reprojecting " + fc + " to " + profile["spatialReferenceName"] + " ....")
+                arcpy.Project_management(fc, outFC, sr)
+            else:
+                arcpy.CopyFeatures_management(fc, outFC)
+
+        outputList.append(shared_folder + "\\" + sharedGDB)
+
+    return outputList
+
+
+def year_stages(run_date, workspace, region=None, stage_names=None):
+    """Stages of one year renamed <year>/<stage>, without the stages pulling from outside sources."""
+
+    prefix = str(run_date.year) + "/"
+
+    stages = pipeline_runner.build_stage_graph(workspace, region=region, run_date=run_date)
+    stageNames = stage_names or [stage["name"] for stage in stages]
+    stages = pipeline_runner.select_stages(stages, [stageName for stageName in stageNames
+                                                    if stageName not in sourceStageList])
+
+    return [dict(stage, name=prefix + stage["name"], deps=[prefix + dep for dep in stage["deps"]])
+            for stage in stages]
+
+
+def share_ownership(stages):
+    """Loads the ownership layer of every year from the first year with the same content.
+
+    The layer keeps the name of its own year in memory, the FID_ field of the intersect outputs is named after it.
+    """
+
+    sharedDict = {}
+    fingerprints = {}
+
+    for stage in stages:
+        path = stage["layers"].get("ownership_fc")
+        if path is None:
+            continue
+        if path not in fingerprints:
+            fingerprints[path] = run_manifest.fingerprint(path)
+        content = fingerprints[path]
+        if content is None:
+            continue
+        sharedPath = sharedDict.setdefault(content, path)
+        if sharedPath != path:
+            stage["shared_layers"] = dict(stage.get("shared_layers", {}), ownership_fc=sharedPath)
+
+    for path in sorted(fingerprints):
+        sharedPath = sharedDict.get(fingerprints[path], path)
+        if sharedPath != path:
+            arcpy.AddMessage("Ownership " + path + " is unchanged, sharing " + sharedPath)
+
+
+def share_local_data(stages, backfill_root, source_folder, region=None):
+    """Adds the stage preparing the local study areas once and points the select stages of every year at it."""
+
+    sharedFolder = shared_folder(backfill_root)
+
+    consumers = [stage for stage in stages if stage["function"] == "select_tes_layer.select_tes_layer" and
+                 stage["args"][3] in localDataDict]
+    if not consumers:
+        return stages
+
+    sourceGDBs = []
+    for name in sorted(set(localDataDict.values())):
+        sourceGDB = newest_local_data_gdb(source_folder, name)
+        if sourceGDB is None:
+            raise ValueError("No " + name + " local data found in " + source_folder)
+        sourceGDBs.append([name, sourceGDB])
+
+    kwargs = {}
+    if region is not None:
+        kwargs["region"] = region
+    sharedStage = pipeline_runner.new_stage(localDataStage, "backfill_years.prepare_local_data",
+                                            [sourceGDBs, sharedFolder], [],
+                                            inputs=[sourceGDB for name, sourceGDB in sourceGDBs],
+                                            outputs=[sharedFolder + "\\" + name + "_CAALB83.gdb"
+                                                     for name, sourceGDB in sourceGDBs],
+                                            kwargs=kwargs)
+
+    for stage in consumers:
+        name = localDataDict[stage["args"][3]]
+        stage["kwargs"] = dict(stage["kwargs"], local_data=sharedFolder)
+        stage["inputs"] = [path for path in stage["inputs"] if not path.endswith("_" + name + "_CAALB83.gdb")] + \
+            [sharedFolder + "\\" + name + "_CAALB83.gdb"]
+        stage["deps"] = stage["deps"] + [localDataStage]
+
+    return [sharedStage] + stages
+
+
+def build_backfill_graph(backfill_root, years, region=None, local_data=None, stage_names=None):
+    """Stages of every (run date, snapshot) pair, sharing the inputs that do not change between years."""
+
+    if len(set(runDate.year for runDate, workspace in years)) != len(years):
+        raise ValueError("Each year can only be backfilled once")
+
+    stages = []
+    for runDate, workspace in years:
+        stages.extend(year_stages(runDate, workspace, region, stage_names))
+
+    share_ownership(stages)
+
+    if local_data is None:
+        runDate, workspace = max(years)
+        local_data = workspace + "\\" + "Input" + "\\" + "Local_Data"
+
+    return share_local_data(stages, backfill_root, local_data, region)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Rebuilds the FRA deliverables of several years together")
+    parser.add_argument("backfill_root", help="folder for the shared local data and the backfill manifest")
+    parser.add_argument("years", nargs="+", help="<year or YYYY-MM-DD>=<snapshot workspace>, e.g. 2017=T:\\Snap2017")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    parser.add_argument("--local-data", default=None,
+                        help="folder with the <year>_ShastaCrayfish/_MYLF_CAALB83.gdb study areas shared by the years, "
+                             "defaults to Input\\Local_Data of the newest snapshot")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes shared by the years, defaults to the number of CPUs")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="only run these stages in every year, for example select_tes_layer:TESP")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every stage even when its inputs have not changed")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="memory budget in MB shared by the running stages, defaults to no limit")
+    parser.add_argument("--plan", action="store_true",
+                        help="only predict time, memory and disk of the stages from earlier runs")
+    args = parser.parse_args()
+
+    try:
+        years = [parse_year(spec) for spec in args.years]
+    except ValueError as e:
+        parser.error(str(e))
+
+    stages = build_backfill_graph(args.backfill_root, years, args.region, args.local_data, args.stages)
+
+    if args.plan:
+        pipeline_runner.plan_pipeline(stages, args.processes, args.memory_mb,
+                                      stage_costs.cost_cache_path(args.backfill_root),
+                                      stage_costs.timing_path(args.backfill_root))
+        return
+
+    status = pipeline_runner.run_pipeline(stages, args.processes, run_manifest.manifest_path(args.backfill_root),
+                                          args.force, memory_budget=args.memory_mb,
+                                          cost_file=stage_costs.cost_cache_path(args.backfill_root),
+                                          timing_file=stage_costs.timing_path(args.backfill_root))
+
+    arcpy.AddMessage("__________________________________________________")
+    for stage in stages:
+        arcpy.AddMessage("  " + stage["name"] + ": " + status.get(stage["name"]))
+
+    if any(value not in ("complete", "current") for value in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
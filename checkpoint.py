@@ -0,0 +1,117 @@
+# ---------------------------------------------------------------------------
+# checkpoint.py
+#
+# Description: Durable checkpoints for the long running loops in
+#              hydrology_processing.py and noaa_esu_processing.py. When an item
+#              of a loop (a subregion feature class, a merge, an ESU) finishes, its
+#              outputs and their record counts are written to a json file next
+#              to the output data. A rerun asks the checkpoint before processing
+#              each item and skips it only when every recorded output still exists
+#              and still holds the recorded number of records, so an item that was
+#              interrupted part way or deleted afterwards is processed again.
+#
+#              The checkpoint file is replaced atomically after every item so a
+#              crash can never leave it half written.
+#
+#              A checkpoint only resumes a run on the same inputs. It records the
+#              key of the inputs it was written for, the run manifest key of the
+#              stage under pipeline_runner.py or input_key() of the input paths
+#              when a script runs on its own, and is started over when the key
+#              has changed. A run that completes removes its checkpoint.
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import hashlib
+import json
+import os
+
+import run_manifest
+
+
+def input_key(path_list):
+    """Key of input datasets from their modification times, for runs outside pipeline_runner.py."""
+
+    digest = hashlib.sha1()
+    for path in sorted(path_list):
+        digest.update(path.encode("utf-8"))
+        digest.update(repr(run_manifest.dataset_modified(path)).encode("utf-8"))
+        if path.lower().endswith(".shp"):
+            # Attribute edits only touch the dbf
+            digest.update(repr(run_manifest.dataset_modified(path[:-len(".shp")] + ".dbf")).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def load_checkpoint(path, restart=False, key=None):
+    """Loads the checkpoint at path, an empty one on restart or when it was written for another input key."""
+
+    if restart and os.path.exists(path):
+        arcpy.AddMessage("Restart requested, removing checkpoint " + path)
+        os.remove(path)
+
+    if not os.path.exists(path):
+        return {"path": path, "key": key, "items": {}}
+
+    with open(path) as f:
+        data = json.load(f)
+
+    if key is not None and data["key"] != key:
+        arcpy.AddMessage("Inputs changed since checkpoint " + path + " was written, starting over")
+        os.remove(path)
+        return {"path": path, "key": key, "items": {}}
+
+    arcpy.AddMessage("Resuming from checkpoint " + path + " with " + str(len(data["items"])) + " completed items")
+    return {"path": path, "key": data["key"] if key is None else key, "items": data["items"]}
+
+
+def clear_checkpoint(checkpoint):
+    """Removes the checkpoint file once the run it belongs to has completed."""
+
+    if os.path.exists(checkpoint["path"]):
+        arcpy.AddMessage("Run complete, removing checkpoint " + checkpoint["path"])
+        os.remove(checkpoint["path"])
+    checkpoint["items"] = {}
+
+
+def save_checkpoint(checkpoint):
+
+    tmpPath = checkpoint["path"] + ".tmp"
+    with open(tmpPath, "w") as f:
+        json.dump({"key": checkpoint.get("key"), "items": checkpoint["items"]}, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    if hasattr(os, "replace"):
+        os.replace(tmpPath, checkpoint["path"])
+    else:
+        if os.path.exists(checkpoint["path"]):
+            os.remove(checkpoint["path"])
+        os.rename(tmpPath, checkpoint["path"])
+
+
+def is_complete(checkpoint, item):
+    """True when the item was recorded and all of its outputs are present with the recorded counts."""
+
+    outputs = checkpoint["items"].get(item)
+    if outputs is None:
+        return False
+
+    for path, count in outputs.items():
+        if not arcpy.Exists(path):
+            arcpy.AddMessage("Checkpoint output missing, reprocessing " + item + ": " + path)
+            return False
+        if int(arcpy.GetCount_management(path).getOutput(0)) != count:
+            arcpy.AddMessage("Checkpoint output incomplete, reprocessing " + item + ": " + path)
+            return False
+
+    return True
+
+
+def mark_complete(checkpoint, item, output_list):
+
+    outputs = {}
+    for path in output_list:
+        outputs[path] = int(arcpy.GetCount_management(path).getOutput(0))
+
+    checkpoint["items"][item] = outputs
+    save_checkpoint(checkpoint)
@@ -11,6 +11,10 @@
 #              Ownership layer uses a dictionary to add the UnitID field and populate
 #              it according to the FORESTNAME field.
 #
+#              edw_extract_data.py <in_workspace>
+#              or import the module and call edw_extract_data(). Other regions pass
+#              region, see region_profile.py. The extracts keep their _region5 names.
+#
 # Runtime Estimates: 17 min 46 sec on Citrix.
 #
 # Created by: Josh Klaus 08/30/2017 jklaus@fs.fed.us
@@ -22,19 +26,7 @@ import sys
 import os
 import datetime
 
-# Set workspace or obtain from user input
-# in_workspace = "T:\FS\NFS\R05\Program\\6800InformationMgmt\GIS\Workspace\jklaus\\Python\\"
-in_workspace = sys.argv[1]
-
-# using the now variable to assign year everytime there is a hardcoded 2017
-now = datetime.datetime.today()
-curMonth = str(now.month)
-curYear = str(now.year)
-arcpy.AddMessage("Year is " + curYear)
-
-
-arcpy.env.workspace = in_workspace
-arcpy.env.overwriteOutput = True
+import region_profile
 
 edwDataWorkspace = "T:\\FS\\Reference\\GeoTool\\agency\\DatabaseConnection\\edw_sde_default_as_myself.sde"
 
@@ -46,12 +38,12 @@ dataWildlifeSites = edwDataWorkspace + "\\S_USA.Fish_and_Wildlife\\S_USA.Wildlif
 
 dataLandBasic = edwDataWorkspace + "\\S_USA.Land\\S_USA.BasicOwnership"
 
-newPath = in_workspace + "\\" + "EDW_Extract"
 edwGDB = "edw_extract.gdb"
-selectQuery = "FS_UNIT_ID LIKE '05%'"
 
-landSelectQuery = "((REGION = '05') OR (FORESTNAME = 'Lake Tahoe Basin Management Unit')) " \
-                  "AND (OWNERCLASSIFICATION = 'USDA FOREST SERVICE')"
+# Region 5 values, other regions pass their region to edw_extract_data()
+selectQuery = region_profile.get_profile()["edwSelectQuery"]
+
+landSelectQuery = region_profile.get_profile()["landSelectQuery"]
 
 newTESPFeatureClass = "TESP_Extract"
 r5TESPFeatureClass = "TESP_region5"
@@ -65,101 +57,128 @@ r5WildSitesFeatureClass = "Wild_Sites_region5"
 newLandFeatureClass = "Land_Extract"
 r5LandFeatureClass = "Land_region5"
 
-forestGDBDict = {"Angeles National Forest": "0501",
-                 "San Bernardino National Forest": "0512",
-                 "Cleveland National Forest": "0502",
-                 "Eldorado National Forest": "0503",
-                 "Inyo National Forest": "0504",
-                 "Klamath National Forest": "0505",
-                 "Lassen National Forest": "0506",
-                 "Los Padres National Forest": "0507",
-                 "Modoc National Forest": "0509",
-                 "Mendocino National Forest": "0508",
-                 "Plumas National Forest": "0511",
-                 "Shasta-Trinity National Forest": "0514",
-                 "Sierra National Forest": "0515",
-                 "Sequoia National Forest": "0513",
-                 "Six Rivers National Forest": "0510",
-                 "Stanislaus National Forest": "0516",
-                 "Lake Tahoe Basin Management Unit": "0519",
-                 "Tahoe National Forest": "0517"}
-
-
-if not os.path.exists(newPath):
-    arcpy.AddMessage("Creating directory for EDW Data Extract ....")
-    os.makedirs(newPath)
-    arcpy.AddMessage("Creating Geodatabase for storing EDW Data Extract ....")
-    arcpy.CreateFileGDB_management(newPath, edwGDB)
-
-newWorkSpace = newPath + "\\" + edwGDB + "\\"
+forestGDBDict = region_profile.get_profile()["forestUnitDict"]
+
 
 edwList = ["TESP", "Wild_Obs", "Wild_Sites", "Land"]
 
-try:
-    for edwData in edwList:
 
-        extractWorkSpace = newWorkSpace + "\\" + edwData + "_Extract"
-        r5WorkSpace = newWorkSpace + "\\" + edwData + "_region5"
+def extract_edw_layer(edw_data, new_path, new_workspace, cur_year, profile=None):
+    """Copies one EDW dataset and its region selection into the extract GDB, returns the region5 fc."""
+
+    if profile is None:
+        profile = region_profile.get_profile()
+
+    extractWorkSpace = new_workspace + "\\" + edw_data + "_Extract"
+    r5WorkSpace = new_workspace + "\\" + edw_data + "_region5"
+
+    arcpy.AddMessage("Copying features from EDW to T drive workspace for dataset: " + edw_data)
+    if edw_data == "TESP":
+        arcpy.CopyFeatures_management(dataTESP, extractWorkSpace)
+    elif edw_data == "Wild_Obs":
+        arcpy.CopyFeatures_management(dataFishWildlifeObs, extractWorkSpace)
+    elif edw_data == "Wild_Sites":
+        arcpy.CopyFeatures_management(dataWildlifeSites, extractWorkSpace)
+    elif edw_data == "Land":
+        arcpy.CopyFeatures_management(dataLandBasic, extractWorkSpace)
+
+    arcpy.MakeFeatureLayer_management(extractWorkSpace, "lyr" )
+
+    arcpy.AddMessage("Selecting layers based on selection ....")
+    if edw_data == "Land":
+        arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", profile["landSelectQuery"])
+    else:
+        arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", profile["edwSelectQuery"])
+
+    arcpy.AddMessage("Selecting feature from Region " + profile["regionNumber"])
+    result = arcpy.GetCount_management(extractWorkSpace)
+    count = int(result.getOutput(0))
+    arcpy.AddMessage("Total Number of Records: " + str(count))
+
+    arcpy.AddMessage("Copying selected records to separate feature class with only Region " +
+                     profile["regionNumber"] + " data")
+    arcpy.CopyFeatures_management("lyr", r5WorkSpace)
 
-        arcpy.AddMessage("Copying features from EDW to T drive workspace for dataset: " + edwData)
-        if edwData == "TESP":
-            arcpy.CopyFeatures_management(dataTESP, extractWorkSpace)
-        elif edwData == "Wild_Obs":
-            arcpy.CopyFeatures_management(dataFishWildlifeObs, extractWorkSpace)
-        elif edwData == "Wild_Sites":
-            arcpy.CopyFeatures_management(dataWildlifeSites, extractWorkSpace)
-        elif edwData == "Land":
-            arcpy.CopyFeatures_management(dataLandBasic, extractWorkSpace)
+    if edw_data == "Land":
+        arcpy.AddMessage("Adding Unit UnitID_FS field")
+        arcpy.AddField_management(r5WorkSpace, "UnitID_FS", "TEXT", "", "", "5", "", "NULLABLE",
+                                  "NON_REQUIRED", "")
 
-        arcpy.MakeFeatureLayer_management(extractWorkSpace, "lyr" )
+        arcpy.AddMessage("Updating UnitID_FS fields")
 
-        arcpy.AddMessage("Selecting layers based on selection ....")
-        if edwData == "Land":
-            arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", landSelectQuery)
-        else:
-            arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", selectQuery )
+        cur = arcpy.UpdateCursor(r5WorkSpace)
 
-        arcpy.AddMessage("Selecting feature from Region 5")
-        result = arcpy.GetCount_management(extractWorkSpace)
-        count = int(result.getOutput(0))
-        arcpy.AddMessage("Total Number of Records: " + str(count))
+        forestField = "FORESTNAME"
 
-        arcpy.AddMessage("Copying selected records to separate feature class with only Region 5 data")
-        arcpy.CopyFeatures_management("lyr", r5WorkSpace)
+        for row in cur:
+            row.UnitID_FS = profile["forestUnitDict"].get(row.getValue(forestField))
 
-        if edwData == "Land":
-            arcpy.AddMessage("Adding Unit UnitID_FS field")
-            arcpy.AddField_management(r5WorkSpace, "UnitID_FS", "TEXT", "", "", "5", "", "NULLABLE",
-                                      "NON_REQUIRED", "")
+            cur.updateRow(row)
 
-            arcpy.AddMessage("Updating UnitID_FS fields")
+        del cur
 
-            cur = arcpy.UpdateCursor(r5WorkSpace)
+        projectedGDB = cur_year + "_USFS_Ownership_CAALB83.gdb"
+        arcpy.CreateFileGDB_management(new_path, projectedGDB)
+        projectedWorkspace = new_path + "\\" + projectedGDB + "\\" + "USFS_OwnershipLSRS_" + cur_year
 
-            forestField = "FORESTNAME"
+        spatial_ref = arcpy.Describe(r5WorkSpace).spatialReference
 
-            for row in cur:
-                row.UnitID_FS = forestGDBDict.get(row.getValue(forestField))
+        arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
+
+        sr = region_profile.spatial_reference(profile)
+
+        if spatial_ref.name != profile["spatialReferenceName"]:
+            arcpy.AddMessage("Reprojecting layer to " + profile["spatialReferenceName"] + " ....")
+            arcpy.Project_management(r5WorkSpace, projectedWorkspace, sr)
+
+    return r5WorkSpace
+
+
+def edw_extract_data(in_workspace, run_date=None, region=None):
+    """Extracts every EDW dataset for the region (Region 5 by default), returns the region5 feature classes."""
+
+    profile = region_profile.get_profile(region)
+
+    # using the now variable to assign year everytime there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    arcpy.env.workspace = in_workspace
+    arcpy.env.overwriteOutput = True
+
+    newPath = in_workspace + "\\" + "EDW_Extract"
+
+    if not os.path.exists(newPath):
+        arcpy.AddMessage("Creating directory for EDW Data Extract ....")
+        os.makedirs(newPath)
+        arcpy.AddMessage("Creating Geodatabase for storing EDW Data Extract ....")
+        arcpy.CreateFileGDB_management(newPath, edwGDB)
+
+    newWorkSpace = newPath + "\\" + edwGDB + "\\"
+
+    r5List = []
+
+    for edwData in edwList:
+        r5List.append(extract_edw_layer(edwData, newPath, newWorkSpace, curYear, profile))
 
-                cur.updateRow(row)
+    return r5List
 
-            del cur
 
-            projectedGDB = curYear + "_USFS_Ownership_CAALB83.gdb"
-            arcpy.CreateFileGDB_management(newPath, projectedGDB)
-            projectedWorkspace = newPath + "\\" + projectedGDB + "\\" + "USFS_OwnershipLSRS_" + curYear
+def main():
 
-            spatial_ref = arcpy.Describe(r5WorkSpace).spatialReference
+    # Set workspace or obtain from user input
+    # in_workspace = "T:\FS\NFS\R05\Program\\6800InformationMgmt\GIS\Workspace\jklaus\\Python\\"
+    in_workspace = sys.argv[1]
 
-            arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
+    try:
+        edw_extract_data(in_workspace)
 
-            sr = arcpy.SpatialReference(3310)
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
 
-            if spatial_ref.name != "NAD_1983_California_Teale_Albers":
-                arcpy.AddMessage("Reprojecting layer to NAD 1983 California Teale Albers ....")
-                arcpy.Project_management(r5WorkSpace, projectedWorkspace, sr)
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
+if __name__ == "__main__":
+    main()
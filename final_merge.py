@@ -9,6 +9,9 @@
 #              final staging database where the WO deliverables and individual
 #              forest geodatabases will be pulled from.
 #
+#              final_merge.py <in_workspace>
+#              or import the module and call final_merge().
+#
 # Runtime Estimates: 37 min 31 sec
 #
 # Created by: Josh Klaus 08/17/2017 jklaus@fs.fed.us
@@ -20,35 +23,116 @@ import os
 import sys
 import datetime
 
-in_workspace = sys.argv[1]
+import region_profile
 
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
+# Region 5 projection, see region_profile.py
+sr = region_profile.spatial_reference(region_profile.get_profile())
 
-# using the now variable to assign year every time there is a hardcoded 2017
-now = datetime.datetime.today()
-curMonth = str(now.month)
-curYear = str(now.year)
-arcpy.AddMessage("Year is " + curYear)
+tesvariablelist = ["Endangered", "Threatened", "Sensitive"]
 
-sr = arcpy.SpatialReference(3310)
 
-arcpy.env.workspace = in_workspace
+def merge_rank(in_workspace, cur_year, tes, final_no_workspace, final_workspace):
+    """Merges and dissolves the IdentInter feature classes of one rank, returns the distributable fc."""
 
-arcpy.env.overwriteOutput = True
+    merge_gdb = cur_year + "_" + tes + "_Merged_CAALB83.gdb"
+    newpath = in_workspace + "\\" + cur_year + "_" + tes
+    tes_workspace = newpath + "\\" + cur_year + "_" + tes + "_IdentInter_CAALB83.gdb"
+    arcpy.env.workspace = tes_workspace
+
+    if arcpy.Exists(tes_workspace):
+        arcpy.AddMessage(tes + " GDB exists")
+    else:
+        arcpy.AddMessage("Creating Geodatabase for " + tes + " Data Deliverables containing merged data")
+        arcpy.CreateFileGDB_management(newpath, merge_gdb)
+
+    fcList = arcpy.ListFeatureClasses()
+
+    inputs = ""
+
+    arcpy.AddMessage("__________________________________________________________________")
+    arcpy.AddMessage("List of features being merged:")
+    for fc in fcList:
+        inputs += os.path.join(arcpy.env.workspace, fc)
+        inputs += ";"
+        arcpy.AddMessage("   " + fc)
+
+    merge_fc = newpath + "\\" + merge_gdb + "\\" + "FireRetardantEIS_" + tes + "_Merged"
+
+    arcpy.AddMessage("-----------------------------------------------------------------")
+    arcpy.AddMessage("Merging " + tes + " feature classes")
+
+    arcpy.Merge_management(inputs, merge_fc)
+
+    arcpy.AddMessage("Finished merging " + tes + " feature classes")
+
+    arcpy.AddMessage("Exporting feature class to final non-distributable Geodatabase")
+
+    final_no_fc_old = final_no_workspace + "\\" + "FireRetardantEIS_" + tes + "_Merged"
+    final_no_fc = final_no_workspace + "\\" + "FireRetardantEIS_" + tes + "_NoDistribution"
+
+    arcpy.FeatureClassToGeodatabase_conversion(merge_fc, final_no_workspace)
+
+    arcpy.Rename_management(final_no_fc_old, final_no_fc)
+
+    arcpy.AddMessage("Export to non-distributable GDB complete")
+
+    arcpy.AddMessage("Dissolving " + tes + " Features")
+
+    dissolveFeatureClass = final_no_fc + "_dissolved"
+
+    if sys.version_info[0] < 3:
+        arcpy.Dissolve_management(final_no_fc, dissolveFeatureClass, ["UnitID", "GRANK_FIRE"], "", "SINGLE_PART")
+    else:
+        arcpy.PairwiseDissolve_analysis(final_no_fc, dissolveFeatureClass,["UnitID", "GRANK_FIRE"])
+
+    arcpy.AddMessage("Repairing Dissolved Geometry ......")
+    arcpy.RepairGeometry_management(dissolveFeatureClass)
+    arcpy.AddMessage("Dissolve and Repair complete")
+
+    arcpy.AddMessage('Exporting dissolved feature class with only UnitID and GRANK_FIRE '
+                     'fields to final distributable Geodatabase')
+
+    final_fc_old = final_workspace + "\\" + "FireRetardantEIS_" + tes + "_NoDistribution_dissolved"
+    final_fc = final_workspace + "\\" + "FireRetardantEIS_" + tes
+
+    arcpy.FeatureClassToGeodatabase_conversion(dissolveFeatureClass, final_workspace)
+
+    arcpy.Rename_management(final_fc_old, final_fc)
+
+    # Delete old file to eliminate any filename confusion
+    arcpy.Delete_management(dissolveFeatureClass)
+
+    arcpy.AddMessage("Export to final distributable GDB complete")
+
+    return final_fc
 
-tesvariablelist = ["Endangered", "Threatened", "Sensitive"]
 
-final_r05_nodist_gdb = curYear + "_S_R05_FireRetardantEIS_CAALB83_NoDistribution_FWS.gdb"
-final_r05_dist_gdb   = curYear + "_S_R05_FireRetardantEIS_CAALB83_DistributableDatasets.gdb"
+def final_merge(in_workspace, run_date=None, region=None):
+    """Merges every rank into the final FWS geodatabases, returns the distributable feature classes.
 
-wo_folder = in_workspace + "\\" + "WO"
-tes_folder = wo_folder + "\\" + "TES_Submitted" + "\\"
-fws_folder = wo_folder + "\\" + "FWS" + "\\"
+    The FWS geodatabases are named after the region, S_R05 by default.
+    """
 
-final_no_wksp = fws_folder + "\\" + final_r05_nodist_gdb
-final_wksp    = fws_folder + "\\" + final_r05_dist_gdb
+    profile = region_profile.get_profile(region)
+
+    # using the now variable to assign year every time there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    arcpy.env.workspace = in_workspace
+
+    arcpy.env.overwriteOutput = True
+
+    final_r05_nodist_gdb = region_profile.no_distribution_gdb(profile, curYear)
+    final_r05_dist_gdb   = region_profile.distributable_gdb(profile, curYear)
+
+    wo_folder = in_workspace + "\\" + "WO"
+    fws_folder = wo_folder + "\\" + "FWS" + "\\"
+
+    final_no_wksp = fws_folder + "\\" + final_r05_nodist_gdb
+    final_wksp    = fws_folder + "\\" + final_r05_dist_gdb
 
-try:
     if not os.path.exists(wo_folder):
         arcpy.AddMessage("Creating directory for WO Data Deliverables ....")
         os.makedirs(wo_folder)
@@ -85,80 +169,30 @@ try:
 
     arcpy.AddMessage("Creating Geodatabase for Forest Data Deliverables ....")
 
-    for tes in tesvariablelist:
-        merge_gdb = curYear + "_" + tes + "_Merged_CAALB83.gdb"
-        newpath = in_workspace + "\\" + curYear + "_" + tes
-        tes_workspace = newpath + "\\" + curYear + "_" + tes + "_IdentInter_CAALB83.gdb"
-        arcpy.env.workspace = tes_workspace
-
-        if arcpy.Exists(tes_workspace):
-            arcpy.AddMessage(tes + " GDB exists")
-        else:
-            arcpy.AddMessage("Creating Geodatabase for " + tes + " Data Deliverables containing merged data")
-            arcpy.CreateFileGDB_management(newpath, merge_gdb)
-
-        fcList = arcpy.ListFeatureClasses()
-
-        inputs = ""
-
-        arcpy.AddMessage("__________________________________________________________________")
-        arcpy.AddMessage("List of features being merged:")
-        for fc in fcList:
-            inputs += os.path.join(arcpy.env.workspace, fc)
-            inputs += ";"
-            arcpy.AddMessage("   " + fc)
+    finalList = []
 
-        merge_fc = newpath + "\\" + merge_gdb + "\\" + "FireRetardantEIS_" + tes + "_Merged"
-
-        arcpy.AddMessage("-----------------------------------------------------------------")
-        arcpy.AddMessage("Merging " + tes + " feature classes")
-
-        arcpy.Merge_management(inputs, merge_fc)
-
-        arcpy.AddMessage("Finished merging " + tes + " feature classes")
-
-        arcpy.AddMessage("Exporting feature class to final non-distributable Geodatabase")
-
-        final_no_fc_old = final_no_wksp + "\\" + "FireRetardantEIS_" + tes + "_Merged"
-        final_no_fc = final_no_wksp + "\\" + "FireRetardantEIS_" + tes + "_NoDistribution"
-
-        arcpy.FeatureClassToGeodatabase_conversion(merge_fc, final_no_wksp)
-
-        arcpy.Rename_management(final_no_fc_old, final_no_fc)
-
-        arcpy.AddMessage("Export to non-distributable GDB complete")
-
-        arcpy.AddMessage("Dissolving " + tes + " Features")
-
-        dissolveFeatureClass = final_no_fc + "_dissolved"
+    for tes in tesvariablelist:
+        finalList.append(merge_rank(in_workspace, curYear, tes, final_no_wksp, final_wksp))
 
-        if sys.version_info[0] < 3:
-            arcpy.Dissolve_management(final_no_fc, dissolveFeatureClass, ["UnitID", "GRANK_FIRE"], "", "SINGLE_PART")
-        else:
-            arcpy.PairwiseDissolve_analysis(final_no_fc, dissolveFeatureClass,["UnitID", "GRANK_FIRE"])
+    arcpy.AddMessage("Merge and Export Complete ready to run wo_deliverable!!")
 
-        arcpy.AddMessage("Repairing Dissolved Geometry ......")
-        arcpy.RepairGeometry_management(dissolveFeatureClass)
-        arcpy.AddMessage("Dissolve and Repair complete")
+    return finalList
 
-        arcpy.AddMessage('Exporting dissolved feature class with only UnitID and GRANK_FIRE '
-                         'fields to final distributable Geodatabase')
 
-        final_fc_old = final_wksp + "\\" + "FireRetardantEIS_" + tes + "_NoDistribution_dissolved"
-        final_fc = final_wksp + "\\" + "FireRetardantEIS_" + tes
+def main():
 
-        arcpy.FeatureClassToGeodatabase_conversion(dissolveFeatureClass, final_wksp)
+    in_workspace = sys.argv[1]
 
-        arcpy.Rename_management(final_fc_old, final_fc)
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
 
-        # Delete old file to eliminate any filename confusion
-        arcpy.Delete_management(dissolveFeatureClass)
+    try:
+        final_merge(in_workspace)
 
-        arcpy.AddMessage("Export to final distributable GDB complete")
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
 
-    arcpy.AddMessage("Merge and Export Complete ready to run wo_deliverable!!")
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
+if __name__ == "__main__":
+    main()
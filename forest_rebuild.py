@@ -0,0 +1,253 @@
+# ---------------------------------------------------------------------------
+# forest_rebuild.py
+#
+# Description: Rebuilds the deliverables of one forest, for example after a
+#              local data correction during fire season, without a statewide run.
+#
+#              Every input of the workspace is clipped to the ownership of the
+#              forest (UnitID_FS) grown by the largest buffer distance, so a
+#              feature outside the forest whose buffer reaches into it is kept.
+#              The clipped copy is written to Forest\<UnitID> with the same
+#              folders, geodatabases and schemas as the workspace (see
+#              copy_workspace in preview_sample.py), its ownership layer holds
+#              only the forest and only the NHD geodatabases of the HU4
+#              subregions touching the forest are copied. The work then scales
+#              with the size of the forest instead of the region.
+#
+#              The pipeline runs on the clipped copy with every stage rebuilt,
+#              except the EDW and USGS/NOAA/FWS downloads and wo_deliverable,
+#              which builds every forest GDB of the region. The forest GDBs are
+#              then written into the workspace the way wo_deliverable.py and
+#              wo_hydro.py write them:
+#                  WO\TES_Submitted\S_R05_<forest>_FireRetardantEIS.gdb
+#                  WO\Hydro_Submitted\S_R05_<forest>_FireRetardantEIS_Hydro.gdb
+#              The regional FWS and NHDfinal geodatabases are left as they are.
+#
+# Usage: forest_rebuild.py <in_workspace> <unitid> [--region NAME] [--margin-feet FT] [--processes N]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import os
+import shutil
+import sys
+
+import gdb_writer
+import pairwise_intersect
+import pipeline_runner
+import preview_sample
+import region_profile
+import run_manifest
+import stage_costs
+import wo_deliverable
+import wo_hydro
+from select_tes_layer import read_selection_list, tesvariablelist
+
+# Stages that pull from outside sources or build the GDBs of every forest
+skippedStageList = ["edw_extract_data", "hydro_download", "wo_deliverable"]
+
+# Buffer of the hydro and Critical Habitat line features, in feet
+fixedBufferFeet = 300
+
+
+def forest_workspace(in_workspace, unit_id):
+
+    return in_workspace + "\\" + "Forest" + "\\" + unit_id
+
+
+def forest_gdb_names(profile, unit_id):
+    """TES_Submitted and Hydro_Submitted GDB names of a UnitID."""
+
+    forestGDB = [gdb for gdb, unitID in region_profile.forest_gdb_dict(profile).items() if unitID == unit_id]
+    hydroGDB = [gdb for gdb, unitID in region_profile.forest_gdb_dict(profile, "_Hydro").items() if unitID == unit_id]
+    if not forestGDB or not hydroGDB:
+        raise ValueError("UnitID " + unit_id + " is not a forest of region " + profile["name"])
+
+    return forestGDB[0], hydroGDB[0]
+
+
+def clip_margin(selection_list):
+    """Largest buffer distance in feet a feature can get, from the summary table and the fixed buffers."""
+
+    margin = fixedBufferFeet
+    for row in selection_list[1:]:
+        if len(row) > 2 and row[2].strip().isdigit():
+            margin = max(margin, int(row[2]))
+
+    return margin
+
+
+def clip_area(in_workspace, cur_year, unit_id, margin_feet):
+    """Ownership of the forest grown by margin_feet, in memory."""
+
+    forestArea = preview_sample.forest_area(in_workspace, cur_year, unit_id)
+
+    arcpy.AddMessage("Growing the ownership of " + unit_id + " by " + str(margin_feet) + " feet")
+    arcpy.Buffer_analysis(forestArea, "in_memory\\forest_clip_area", str(margin_feet) + " Feet",
+                          "FULL", "ROUND", "ALL")
+    arcpy.Delete_management(forestArea)
+
+    return "in_memory\\forest_clip_area"
+
+
+def forest_subregions(in_workspace, profile, area):
+    """HU4 subregions of the region whose boundary touches the area."""
+
+    subregionList = []
+    for subregion in profile["subRegionList"]:
+        wbd = preview_sample.subregion_area(in_workspace, subregion)
+        if not arcpy.Exists(wbd):
+            continue
+
+        arcpy.MakeFeatureLayer_management(wbd, "forest_hu4_lyr")
+        arcpy.SelectLayerByLocation_management("forest_hu4_lyr", "INTERSECT", area)
+        count = int(arcpy.GetCount_management("forest_hu4_lyr").getOutput(0))
+        arcpy.Delete_management("forest_hu4_lyr")
+
+        if count > 0:
+            subregionList.append(subregion)
+
+    return subregionList
+
+
+def clip_workspace(in_workspace, target_workspace, cur_year, unit_id, area, subregions):
+    """Copies the inputs of the workspace clipped to area, with the ownership of the forest only."""
+
+    ownershipFC = pairwise_intersect.ownership_feature_class(in_workspace, cur_year).lower()
+    subregionGDBs = [preview_sample.subregion_gdb(in_workspace, subregion).lower() for subregion in subregions]
+
+    def copy_features(source, target):
+        if source.replace("/", "\\").lower() == ownershipFC:
+            arcpy.MakeFeatureLayer_management(source, "forest_clip_lyr", "UnitID_FS = '" + unit_id + "'")
+            arcpy.CopyFeatures_management("forest_clip_lyr", target)
+            arcpy.Delete_management("forest_clip_lyr")
+        else:
+            arcpy.Clip_analysis(source, area, target)
+        arcpy.AddMessage("  " + target + ": " + arcpy.GetCount_management(target).getOutput(0) + " features")
+
+    def keep_gdb(source_gdb):
+        return not source_gdb.split("\\")[-1].startswith("NHD_H_") or source_gdb.lower() in subregionGDBs
+
+    preview_sample.copy_workspace(in_workspace, target_workspace, copy_features, keep_gdb)
+
+
+def clear_forest_gdb(folder, gdb_name, fc_names):
+    """Creates the forest GDB or removes the feature classes a rebuild writes, so none is left over."""
+
+    if not arcpy.Exists(folder + gdb_name):
+        arcpy.CreateFileGDB_management(folder, gdb_name)
+        return
+
+    for fc in fc_names:
+        if arcpy.Exists(folder + gdb_name + "\\" + fc):
+            arcpy.Delete_management(folder + gdb_name + "\\" + fc)
+
+
+def publish_forest(forest_workspace, in_workspace, cur_year, profile, unit_id):
+    """Writes the forest GDBs built in forest_workspace into the WO folders of in_workspace."""
+
+    forestGDB, hydroGDB = forest_gdb_names(profile, unit_id)
+
+    tesFolder = in_workspace + "\\" + "WO" + "\\" + "TES_Submitted" + "\\"
+    hydroFolder = in_workspace + "\\" + "WO" + "\\" + "Hydro_Submitted" + "\\"
+    for folder in [tesFolder, hydroFolder]:
+        if not os.path.exists(folder.replace("\\", os.sep)):
+            os.makedirs(folder.replace("\\", os.sep))
+
+    with gdb_writer.gdb_write_lock(tesFolder + forestGDB):
+        clear_forest_gdb(tesFolder, forestGDB, ["FireRetardantEIS_" + tes for tes in tesvariablelist])
+        wo_deliverable.build_forest_gdb(forestGDB, wo_deliverable.final_workspace(forest_workspace, cur_year, profile),
+                                        tesFolder, {forestGDB: unit_id})
+
+    finalHydro = forest_workspace + "\\" + "WO" + "\\" + "Hydro_Submitted" + "\\" + \
+        cur_year + "_NHDfinal_CAALB83.gdb" + "\\"
+    with gdb_writer.gdb_write_lock(hydroFolder + hydroGDB):
+        clear_forest_gdb(hydroFolder, hydroGDB, wo_hydro.hydroList)
+        wo_hydro.build_forest_gdb(hydroGDB, finalHydro, hydroFolder, {hydroGDB: unit_id})
+
+    return [tesFolder + forestGDB, hydroFolder + hydroGDB]
+
+
+def forest_rebuild(in_workspace, unit_id, region=None, margin_feet=None, processes=None, run_date=None):
+    """Rebuilds the TES and hydro deliverable GDBs of one forest, returns them."""
+
+    arcpy.env.overwriteOutput = True
+
+    profile = region_profile.get_profile(region)
+    forest_gdb_names(profile, unit_id)
+
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    if margin_feet is None:
+        margin_feet = clip_margin(read_selection_list(pairwise_intersect.summary_table(in_workspace)))
+
+    forestWorkspace = forest_workspace(in_workspace, unit_id)
+
+    area = clip_area(in_workspace, curYear, unit_id, margin_feet)
+    subregions = forest_subregions(in_workspace, profile, area)
+    arcpy.AddMessage("HU4 subregions touching " + unit_id + ": " + ", ".join(subregions))
+
+    arcpy.AddMessage("Clipping the inputs into " + forestWorkspace)
+    clip_workspace(in_workspace, forestWorkspace, curYear, unit_id, area, subregions)
+    arcpy.Delete_management(area)
+
+    # wo_hydro.py only creates its GDBs along with the Hydro_Submitted folder
+    woFolder = forestWorkspace + "\\" + "WO"
+    if os.path.exists(woFolder.replace("\\", os.sep)):
+        shutil.rmtree(woFolder.replace("\\", os.sep))
+
+    stages = pipeline_runner.build_stage_graph(forestWorkspace, region=region, run_date=run_date)
+    stages = pipeline_runner.select_stages(stages, [stage["name"] for stage in stages
+                                                    if stage["name"] not in skippedStageList])
+    for stage in stages:
+        if stage["name"] == "hydrology_processing":
+            stage["kwargs"] = dict(stage["kwargs"], sub_region_list=subregions)
+
+    status = pipeline_runner.run_pipeline(stages, processes, run_manifest.manifest_path(forestWorkspace),
+                                          force=True, cost_file=stage_costs.cost_cache_path(forestWorkspace))
+
+    arcpy.AddMessage("__________________________________________________")
+    for stage in stages:
+        arcpy.AddMessage("  " + stage["name"] + ": " + status.get(stage["name"]))
+
+    if any(value not in ("complete", "current") for value in status.values()):
+        raise RuntimeError("The pipeline failed for " + unit_id + ", the forest GDBs were not replaced")
+
+    gdbList = publish_forest(forestWorkspace, in_workspace, curYear, profile, unit_id)
+    for gdb in gdbList:
+        arcpy.AddMessage("Rebuilt " + gdb)
+
+    return gdbList
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Rebuilds the FRA deliverables of one forest")
+    parser.add_argument("in_workspace")
+    parser.add_argument("unitid", help="UnitID of the forest, for example 0512")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    parser.add_argument("--margin-feet", type=int, default=None,
+                        help="distance around the forest ownership the inputs are clipped to, "
+                             "defaults to the largest buffer of the summary table")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    try:
+        forest_rebuild(args.in_workspace, args.unitid, args.region, args.margin_feet, args.processes)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+        sys.exit(1)
+    except (ValueError, RuntimeError) as e:
+        arcpy.AddError(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
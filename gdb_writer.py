@@ -0,0 +1,203 @@
+# ---------------------------------------------------------------------------
+# gdb_writer.py
+#
+# Description: Serializes writes into the geodatabases that every layer shares,
+#              the YEAR_<rank>_IdentInter_CAALB83.gdb, the
+#              YEAR_FRA_<rank>_OriginalDataBufferedAndNonBufferedAreas_CAALB83.gdb
+#              and the YEAR_FRA_<rank>_OriginalDataNoBuffers_FWSDeliverable_CAALB83.gdb
+#              of the Endangered, Threatened and Sensitive folders.
+#
+#              When select_tes_layer.py or pairwise_intersect.py run for several
+#              layers at once (pipeline_runner.py, stage_daemon.py) their copies
+#              into these GDBs collide on the file geodatabase schema locks and
+#              fail at random. Each layer still selects, buffers, intersects and
+#              dissolves in parallel in its own GDB; only the final copy into a
+#              shared GDB goes through here. A writer takes a lock file next to
+#              the GDB (YEAR_Endangered_IdentInter_CAALB83.gdb.writelock), copies
+#              its features and removes the lock, other writers wait their turn.
+#
+#              The writer touches the lock file while it copies. A lock that has
+#              not been touched for staleLockSeconds was left by a crashed
+#              process and is taken over, so the workspace has to be on a share
+#              whose clock agrees with the workers.
+#
+#              A GDB compressed by intermediate_gc.py to save disk is read only,
+#              the writer uncompresses it before its copy.
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+lockSuffix = ".writelock"
+
+# Marker next to a GDB compressed by intermediate_gc.py
+compressedSuffix = ".compressed"
+
+# Seconds between touches of a held lock and before an untouched lock is stale
+touchSeconds = 15
+staleLockSeconds = 120
+
+pollSeconds = 1
+
+
+def gdb_of(path):
+    """Returns the file geodatabase a dataset path is in, or None when it is not in one."""
+
+    parts = path.replace("/", "\\").rstrip("\\").split("\\")
+    for index in range(len(parts) - 1, -1, -1):
+        if parts[index].lower().endswith(".gdb"):
+            return "\\".join(parts[:index + 1])
+
+    return None
+
+
+def lock_file(gdb):
+
+    return (gdb.rstrip("\\") + lockSuffix).replace("\\", os.sep)
+
+
+def compressed_marker(gdb):
+
+    return (gdb.rstrip("\\") + compressedSuffix).replace("\\", os.sep)
+
+
+def uncompress_gdb(gdb):
+    """Uncompresses a GDB compressed by intermediate_gc.py so its feature classes can be edited again."""
+
+    marker = compressed_marker(gdb)
+    if os.path.exists(marker):
+        arcpy.AddMessage("Uncompressing " + gdb.rstrip("\\") + " before writing to it")
+        arcpy.UncompressFileGeodatabaseData_management(gdb.rstrip("\\"))
+        os.remove(marker)
+
+
+class LockToucher(threading.Thread):
+    """Keeps a held lock fresh in the background while the copy runs."""
+
+    def __init__(self, path):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = path
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(touchSeconds):
+            try:
+                os.utime(self.path, None)
+            except OSError:
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def acquire_lock(path, token):
+    """Creates the lock file, or takes over a stale one. Returns True when the lock is held."""
+
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError:
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            # Released between the two calls
+            return False
+        if age < staleLockSeconds:
+            return False
+
+        # Stale, only one writer can rename it away
+        stalePath = path + ".stale." + token
+        try:
+            os.rename(path, stalePath)
+        except OSError:
+            return False
+        os.remove(stalePath)
+        arcpy.AddWarning("Removed stale write lock " + path)
+        return False
+
+    with os.fdopen(fd, "w") as f:
+        json.dump({"host": socket.gethostname(), "pid": os.getpid(), "token": token, "acquired": time.time()}, f)
+
+    return True
+
+
+class gdb_write_lock(object):
+    """Context manager holding the write lock of a shared geodatabase.
+
+        with gdb_write_lock(gdb):
+            arcpy.CopyFeatures_management(...)
+    """
+
+    def __init__(self, gdb):
+        self.gdb = gdb
+        self.path = lock_file(gdb)
+        self.token = uuid.uuid4().hex
+        self.toucher = None
+
+    def __enter__(self):
+        waited = False
+        while not acquire_lock(self.path, self.token):
+            if not waited:
+                arcpy.AddMessage("Waiting for another process writing to " + os.path.basename(self.path)[:-len(lockSuffix)])
+                waited = True
+            time.sleep(pollSeconds)
+
+        self.toucher = LockToucher(self.path)
+        self.toucher.start()
+        try:
+            uncompress_gdb(self.gdb)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.toucher.stop()
+        try:
+            with open(self.path) as f:
+                owner = json.load(f).get("token")
+        except (IOError, OSError, ValueError):
+            owner = None
+        if owner == self.token:
+            os.remove(self.path)
+        else:
+            arcpy.AddWarning("Write lock " + self.path + " was taken over while it was held")
+        return False
+
+
+def create_file_gdb(folder, gdb_name):
+    """Creates a shared geodatabase unless another process already has."""
+
+    gdb = folder.rstrip("\\") + "\\" + gdb_name
+
+    if not os.path.exists(folder.replace("\\", os.sep)):
+        try:
+            os.makedirs(folder.replace("\\", os.sep))
+        except OSError:
+            # Created by another process in the meantime
+            if not os.path.isdir(folder.replace("\\", os.sep)):
+                raise
+
+    with gdb_write_lock(gdb):
+        if not arcpy.Exists(gdb):
+            arcpy.CreateFileGDB_management(folder, gdb_name)
+
+    return gdb
+
+
+def copy_features(in_features, out_feature_class):
+    """CopyFeatures_management into a shared geodatabase, one writer per geodatabase at a time."""
+
+    gdb = gdb_of(out_feature_class)
+    if gdb is None:
+        return arcpy.CopyFeatures_management(in_features, out_feature_class)
+
+    with gdb_write_lock(gdb):
+        return arcpy.CopyFeatures_management(in_features, out_feature_class)
@@ -8,6 +8,9 @@
 #              Note: usage is limited to ArcGIS 10.x because of Python version issues with Pro.
 #                    Due to the usage of urllib module. Will need to change for Pro.
 #
+#              hydro_download.py <in_workspace>
+#              or import the module and call hydro_download().
+#
 # Runtime Estimates: 13 min 10 sec
 #
 # Created by: Josh Klaus 08/24/2017 jklaus@fs.fed.us
@@ -17,61 +20,102 @@
 import arcpy
 import sys
 import os
-import datetime
 import urllib
 import zipfile
 import shutil
 
-# Set workspace or obtain from user input
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
-in_workspace = sys.argv[1]
-
-arcpy.env.workspace = in_workspace
-arcpy.env.overwriteOutput = True
+import gdb_writer
+import region_profile
 
-subRegionList = ["1503", "1604", "1605", "1606", "1710", "1712",
-                 "1801", "1802", "1803", "1804", "1805", "1806",
-                 "1807", "1808", "1809", "1810"]
+# Region 5 subregions, other regions pass their region to hydro_download()
+subRegionList = region_profile.get_profile()["subRegionList"]
 
 salmonList = ["chinook", "coho", "steelhead"]
 
 downloadFolders = ["NOAA_ESU", "Hydro", "CHab"]
 
-downloadPath = in_workspace + "\\" + "Downloads"
-if not os.path.exists(downloadPath):
-    arcpy.AddMessage("Creating directory for Downloads")
-    os.makedirs(downloadPath)
 
-for folder in downloadFolders:
+def download_and_unzip(url, download_path, filename, cache_path=None):
+    """Downloads and unzips filename into download_path.
+
+    With a cache_path the zip is kept there and only downloaded once for every workspace using the
+    cache, for example by the regions of region_batch.py that share NHD subregions.
+    """
+
+    if cache_path is None:
+        downloadFile = os.path.join(download_path, filename)
+
+        arcpy.AddMessage("Downloading " + filename + " to " + download_path)
+
+        urllib.urlretrieve(url, downloadFile)
+    else:
+        downloadFile = os.path.join(cache_path, filename)
+        if not os.path.exists(cache_path):
+            try:
+                os.makedirs(cache_path)
+            except OSError:
+                # Created by another region in the meantime
+                pass
+
+        # One region downloads, the others wait for it and reuse the zip
+        with gdb_writer.gdb_write_lock(downloadFile):
+            if os.path.exists(downloadFile):
+                arcpy.AddMessage("Using cached " + filename)
+            else:
+                arcpy.AddMessage("Downloading " + filename + " to " + cache_path)
+                urllib.urlretrieve(url, downloadFile + ".part")
+                os.rename(downloadFile + ".part", downloadFile)
+#     with urllib.request.urlopen(url) as response, open(downloadFile, 'wb') as output_file:
+#         shutil.copyfileobj(response, output_file)
+
+    arcpy.AddMessage("Unzipping " + filename)
+    zip_ref = zipfile.ZipFile(downloadFile, 'r')
+    zip_ref.extractall(download_path)
+    zip_ref.close()
+
+    return downloadFile
+
+
+def hydro_download(in_workspace, sub_region_list=None, region=None, download_cache=None):
+    """Downloads and unzips the NHD, NOAA ESU and critical habitat data, returns the Downloads folder.
+
+    The NHD subregions default to those of the region profile (Region 5). With a download_cache folder
+    the zips are shared with other workspaces using the same cache.
+    """
+
+    arcpy.env.workspace = in_workspace
+    arcpy.env.overwriteOutput = True
+
+    if sub_region_list is None:
+        sub_region_list = region_profile.get_profile(region)["subRegionList"]
+
+    cacheDict = dict((folder, None) for folder in downloadFolders)
+    if download_cache is not None:
+        cacheDict = dict((folder, os.path.join(download_cache, folder)) for folder in downloadFolders)
 
-    if not os.path.exists(downloadPath + "\\" + folder):
-        arcpy.AddMessage("Creating download directory for " + folder)
-        os.makedirs(downloadPath + "\\" + folder)
+    downloadPath = in_workspace + "\\" + "Downloads"
+    if not os.path.exists(downloadPath):
+        arcpy.AddMessage("Creating directory for Downloads")
+        os.makedirs(downloadPath)
+
+    for folder in downloadFolders:
+
+        if not os.path.exists(downloadPath + "\\" + folder):
+            arcpy.AddMessage("Creating download directory for " + folder)
+            os.makedirs(downloadPath + "\\" + folder)
 
-try:
     arcpy.AddMessage("_____________________________________________________")
     arcpy.AddMessage("Downloading and unzipping all NHD data from USGS ftp site")
 
-    for region in subRegionList:
+    for subRegion in sub_region_list:
 
-        filename = "NHD_H_" + region + "_HU4_GDB.zip"
+        filename = "NHD_H_" + subRegion + "_HU4_GDB.zip"
 
         hydroDownloadPath = downloadPath + "\\" + "Hydro"
 
-        downloadFile = os.path.join(hydroDownloadPath, filename)
-
         url = "ftp://rockyftp.cr.usgs.gov/vdelivery/Datasets/Staged/Hydrography/NHD/HU4/HighResolution/GDB/" + filename
 
-        arcpy.AddMessage("Downloading " + filename + " to " + hydroDownloadPath)
-
-        urllib.urlretrieve(url, downloadFile)
-#         with urllib.request.urlopen(url) as response, open(filename, 'wb') as output_file:
-#             shutil.copyfileobj(response, output_file)
-
-        arcpy.AddMessage("Unzipping " + filename)
-        zip_ref = zipfile.ZipFile(downloadFile, 'r')
-        zip_ref.extractall(hydroDownloadPath)
-        zip_ref.close()
+        download_and_unzip(url, hydroDownloadPath, filename, cacheDict["Hydro"])
 
     arcpy.AddMessage("_____________________________________________________")
     arcpy.AddMessage("Downloading and unzipping all ESU data from NOAA website")
@@ -82,20 +126,9 @@ try:
 
         noaaDownloadPath = downloadPath + "\\" + "NOAA_ESU"
 
-        downloadFile = os.path.join(noaaDownloadPath, filename)
-
         url = "http://www.westcoast.fisheries.noaa.gov/publications/gis_maps/gis_data/salmon_steelhead/esu/" + filename
 
-        arcpy.AddMessage("Downloading " + filename + " to " + noaaDownloadPath)
-
-        urllib.urlretrieve(url, downloadFile)
-#         with urllib.request.urlopen(url) as response, open(downloadFile, 'wb') as output_file:
-#             shutil.copyfileobj(response, output_file)
-
-        arcpy.AddMessage("Unzipping " + filename)
-        zip_ref = zipfile.ZipFile(downloadFile, 'r')
-        zip_ref.extractall(noaaDownloadPath)
-        zip_ref.close()
+        download_and_unzip(url, noaaDownloadPath, filename, cacheDict["NOAA_ESU"])
 
     arcpy.AddMessage("_____________________________________________________")
     arcpy.AddMessage("Downloading and unzipping all Critical Habitat data from FWS website")
@@ -103,23 +136,27 @@ try:
 
     chabDownloadPath = downloadPath + "\\" + "CHab"
 
-    downloadFile = os.path.join(chabDownloadPath, filename)
-
     url = "https://ecos.fws.gov/docs/crithab/crithab_all/" + filename
 
-    arcpy.AddMessage("Downloading " + filename + " to " + chabDownloadPath)
+    download_and_unzip(url, chabDownloadPath, filename, cacheDict["CHab"])
 
-    urllib.urlretrieve(url, downloadFile)
-#     with urllib.request.urlopen(url) as response, open(downloadFile, 'wb') as output_file:
-#         shutil.copyfileobj(response, output_file)
+    return downloadPath
 
-    arcpy.AddMessage("Unzipping " + filename)
-    zip_ref = zipfile.ZipFile(downloadFile, 'r')
-    zip_ref.extractall(chabDownloadPath)
-    zip_ref.close()
+
+def main():
+
+    # Set workspace or obtain from user input
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
+    in_workspace = sys.argv[1]
+
+    try:
+        hydro_download(in_workspace)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
 
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,34 @@
 #              The buffered feature class is then intersected with the Land Ownership feature
 #              class to obtain the UnitID. The feature classes are then dissolved to just the
 #              relevant FRA fields added earlier.
+#              Progress is checkpointed after every subregion feature class, merge and
+#              buffer/intersect/dissolve pass. A rerun on the same inputs resumes at the
+#              first item that is not complete, changed inputs start over and a
+#              complete run removes the checkpoint (see checkpoint.py). Pass "restart"
+#              as the second argument to start over.
+#
+#              The 3 feature classes of every subregion are independent, they are
+#              exported, projected, selected and attributed by a pool of worker
+#              processes (--processes, all CPUs by default). Each worker works in
+#              its own scratch folder and GDB under Output\HydroYEAR\ingest and
+#              copies only the finished _select feature class into the Hydro GDB,
+#              one writer at a time (see gdb_writer.py). The merge lists keep the
+#              subregion order whatever order the workers finish in.
+#              pipeline_runner.py runs this stage in a process of its own so it can
+#              start the pool (--stage-processes, --sharded). Run inside a daemonic
+#              pool worker, which cannot start processes of its own, or with
+#              --processes 1 the feature classes are ingested one by one.
+#
+#              With --sharded the buffer, intersect, perennial select and dissolve
+#              also run per subregion (HU4 shard) in the worker pool instead of on
+#              the statewide merges, which are not built. The shard intersects are
+#              merged into the _Buff_intersect feature classes. The shard
+#              dissolves are merged and only the dissolve groups found in more
+#              than one shard, those crossing a seam between subregions, are
+#              dissolved again.
+#
+#              hydrology_processing.py <in_workspace> [restart] [--processes N] [--sharded]
+#              or import the module and call hydrology_processing().
 #
 # Arcpy Usage: FeatureClassToShapefile_conversion, Rename_management, Project_management,
 #              FeatureClassToGeodatabase_conversion, MakeFeatureLayer_management, SelectLayerByAttribute_management,
@@ -26,58 +54,33 @@
 
 # Import arcpy module
 import arcpy
+import argparse
 import sys
 import os
 import datetime
+import multiprocessing
+import shutil
+import socket
 
-# Set workspace or obtain from user input
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fra_new\\"
-in_workspace = sys.argv[1]
-
-arcpy.env.workspace = in_workspace
-arcpy.env.overwriteOutput = True
-
-# using the now variable to assign year every time there is a hardcoded 2017
-now = datetime.datetime.today()
-curMonth = str(now.month)
-curYear = str(now.year)
-arcpy.AddMessage("Year is " + curYear)
-
-# hydroWorkspace = in_workspace + "\\" + "NHD" + curYear + "\\" + "Subregions" + "\\"
+import checkpoint
+import gdb_writer
+import region_profile
 
-hydroWorkspace = in_workspace + "\\" + "Downloads" + "\\" + "Hydro" + "\\"
+# Region 5 values, other regions pass their region to hydrology_processing()
+sr = region_profile.spatial_reference(region_profile.get_profile())
 
-outputDir = in_workspace + "\\" + "Output"
+subRegionList = region_profile.get_profile()["subRegionList"]
 
-outputHydroDir = "Hydro" + curYear
-
-outputWorkspace = outputDir + "\\" + outputHydroDir + "\\"
+# subRegionList = ["1503", "1801"]
 
 hydroFeatureDataset = "\\" + "Hydrography" + "\\"
 
-# Need to rename when done with testing
-projectedGDB = "Hydro_" + curYear + "_CAALB83.gdb"
-
-outputProjGDB = outputWorkspace + projectedGDB
-
-sr = arcpy.SpatialReference(3310)
-
-subRegionList = ["1503", "1604", "1605", "1606", "1710", "1712",
-                "1801", "1802", "1803", "1804", "1805", "1806",
-                "1807", "1808", "1809", "1810"]
-
-# subRegionList = ["1503", "1801"]
-
 nhdAreaFC = "NHDArea"
 nhdFlowlineFC = "NHDFlowline"
 nhdWaterbodyFC = "NHDWaterbody"
 
 waterFeatureList = [nhdAreaFC, nhdFlowlineFC, nhdWaterbodyFC]
 
-nhdAreaList = []
-nhdFlowlineList = []
-nhdWaterbodyList = []
-
 nhdAreaMerge = "NHDArea_Merge"
 nhdFlowlineMerge = "NHDFlowline_Merge"
 nhdWaterbodyMerge = "NHDWaterBody_Merge"
@@ -85,306 +88,736 @@ nhdArea_WaterbodyMerge = "NHDWaterbody_Area_Merge"
 
 mergeList = [nhdAreaMerge, nhdFlowlineMerge, nhdWaterbodyMerge, nhdArea_WaterbodyMerge]
 
-nhdAreaBuffer = "NHDArea_Merge_Buff"
-nhdFlowlineBuffer = "NHDFlowline_Merge_Buff"
-nhdWaterbodyBuffer = "NHDWaterBody_Merge_Buff"
-nhdArea_WaterbodyBuffer = "NHDWaterbody_Area_Merge_Buff"
+bufferField = "BUFFM_FIRE"
 
-bufferList = [nhdAreaMerge, nhdFlowlineMerge, nhdWaterbodyMerge, nhdArea_WaterbodyMerge]
+dissolveFieldList = ["UnitID", "GRANK_FIRE", "SNAME_FIRE", "CNAME_FIRE", "SOURCEFIRE",
+                     "BUFFT_FIRE", "BUFFM_FIRE", "CMNT_FIRE", "INST_FIRE", "BUFF_DIST"]
+
+# Subregion feature classes each merge is built from in the sharded mode
+shardInputDict = {nhdFlowlineMerge: [nhdFlowlineFC],
+                  nhdAreaMerge: [nhdAreaFC],
+                  nhdWaterbodyMerge: [nhdWaterbodyFC],
+                  nhdArea_WaterbodyMerge: [nhdAreaFC, nhdWaterbodyFC]}
+
+# Field holding the subregion of a shard dissolve until the seam pass
+shardField = "HU4_SHARD"
+
+
+def add_fra_fields(select_fc):
+
+    arcpy.AddField_management(select_fc, "UnitID", "TEXT", "", "", "5", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "GRANK_FIRE", "TEXT", "", "", "50", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "SOURCEFIRE", "TEXT", "", "", "50", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "SNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "CNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "BUFFT_FIRE", "SHORT", "", "", "", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "BUFFM_FIRE", "SHORT", "", "", "", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "CMNT_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(select_fc, "INST_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+
+
+def populate_fra_attributes(select_fc, water_feature, cur_month, cur_year):
+
+    cur = arcpy.UpdateCursor(select_fc)
+
+    for row in cur:
+        fCodefield = row.getValue("FCode")
+        fTypefield = row.getValue("FType")
+
+        row.SOURCEFIRE = "NHD Subbasins " + cur_month + " " + cur_year
+        row.SNAME_FIRE = "Hydro"
+        row.CNAME_FIRE = "Hydro"
+        row.BUFFT_FIRE = "300"
+        row.BUFFM_FIRE = 91.44
+        if water_feature == nhdAreaFC:
+            row.GRANK_FIRE = "NHDArea Stream/River"
+        elif water_feature == nhdWaterbodyFC:
+            row.GRANK_FIRE = "NHD Waterbody"
+        elif water_feature == nhdFlowlineFC:
+            row.GRANK_FIRE = "NHDFlowline Stream/River"
+
+        if fCodefield == 46000:
+            row.CMNT_FIRE = "FCode 46000 - Stream/River"
+            row.INST_FIRE = "Stream/River"
+        elif fCodefield == 46003:
+            row.CMNT_FIRE = "FCode 46003 - Stream/River Intermittent"
+            row.INST_FIRE = "Stream/River Intermitten"
+        elif fCodefield == 46006:
+            row.CMNT_FIRE = "FCode 46006 - Stream/River Perennial"
+            row.INST_FIRE = "Stream/River Perennial"
+        elif fCodefield == 39004:
+            row.CMNT_FIRE = "FCode 39004 - LakePond Perennial"
+            row.INST_FIRE = "LakePond Perennial"
+        elif fCodefield == 39009:
+            row.CMNT_FIRE = "FCode 39009 - LakePond Perennial Average Stage"
+            row.INST_FIRE = "LakePond Perennial Average Stage"
+        elif fCodefield == 39010:
+            row.CMNT_FIRE = "FCode 39010 - LakePond Perennial Normal Pool"
+            row.INST_FIRE = "LakePond Perennial Normal Pool"
+        elif fCodefield == 39011:
+            row.CMNT_FIRE = "FCode 39011 - LakePond Perennial Date of Photography"
+            row.INST_FIRE = "LakePond Perennial Date of Photography"
+        elif fTypefield == 436:
+            row.CMNT_FIRE = "FType 436 - Reservoir"
+            row.INST_FIRE = "Reservoir"
+        elif fTypefield == 466:
+            row.CMNT_FIRE = "FType 466 - Swamp Marsh"
+            row.INST_FIRE = "Swamp Marsh"
+        elif fTypefield == 493:
+            row.CMNT_FIRE = "FType 493 - Estuary"
+            row.INST_FIRE = "Estuary"
 
-intersectList = []
+        cur.updateRow(row)
+
+    del cur
 
-bufferField = "BUFFM_FIRE"
 
-usfsOwnershipFeatureClass = in_workspace + \
-                            "\\USFS_Ownership_LSRS\\" + curYear + \
-                            "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + curYear
+def ingest_subregion_feature(hydro_gdb, water_feature, region, output_workspace, new_hydro_workspace,
+                             cur_month, cur_year, profile=None):
+    """Exports, projects, selects and attributes one NHD feature class of a subregion, returns the select fc."""
+
+    if profile is None:
+        profile = region_profile.get_profile()
+
+    newShapefile = water_feature + "_" + region
+    selectFC = new_hydro_workspace + newShapefile + "_select"
+
+    inHydroFD = hydro_gdb + hydroFeatureDataset
+    inHydroFC = inHydroFD + water_feature
+    arcpy.AddMessage("Origin of Data: " + inHydroFC)
+
+    arcpy.AddMessage("Exporting " + water_feature + " to shapefile for projecting")
+    arcpy.FeatureClassToShapefile_conversion(inHydroFC, output_workspace)
 
-try:
+    # Rename files to add Subregion to name to distinguish different feature classes as loop runs
+    arcpy.Rename_management(output_workspace + water_feature + ".shp", newShapefile)
 
-    if not os.path.exists(outputDir):
-        arcpy.AddMessage("Creating directory for Output")
-        os.makedirs(outputDir)
+    inProjShapefile = output_workspace + newShapefile + ".shp"
+    outProjShapefile = output_workspace + newShapefile + "_proj.shp"
+
+    spatial_ref = arcpy.Describe(inProjShapefile).spatialReference
+
+    arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
 
-    if not os.path.exists(outputDir + "\\" + outputHydroDir):
-        arcpy.AddMessage("Creating output directory for " + outputHydroDir)
-        os.makedirs(outputDir + "\\" + outputHydroDir)
+    if spatial_ref.name != profile["spatialReferenceName"]:
+        arcpy.AddMessage("Reprojecting shapefile to " + profile["spatialReferenceName"])
+        arcpy.Project_management(inProjShapefile, outProjShapefile, region_profile.spatial_reference(profile))
+        arcpy.AddMessage("reprojection complete")
 
-    if arcpy.Exists(outputWorkspace + "\\" + projectedGDB):
-        newHydroWorkSpace = outputWorkspace + "\\" + projectedGDB + "\\"
+    arcpy.AddMessage("Converting shapefile to GDB")
+    arcpy.FeatureClassToGeodatabase_conversion(outProjShapefile, new_hydro_workspace)
+    arcpy.AddMessage("Finished converting shapefile to GDB")
+
+    inSelectFC = new_hydro_workspace + newShapefile + "_proj"
+
+    selectQuery = ""
+
+    if water_feature == nhdFlowlineFC:
+        selectQuery = "( FCode = 46000 OR FCode = 46003 OR FCode = 46006 )"
+    elif water_feature == nhdWaterbodyFC:
+        selectQuery = "(  FType = 436 OR FType = 466 OR FType = 493 " \
+                      "OR FCode = 39004 OR FCode = 39009 OR FCode = 39010 OR FCode = 39011)"
+    elif water_feature == nhdAreaFC:
+        selectQuery = "( FCode = 46000 OR FCode = 46003 OR FCode = 46006 )"
+
+    arcpy.AddMessage("Selecting features based on following Select Query: " + selectQuery)
+    arcpy.MakeFeatureLayer_management(inSelectFC, "lyr" )
+
+    arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", selectQuery )
+
+    arcpy.AddMessage("Copying selected records to new feature ......")
+    arcpy.CopyFeatures_management("lyr", selectFC)
+
+    result = arcpy.GetCount_management(selectFC)
+    count = int(result.getOutput(0))
+    arcpy.AddMessage("Total Number of Records: " + str(count))
+
+    arcpy.AddMessage("Adding fields")
+    add_fra_fields(selectFC)
+
+    arcpy.AddMessage("Updating fields")
+    populate_fra_attributes(selectFC, water_feature, cur_month, cur_year)
+
+    return selectFC
+
+
+def worker_scratch(scratch_folder, gdb_name):
+    """Creates the scratch folder and GDB of this worker process, returns the folder ending in a backslash."""
+
+    workFolder = scratch_folder + socket.gethostname() + "_" + str(os.getpid()) + "\\"
+    if not os.path.exists(workFolder):
+        os.makedirs(workFolder)
+    if not arcpy.Exists(workFolder + gdb_name):
+        arcpy.CreateFileGDB_management(workFolder, gdb_name)
+
+    return workFolder
+
+
+def ingest_unit(unit):
+    """Ingests one subregion feature class in the scratch folder of this worker and copies the select
+    feature class into the Hydro GDB, returns its name, the select fc or None and the error message.
+    """
+
+    hydroGDB, waterFeature, region, scratchFolder, newHydroWorkSpace, curMonth, curYear, profile = unit
+    newShapefile = waterFeature + "_" + region
+
+    arcpy.env.overwriteOutput = True
+
+    try:
+        workFolder = worker_scratch(scratchFolder, "ingest.gdb")
+        workGDB = workFolder + "ingest.gdb" + "\\"
+
+        arcpy.AddMessage("Processing " + waterFeature + " of " + hydroGDB)
+        workSelectFC = ingest_subregion_feature(hydroGDB, waterFeature, region, workFolder, workGDB,
+                                                curMonth, curYear, profile)
+
+        selectFC = newHydroWorkSpace + newShapefile + "_select"
+        gdb_writer.copy_features(workSelectFC, selectFC)
+
+        for intermediate in [workSelectFC, workGDB + newShapefile + "_proj", workFolder + newShapefile + ".shp",
+                             workFolder + newShapefile + "_proj.shp"]:
+            if arcpy.Exists(intermediate):
+                arcpy.Delete_management(intermediate)
+
+        return newShapefile, selectFC, ""
+
+    except arcpy.ExecuteError:
+        return newShapefile, None, arcpy.GetMessages(2)
+    except Exception as e:
+        return newShapefile, None, str(e)
+
+
+def ingest_parallel(unit_list, output_workspace, new_hydro_workspace, cur_month, cur_year, profile,
+                    hydro_checkpoint, rebuilt_list, processes):
+    """Ingests the (hydro GDB, water feature, subregion) units with a pool of worker processes."""
+
+    scratchFolder = output_workspace + "ingest" + "\\"
+
+    arcpy.AddMessage("Ingesting " + str(len(unit_list)) + " subregion feature classes with " +
+                     str(processes) + " worker processes")
+
+    if not os.path.exists(scratchFolder):
+        os.makedirs(scratchFolder)
+
+    jobList = [unit + (scratchFolder, new_hydro_workspace, cur_month, cur_year, profile) for unit in unit_list]
+    failedList = []
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for newShapefile, selectFC, message in pool.imap_unordered(ingest_unit, jobList):
+            if selectFC is None:
+                arcpy.AddError("Ingest of " + newShapefile + " failed: " + message)
+                failedList.append(newShapefile)
+                continue
+            arcpy.AddMessage("Ingested " + newShapefile)
+            checkpoint.mark_complete(hydro_checkpoint, newShapefile, [selectFC])
+            rebuilt_list.append(selectFC)
+    finally:
+        pool.close()
+        pool.join()
+
+    if failedList:
+        # The scratch folders are left for inspection, the checkpoint keeps the units that finished
+        raise RuntimeError("NHD ingest failed for " + ", ".join(failedList))
+
+    if os.path.exists(scratchFolder):
+        shutil.rmtree(scratchFolder)
+
+
+def dissolve_fra_fields(in_fc, out_fc):
+
+    if sys.version_info[0] < 3:
+        arcpy.Dissolve_management(in_fc, out_fc, dissolveFieldList, "", "SINGLE_PART")
     else:
-        arcpy.CreateFileGDB_management(outputWorkspace, projectedGDB)
-        newHydroWorkSpace = outputWorkspace + "\\" + projectedGDB + "\\"
+        arcpy.PairwiseDissolve_analysis(in_fc, out_fc, dissolveFieldList)
 
-    arcpy.AddMessage("Ouput Workspace: " + newHydroWorkSpace)
 
-    for region in subRegionList:
-        hydroGDB = "NHD_H_" + region + "_HU4_GDB.gdb"
+def buffer_intersect_dissolve(output_proj_gdb, item, ownership_fc, copy_geocomplete=True):
+    """Buffers a merged hydro feature class, intersects it with ownership and dissolves it to _geocomplete.
 
-        if arcpy.Exists(hydroWorkspace + hydroGDB):
-            arcpy.AddMessage("______________________________________")
-            arcpy.AddMessage("Processing " + hydroGDB)
+    Without copy_geocomplete the intersect and dissolved feature classes are returned, the dissolved one
+    is None when no perennial feature is on forest land.
+    """
 
-            for waterFeature in waterFeatureList:
-                arcpy.AddMessage("--------------------------------------")
-                arcpy.AddMessage("processing " + waterFeature)
+    bufferInput = output_proj_gdb + "\\" + item
+    bufferOutput = output_proj_gdb + "\\" + item + "_Buff"
 
-                flowlineShapefile = waterFeature + ".shp"
+    arcpy.AddMessage("Buffering " + item + " features ....")
 
-                inHydroFD = hydroWorkspace + hydroGDB + hydroFeatureDataset
-                inHydroFC = inHydroFD + waterFeature
-                arcpy.AddMessage("Origin of Data: " + inHydroFC)
+    arcpy.Buffer_analysis(bufferInput, bufferOutput, bufferField)
 
-                arcpy.AddMessage("Exporting " + waterFeature + " to shapefile for projecting")
-                arcpy.FeatureClassToShapefile_conversion(inHydroFC, outputWorkspace)
+    arcpy.AddMessage("Repairing Geometry of Buffered " + item)
+    arcpy.RepairGeometry_management(bufferOutput)
 
-                newShapefile = waterFeature + "_" + region
+    intersectFeatureClass = bufferOutput + "_intersect"
 
-                # Rename files to add Subregion to name to distinguish different feature classes as loop runs
-                arcpy.Rename_management(outputWorkspace + waterFeature + ".shp", newShapefile)
+    arcpy.AddMessage("Intersecting with USFS Ownership feature class .....")
+    arcpy.AddMessage("Please be patient while this runs .....")
 
-                inProjShapefile = outputWorkspace + newShapefile + ".shp"
-                outProjShapefile = outputWorkspace + newShapefile + "_proj.shp"
+    if sys.version_info[0] < 3:
+        arcpy.Intersect_analysis([bufferOutput, ownership_fc], intersectFeatureClass)
+    else:
+        arcpy.PairwiseIntersect_analysis([bufferOutput, ownership_fc], intersectFeatureClass)
 
-                spatial_ref = arcpy.Describe(inProjShapefile).spatialReference
+    arcpy.AddMessage("Completed Intersection")
 
-                arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
+    arcpy.AddMessage(" ____________________________________________________________________")
 
-                if spatial_ref.name != "NAD_1983_California_Teale_Albers":
-                    arcpy.AddMessage("Reprojecting shapefile to NAD 1983 California Teale Albers")
-                    arcpy.Project_management(inProjShapefile, outProjShapefile, sr)
-                    arcpy.AddMessage("reprojection complete")
+    arcpy.AddMessage("Updating UnitID field from intersection")
 
-                arcpy.AddMessage("Converting shapefile to GDB")
-                arcpy.FeatureClassToGeodatabase_conversion(outProjShapefile, newHydroWorkSpace)
-                arcpy.AddMessage("Finished converting shapefile to GDB")
+    cur = arcpy.UpdateCursor(intersectFeatureClass)
 
-                inSelectFC = newHydroWorkSpace + newShapefile + "_proj"
-                selectFC = newHydroWorkSpace + newShapefile + "_select"
+    field = "UnitID_FS"
+
+    # populating UnitID field with UnitID_FS field
+    for row in cur:
+        row.UnitID = str(row.getValue(field))
+        cur.updateRow(row)
+
+    del cur
+
+    arcpy.AddMessage("Repairing Geometry ......")
+    arcpy.RepairGeometry_management(intersectFeatureClass)
+
+    # make a copy of intersectFeatureClass for NOAA processing
+
+    arcpy.AddMessage("Selecting out Intermittents")
+
+    perennialFeatureClass = output_proj_gdb + "\\" + item + "_perennial"
+
+    arcpy.MakeFeatureLayer_management(intersectFeatureClass, "lyr")
+
+    if item.startswith(nhdFlowlineMerge):
+        arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "(FCode <> 46000) AND (FCode <> 46003)")
+        arcpy.AddMessage("Selecting out 46000 and 46003 for Flowlines")
+    else:
+        arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "(FCode <> 46003)")
+        arcpy.AddMessage("Selecting out 46003 for Waterbodies and Areas")
+
+    result = arcpy.GetCount_management("lyr")
+    count = int(result.getOutput(0))
+    arcpy.AddMessage("Total Number of Records: " + str(count))
+
+    if count > 0:
+        arcpy.AddMessage("Copying selected records to Geodatabase without intermittent data.")
+        arcpy.CopyFeatures_management("lyr", perennialFeatureClass)
+    elif not copy_geocomplete:
+        # A shard whose subregion has no perennial water on forest land
+        arcpy.Delete_management("lyr")
+        return [intersectFeatureClass, None]
+
+    arcpy.AddMessage("Dissolving Features")
 
-                selectQuery = ""
-
-                if waterFeature == nhdFlowlineFC:
-                    selectQuery = "( FCode = 46000 OR FCode = 46003 OR FCode = 46006 )"
-                elif waterFeature == nhdWaterbodyFC:
-                    selectQuery = "(  FType = 436 OR FType = 466 OR FType = 493 " \
-                                  "OR FCode = 39004 OR FCode = 39009 OR FCode = 39010 OR FCode = 39011)"
-                elif waterFeature == nhdAreaFC:
-                    selectQuery = "( FCode = 46000 OR FCode = 46003 OR FCode = 46006 )"
-
-                arcpy.AddMessage("Selecting features based on following Select Query: " + selectQuery)
-                arcpy.MakeFeatureLayer_management(inSelectFC, "lyr" )
-
-                arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", selectQuery )
-
-                arcpy.AddMessage("Copying selected records to new feature ......")
-                arcpy.CopyFeatures_management("lyr", selectFC)
-
-                result = arcpy.GetCount_management(selectFC)
-                count = int(result.getOutput(0))
-                arcpy.AddMessage("Total Number of Records: " + str(count))
-
-                arcpy.AddMessage("Adding fields")
-
-                arcpy.AddField_management(selectFC, "UnitID", "TEXT", "", "", "5", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "GRANK_FIRE", "TEXT", "", "", "50", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "SOURCEFIRE", "TEXT", "", "", "50", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "SNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "CNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "BUFFT_FIRE", "SHORT", "", "", "", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "BUFFM_FIRE", "SHORT", "", "", "", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "CMNT_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-                arcpy.AddField_management(selectFC, "INST_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
-                                          "NON_REQUIRED", "")
-
-                arcpy.AddMessage("Updating fields")
-
-                cur = arcpy.UpdateCursor(selectFC)
-
-                for row in cur:
-                    fCodefield = row.getValue("FCode")
-                    fTypefield = row.getValue("FType")
-
-                    row.SOURCEFIRE = "NHD Subbasins " + curMonth + " " + curYear
-                    row.SNAME_FIRE = "Hydro"
-                    row.CNAME_FIRE = "Hydro"
-                    row.BUFFT_FIRE = "300"
-                    row.BUFFM_FIRE = 91.44
-                    if waterFeature == nhdAreaFC:
-                        row.GRANK_FIRE = "NHDArea Stream/River"
-                    elif waterFeature == nhdWaterbodyFC:
-                        row.GRANK_FIRE = "NHD Waterbody"
-                    elif waterFeature == nhdFlowlineFC:
-                        row.GRANK_FIRE = "NHDFlowline Stream/River"
-
-                    if fCodefield == 46000:
-                        row.CMNT_FIRE = "FCode 46000 - Stream/River"
-                        row.INST_FIRE = "Stream/River"
-                    elif fCodefield == 46003:
-                        row.CMNT_FIRE = "FCode 46003 - Stream/River Intermittent"
-                        row.INST_FIRE = "Stream/River Intermitten"
-                    elif fCodefield == 46006:
-                        row.CMNT_FIRE = "FCode 46006 - Stream/River Perennial"
-                        row.INST_FIRE = "Stream/River Perennial"
-                    elif fCodefield == 39004:
-                        row.CMNT_FIRE = "FCode 39004 - LakePond Perennial"
-                        row.INST_FIRE = "LakePond Perennial"
-                    elif fCodefield == 39009:
-                        row.CMNT_FIRE = "FCode 39009 - LakePond Perennial Average Stage"
-                        row.INST_FIRE = "LakePond Perennial Average Stage"
-                    elif fCodefield == 39010:
-                        row.CMNT_FIRE = "FCode 39010 - LakePond Perennial Normal Pool"
-                        row.INST_FIRE = "LakePond Perennial Normal Pool"
-                    elif fCodefield == 39011:
-                        row.CMNT_FIRE = "FCode 39011 - LakePond Perennial Date of Photography"
-                        row.INST_FIRE = "LakePond Perennial Date of Photography"
-                    elif fTypefield == 436:
-                        row.CMNT_FIRE = "FType 436 - Reservoir"
-                        row.INST_FIRE = "Reservoir"
-                    elif fTypefield == 466:
-                        row.CMNT_FIRE = "FType 466 - Swamp Marsh"
-                        row.INST_FIRE = "Swamp Marsh"
-                    elif fTypefield == 493:
-                        row.CMNT_FIRE = "FType 493 - Estuary"
-                        row.INST_FIRE = "Estuary"
-
-                    cur.updateRow(row)
-
-                del cur
-
-                if waterFeature == nhdAreaFC:
-                    nhdAreaList.append(selectFC)
-                elif waterFeature == nhdFlowlineFC:
-                    nhdFlowlineList.append(selectFC)
-                elif waterFeature == nhdWaterbodyFC:
-                    nhdWaterbodyList.append(selectFC)
+    dissolveFeatureClass = perennialFeatureClass + "_dissolved"
 
+    dissolve_fra_fields(perennialFeatureClass, dissolveFeatureClass)
+
+    arcpy.AddMessage("Repairing Dissolved Geometry ......")
+    arcpy.RepairGeometry_management(dissolveFeatureClass)
+    arcpy.AddMessage("Dissolve and Repair complete")
+    arcpy.AddMessage(" ____________________________________________________________________")
+
+    if not copy_geocomplete:
+        return [intersectFeatureClass, dissolveFeatureClass]
+
+    interimfc = output_proj_gdb + "\\" + item + "_geocomplete"
+
+    arcpy.CopyFeatures_management(dissolveFeatureClass, interimfc)
+
+    return [intersectFeatureClass, interimfc]
+
+
+def shard_unit(unit):
+    """Buffers, intersects and dissolves the feature classes of one merge for one subregion in a scratch
+    GDB of its own, returns the merge, the subregion, the intersect and dissolved fcs and the error message.
+
+    The shard is merged under the name of the merge so its intersect has the same FID_<merge>_Buff
+    field as the statewide one and the shard intersects merge into the same schema.
+    """
+
+    item, region, inputList, ownershipFC, scratchFolder = unit
+
+    arcpy.env.overwriteOutput = True
+
+    try:
+        shardGDB = item + "_" + region + ".gdb"
+        workGDB = worker_scratch(scratchFolder, shardGDB) + shardGDB
+
+        arcpy.AddMessage("Processing the " + region + " shard of " + item)
+        arcpy.Merge_management(inputList, workGDB + "\\" + item)
+        intersectFC, dissolveFC = buffer_intersect_dissolve(workGDB, item, ownershipFC, copy_geocomplete=False)
+
+        if dissolveFC is not None:
+            arcpy.AddField_management(dissolveFC, shardField, "TEXT", "", "", "10")
+            cur = arcpy.UpdateCursor(dissolveFC)
+            for row in cur:
+                row.setValue(shardField, region)
+                cur.updateRow(row)
+            del cur
+
+        return item, region, intersectFC, dissolveFC, ""
+
+    except arcpy.ExecuteError:
+        return item, region, None, None, arcpy.GetMessages(2)
+    except Exception as e:
+        return item, region, None, None, str(e)
+
+
+def seam_dissolve(shard_dissolve_list, dissolve_fc):
+    """Merges the shard dissolves into dissolve_fc. Only the groups of dissolve fields found in more than
+    one shard, the ones crossing a seam between subregions, are dissolved again.
+    """
+
+    mergedFC = dissolve_fc + "_shards"
+    arcpy.Merge_management(shard_dissolve_list, mergedFC)
+
+    oidField = arcpy.Describe(mergedFC).OIDFieldName
+
+    shardDict = {}
+    oidDict = {}
+    with arcpy.da.SearchCursor(mergedFC, ["OID@", shardField] + dissolveFieldList) as cursor:
+        for row in cursor:
+            key = tuple(row[2:])
+            shardDict.setdefault(key, set()).add(row[1])
+            oidDict.setdefault(key, []).append(row[0])
+
+    seamOIDs = [str(oid) for key, oids in oidDict.items() if len(shardDict[key]) > 1 for oid in oids]
+    arcpy.AddMessage(str(len([key for key in shardDict if len(shardDict[key]) > 1])) + " of " +
+                     str(len(shardDict)) + " dissolve groups cross a seam between subregions")
+
+    if not seamOIDs:
+        arcpy.CopyFeatures_management(mergedFC, dissolve_fc)
+    else:
+        seamWhere = oidField + " IN (" + ",".join(seamOIDs) + ")"
+        seamFC = dissolve_fc + "_seam"
+
+        arcpy.MakeFeatureLayer_management(mergedFC, "seam_lyr", seamWhere)
+        dissolve_fra_fields("seam_lyr", seamFC)
+        arcpy.Delete_management("seam_lyr")
+
+        arcpy.MakeFeatureLayer_management(mergedFC, "inner_lyr", "NOT " + seamWhere)
+        arcpy.Merge_management(["inner_lyr", seamFC], dissolve_fc)
+        arcpy.Delete_management("inner_lyr")
+        arcpy.Delete_management(seamFC)
+
+    arcpy.DeleteField_management(dissolve_fc, shardField)
+    arcpy.Delete_management(mergedFC)
+
+    arcpy.AddMessage("Repairing Dissolved Geometry ......")
+    arcpy.RepairGeometry_management(dissolve_fc)
+
+
+def sharded_buffer(output_proj_gdb, select_dict, hydro_checkpoint, rebuilt_list, ownership_fc, scratch_folder,
+                   processes=None):
+    """Buffers, intersects and dissolves every subregion on its own instead of the statewide merges, then
+    merges the shards with a seam pass. Returns the _geocomplete feature classes.
+    """
+
+    # Subregion select feature classes by subregion in merge order, from the names <feature>_<region>_select
+    regionList = []
+    regionDict = {}
+    for waterFeature in waterFeatureList:
+        for selectFC in select_dict.get(waterFeature):
+            region = selectFC.split("\\")[-1][len(waterFeature) + 1:-len("_select")]
+            if region not in regionDict:
+                regionList.append(region)
+            regionDict.setdefault(region, {})[waterFeature] = selectFC
+
+    jobList = []
+    for item in mergeList:
+        itemInputs = [fc for region in regionList for fc in regionDict[region].values()
+                      if fc.split("\\")[-1].split("_")[0] in shardInputDict[item]]
+        if checkpoint.is_complete(hydro_checkpoint, item + "_geocomplete") \
+                and not any(fc in rebuilt_list for fc in itemInputs):
+            arcpy.AddMessage(item + " already buffered, intersected and dissolved, skipping")
+            continue
+        for region in regionList:
+            inputList = [regionDict[region][waterFeature] for waterFeature in shardInputDict[item]
+                         if waterFeature in regionDict[region]]
+            if inputList:
+                jobList.append((item, region, inputList, ownership_fc, scratch_folder))
+
+    if not os.path.exists(scratch_folder):
+        os.makedirs(scratch_folder)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(jobList))
+
+    resultDict = {}
+    failedList = []
+    if processes > 1 and not multiprocessing.current_process().daemon:
+        arcpy.AddMessage("Processing " + str(len(jobList)) + " shards with " + str(processes) + " worker processes")
+        pool = multiprocessing.Pool(processes)
+        try:
+            resultList = list(pool.imap_unordered(shard_unit, jobList))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        resultList = [shard_unit(job) for job in jobList]
+
+    for item, region, intersectFC, dissolveFC, message in resultList:
+        if intersectFC is None:
+            arcpy.AddError("Shard " + region + " of " + item + " failed: " + message)
+            failedList.append(item + "_" + region)
+        resultDict[(item, region)] = (intersectFC, dissolveFC)
+
+    if failedList:
+        # The scratch folders are left for inspection
+        raise RuntimeError("Hydro shards failed: " + ", ".join(failedList))
+
+    geocompleteList = []
+    for item in mergeList:
+        interimfc = output_proj_gdb + "\\" + item + "_geocomplete"
+        geocompleteList.append(interimfc)
+
+        shardList = [(region, resultDict[(item, region)]) for region in regionList if (item, region) in resultDict]
+        if not shardList:
+            continue
+
+        # The shards are merged in subregion order, one writer into the Hydro GDB
+        intersectFeatureClass = output_proj_gdb + "\\" + item + "_Buff_intersect"
+        arcpy.AddMessage("Merging the shard intersects of " + item)
+        arcpy.Merge_management([intersectFC for region, (intersectFC, dissolveFC) in shardList],
+                               intersectFeatureClass)
+
+        dissolveFeatureClass = output_proj_gdb + "\\" + item + "_perennial_dissolved"
+        shardDissolveList = [dissolveFC for region, (intersectFC, dissolveFC) in shardList if dissolveFC]
+        if shardDissolveList:
+            arcpy.AddMessage("Merging the shard dissolves of " + item)
+            seam_dissolve(shardDissolveList, dissolveFeatureClass)
         else:
-            arcpy.AddMessage(region + " GDB does not exist may need to download and unzip")
+            # No shard has perennial water on forest land, dissolving no records gives the empty schema
+            arcpy.AddMessage("No perennial " + item + " features on forest land")
+            oidField = arcpy.Describe(intersectFeatureClass).OIDFieldName
+            arcpy.MakeFeatureLayer_management(intersectFeatureClass, "empty_lyr", oidField + " < 0")
+            dissolve_fra_fields("empty_lyr", dissolveFeatureClass)
+            arcpy.Delete_management("empty_lyr")
+
+        arcpy.CopyFeatures_management(dissolveFeatureClass, interimfc)
+        checkpoint.mark_complete(hydro_checkpoint, item + "_geocomplete", [intersectFeatureClass, interimfc])
+
+    if os.path.exists(scratch_folder):
+        shutil.rmtree(scratch_folder)
+
+    return geocompleteList
 
-    arcpy.AddMessage("________________________________________________")
-    arcpy.AddMessage("------------------------------------------------")
-    arcpy.AddMessage("________________________________________________")
 
-    arcpy.AddMessage("Merging Flowlines")
-    arcpy.Merge_management(nhdFlowlineList, outputProjGDB + "\\" + nhdFlowlineMerge)
+def create_hydro_workspace(in_workspace, cur_year):
+    """Creates the Hydro output folder and GDB, returns the folder, the GDB workspace and the GDB path."""
 
-    arcpy.AddMessage("Merging Areas")
-    arcpy.Merge_management(nhdAreaList, outputProjGDB + "\\" + nhdAreaMerge)
+    outputDir = in_workspace + "\\" + "Output"
 
-    arcpy.AddMessage("Merging Waterbodies")
-    arcpy.Merge_management(nhdWaterbodyList, outputProjGDB + "\\" + nhdWaterbodyMerge)
+    outputHydroDir = "Hydro" + cur_year
 
-    arcpy.AddMessage("Merging Areas and Waterbodies")
-    arcpy.Merge_management([outputProjGDB + "\\" + nhdAreaMerge, outputProjGDB + "\\" + nhdWaterbodyMerge],
-                            outputProjGDB + "\\" + nhdArea_WaterbodyMerge)
+    outputWorkspace = outputDir + "\\" + outputHydroDir + "\\"
+
+    # Need to rename when done with testing
+    projectedGDB = "Hydro_" + cur_year + "_CAALB83.gdb"
+
+    if not os.path.exists(outputDir):
+        arcpy.AddMessage("Creating directory for Output")
+        os.makedirs(outputDir)
+
+    if not os.path.exists(outputDir + "\\" + outputHydroDir):
+        arcpy.AddMessage("Creating output directory for " + outputHydroDir)
+        os.makedirs(outputDir + "\\" + outputHydroDir)
+
+    if arcpy.Exists(outputWorkspace + "\\" + projectedGDB):
+        newHydroWorkSpace = outputWorkspace + "\\" + projectedGDB + "\\"
+    else:
+        arcpy.CreateFileGDB_management(outputWorkspace, projectedGDB)
+        newHydroWorkSpace = outputWorkspace + "\\" + projectedGDB + "\\"
+
+    arcpy.AddMessage("Ouput Workspace: " + newHydroWorkSpace)
+
+    return outputWorkspace, newHydroWorkSpace, outputWorkspace + projectedGDB
+
+
+def merge_and_buffer(output_proj_gdb, select_dict, hydro_checkpoint, rebuilt_list, ownership_fc):
+    """Merges the subregion select feature classes by type, then buffers, intersects and dissolves
+    each merge. select_dict maps each water feature to its select feature classes in merge order.
+    """
+
+    arcpy.AddMessage("________________________________________________")
+    arcpy.AddMessage("------------------------------------------------")
+    arcpy.AddMessage("________________________________________________")
+
+    mergeInputDict = {nhdFlowlineMerge: select_dict.get(nhdFlowlineFC),
+                      nhdAreaMerge: select_dict.get(nhdAreaFC),
+                      nhdWaterbodyMerge: select_dict.get(nhdWaterbodyFC),
+                      nhdArea_WaterbodyMerge: [output_proj_gdb + "\\" + nhdAreaMerge,
+                                               output_proj_gdb + "\\" + nhdWaterbodyMerge]}
+
+    for merge in [nhdFlowlineMerge, nhdAreaMerge, nhdWaterbodyMerge, nhdArea_WaterbodyMerge]:
+        mergeOutput = output_proj_gdb + "\\" + merge
+        # The merge is only reused when none of the feature classes it was built from were rebuilt
+        if checkpoint.is_complete(hydro_checkpoint, merge) \
+                and not any(mergeInput in rebuilt_list for mergeInput in mergeInputDict.get(merge)):
+            arcpy.AddMessage(merge + " already merged, skipping")
+            continue
+
+        arcpy.AddMessage("Merging " + merge)
+        arcpy.Merge_management(mergeInputDict.get(merge), mergeOutput)
+        checkpoint.mark_complete(hydro_checkpoint, merge, [mergeOutput])
+        rebuilt_list.append(mergeOutput)
 
     arcpy.AddMessage("__________________________________________________")
     arcpy.AddMessage("--------------------------------------------------")
     arcpy.AddMessage("__________________________________________________")
 
+    geocompleteList = []
+
     for item in mergeList:
         arcpy.AddMessage("|------------------------------------------------|")
         arcpy.AddMessage("|------------------------------------------------|")
         arcpy.AddMessage("__________________________________________________")
 
-        arcpy.AddMessage("Buffering " + item + " features ....")
-        bufferInput = outputProjGDB + "\\" + item
-        bufferOutput = outputProjGDB + "\\" + item + "_Buff"
+        bufferInput = output_proj_gdb + "\\" + item
+        interimfc = output_proj_gdb + "\\" + item + "_geocomplete"
 
-        arcpy.Buffer_analysis(bufferInput, bufferOutput, bufferField)
+        if checkpoint.is_complete(hydro_checkpoint, item + "_geocomplete") and bufferInput not in rebuilt_list:
+            arcpy.AddMessage(item + " already buffered, intersected and dissolved, skipping")
+        else:
+            outputList = buffer_intersect_dissolve(output_proj_gdb, item, ownership_fc)
+            checkpoint.mark_complete(hydro_checkpoint, item + "_geocomplete", outputList)
 
-        arcpy.AddMessage("Repairing Geometry of Buffered " + item)
-        arcpy.RepairGeometry_management(bufferOutput)
+        geocompleteList.append(interimfc)
 
-        # usfsOwnershipFeatureClass = in_workspace + \
-        #                             "\\USFS_Ownership_LSRS\\2017_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_2017"
+    return geocompleteList
 
-        intersectFeatureClass = bufferOutput + "_intersect"
 
-        arcpy.AddMessage("Intersecting with USFS Ownership feature class .....")
-        arcpy.AddMessage("Please be patient while this runs .....")
+def hydrology_processing(in_workspace, restart=False, run_date=None, sub_region_list=None, ownership_fc=None,
+                         region=None, processes=None, sharded=False, checkpoint_key=None):
+    """Builds the hydro _geocomplete feature classes for every subregion, returns their paths.
 
-        if sys.version_info[0] < 3:
-            arcpy.Intersect_analysis([bufferOutput, usfsOwnershipFeatureClass], intersectFeatureClass)
-        else:
-            arcpy.PairwiseIntersect_analysis([bufferOutput, usfsOwnershipFeatureClass], intersectFeatureClass)
+    The subregions and projection come from the region profile, Region 5 by default. The subregion
+    feature classes are ingested by processes worker processes, all CPUs when it is None. Sharded
+    buffers, intersects and dissolves every subregion on its own instead of the statewide merges.
+    The checkpoint only resumes a run for checkpoint_key, pipeline_runner.py passes the stage key,
+    by default it is built from the modification times of the NHD GDBs and the ownership layer.
+    """
+
+    profile = region_profile.get_profile(region)
+
+    arcpy.env.workspace = in_workspace
+    arcpy.env.overwriteOutput = True
+
+    # using the now variable to assign year every time there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curMonth = str(now.month)
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
 
-        arcpy.AddMessage("Completed Intersection")
+    if sub_region_list is None:
+        sub_region_list = profile["subRegionList"]
 
-        arcpy.AddMessage(" ____________________________________________________________________")
+    # hydroWorkspace = in_workspace + "\\" + "NHD" + curYear + "\\" + "Subregions" + "\\"
 
-        arcpy.AddMessage("Updating UnitID field from intersection")
+    hydroWorkspace = in_workspace + "\\" + "Downloads" + "\\" + "Hydro" + "\\"
 
-        cur = arcpy.UpdateCursor(intersectFeatureClass)
+    usfsOwnershipFeatureClass = in_workspace + \
+                                "\\USFS_Ownership_LSRS\\" + curYear + \
+                                "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + curYear
+    if ownership_fc:
+        usfsOwnershipFeatureClass = ownership_fc
 
-        field = "UnitID_FS"
+    selectDict = {nhdAreaFC: [], nhdFlowlineFC: [], nhdWaterbodyFC: []}
 
-        # populating UnitID field with UnitID_FS field
-        for row in cur:
-            row.UnitID = str(row.getValue(field))
-            cur.updateRow(row)
+    outputWorkspace, newHydroWorkSpace, outputProjGDB = create_hydro_workspace(in_workspace, curYear)
 
-        del cur
+    if checkpoint_key is None:
+        checkpoint_key = checkpoint.input_key([hydroWorkspace + "NHD_H_" + region + "_HU4_GDB.gdb"
+                                               for region in sub_region_list] + [usfsOwnershipFeatureClass])
+    hydroCheckpoint = checkpoint.load_checkpoint(outputWorkspace + "hydrology_checkpoint.json", restart,
+                                                 checkpoint_key)
 
-        arcpy.AddMessage("Repairing Geometry ......")
-        arcpy.RepairGeometry_management(intersectFeatureClass)
+    # Items rebuilt during this run, anything built from them cannot be reused from the checkpoint
+    rebuiltList = []
 
-        # make a copy of intersectFeatureClass for NOAA processing
+    # Subregion feature classes still to ingest, the merge lists are filled in subregion order
+    unitList = []
 
-        arcpy.AddMessage("Selecting out Intermittents")
+    for region in sub_region_list:
+        hydroGDB = "NHD_H_" + region + "_HU4_GDB.gdb"
+
+        if arcpy.Exists(hydroWorkspace + hydroGDB):
+            for waterFeature in waterFeatureList:
+                newShapefile = waterFeature + "_" + region
+                selectFC = newHydroWorkSpace + newShapefile + "_select"
 
-        perennialFeatureClass = outputProjGDB + "\\" + item + "_perennial"
+                if checkpoint.is_complete(hydroCheckpoint, newShapefile):
+                    arcpy.AddMessage(newShapefile + " already processed, skipping")
+                else:
+                    unitList.append((hydroWorkspace + hydroGDB, waterFeature, region))
 
-        arcpy.MakeFeatureLayer_management(intersectFeatureClass, "lyr")
+                selectDict[waterFeature].append(selectFC)
 
-        if item == "NHDFlowline_Merge":
-            arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "(FCode <> 46000) AND (FCode <> 46003)")
-            arcpy.AddMessage("Selecting out 46000 and 46003 for Flowlines")
         else:
-            arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "(FCode <> 46003)")
-            arcpy.AddMessage("Selecting out 46003 for Waterbodies and Areas")
+            arcpy.AddMessage(region + " GDB does not exist may need to download and unzip")
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    ingestProcesses = min(processes, len(unitList))
+
+    if ingestProcesses > 1 and not multiprocessing.current_process().daemon:
+        ingest_parallel(unitList, outputWorkspace, newHydroWorkSpace, curMonth, curYear, profile,
+                        hydroCheckpoint, rebuiltList, ingestProcesses)
+    else:
+        for hydroGDB, waterFeature, region in unitList:
+            arcpy.AddMessage("______________________________________")
+            arcpy.AddMessage("Processing " + waterFeature + " of " + hydroGDB)
 
-        result = arcpy.GetCount_management("lyr")
-        count = int(result.getOutput(0))
-        arcpy.AddMessage("Total Number of Records: " + str(count))
+            newShapefile = waterFeature + "_" + region
+            selectFC = ingest_subregion_feature(hydroGDB, waterFeature, region, outputWorkspace, newHydroWorkSpace,
+                                                curMonth, curYear, profile)
+            checkpoint.mark_complete(hydroCheckpoint, newShapefile, [selectFC])
+            rebuiltList.append(selectFC)
 
-        if count > 0:
-            arcpy.AddMessage("Copying selected records to Geodatabase without intermittent data.")
-            arcpy.CopyFeatures_management("lyr", perennialFeatureClass)
+    if sharded:
+        geocompleteList = sharded_buffer(outputProjGDB, selectDict, hydroCheckpoint, rebuiltList,
+                                         usfsOwnershipFeatureClass, outputWorkspace + "shards" + "\\", processes)
+    else:
+        geocompleteList = merge_and_buffer(outputProjGDB, selectDict, hydroCheckpoint, rebuiltList,
+                                           usfsOwnershipFeatureClass)
 
-        arcpy.AddMessage("Dissolving Features")
+    checkpoint.clear_checkpoint(hydroCheckpoint)
 
-        dissolveFeatureClass = perennialFeatureClass + "_dissolved"
+    return geocompleteList
 
-        if sys.version_info[0] < 3:
-            arcpy.Dissolve_management(perennialFeatureClass, dissolveFeatureClass,
-                                            ["UnitID", "GRANK_FIRE", "SNAME_FIRE", "CNAME_FIRE", "SOURCEFIRE",
-                                             "BUFFT_FIRE", "BUFFM_FIRE", "CMNT_FIRE", "INST_FIRE", "BUFF_DIST"], "", "SINGLE_PART")
-        else:
-            arcpy.PairwiseDissolve_analysis(perennialFeatureClass, dissolveFeatureClass,
-                                        ["UnitID", "GRANK_FIRE", "SNAME_FIRE", "CNAME_FIRE", "SOURCEFIRE",
-                                         "BUFFT_FIRE", "BUFFM_FIRE", "CMNT_FIRE", "INST_FIRE", "BUFF_DIST"])
 
-        arcpy.AddMessage("Repairing Dissolved Geometry ......")
-        arcpy.RepairGeometry_management(dissolveFeatureClass)
-        arcpy.AddMessage("Dissolve and Repair complete")
-        arcpy.AddMessage(" ____________________________________________________________________")
+def main():
 
-        interimfc = outputProjGDB + "\\" + item + "_geocomplete"
+    # Set workspace or obtain from user input
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fra_new\\"
+    parser = argparse.ArgumentParser(description="Builds the FRA hydro layers from the NHD subregion downloads")
+    parser.add_argument("in_workspace")
+    parser.add_argument("restart", nargs="?", choices=["restart"], help="start over instead of resuming")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes ingesting the subregions, defaults to the number of CPUs")
+    parser.add_argument("--sharded", action="store_true",
+                        help="buffer, intersect and dissolve every subregion on its own and merge them at the end")
+    args = parser.parse_args()
 
-        arcpy.CopyFeatures_management(dissolveFeatureClass, interimfc)
+    try:
+        hydrology_processing(args.in_workspace, args.restart == "restart", processes=args.processes,
+                             sharded=args.sharded)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
 
+if __name__ == "__main__":
+    main()
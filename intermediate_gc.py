@@ -0,0 +1,318 @@
+# ---------------------------------------------------------------------------
+# intermediate_gc.py
+#
+# Description: Removes the intermediates the stages leave behind on the scratch
+#              disk once nothing downstream needs them, and keeps the Output
+#              folder of the workspace under a disk budget.
+#
+#              select_tes_layer.py run outside the pipeline leaves the _original,
+#              _selection, _singlepart, _buffer, _buffered_single and _merge
+#              feature classes of a layer (and the copied crayfish and MYLF study
+#              areas) in Output\<layer>\<layer>_YEAR_CAALB83.gdb.
+#              hydrology_processing.py leaves the exported and _proj shapefiles of
+#              every subregion in Output\HydroYEAR and the _proj and _select
+#              feature classes, the merges and their _Buff, _perennial and
+#              _perennial_dissolved feature classes in Hydro_YEAR_CAALB83.gdb.
+#
+#              An intermediate is removed as soon as the stage that wrote it has
+#              completed, unless a stage that has not finished yet lists it as an
+#              input. Stage outputs are never removed, they are what the run
+#              manifest and species_delta.py build on. A hydrology rerun finds
+#              its checkpointed intermediates gone and processes them again.
+#
+#              With a disk budget, when the Output folder is still larger than the
+#              budget after the intermediates are removed, the largest GDBs under
+#              Output that no unfinished stage reads or writes are compressed
+#              (CompressFileGeodatabaseData). Compressed data stays readable and
+#              keeps its run manifest fingerprint, a marker file next to the GDB
+#              lets gdb_writer.py uncompress it before the next write.
+#
+#              pipeline_runner.py --gc collects after every completed stage,
+#              --disk-budget-mb sets the budget. Run on its own it collects the
+#              intermediates of every stage of the workspace.
+#
+# Usage: intermediate_gc.py <in_workspace> [--disk-budget-mb MB] [--region NAME] [--dry-run]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import os
+import sys
+
+import gdb_writer
+import pipeline_runner
+import region_profile
+import stage_costs
+from hydrology_processing import mergeList, waterFeatureList
+from select_tes_layer import localFeatureDict
+
+selectSuffixList = ["_original", "_selection", "_singlepart", "_buffer", "_buffered_single", "_merge"]
+
+hydroMergeSuffixList = ["", "_Buff", "_perennial", "_perennial_dissolved"]
+
+
+def megabytes(size):
+
+    return str(int(size / (1024.0 * 1024))) + " MB"
+
+
+def stage_year(stage):
+    """Year of the deliverables a stage builds."""
+
+    return str(pipeline_runner.stage_date(stage).year)
+
+
+def select_intermediates(stage):
+
+    inWorkspace = stage["args"][0]
+    layerType = stage["args"][3]
+    curYear = stage_year(stage)
+
+    projGDB = inWorkspace + "\\" + "Output" + "\\" + layerType + "\\" + layerType + "_" + curYear + "_CAALB83.gdb"
+    fileRoot = projGDB + "\\" + layerType + "_" + curYear
+
+    return [fileRoot + suffix for suffix in selectSuffixList] + \
+        [projGDB + "\\" + fc for fc in localFeatureDict.get(layerType, [])]
+
+
+def hydro_intermediates(stage):
+
+    inWorkspace = stage["args"][0]
+    curYear = stage_year(stage)
+
+    subRegionList = stage.get("kwargs", {}).get("sub_region_list")
+    if not subRegionList:
+        subRegionList = region_profile.get_profile(stage.get("kwargs", {}).get("region"))["subRegionList"]
+
+    outputFolder = inWorkspace + "\\" + "Output" + "\\" + "Hydro" + curYear
+    hydroGDB = outputFolder + "\\" + "Hydro_" + curYear + "_CAALB83.gdb"
+
+    intermediateList = []
+    for subRegion in subRegionList:
+        for waterFeature in waterFeatureList:
+            newShapefile = waterFeature + "_" + subRegion
+            intermediateList += [outputFolder + "\\" + newShapefile + ".shp",
+                                 outputFolder + "\\" + newShapefile + "_proj.shp",
+                                 hydroGDB + "\\" + newShapefile + "_proj",
+                                 hydroGDB + "\\" + newShapefile + "_select"]
+
+    for merge in mergeList:
+        intermediateList += [hydroGDB + "\\" + merge + suffix for suffix in hydroMergeSuffixList]
+
+    return intermediateList
+
+
+# Functions listing the intermediates of a stage function
+intermediateFunctionDict = {"select_tes_layer.select_tes_layer": select_intermediates,
+                            "hydrology_processing.hydrology_processing": hydro_intermediates}
+
+
+def stage_intermediates(stage):
+
+    function = intermediateFunctionDict.get(stage["function"])
+    if function is None:
+        return []
+
+    return function(stage)
+
+
+def dataset_size(path):
+    """Bytes on disk of a shapefile with its side files, or of the GDB holding a feature class."""
+
+    localPath = path.replace("\\", os.sep)
+    if localPath.lower().endswith(".shp"):
+        folder, name = os.path.split(localPath)
+        base = name[:-len(".shp")].lower()
+        if not os.path.isdir(folder):
+            return 0
+        # The .dbf, .shx, .prj and other side files, and the .shp.xml metadata
+        return sum(os.path.getsize(os.path.join(folder, filename)) for filename in os.listdir(folder)
+                   if os.path.splitext(filename)[0].lower() in (base, base + ".shp"))
+
+    return stage_costs.folder_size(localPath)
+
+
+def is_compressed(gdb):
+
+    return os.path.exists(gdb_writer.compressed_marker(gdb))
+
+
+class RetentionPolicy(object):
+    """Removes the intermediates of completed stages that no unfinished stage needs, and compresses
+    finished GDBs while the Output folder is over the disk budget.
+    """
+
+    def __init__(self, in_workspace, stages, budget_mb=None, dry_run=False):
+        self.inWorkspace = in_workspace
+        self.stages = stages
+        self.budget = budget_mb * 1024 * 1024 if budget_mb else None
+        self.dryRun = dry_run
+        self.finished = set()
+        self.removed = 0
+        self.deleted = 0
+        self.compressed = 0
+        self.overBudget = False
+
+    def unfinished_paths(self):
+        """Lower case inputs and outputs of the stages that have not finished, with their GDBs."""
+
+        pathSet = set()
+        for stage in self.stages:
+            if stage["name"] in self.finished:
+                continue
+            for path in (stage["inputs"] or []) + stage["outputs"]:
+                pathSet.add(path.lower())
+                gdb = gdb_writer.gdb_of(path)
+                if gdb:
+                    pathSet.add(gdb.lower())
+
+        return pathSet
+
+    def remove_intermediates(self, stage):
+
+        neededSet = self.unfinished_paths()
+        outputSet = set(path.lower() for other in self.stages for path in other["outputs"])
+
+        gdbDict = {}
+        for path in stage_intermediates(stage):
+            if path.lower() in neededSet or path.lower() in outputSet or not arcpy.Exists(path):
+                continue
+            gdbDict.setdefault(gdb_writer.gdb_of(path), []).append(path)
+
+        for gdb, pathList in sorted(gdbDict.items(), key=lambda item: item[0] or ""):
+            if self.dryRun:
+                for path in pathList:
+                    arcpy.AddMessage("Would remove " + path)
+                self.removed += len(pathList)
+                continue
+
+            if gdb is None:
+                for path in pathList:
+                    size = dataset_size(path)
+                    arcpy.Delete_management(path)
+                    self.deleted += size
+                    self.removed += 1
+                continue
+
+            before = dataset_size(gdb)
+            with gdb_writer.gdb_write_lock(gdb):
+                for path in pathList:
+                    arcpy.Delete_management(path)
+            self.deleted += max(before - dataset_size(gdb), 0)
+            self.removed += len(pathList)
+
+        if gdbDict:
+            arcpy.AddMessage("Removed " + str(sum(len(pathList) for pathList in gdbDict.values())) +
+                             " intermediates of " + stage["name"])
+
+    def output_gdbs(self):
+        """GDBs under the Output folder with their size, largest first."""
+
+        outputFolder = (self.inWorkspace + "\\" + "Output").replace("\\", os.sep)
+        gdbList = []
+        for root, dirs, files in os.walk(outputFolder):
+            for dirname in list(dirs):
+                if dirname.lower().endswith(".gdb"):
+                    dirs.remove(dirname)
+                    path = os.path.join(root, dirname)
+                    gdbList.append((stage_costs.folder_size(path), path))
+
+        return sorted(gdbList, reverse=True)
+
+    def enforce_budget(self):
+
+        if self.budget is None:
+            return
+
+        used = stage_costs.folder_size((self.inWorkspace + "\\" + "Output").replace("\\", os.sep))
+        if used <= self.budget:
+            return
+
+        arcpy.AddMessage("Output uses " + megabytes(used) + " of a " + megabytes(self.budget) + " budget")
+
+        neededSet = self.unfinished_paths()
+        for size, gdb in self.output_gdbs():
+            if used <= self.budget:
+                break
+            gdbPath = gdb.replace(os.sep, "\\")
+            if is_compressed(gdbPath) or gdbPath.lower() in neededSet:
+                continue
+            if os.path.exists(gdb_writer.lock_file(gdbPath)):
+                # Another process is writing to it
+                continue
+
+            if self.dryRun:
+                arcpy.AddMessage("Would compress " + gdbPath + " (" + megabytes(size) + ")")
+                used -= size
+                continue
+
+            arcpy.AddMessage("Compressing " + gdbPath + " (" + megabytes(size) + ")")
+            try:
+                arcpy.CompressFileGeodatabaseData_management(gdbPath)
+            except arcpy.ExecuteError:
+                arcpy.AddWarning("Could not compress " + gdbPath + ": " + arcpy.GetMessages(2))
+                continue
+            open(gdb_writer.compressed_marker(gdbPath), "w").close()
+
+            saved = max(size - stage_costs.folder_size(gdb), 0)
+            self.compressed += saved
+            used -= saved
+
+        if used > self.budget and not self.overBudget:
+            # Warned once, the stages still to run may free more
+            self.overBudget = True
+            arcpy.AddWarning("Output still uses " + megabytes(used) + ", over the " + megabytes(self.budget) +
+                             " disk budget, nothing more can be removed or compressed")
+
+    def stage_complete(self, stage):
+        """Collects after a stage completed or was current, used as on_complete of run_pipeline."""
+
+        self.finished.add(stage["name"])
+        self.remove_intermediates(stage)
+        self.enforce_budget()
+
+    def collect_all(self):
+        """Collects the intermediates of every stage, when no stage is running."""
+
+        for stage in self.stages:
+            self.finished.add(stage["name"])
+        for stage in self.stages:
+            self.remove_intermediates(stage)
+        self.enforce_budget()
+
+    def report(self):
+
+        reclaimed = self.deleted + self.compressed
+        action = "Would remove " if self.dryRun else "Removed "
+        arcpy.AddMessage(action + str(self.removed) + " intermediates (" + megabytes(self.deleted) +
+                         "), compressing saved " + megabytes(self.compressed) + ", reclaimed " +
+                         megabytes(reclaimed) + " in total")
+
+        return reclaimed
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Removes FRA intermediates and keeps Output under a disk budget")
+    parser.add_argument("in_workspace")
+    parser.add_argument("--disk-budget-mb", type=int, default=None,
+                        help="compress finished GDBs while the Output folder is larger than this")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be removed or compressed")
+    args = parser.parse_args()
+
+    try:
+        stages = pipeline_runner.build_stage_graph(args.in_workspace, region=args.region)
+        policy = RetentionPolicy(args.in_workspace, stages, args.disk_budget_mb, args.dry_run)
+        policy.collect_all()
+        policy.report()
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
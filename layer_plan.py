@@ -0,0 +1,350 @@
+# ---------------------------------------------------------------------------
+# layer_plan.py
+#
+# Description: Builds the select, annotate, explode, repair, buffer and rank
+#              split steps of a layer as a plan and only writes data when an
+#              output is asked for. select_tes_layer.py used to write every step
+#              to the projected GDB: CopyFeatures of the selection,
+#              MultipartToSinglepart, RepairGeometry, Buffer,
+#              MultipartToSinglepart again, RepairGeometry again and a final
+#              CopyFeatures to _geocomplete.
+#
+#              When the plan runs
+#                  select      becomes a feature layer with a where clause that
+#                              the next tool reads directly, nothing is copied
+#                  explode,    write straight to the requested output when they
+#                  buffer      are the last step, otherwise to in_memory
+#                  repair,     change their input in place, so they force a copy
+#                  annotate    only when their input is the source data or a
+#                              feature layer; a repair right after another
+#                              repair is dropped
+#                  keep        writes the data at that point to a named feature
+#                              class because something outside the plan reads it
+#              explode, repair, buffer, explode, repair in a row run as
+#              explode_buffer: the first explode and repair in in_memory, then
+#              one pass that buffers and explodes and writes once, followed by a
+#              single RepairGeometry of the output.
+#              in_memory intermediates are deleted once the plan has run.
+#
+#              explain() lists what will be run and written and why, for example
+#
+#                  plan = LayerPlan(selectFC, "TESP_2017")
+#                  plan.explode().repair().buffer("BUFFM_FIRE").explode().repair()
+#                  arcpy.AddMessage(plan.explain(interimfc))
+#                  plan.materialize(interimfc)
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+
+# Steps that change their input instead of writing a new feature class
+inPlaceStepList = ["repair", "annotate"]
+
+# Steps that write a new feature class
+producingStepList = ["explode", "buffer"]
+
+# Steps run together by explode_buffer()
+fusedStepList = ["explode", "repair", "buffer", "explode", "repair"]
+
+
+def single_parts(geometry):
+    """Splits a geometry into singlepart geometries, null and empty geometries give none."""
+
+    if geometry is None or geometry.pointCount == 0:
+        return []
+
+    if geometry.partCount == 1:
+        return [geometry]
+
+    sr = geometry.spatialReference
+    if geometry.type == "polygon":
+        return [arcpy.Polygon(geometry.getPart(i), sr) for i in range(geometry.partCount)]
+    elif geometry.type == "polyline":
+        return [arcpy.Polyline(geometry.getPart(i), sr) for i in range(geometry.partCount)]
+
+    return [arcpy.PointGeometry(geometry.getPart(i), sr) for i in range(geometry.partCount)]
+
+
+def explode_buffer(in_features, out_feature_class, distance_field):
+    """Explodes, repairs, buffers by distance_field and explodes again, writing out_feature_class once.
+
+    The first explode and repair run as MultipartToSinglepart and RepairGeometry in in_memory so
+    every part is repaired before it is buffered and ORIG_FID holds the OID of the input feature.
+    Buffering and the second explode run as one pass over the parts; ORIG_FID_1 holds the buffered
+    feature each part came from, as Buffer_analysis followed by MultipartToSinglepart would write.
+    Run RepairGeometry on the output once afterwards.
+    """
+
+    outPath, outName = out_feature_class.rsplit("\\", 1)
+    explodedFC = "in_memory\\" + outName + "_explode"
+
+    arcpy.AddMessage("Converting multipart geometry to singlepart .....")
+    arcpy.MultipartToSinglepart_management(in_features, explodedFC)
+    inCount = int(arcpy.GetCount_management(in_features).getOutput(0))
+    partCount = int(arcpy.GetCount_management(explodedFC).getOutput(0))
+    arcpy.AddMessage("Number of new records: " + str(partCount - inCount))
+    arcpy.AddMessage("Repairing Geometry ......")
+    arcpy.RepairGeometry_management(explodedFC)
+
+    arcpy.CreateFeatureclass_management(outPath, outName, "POLYGON", explodedFC, "DISABLED", "DISABLED",
+                                        arcpy.Describe(explodedFC).spatialReference)
+    arcpy.AddField_management(out_feature_class, "BUFF_DIST", "DOUBLE")
+    arcpy.AddField_management(out_feature_class, "ORIG_FID_1", "LONG")
+
+    fieldNames = [field.name for field in arcpy.ListFields(explodedFC)
+                  if field.editable and field.type not in ("OID", "Geometry") and
+                  field.name.upper() not in ("BUFF_DIST", "ORIG_FID_1")]
+
+    bufferCount = 0
+    outCount = 0
+
+    arcpy.AddMessage("Buffering and exploding features in one pass .....")
+
+    with arcpy.da.SearchCursor(explodedFC, ["SHAPE@", distance_field] + fieldNames) as searchCursor:
+        with arcpy.da.InsertCursor(out_feature_class, ["SHAPE@", "BUFF_DIST", "ORIG_FID_1"] + fieldNames) as insertCursor:
+            for row in searchCursor:
+                distance = row[1] or 0
+                bufferedParts = single_parts(row[0].buffer(distance)) if row[0] is not None else []
+                if not bufferedParts:
+                    continue
+                bufferCount += 1
+                for bufferedPart in bufferedParts:
+                    outCount += 1
+                    insertCursor.insertRow([bufferedPart, distance, bufferCount] + list(row[2:]))
+
+    arcpy.Delete_management(explodedFC)
+    arcpy.AddMessage("Number of new records: " + str(outCount - bufferCount))
+
+    return out_feature_class
+
+
+class LayerPlan(object):
+    """Logical plan of the steps applied to one feature class."""
+
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self.steps = []
+
+    def select(self, where_clause):
+        self.steps.append({"op": "select", "where": where_clause})
+        return self
+
+    def annotate(self, function, label):
+        """Calls function(feature_class) on the data at this point, for example to populate fields."""
+
+        self.steps.append({"op": "annotate", "function": function, "label": label})
+        return self
+
+    def explode(self):
+        self.steps.append({"op": "explode"})
+        return self
+
+    def repair(self):
+        self.steps.append({"op": "repair"})
+        return self
+
+    def buffer(self, distance_field):
+        self.steps.append({"op": "buffer", "field": distance_field})
+        return self
+
+    def keep(self, feature_class, reason):
+        self.steps.append({"op": "keep", "path": feature_class, "reason": reason})
+        return self
+
+    def memory_name(self, index, op):
+
+        return "in_memory\\" + self.name + "_" + str(index) + "_" + op
+
+    def target(self, index, output):
+        """Where the step at index writes: a kept feature class, the output or in_memory."""
+
+        for step in self.steps[index + 1:]:
+            if step["op"] in inPlaceStepList:
+                continue
+            if step["op"] == "keep":
+                return step["path"], "kept: " + step["reason"]
+            return self.memory_name(index, self.steps[index]["op"]), "intermediate, read by the next step"
+
+        if output is None:
+            return self.memory_name(index, self.steps[index]["op"]), "intermediate, read by the rank split"
+        return output, "requested output"
+
+    def fusable(self, index):
+
+        return [step["op"] for step in self.steps[index:index + len(fusedStepList)]] == fusedStepList
+
+    def physical_plan(self, output=None):
+        """Turns the steps into the tool calls that run them, each with the reason it is there."""
+
+        actions = []
+        current = self.source
+        where = None
+        owned = False
+        lastOp = None
+
+        index = 0
+        while index < len(self.steps):
+            step = self.steps[index]
+            op = step["op"]
+            index += 1
+
+            if op == "select":
+                if where is None:
+                    where = step["where"]
+                else:
+                    where = "(" + where + ") AND (" + step["where"] + ")"
+                continue
+
+            if where is not None:
+                layerName = self.name + "_lyr" + str(index - 1)
+                actions.append({"op": "layer", "input": current, "output": layerName, "where": where,
+                                "reason": "selection read directly by the next step, not copied"})
+                current = layerName
+                where = None
+                owned = False
+
+            if self.fusable(index - 1):
+                # Explodes and repairs in in_memory, then buffers and explodes in one pass that writes once
+                out, reason = self.target(index - 1 + len(fusedStepList) - 2, output)
+                actions.append({"op": "explode_buffer", "field": self.steps[index + 1]["field"], "input": current,
+                                "output": out, "reason": "fused explode, repair, buffer, explode, " + reason})
+                actions.append({"op": "repair", "input": out, "output": out, "reason": "once on the fused output"})
+                current = out
+                owned = True
+                lastOp = "repair"
+                index += len(fusedStepList) - 1
+                continue
+
+            if op in producingStepList:
+                out, reason = self.target(index - 1, output)
+                actions.append(dict(step, input=current, output=out, reason=reason))
+                current = out
+                owned = True
+            elif op in inPlaceStepList:
+                if not owned:
+                    out, reason = self.target(index - 1, output)
+                    actions.append({"op": "copy", "input": current, "output": out,
+                                    "reason": op + " changes its input, " + reason})
+                    current = out
+                    owned = True
+                    lastOp = "copy"
+                if op == "repair" and lastOp == "repair":
+                    continue
+                actions.append(dict(step, input=current, output=current, reason="in place"))
+            elif op == "keep":
+                if current != step["path"]:
+                    actions.append({"op": "copy", "input": current, "output": step["path"],
+                                    "reason": "kept: " + step["reason"]})
+                    current = step["path"]
+                owned = True
+
+            lastOp = op
+
+        if where is not None:
+            layerName = self.name + "_lyr" + str(len(self.steps))
+            actions.append({"op": "layer", "input": current, "output": layerName, "where": where,
+                            "reason": "selection read directly by the next step, not copied"})
+            current = layerName
+
+        if output is not None and current != output:
+            actions.append({"op": "copy", "input": current, "output": output, "reason": "requested output"})
+
+        return actions
+
+    def explain(self, output=None):
+
+        lines = ["Plan for " + self.name + " from " + self.source]
+        for number, action in enumerate(self.physical_plan(output)):
+            op = action["op"]
+            if op == "layer":
+                detail = "select " + action["where"] + " -> " + action["output"]
+            elif op == "buffer":
+                detail = "buffer by " + action["field"] + " -> " + action["output"]
+            elif op == "explode_buffer":
+                detail = "explode and buffer by " + action["field"] + " -> " + action["output"]
+            elif op == "annotate":
+                detail = action["label"] + " on " + action["output"]
+            elif op == "repair":
+                detail = "repair " + action["output"]
+            else:
+                detail = op + " -> " + action["output"]
+            lines.append("  " + str(number + 1) + ". " + detail + "  (" + action["reason"] + ")")
+
+        return "\n".join(lines)
+
+    def run(self, output=None):
+        """Runs the plan, returns the feature class or layer holding the result."""
+
+        actions = self.physical_plan(output)
+        current = self.source
+
+        for action in actions:
+            op = action["op"]
+            current = action["output"]
+
+            if op == "layer":
+                arcpy.MakeFeatureLayer_management(action["input"], current, action["where"])
+            elif op == "copy":
+                arcpy.AddMessage("Copying " + self.name + " to " + current + " ......")
+                arcpy.CopyFeatures_management(action["input"], current)
+            elif op == "explode":
+                arcpy.AddMessage("Converting multipart geometry to singlepart .....")
+                arcpy.MultipartToSinglepart_management(action["input"], current)
+                inCount = int(arcpy.GetCount_management(action["input"]).getOutput(0))
+                outCount = int(arcpy.GetCount_management(current).getOutput(0))
+                arcpy.AddMessage("Number of new records: " + str(outCount - inCount))
+            elif op == "explode_buffer":
+                explode_buffer(action["input"], current, action["field"])
+            elif op == "buffer":
+                arcpy.AddMessage("Buffering features ....")
+                arcpy.Buffer_analysis(action["input"], current, action["field"])
+            elif op == "repair":
+                arcpy.AddMessage("Repairing Geometry ......")
+                arcpy.RepairGeometry_management(current)
+            elif op == "annotate":
+                action["function"](current)
+
+        self.intermediates = []
+        for action in actions:
+            temporary = action["op"] == "layer" or action["output"].startswith("in_memory\\")
+            if temporary and action["output"] != current and action["output"] not in self.intermediates:
+                self.intermediates.append(action["output"])
+        return current
+
+    def clean_up(self):
+
+        for intermediate in getattr(self, "intermediates", []):
+            arcpy.Delete_management(intermediate)
+        self.intermediates = []
+
+    def materialize(self, output):
+        """Runs the plan writing the result to output."""
+
+        result = self.run(output)
+        self.clean_up()
+        return result
+
+    def rank_split(self, rank_field, outputs):
+        """Runs the plan and copies the records of each rank to its feature class.
+
+        outputs is a list of (rank, feature class) pairs, returns the feature classes in the same order.
+        """
+
+        result = self.run()
+        outputList = []
+
+        for rank, feature_class in outputs:
+            layerName = self.name + "_" + rank + "_lyr"
+            arcpy.AddMessage("Selecting records based on " + rank + " rank ....")
+            arcpy.MakeFeatureLayer_management(result, layerName, rank_field + " = '" + rank + "'")
+            arcpy.AddMessage("Copying selected records to " + rank + " Feature Class ......")
+            arcpy.CopyFeatures_management(layerName, feature_class)
+            arcpy.Delete_management(layerName)
+            outputList.append(feature_class)
+
+        if result.startswith("in_memory\\"):
+            self.intermediates.append(result)
+        self.clean_up()
+
+        return outputList
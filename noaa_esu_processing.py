@@ -9,6 +9,24 @@
 #              from Hydrology processing. Merges those two feature classes into one
 #              and performs an explode and repair. Next steps will be done with
 #              pairwise_intersection script.
+#              Each completed ESU is checkpointed, a rerun on the same inputs resumes at
+#              the first ESU that is not complete, changed inputs start over and a
+#              complete run removes the checkpoint (see checkpoint.py). Pass "restart"
+#              as the second argument to start over.
+#
+#              The ESUs are independent, they are processed by a pool of worker
+#              processes (--processes, all CPUs by default). Every worker opens the
+#              two hydro clip feature classes as feature layers once and keeps them
+#              for all the ESUs it processes. It works in its own scratch folder and
+#              GDB under Output\NOAA_ESU\esu and copies only the _geocomplete feature
+#              class into the NOAA_ESU GDB, one writer at a time (see gdb_writer.py).
+#              pipeline_runner.py runs this stage in a process of its own so it can
+#              start the pool (--stage-processes). Run inside a daemonic pool worker,
+#              which cannot start processes of its own, or with --processes 1 the
+#              ESUs are processed one by one.
+#
+#              noaa_esu_processing.py <in_workspace> [restart] [--processes N]
+#              or import the module and call noaa_esu_processing().
 #
 # Usage: CreateFileGDB_management, CopyFeatures_management, Clip_analysis,
 #        Merge_management, MultipartToSinglepart_management, RepairGeometry_management
@@ -20,25 +38,22 @@
 
 # Import arcpy module
 import arcpy
+import argparse
 import sys
-import csv
 import os
 import datetime
+import multiprocessing
 import shutil
 
-# Set workspace or obtain from user input
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
-in_workspace = sys.argv[1]
+import checkpoint
+import gdb_writer
+import region_profile
+from hydrology_processing import worker_scratch
 
-arcpy.env.workspace = in_workspace
-arcpy.env.overwriteOutput = True
+# Region 5 projection, other regions pass their region to noaa_esu_processing()
+sr = region_profile.spatial_reference(region_profile.get_profile())
 
-# using the now variable to assign year everytime there is a hardcoded 2017
-now = datetime.datetime.today()
-curYear = str(now.year)
-curMonth = now.strftime("%B")
-arcpy.AddMessage("Month is " + curMonth)
-arcpy.AddMessage("Year is " + curYear)
+layerType = "NOAA_ESU"
 
 esuSpeciesList = ["CKCAC", "CKCVS", "CKSAC", "STCCV",
                   "STNCA", "STSCC", "STSCA", "COSNC"]
@@ -81,167 +96,376 @@ esuStatusDict = {"CKCAC": "Threatened",
                  "STSCA": "Endangered",
                  "COSNC": "Threatened"}
 
-# this workspace may change to output workspace from hydrology_processing.py
-noaaWorkspace = in_workspace + "\\" + "Downloads" + "\\" + "NOAA_ESU" + "\\"
-hydroClipWorkspace = in_workspace + "\\" + "Output" + "\\" + "Hydro" + curYear + "\\" + "Hydro_" + curYear + "_CAALB83.gdb" + "\\"
+# Hydro clip feature layers of a worker process, made once by init_esu_worker
+clipLayerDict = {}
 
-# will need to rename these when done testing
-flowClipFeatClass = hydroClipWorkspace + "NHDFlowline_Merge_Buff_intersect"
-bodyClipFeatClass = hydroClipWorkspace + "NHDWaterBody_Area_Merge_Buff_intersect"
 
-chinookFolder = noaaWorkspace + "Chinook" + "\\"
-cohoFolder = noaaWorkspace + "Coho" + "\\"
-steelFolder = noaaWorkspace + "Steelhead" + "\\"
+def esu_shapefile(noaa_workspace, species):
+    """NOAA download shapefile of an ESU, in the Chinook, Steelhead or Coho folder."""
 
-sr = arcpy.SpatialReference(3310)
+    if species.startswith("CK"):
+        return noaa_workspace + "Chinook" + "\\" + species + ".shp"
+    elif species.startswith("ST"):
+        return noaa_workspace + "Steelhead" + "\\" + species + ".shp"
+    elif species.startswith("CO"):
+        return noaa_workspace + "Coho" + "\\" + species + ".shp"
 
-# inTable = sys.argv[2]
+    raise ValueError("Unknown ESU " + species)
 
-layerType = "NOAA_ESU"
 
-outputDir = in_workspace + "\\" + "Output"
-if not os.path.exists(outputDir):
-    arcpy.AddMessage("Creating directory for Output")
-    os.makedirs(outputDir)
+def process_esu(species, noaa_workspace, layer_workspace, new_project_workspace, flow_clip_fc, body_clip_fc,
+                cur_month, cur_year, profile=None):
+    """Copies, projects, attributes and clips one ESU to hydro, returns its _geocomplete feature class."""
+
+    if profile is None:
+        profile = region_profile.get_profile()
+
+    arcpy.AddMessage("Processing: " + species)
+
+    # need to fix how the original shapefiles arrive in output directory
+    arcpy.CopyFeatures_management(esu_shapefile(noaa_workspace, species), layer_workspace + species + ".shp")
+    inProjShapefile = layer_workspace + species + ".shp"
+    outProjShapefile = layer_workspace + species + "_proj.shp"
+
+    spatial_ref = arcpy.Describe(inProjShapefile).spatialReference
+
+    arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
+
+    if spatial_ref.name != profile["spatialReferenceName"]:
+        arcpy.AddMessage("Reprojecting shapefile to " + profile["spatialReferenceName"])
+        arcpy.Project_management(inProjShapefile, outProjShapefile, region_profile.spatial_reference(profile))
+        arcpy.AddMessage("reprojection complete")
+
+    arcpy.AddMessage("Converting shapefile to GDB")
+    arcpy.FeatureClassToGeodatabase_conversion(outProjShapefile, new_project_workspace)
+    arcpy.AddMessage("Finished converting shapefile to GDB")
+
+    inSelectFC = new_project_workspace + species + "_proj"
+    selectFC = new_project_workspace + species + "_select"
+
+    selectQuery = "( Class = 'Accessible' )"
+
+    arcpy.MakeFeatureLayer_management(inSelectFC, "lyr")
+
+    arcpy.AddMessage("Selecting records based on selection where [Class = 'Accessible'] ")
+    arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", selectQuery)
+
+    arcpy.AddMessage("Copying selected records to new feature ......")
+    arcpy.CopyFeatures_management("lyr", selectFC)
+
+    result = arcpy.GetCount_management(selectFC)
+    count = int(result.getOutput(0))
+    arcpy.AddMessage("Total Number of Records: " + str(count))
+
+    arcpy.AddMessage("Adding fields")
+
+    arcpy.AddField_management(selectFC, "UnitID", "TEXT", "", "", "5", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "GRANK_FIRE", "TEXT", "", "", "50", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "SOURCEFIRE", "TEXT", "", "", "50", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "SNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "CNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "BUFFT_FIRE", "SHORT", "", "", "", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "BUFFM_FIRE", "SHORT", "", "", "", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "CMNT_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+    arcpy.AddField_management(selectFC, "INST_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
+                              "NON_REQUIRED", "")
+
+    arcpy.AddMessage("Updating fields")
+
+    cur = arcpy.UpdateCursor(selectFC)
+
+    for row in cur:
+        row.SOURCEFIRE = "NHD Subbasins " + cur_month + " " + cur_year + " within ESU"
+        row.GRANK_FIRE = esuStatusDict.get(species)
+        row.SNAME_FIRE = esuSpeciesNameDict.get(species)
+        row.CNAME_FIRE = esuCommonNameDict.get(species)
+        row.CMNT_FIRE = "NHD Flowlines and Waterbodies used within accessible ESU"
+        row.INST_FIRE = " "
+        row.BUFFT_FIRE = "300"
+        row.BUFFM_FIRE = 91.44
+
+        cur.updateRow(row)
+
+    del cur
+
+    fullNameFC = new_project_workspace + esuFilenameDict.get(species)
+
+    arcpy.Rename_management(selectFC, fullNameFC)
+
+    arcpy.AddMessage("Clipping to Flowline data")
+    outFlowClipFC = fullNameFC + "_Flowline"
+    arcpy.Clip_analysis(fullNameFC, flow_clip_fc, outFlowClipFC)
+
+    # this may need to change to a different feature class - check naming conventions
+    arcpy.AddMessage("Clipping to Waterbody data")
+    outBodyClipFC = fullNameFC + "_Waterbody"
+    arcpy.Clip_analysis(fullNameFC, body_clip_fc, outBodyClipFC)
+
+    arcpy.AddMessage("Merging both clipped Feature classes")
+    mergeFC = fullNameFC + "_AllHydro"
+    arcpy.Merge_management([outFlowClipFC, outBodyClipFC], mergeFC)
+
+    singlePartFeatureClass = mergeFC + "_singlepart"
+
+    arcpy.AddMessage("Converting multipart geometry to singlepart ")
+
+    arcpy.MultipartToSinglepart_management(mergeFC, singlePartFeatureClass)
+
+    inCount = int(arcpy.GetCount_management(mergeFC).getOutput(0))
+    outCount = int(arcpy.GetCount_management(singlePartFeatureClass).getOutput(0))
+
+    arcpy.AddMessage("Number of new records: " + str(outCount - inCount))
 
-if not os.path.exists(outputDir + "\\" + layerType):
-    arcpy.AddMessage("Creating output directory for " + layerType)
-    os.makedirs(outputDir + "\\" + layerType)
+    arcpy.AddMessage("Repairing Geometry ......")
+    arcpy.RepairGeometry_management(singlePartFeatureClass)
+    arcpy.AddMessage("Finished with Explode and Repair")
 
-layerWorkSpace = outputDir + "\\" + layerType + "\\"
-projectedGDB = layerType + "_" + curYear + "_CAALB83.gdb"
+    interimfc = fullNameFC + "_geocomplete"
 
-if arcpy.Exists(layerWorkSpace + "\\" + projectedGDB):
-    newProjectWorkSpace = layerWorkSpace + "\\" + projectedGDB + "\\"
-else:
-    arcpy.CreateFileGDB_management(layerWorkSpace, projectedGDB)
-    newProjectWorkSpace = layerWorkSpace + "\\" + projectedGDB + "\\"
+    arcpy.CopyFeatures_management(singlePartFeatureClass, interimfc)
 
-arcpy.AddMessage("Layer Type: " + layerType)
+    return interimfc
 
-try:
 
-    for species in esuSpeciesList:
-        arcpy.AddMessage("Processing: " + species)
-        # need to fix how the original shapefiles arrive in output directory
-        if species.startswith("CK"):
-            arcpy.CopyFeatures_management(chinookFolder + species + ".shp", layerWorkSpace + species + ".shp")
-        elif species.startswith("ST"):
-            arcpy.CopyFeatures_management(steelFolder + species + ".shp", layerWorkSpace + species + ".shp")
-        elif species.startswith("CO"):
-            arcpy.CopyFeatures_management(cohoFolder + species + ".shp", layerWorkSpace + species + ".shp")
-        inProjShapefile = layerWorkSpace + species + ".shp"
-        outProjShapefile = layerWorkSpace + species + "_proj.shp"
+def esu_intermediates(species, layer_workspace, new_project_workspace):
 
-        spatial_ref = arcpy.Describe(inProjShapefile).spatialReference
+    fullNameFC = new_project_workspace + esuFilenameDict.get(species)
 
-        arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
+    return [layer_workspace + species + ".shp", layer_workspace + species + "_proj.shp",
+            new_project_workspace + species + "_proj", new_project_workspace + species + "_select", fullNameFC,
+            fullNameFC + "_Flowline", fullNameFC + "_Waterbody", fullNameFC + "_AllHydro",
+            fullNameFC + "_AllHydro_singlepart", fullNameFC + "_geocomplete"]
 
-        if spatial_ref.name != "NAD_1983_California_Teale_Albers":
-            arcpy.AddMessage("Reprojecting shapefile to NAD 1983 California Teale Albers")
-            arcpy.Project_management(inProjShapefile, outProjShapefile, sr)
-            arcpy.AddMessage("reprojection complete")
 
-        arcpy.AddMessage("Converting shapefile to GDB")
-        arcpy.FeatureClassToGeodatabase_conversion(outProjShapefile, newProjectWorkSpace)
-        arcpy.AddMessage("Finished converting shapefile to GDB")
+def init_esu_worker(flow_clip_fc, body_clip_fc):
+    """Opens the hydro clip feature classes as feature layers, once per worker process.
 
-        inSelectFC = newProjectWorkSpace + species + "_proj"
-        selectFC = newProjectWorkSpace + species + "_select"
+    An error is kept for esu_unit to report, a pool whose initializer raises starts new workers forever.
+    """
 
-        selectQuery = "( Class = 'Accessible' )"
+    try:
+        arcpy.MakeFeatureLayer_management(flow_clip_fc, "flow_clip_lyr")
+        arcpy.MakeFeatureLayer_management(body_clip_fc, "body_clip_lyr")
+        clipLayerDict["flow"] = "flow_clip_lyr"
+        clipLayerDict["body"] = "body_clip_lyr"
+    except arcpy.ExecuteError:
+        clipLayerDict["error"] = "Could not open the hydro clip layers: " + arcpy.GetMessages(2)
+    except Exception as e:
+        clipLayerDict["error"] = "Could not open the hydro clip layers: " + str(e)
 
-        arcpy.MakeFeatureLayer_management(inSelectFC, "lyr")
 
-        arcpy.AddMessage("Selecting records based on selection where [Class = 'Accessible'] ")
-        arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", selectQuery)
+def esu_unit(unit):
+    """Processes one ESU in the scratch folder of this worker and copies its _geocomplete feature class
+    into the NOAA_ESU GDB, returns the species, the _geocomplete fc or None and the error message.
+    """
 
-        arcpy.AddMessage("Copying selected records to new feature ......")
-        arcpy.CopyFeatures_management("lyr", selectFC)
+    species, noaaWorkspace, scratchFolder, newProjectWorkSpace, curMonth, curYear, profile = unit
 
-        result = arcpy.GetCount_management(selectFC)
-        count = int(result.getOutput(0))
-        arcpy.AddMessage("Total Number of Records: " + str(count))
+    if "error" in clipLayerDict:
+        return species, None, clipLayerDict["error"]
 
-        arcpy.AddMessage("Adding fields")
+    arcpy.env.overwriteOutput = True
 
-        arcpy.AddField_management(selectFC, "UnitID", "TEXT", "", "", "5", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "GRANK_FIRE", "TEXT", "", "", "50", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "SOURCEFIRE", "TEXT", "", "", "50", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "SNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "CNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "BUFFT_FIRE", "SHORT", "", "", "", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "BUFFM_FIRE", "SHORT", "", "", "", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "CMNT_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
-        arcpy.AddField_management(selectFC, "INST_FIRE", "TEXT", "", "", "150", "", "NULLABLE",
-                                  "NON_REQUIRED", "")
+    try:
+        workFolder = worker_scratch(scratchFolder, "esu.gdb")
+        workGDB = workFolder + "esu.gdb" + "\\"
 
-        arcpy.AddMessage("Updating fields")
+        workFC = process_esu(species, noaaWorkspace, workFolder, workGDB, clipLayerDict["flow"],
+                             clipLayerDict["body"], curMonth, curYear, profile)
 
-        cur = arcpy.UpdateCursor(selectFC)
+        interimfc = newProjectWorkSpace + esuFilenameDict.get(species) + "_geocomplete"
+        gdb_writer.copy_features(workFC, interimfc)
 
-        for row in cur:
-            row.SOURCEFIRE = "NHD Subbasins " + curMonth + " " + curYear + " within ESU"
-            row.GRANK_FIRE = esuStatusDict.get(species)
-            row.SNAME_FIRE = esuSpeciesNameDict.get(species)
-            row.CNAME_FIRE = esuCommonNameDict.get(species)
-            row.CMNT_FIRE = "NHD Flowlines and Waterbodies used within accessible ESU"
-            row.INST_FIRE = " "
-            row.BUFFT_FIRE = "300"
-            row.BUFFM_FIRE = 91.44
+        for intermediate in esu_intermediates(species, workFolder, workGDB):
+            if arcpy.Exists(intermediate):
+                arcpy.Delete_management(intermediate)
 
-            cur.updateRow(row)
+        return species, interimfc, ""
 
-        del cur
+    except arcpy.ExecuteError:
+        return species, None, arcpy.GetMessages(2)
+    except Exception as e:
+        return species, None, str(e)
 
-        fullNameFC = newProjectWorkSpace + esuFilenameDict.get(species)
 
-        arcpy.Rename_management(selectFC, fullNameFC)
+def esu_parallel(species_list, noaa_workspace, layer_workspace, new_project_workspace, flow_clip_fc, body_clip_fc,
+                 cur_month, cur_year, profile, esu_checkpoint, processes):
+    """Processes the ESUs with a pool of worker processes, returns their _geocomplete fcs by species."""
 
-        arcpy.AddMessage("Clipping to Flowline data")
-        outFlowClipFC = fullNameFC + "_Flowline"
-        arcpy.Clip_analysis(fullNameFC, flowClipFeatClass, outFlowClipFC)
+    scratchFolder = layer_workspace + "esu" + "\\"
 
-        # this may need to change to a different feature class - check naming conventions
-        arcpy.AddMessage("Clipping to Waterbody data")
-        outBodyClipFC = fullNameFC + "_Waterbody"
-        arcpy.Clip_analysis(fullNameFC, bodyClipFeatClass, outBodyClipFC)
+    for clipFC in [flow_clip_fc, body_clip_fc]:
+        if not arcpy.Exists(clipFC):
+            raise RuntimeError("Hydro clip layer " + clipFC + " does not exist, run hydrology_processing.py first")
 
-        arcpy.AddMessage("Merging both clipped Feature classes")
-        mergeFC = fullNameFC + "_AllHydro"
-        arcpy.Merge_management([outFlowClipFC, outBodyClipFC], mergeFC)
+    arcpy.AddMessage("Processing " + str(len(species_list)) + " ESUs with " + str(processes) + " worker processes")
 
-        singlePartFeatureClass = mergeFC + "_singlepart"
+    if not os.path.exists(scratchFolder):
+        os.makedirs(scratchFolder)
 
-        arcpy.AddMessage("Converting multipart geometry to singlepart ")
+    jobList = [(species, noaa_workspace, scratchFolder, new_project_workspace, cur_month, cur_year, profile)
+               for species in species_list]
+    geocompleteDict = {}
+    failedList = []
 
-        arcpy.MultipartToSinglepart_management(mergeFC, singlePartFeatureClass)
+    pool = multiprocessing.Pool(processes, init_esu_worker, (flow_clip_fc, body_clip_fc))
+    try:
+        for species, interimfc, message in pool.imap_unordered(esu_unit, jobList):
+            if interimfc is None:
+                arcpy.AddError("Processing of " + species + " failed: " + message)
+                failedList.append(species)
+                continue
+            arcpy.AddMessage("Processed " + species)
+            checkpoint.mark_complete(esu_checkpoint, species, [interimfc])
+            geocompleteDict[species] = interimfc
+    finally:
+        pool.close()
+        pool.join()
 
-        inCount = int(arcpy.GetCount_management(mergeFC).getOutput(0))
-        outCount = int(arcpy.GetCount_management(singlePartFeatureClass).getOutput(0))
+    if failedList:
+        # The scratch folders are left for inspection, the checkpoint keeps the ESUs that finished
+        raise RuntimeError("ESU processing failed for " + ", ".join(failedList))
 
-        arcpy.AddMessage("Number of new records: " + str(outCount - inCount))
+    if os.path.exists(scratchFolder):
+        shutil.rmtree(scratchFolder)
 
-        arcpy.AddMessage("Repairing Geometry ......")
-        arcpy.RepairGeometry_management(singlePartFeatureClass)
-        arcpy.AddMessage("Finished with Explode and Repair")
+    return geocompleteDict
 
-        interimfc = fullNameFC + "_geocomplete"
 
-        arcpy.CopyFeatures_management(singlePartFeatureClass, interimfc)
+def esu_inputs(in_workspace, cur_year):
+    """Returns the NOAA download folder and the hydro feature classes the ESUs are clipped to."""
+
+    # this workspace may change to output workspace from hydrology_processing.py
+    noaaWorkspace = in_workspace + "\\" + "Downloads" + "\\" + "NOAA_ESU" + "\\"
+    hydroClipWorkspace = in_workspace + "\\" + "Output" + "\\" + "Hydro" + cur_year + "\\" + "Hydro_" + cur_year + "_CAALB83.gdb" + "\\"
+
+    # will need to rename these when done testing
+    flowClipFeatClass = hydroClipWorkspace + "NHDFlowline_Merge_Buff_intersect"
+    bodyClipFeatClass = hydroClipWorkspace + "NHDWaterBody_Area_Merge_Buff_intersect"
+
+    return noaaWorkspace, flowClipFeatClass, bodyClipFeatClass
+
+
+def create_noaa_workspace(in_workspace, cur_year):
+    """Creates the NOAA_ESU output folder and GDB, returns the folder and the GDB workspace."""
+
+    outputDir = in_workspace + "\\" + "Output"
+    if not os.path.exists(outputDir):
+        arcpy.AddMessage("Creating directory for Output")
+        os.makedirs(outputDir)
+
+    if not os.path.exists(outputDir + "\\" + layerType):
+        arcpy.AddMessage("Creating output directory for " + layerType)
+        os.makedirs(outputDir + "\\" + layerType)
+
+    layerWorkSpace = outputDir + "\\" + layerType + "\\"
+    projectedGDB = layerType + "_" + cur_year + "_CAALB83.gdb"
+
+    if arcpy.Exists(layerWorkSpace + "\\" + projectedGDB):
+        newProjectWorkSpace = layerWorkSpace + "\\" + projectedGDB + "\\"
+    else:
+        arcpy.CreateFileGDB_management(layerWorkSpace, projectedGDB)
+        newProjectWorkSpace = layerWorkSpace + "\\" + projectedGDB + "\\"
+
+    return layerWorkSpace, newProjectWorkSpace
+
+
+def noaa_esu_processing(in_workspace, restart=False, run_date=None, species_list=None, region=None,
+                        processes=None, checkpoint_key=None):
+    """Builds the _geocomplete feature class of every ESU, returns their paths.
+
+    The ESUs are the California ones, region only changes the projection. The ESUs are processed by
+    processes worker processes, all CPUs when it is None. The checkpoint only resumes a run for
+    checkpoint_key, pipeline_runner.py passes the stage key, by default it is built from the modification
+    times of the ESU shapefiles and the hydro clip layers.
+    """
+
+    profile = region_profile.get_profile(region)
+
+    arcpy.env.workspace = in_workspace
+    arcpy.env.overwriteOutput = True
+
+    # using the now variable to assign year everytime there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+    curMonth = now.strftime("%B")
+    arcpy.AddMessage("Month is " + curMonth)
+    arcpy.AddMessage("Year is " + curYear)
+
+    if species_list is None:
+        species_list = esuSpeciesList
+
+    noaaWorkspace, flowClipFeatClass, bodyClipFeatClass = esu_inputs(in_workspace, curYear)
+
+    layerWorkSpace, newProjectWorkSpace = create_noaa_workspace(in_workspace, curYear)
+
+    arcpy.AddMessage("Layer Type: " + layerType)
+
+    if checkpoint_key is None:
+        checkpoint_key = checkpoint.input_key([esu_shapefile(noaaWorkspace, species) for species in species_list] +
+                                              [flowClipFeatClass, bodyClipFeatClass])
+    esuCheckpoint = checkpoint.load_checkpoint(layerWorkSpace + "NOAA_ESU_" + curYear + "_checkpoint.json", restart,
+                                               checkpoint_key)
+
+    todoList = []
+    for species in species_list:
+        if checkpoint.is_complete(esuCheckpoint, species):
+            arcpy.AddMessage(species + " already processed, skipping")
+        else:
+            todoList.append(species)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(todoList))
+
+    if processes > 1 and not multiprocessing.current_process().daemon:
+        esu_parallel(todoList, noaaWorkspace, layerWorkSpace, newProjectWorkSpace, flowClipFeatClass,
+                     bodyClipFeatClass, curMonth, curYear, profile, esuCheckpoint, processes)
+    else:
+        for species in todoList:
+            interimfc = process_esu(species, noaaWorkspace, layerWorkSpace, newProjectWorkSpace,
+                                    flowClipFeatClass, bodyClipFeatClass, curMonth, curYear, profile)
+
+            checkpoint.mark_complete(esuCheckpoint, species, [interimfc])
+
+    # In species order whatever order the workers finish in
+    geocompleteList = [newProjectWorkSpace + esuFilenameDict.get(species) + "_geocomplete" for species in species_list]
+
+    checkpoint.clear_checkpoint(esuCheckpoint)
 
     arcpy.AddMessage("Complete processing of all ESU datasets!")
     arcpy.AddMessage("Continue with pairwise_intersection.py to finalized processing of NOAA ESU data.")
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
\ No newline at end of file
+    return geocompleteList
+
+
+def main():
+
+    # Set workspace or obtain from user input
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
+    parser = argparse.ArgumentParser(description="Builds the FRA NOAA ESU layers clipped to hydro")
+    parser.add_argument("in_workspace")
+    parser.add_argument("restart", nargs="?", choices=["restart"], help="start over instead of resuming")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes processing the ESUs, defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    try:
+        noaa_esu_processing(args.in_workspace, args.restart == "restart", processes=args.processes)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# ---------------------------------------------------------------------------
+# output_store.py
+#
+# Description: Content addressed store of stage outputs shared by several
+#              workstations and workspaces. Many stage runs repeat work that was
+#              already done somewhere else on the same data: a second workstation
+#              running the same region, a backfill or region batch rebuilding the
+#              same inputs, or a workspace copied to a new scratch disk whose
+#              run manifest is lost. The projection of the static Local_Data
+#              layers, the NOAA ESU shapefiles and the Shasta crayfish and MYLF
+#              study areas copied into the layer GDBs come out the same every time.
+#
+#              The key of a stage run is built from its function, its parameters,
+#              the month it runs for (stages stamp it into SOURCEFIRE and the pull
+#              date) and the content hash of every input (see run_manifest.py),
+#              with the workspace folder taken out of every path, so the same run
+#              in another workspace or on another workstation finds the same key.
+#              After a stored stage completes its outputs, and the feature classes
+#              it writes into the rank GDBs on the side, are copied into
+#              <store>\<key[:2]>\<key>\data.gdb with an entry.json listing them.
+#              When a later run of the stage has the same key, the stage function
+#              is not called, the outputs are copied from the store into the
+#              workspace instead.
+#
+#              An entry is built in <store>\incoming and renamed into place when it
+#              is complete, and is never changed afterwards, so workstations can
+#              read the store while others write to it. When two workstations store
+#              the same key the first rename wins and the other copy is dropped.
+#
+#              hydrology_processing and noaa_esu_processing resume from a checkpoint,
+#              they are only stored when it is kept for the run manifest key of
+#              their inputs (see checkpoint.py), so a run on changed inputs never
+#              stores outputs of the earlier inputs under the new key.
+#
+#              Only stages whose every write is known are stored:
+#                  select_tes_layer      geocomplete and the _nobuf rank feature classes
+#                  pairwise_intersect    _intersect, _intersect_dissolved and the
+#                                        Interim and IdentInter rank feature classes
+#                  hydrology_processing  the hydro _intersect and _geocomplete
+#                  noaa_esu_processing   the ESU _geocomplete feature classes
+#
+#              pipeline_runner.py --store <folder> uses the store.
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import socket
+
+import gdb_writer
+import pairwise_intersect
+import pipeline_runner
+import run_manifest
+from select_tes_layer import nobuf_feature_class, tesvariablelist
+
+entryFile = "entry.json"
+dataGDB = "data.gdb"
+
+workspaceToken = "<workspace>"
+
+
+def select_side_outputs(stage):
+
+    inWorkspace = stage["args"][0]
+    curYear = str(pipeline_runner.stage_date(stage).year)
+
+    return [nobuf_feature_class(inWorkspace, curYear, stage["args"][3], tesRank) for tesRank in tesvariablelist]
+
+
+def intersect_side_outputs(stage):
+
+    inWorkspace = stage["args"][0]
+    layerType = stage["args"][2]
+    curYear = str(pipeline_runner.stage_date(stage).year)
+
+    if layerType == "NOAA_ESU":
+        fcList = [path[:-len("_intersect_dissolved")] for path in stage["outputs"]]
+    else:
+        fcList = [stage["args"][1]]
+
+    sideList = []
+    for fc in fcList:
+        sideList.append(fc + "_intersect")
+        origFilename = fc.split("\\")[-1] if layerType == "NOAA_ESU" else ""
+        for tesRank in tesvariablelist:
+            filename = pairwise_intersect.get_filename(layerType, curYear, tesRank, origFilename)
+            for rankStage in ["Interim", "Final"]:
+                sideList.append(pairwise_intersect.rank_gdb(inWorkspace, curYear, tesRank, rankStage) + "\\" +
+                                filename)
+
+    return sideList
+
+
+# Stage functions whose outputs are stored, with the function listing the feature classes they write on the side
+storedFunctionDict = {"select_tes_layer.select_tes_layer": select_side_outputs,
+                      "pairwise_intersect.pairwise_intersect": intersect_side_outputs,
+                      "hydrology_processing.hydrology_processing": None,
+                      "noaa_esu_processing.noaa_esu_processing": None}
+
+
+def is_stored(stage):
+    """A stage resuming from a checkpoint is only stored when the checkpoint is kept for the key of its
+    inputs, otherwise it could finish on the items of an earlier run with other inputs.
+    """
+
+    if stage["function"] in pipeline_runner.checkpointFunctionList and not stage.get("checkpoint_key"):
+        return False
+
+    return stage["function"] in storedFunctionDict and stage["inputs"] is not None
+
+
+def stored_outputs(stage):
+
+    sideFunction = storedFunctionDict.get(stage["function"])
+    return list(stage["outputs"]) + (sideFunction(stage) if sideFunction else [])
+
+
+def relative_path(path, in_workspace):
+    """Path with the workspace folder replaced by a token, paths outside the workspace are kept."""
+
+    if path.lower() == in_workspace.lower() or path.lower().startswith(in_workspace.lower() + "\\"):
+        return workspaceToken + path[len(in_workspace):]
+
+    return path
+
+
+def workspace_path(path, in_workspace):
+
+    if path.startswith(workspaceToken):
+        return in_workspace + path[len(workspaceToken):]
+
+    return path
+
+
+def relative_value(value, in_workspace):
+
+    if isinstance(value, (list, tuple)):
+        return [relative_value(item, in_workspace) for item in value]
+    if isinstance(value, dict):
+        return dict((key, relative_value(item, in_workspace)) for key, item in value.items())
+    if hasattr(value, "startswith"):
+        return relative_path(value, in_workspace)
+
+    return value
+
+
+def store_key(stage, fingerprints):
+    """Key of a stage run that does not depend on where the workspace is."""
+
+    inWorkspace = stage["args"][0]
+
+    for path in stage["inputs"]:
+        if path not in fingerprints:
+            fingerprints[path] = run_manifest.fingerprint(path)
+
+    digest = hashlib.sha1()
+    digest.update(stage["function"].encode("utf-8"))
+    digest.update(json.dumps(relative_value(stage["args"], inWorkspace)).encode("utf-8"))
+    kwargs = dict(stage.get("kwargs", {}))
+    kwargs.pop("run_date", None)
+    digest.update(json.dumps(relative_value(kwargs, inWorkspace), sort_keys=True).encode("utf-8"))
+    digest.update(pipeline_runner.stage_date(stage).strftime("%Y-%m").encode("utf-8"))
+    for path in sorted(stage["inputs"], key=lambda inPath: relative_path(inPath, inWorkspace)):
+        digest.update(relative_path(path, inWorkspace).encode("utf-8"))
+        digest.update(str(fingerprints.get(path)).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def entry_path(store, key):
+
+    return store + "\\" + key[:2] + "\\" + key
+
+
+def find_entry(store, key):
+    """Folder of the complete entry of a key, None when the store does not have it."""
+
+    entry = entry_path(store, key)
+    if os.path.exists((entry + "\\" + entryFile).replace("\\", os.sep)):
+        return entry
+
+    return None
+
+
+def store_outputs(store, key, stage):
+    """Copies the outputs of a completed stage into the store under key, returns the entry folder."""
+
+    entry = entry_path(store, key)
+    if find_entry(store, key):
+        return entry
+
+    if any(not arcpy.Exists(path) for path in stage["outputs"]):
+        arcpy.AddMessage("Not storing " + stage["name"] + ", some of its outputs do not exist")
+        return None
+
+    inWorkspace = stage["args"][0]
+    # Rank feature classes are only written when the layer has records of the rank
+    outputList = [path for path in stored_outputs(stage) if arcpy.Exists(path)]
+
+    incoming = store + "\\" + "incoming" + "\\" + socket.gethostname() + "_" + str(os.getpid()) + "_" + key
+    if os.path.exists(incoming.replace("\\", os.sep)):
+        shutil.rmtree(incoming.replace("\\", os.sep))
+    os.makedirs(incoming.replace("\\", os.sep))
+    arcpy.CreateFileGDB_management(incoming, dataGDB)
+
+    datasetList = []
+    for index, path in enumerate(outputList):
+        dataset = "d" + str(index)
+        arcpy.CopyFeatures_management(path, incoming + "\\" + dataGDB + "\\" + dataset)
+        datasetList.append({"path": relative_path(path, inWorkspace), "dataset": dataset})
+
+    entryDict = {"key": key, "stage": stage["name"], "function": stage["function"], "outputs": datasetList,
+                 "host": socket.gethostname(), "created": datetime.datetime.now().isoformat()}
+    with open((incoming + "\\" + entryFile).replace("\\", os.sep), "w") as f:
+        json.dump(entryDict, f, indent=2, sort_keys=True)
+
+    keyFolder = store + "\\" + key[:2]
+    if not os.path.exists(keyFolder.replace("\\", os.sep)):
+        try:
+            os.makedirs(keyFolder.replace("\\", os.sep))
+        except OSError:
+            # Created by another workstation in the meantime
+            if not os.path.isdir(keyFolder.replace("\\", os.sep)):
+                raise
+
+    try:
+        os.rename(incoming.replace("\\", os.sep), entry.replace("\\", os.sep))
+        arcpy.AddMessage("Stored " + str(len(datasetList)) + " outputs of " + stage["name"] + " as " + key)
+    except OSError:
+        # Another workstation stored the same key first
+        shutil.rmtree(incoming.replace("\\", os.sep), ignore_errors=True)
+        if not find_entry(store, key):
+            raise
+
+    return entry
+
+
+def restore_entry(entry, stage):
+    """Copies the stored outputs of an entry into the workspace of the stage, returns them."""
+
+    arcpy.env.overwriteOutput = True
+
+    with open((entry + "\\" + entryFile).replace("\\", os.sep)) as f:
+        entryDict = json.load(f)
+
+    inWorkspace = stage["args"][0]
+    restoredList = []
+    for output in entryDict["outputs"]:
+        target = workspace_path(output["path"], inWorkspace)
+        gdb = gdb_writer.gdb_of(target)
+        if gdb and not arcpy.Exists(gdb):
+            folder, gdbName = gdb.rsplit("\\", 1)
+            gdb_writer.create_file_gdb(folder, gdbName)
+
+        gdb_writer.copy_features(entry + "\\" + dataGDB + "\\" + output["dataset"], target)
+        restoredList.append(target)
+
+    arcpy.AddMessage("Restored " + str(len(restoredList)) + " outputs of " + stage["name"] + " from " + entry)
+
+    return restoredList
@@ -12,6 +12,13 @@
 #                     and NOAA. Those two datasets will generate a list of feature classes and
 #                     loop through them running intersection and export processes.
 #
+#              pairwise_intersect.py <in_workspace> <outFeatClass> <layerType>
+#              or import the module and call pairwise_intersect() with the same values.
+#              The summary csv table can be passed in already read as selection_list and
+#              the ownership layer as ownership_fc.
+#              Copies into the shared rank GDBs go through gdb_writer.py so several
+#              layers can run at the same time.
+#
 # Runtime Estimates: NOAA       : 29 min 52 sec
 #                    Local      : 16 min 20 sec
 #                    TESP       :  1 min  2 sec
@@ -32,162 +39,101 @@
 import arcpy
 import sys
 import os
-import csv
 import datetime
 
-# in_workspace = sys.argv[1]
-
-in_workspace = arcpy.GetParameterAsText(0)
+import gdb_writer
+from select_tes_layer import read_selection_list
 
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
+tesvariablelist = ["Endangered", "Threatened", "Sensitive"]
 
-# using the now variable to assign year everytime there is a hardcoded 2017
-now = datetime.datetime.today()
-curYear = str(now.year)
-arcpy.AddMessage("Year is " + curYear)
 
-# The following is used for testing locally. DELETE when done testing.
-# -------------------------------------------------------------------------------
-# outFeatClass = in_workspace + "\\" + layerType + "\\Critical_Habitat_Polygons_Test_2017_CAALB83_newproj.gdb\Critical_Habitat_Polygons_2017_Occurrence_found_newE_singlepart"
-# outFeatClass = in_workspace + "\\" + "Output" + "\\" + layerType + "\\TESP_Test_2017_CAALB83_newproj.gdb\\TESP_2017_original_buffered_single"
-# outFeatClass = in_workspace + "\\" + layerType + "\\Wildlife_Sites_Test_2017_CAALB83_newproj.gdb\\Wildlife_Sites_2017_Occurrence_found_newE_singlepart_buffer_spart"
-# outFeatClass = in_workspace + "\\CondorData_noFOIAnoRelease\\2017_Condor_CAALB83.gdb\\CondorHacking_2015"
-# outFeatClass = in_workspace + "\\Output\\CNDDB\\CNDDB_Test_2017_CAALB83_newproj.gdb\\CNDDB_2017_original_merge"
-# -------------------------------------------------------------------------------
+def ownership_feature_class(in_workspace, cur_year):
 
-# layerType = "Condor_Hacking"
-# layerType = "Local"
-# layerType = "NOAA_ESU"
-# layerType = "CNDDB"
+    return in_workspace + "\\USFS_Ownership_LSRS\\" + cur_year + \
+        "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + cur_year
 
-# -------------------------------------------------------------------------------
 
-outFeatClass = sys.argv[2]
+def summary_table(in_workspace):
 
-layerType = sys.argv[3]
+    return in_workspace + "\\csv_tables\AllMerge_SummaryTable.csv"
 
-# outFeatClassFile = arcpy.GetParameterAsText(2)
-#
-# layerType = arcpy.GetParameterAsText(2)
-
-sr = arcpy.SpatialReference(3310)
-
-intersectFeatureDataset = ""
-noaa_gdb = ""
-local_gdb = in_workspace + "\\" + "Input" + "\\" + "Local_Data" + "\\" + curYear + "_Local_CAALB83.gdb" + "\\"
-outputDir = in_workspace + "\\" + "Output"
-condor_output = outputDir + "\\" + "Condor" + "\\" + "Condor" + "_" + curYear + "_CAALB83.gdb" + "\\"
-local_output = outputDir + "\\" + "Local" + "\\" + "Local" + "_" + curYear + "_CAALB83.gdb" + "\\"
-
-# local_data = local_gdb + "\\Explode"
-
-# if layerType == "Local":
-#     arcpy.env.workspace = local_gdb
-#     if arcpy.Exists(local_gdb + "\\Intersect_New"):
-#         intersectFeatureDataset = local_gdb + "\\Intersect_New\\"
-#     else:
-#         arcpy.CreateFeatureDataset_management(local_gdb, "Intersect_New", 3310)
-#         intersectFeatureDataset = local_gdb + "\\Intersect_New\\"
-# elif layerType == "NOAA_ESU":
-
-if layerType == "Local":
-    arcpy.env.workspace = local_gdb
-    if arcpy.Exists(local_output):
-        localOutputWorkSpace = local_output
-    else:
-        if not os.path.exists(outputDir):
-            arcpy.AddMessage("Creating directory for Output")
-            os.makedirs(outputDir)
 
-        if not os.path.exists(outputDir + "\\" + layerType):
-            arcpy.AddMessage("Creating output directory for " + layerType)
-            os.makedirs(outputDir + "\\" + layerType)
+def create_output_gdb(in_workspace, folder, cur_year):
 
-        outputWorkSpace = outputDir + "\\" + layerType + "\\"
-        projectedGDB = layerType + "_" + curYear + "_CAALB83.gdb"
+    outputDir = in_workspace + "\\" + "Output"
+    if not os.path.exists(outputDir):
+        arcpy.AddMessage("Creating directory for Output")
+        os.makedirs(outputDir)
 
-        if arcpy.Exists(outputWorkSpace + "\\" + projectedGDB):
-            localOutputWorkSpace = outputWorkSpace + "\\" + projectedGDB + "\\"
-        else:
-            arcpy.CreateFileGDB_management(outputWorkSpace, projectedGDB)
-            localOutputWorkSpace = outputWorkSpace + "\\" + projectedGDB + "\\"
-elif layerType == "Condor_Nest" or layerType == "Condor_Hacking":
-    arcpy.env.workspace = in_workspace
-    if arcpy.Exists(condor_output):
-        condorOutputWorkSpace = condor_output
-    else:
-        outputDir = in_workspace + "\\" + "Output"
-        if not os.path.exists(outputDir):
-            arcpy.AddMessage("Creating directory for Output")
-            os.makedirs(outputDir)
+    if not os.path.exists(outputDir + "\\" + folder):
+        arcpy.AddMessage("Creating output directory for " + folder)
+        os.makedirs(outputDir + "\\" + folder)
 
-        if not os.path.exists(outputDir + "\\" + "Condor"):
-            arcpy.AddMessage("Creating output directory for Condor")
-            os.makedirs(outputDir + "\\" + "Condor")
+    outputWorkSpace = outputDir + "\\" + folder + "\\"
+    projectedGDB = folder + "_" + cur_year + "_CAALB83.gdb"
 
-        outputWorkSpace = outputDir + "\\" + "Condor" + "\\"
-        projectedGDB = "Condor" + "_" + curYear + "_CAALB83.gdb"
+    if not arcpy.Exists(outputWorkSpace + "\\" + projectedGDB):
+        arcpy.CreateFileGDB_management(outputWorkSpace, projectedGDB)
 
-        if arcpy.Exists(outputWorkSpace + "\\" + projectedGDB):
-            localOutputWorkSpace = outputWorkSpace + "\\" + projectedGDB + "\\"
-        else:
-            arcpy.CreateFileGDB_management(outputWorkSpace, projectedGDB)
-            localOutputWorkSpace = outputWorkSpace + "\\" + projectedGDB + "\\"
-elif layerType == "NOAA_ESU":
-    noaa_gdb = in_workspace + "\\" + "Output" + "\\" + "NOAA_ESU" + "\\" + layerType + "_" + curYear + "_CAALB83.gdb"
-    arcpy.env.workspace = noaa_gdb
-    outFeatClass = noaa_gdb
-else:
-    arcpy.env.workspace = in_workspace
+    return outputWorkSpace + "\\" + projectedGDB + "\\"
 
-arcpy.env.overwriteOutput = True
 
-tesvariablelist = ["Endangered", "Threatened", "Sensitive"]
+def create_rank_gdbs(in_workspace, cur_year):
 
-for tes in tesvariablelist:
+    for tes in tesvariablelist:
 
-    newPath = in_workspace + "\\" + curYear + "_" + tes
+        newPath = in_workspace + "\\" + cur_year + "_" + tes
 
-    # Geodatabases for final merge
-    identInterGdb = curYear + "_" + tes + "_IdentInter_CAALB83.gdb"
+        # Geodatabases for final merge
+        identInterGdb = cur_year + "_" + tes + "_IdentInter_CAALB83.gdb"
 
-    # Geodatabases for FWS Deliverable
-    fraDeliverableGdb = curYear + "_FRA_" + tes + "_OriginalDataBufferedAndNonBufferedAreas_CAALB83.gdb"
+        # Geodatabases for FWS Deliverable
+        fraDeliverableGdb = cur_year + "_FRA_" + tes + "_OriginalDataBufferedAndNonBufferedAreas_CAALB83.gdb"
 
-    if arcpy.Exists(newPath + "\\" + identInterGdb):
-        arcpy.AddMessage(tes + " GDB exists")
-    else:
-        arcpy.AddMessage("Creating Geodatabase for " + tes + " Data Deliverables containing intersection data ....")
-        arcpy.CreateFileGDB_management(newPath, identInterGdb)
-        arcpy.CreateFileGDB_management(newPath, fraDeliverableGdb)
+        if arcpy.Exists(newPath + "\\" + identInterGdb):
+            arcpy.AddMessage(tes + " GDB exists")
+        else:
+            arcpy.AddMessage("Creating Geodatabase for " + tes + " Data Deliverables containing intersection data ....")
+            gdb_writer.create_file_gdb(newPath, identInterGdb)
+            gdb_writer.create_file_gdb(newPath, fraDeliverableGdb)
 
 
-def get_filename(tes_rank, orig_filename):
+def get_filename(layer_type, cur_year, tes_rank, orig_filename):
 
     filename = ""
-    if layerType == "TESP":
-        filename = "EDW_TESP_" + curYear + "_OccurrenceAll_FoundPlants_ident_" + tes_rank
-    elif layerType == "Wildlife_Sites":
-        filename = "EDW_WildlifeSites_" + curYear + "_ident_" + tes_rank
-    elif layerType == "Wildlife_Observations":
-        filename = "EDW_FishWildlife_Observation_" + curYear + "_" + tes_rank[:1] + "_ident"
-    elif layerType == "Critical_Habitat_Polygons":
-        filename = "CHabPolyAllSelectedSpecies_" + curYear + "_nobuf_Ident_" + tes_rank
-    elif layerType == "Critical_Habitat_Lines":
-        filename = "CHabLineAllSelectedSpecies_" + curYear + "_nobuf_Ident_" + tes_rank
-    elif layerType == "CNDDB":
-        filename = "CNDDB_" + curYear + "_All_selectsAndShastaCrayfish_Ident_noBDF_" + tes_rank
-    elif layerType == "Condor_Hacking":
-        filename = "CNH_" + curYear + "_ident"
-    elif layerType == "Condor_Nest":
-        filename = "CN_" + curYear + "_ident"
-    elif layerType == "Local" or layerType == "NOAA_ESU":
-        filename = fc
+    if layer_type == "TESP":
+        filename = "EDW_TESP_" + cur_year + "_OccurrenceAll_FoundPlants_ident_" + tes_rank
+    elif layer_type == "Wildlife_Sites":
+        filename = "EDW_WildlifeSites_" + cur_year + "_ident_" + tes_rank
+    elif layer_type == "Wildlife_Observations":
+        filename = "EDW_FishWildlife_Observation_" + cur_year + "_" + tes_rank[:1] + "_ident"
+    elif layer_type == "Critical_Habitat_Polygons":
+        filename = "CHabPolyAllSelectedSpecies_" + cur_year + "_nobuf_Ident_" + tes_rank
+    elif layer_type == "Critical_Habitat_Lines":
+        filename = "CHabLineAllSelectedSpecies_" + cur_year + "_nobuf_Ident_" + tes_rank
+    elif layer_type == "CNDDB":
+        filename = "CNDDB_" + cur_year + "_All_selectsAndShastaCrayfish_Ident_noBDF_" + tes_rank
+    elif layer_type == "Condor_Hacking":
+        filename = "CNH_" + cur_year + "_ident"
+    elif layer_type == "Condor_Nest":
+        filename = "CN_" + cur_year + "_ident"
+    elif layer_type == "Local" or layer_type == "NOAA_ESU":
+        filename = orig_filename
 
     return filename
 
 
-def copy_to_gdb(stage, filename):
+def rank_gdb(in_workspace, cur_year, tes_rank, stage):
+    """FWS deliverable GDB of a rank for the Interim stage, the IdentInter GDB for the Final stage."""
+
+    if stage == "Interim":
+        return in_workspace + "\\" + cur_year + "_" + tes_rank + "\\" + cur_year + "_FRA_" + \
+            tes_rank + "_OriginalDataBufferedAndNonBufferedAreas_CAALB83.gdb"
+
+    return in_workspace + "\\" + cur_year + "_" + tes_rank + "\\" + cur_year + "_" + tes_rank + "_IdentInter_CAALB83.gdb"
+
+
+def copy_to_gdb(in_workspace, cur_year, layer_type, stage, filename, orig_filename=""):
 
     for tes_rank in tesvariablelist:
         arcpy.AddMessage(" --------------------------------------------------------------- ")
@@ -197,14 +143,9 @@ def copy_to_gdb(stage, filename):
         arcpy.AddMessage("Selecting records based on " + tes_rank + " rank ....")
         arcpy.SelectLayerByAttribute_management("tmplyr", "NEW_SELECTION", "GRANK_FIRE = '" + tes_rank + "'")
 
-        if stage == "Interim":
-            outlocation = in_workspace + "\\" + curYear + "_" + tes_rank + "\\" + curYear + "_FRA_" + \
-                          tes_rank + "_OriginalDataBufferedAndNonBufferedAreas_CAALB83.gdb" + "\\"
-        else:
-            outlocation = in_workspace + "\\" + curYear + "_" + tes_rank + "\\" \
-                                              + curYear + "_" + tes_rank + "_IdentInter_CAALB83.gdb\\"
+        outlocation = rank_gdb(in_workspace, cur_year, tes_rank, stage) + "\\"
 
-        outputfilename = get_filename(tes_rank, filename)
+        outputfilename = get_filename(layer_type, cur_year, tes_rank, orig_filename)
 
         outlocation += outputfilename
 
@@ -214,12 +155,12 @@ def copy_to_gdb(stage, filename):
 
         if count > 0:
             if stage == "Interim":
-                arcpy.AddMessage("Copying " + layerType + " records to FWS Deliverable Stage " +
+                arcpy.AddMessage("Copying " + layer_type + " records to FWS Deliverable Stage " +
                              tes_rank + " Geodatabase as " + outputfilename)
             else:
-                arcpy.AddMessage("Copying " + layerType + " records to Final Stage " +
+                arcpy.AddMessage("Copying " + layer_type + " records to Final Stage " +
                              tes_rank + " Geodatabase as " + outputfilename)
-            arcpy.CopyFeatures_management("tmplyr", outlocation)
+            gdb_writer.copy_features("tmplyr", outlocation)
         else:
             arcpy.AddMessage("No records found for rank " + tes_rank)
 
@@ -228,7 +169,8 @@ def copy_to_gdb(stage, filename):
     return
 
 
-def unitid_dissolve(filename):
+def unitid_dissolve(in_workspace, cur_year, layer_type, filename, orig_filename="", selection_list=None,
+                    copy_interim=True):
     arcpy.AddMessage(" ____________________________________________________________________")
 
     arcpy.AddMessage("Updating UnitID field from intersection")
@@ -246,23 +188,15 @@ def unitid_dissolve(filename):
     ranamuscosanum = 0
     unprotforestnum = 0
 
-    csvfile = in_workspace + "\\csv_tables\AllMerge_SummaryTable.csv"
+    csvfile = summary_table(in_workspace)
 
-    if layerType == "CNDDB":
+    if layer_type == "CNDDB":
         arcpy.AddMessage("csv File: " + csvfile)
         arcpy.AddMessage("NOTE: Code will operate differently for csv in Pro vs 10.x!!!!!")
         arcpy.AddMessage("Version of Python: " + sys.version)
 
-    if sys.version_info[0] < 3:
-        # uncomment when using arcgis 10.3
-        with open(csvfile, 'rb') as f:
-            reader = csv.reader(f)
-            selectionList = list(reader)
-    else:
-        # use when using arcgis pro
-        with open(csvfile) as f:
-            reader = csv.reader(f)
-            selectionList = list(reader)
+    if selection_list is None:
+        selection_list = read_selection_list(csvfile)
 
     # populating UnitID field with UnitID_FS field
     for row in cur:
@@ -270,14 +204,14 @@ def unitid_dissolve(filename):
         forestname = row.getValue(fieldforest)
         row.UnitID = row.getValue(field)
         cur.updateRow(row)
-        if layerType == "Wildlife_Observations":
+        if layer_type == "Wildlife_Observations":
             if speciesname == "Oncorhynchus kisutch" \
                     and str(row.getValue(field)) == "0516":
                 cur.deleteRow(row)
                 cohosalmnum += 1
                 arcpy.AddMessage(
                     "Deleting row for Oncorhynchus kisutch because forest not protected, found in " + forestname)
-        elif layerType == "Critical_Habitat_Polygons":
+        elif layer_type == "Critical_Habitat_Polygons":
             if speciesname == "Rana muscosa" \
                     and str(row.getValue(field)) != "0501" \
                     and str(row.getValue(field)) != "0512" \
@@ -288,7 +222,7 @@ def unitid_dissolve(filename):
                 arcpy.AddMessage(
                     "Deleting row for Rana muscosa because not Southern forest species, found in " + forestname)
         # Used for filtering out records in CNDDB
-        elif layerType == "CNDDB":
+        elif layer_type == "CNDDB":
             # Used for deleting all the plant records in San Bernardino for CNDDB
             if str(row.getValue(field)) == "0512" \
                     and row.getValue(fieldrank) != "Sensitive" \
@@ -313,7 +247,7 @@ def unitid_dissolve(filename):
             #     arcpy.AddMessage("deleted a row for Rana muscosa in forest: " + forestname)
             else:
                 # Used for deleting all the species selected not in a particular forest
-                for item in selectionList:
+                for item in selection_list:
                     if item[0].startswith(speciesname) \
                             and speciesname != "Rana boylii" \
                             and speciesname != "Rana muscosa":
@@ -328,22 +262,26 @@ def unitid_dissolve(filename):
     del cur
 
     # running export to gdb just for datasets that required additional filtering others were ran prior to this function
-    if layerType == "CNDDB":
+    # copy_interim is False when the caller patches the FWS deliverable GDBs itself (see species_delta.py)
+    if layer_type == "CNDDB":
         arcpy.AddMessage("Total records deleted because they were Plants from San Bernardino : "
                          + str(plant0512num))
         arcpy.AddMessage("Total records deleted because they were Rana boylii not in target forests : "
                          + str(ranaboyliinum))
         arcpy.AddMessage("Total records deleted because they were species found in unprotected forests : "
                          + str(unprotforestnum))
-        copy_to_gdb("Interim", filename)
-    elif layerType == "Wildlife_Observations":
+        if copy_interim:
+            copy_to_gdb(in_workspace, cur_year, layer_type, "Interim", filename, orig_filename)
+    elif layer_type == "Wildlife_Observations":
         arcpy.AddMessage("Total records deleted because they were Oncorhynchus kisutch in STF : "
                          + str(cohosalmnum))
-        copy_to_gdb("Interim", filename)
-    elif layerType == "Critical_Habitat_Polygons":
+        if copy_interim:
+            copy_to_gdb(in_workspace, cur_year, layer_type, "Interim", filename, orig_filename)
+    elif layer_type == "Critical_Habitat_Polygons":
         arcpy.AddMessage("Total records deleted because they were Rana muscosa not in southern forests : "
                          + str(ranamuscosanum))
-        copy_to_gdb("Interim", filename)
+        if copy_interim:
+            copy_to_gdb(in_workspace, cur_year, layer_type, "Interim", filename, orig_filename)
 
     arcpy.AddMessage("Repairing Geometry ......")
     arcpy.RepairGeometry_management(filename)
@@ -355,13 +293,13 @@ def unitid_dissolve(filename):
     dissolvefields = ["UnitID", "GRANK_FIRE", "SNAME_FIRE", "CNAME_FIRE", "SOURCEFIRE",
                       "BUFFT_FIRE", "BUFFM_FIRE", "CMNT_FIRE", "INST_FIRE"]
 
-    if layerType != "Critical_Habitat_Lines" and layerType != "Critical_Habitat_Polygons" and layerType != "NOAA_ESU":
+    if layer_type != "Critical_Habitat_Lines" and layer_type != "Critical_Habitat_Polygons" and layer_type != "NOAA_ESU":
         dissolvefields.append("BUFF_DIST")
 
     if sys.version_info[0] < 3:
         arcpy.Dissolve_management(filename, dissolveFeatureClass, dissolvefields, "", "SINGLE_PART")
     else:
-        arcpy.PairwiseDissolve_analysis(intersectFeatureClass, dissolveFeatureClass, dissolvefields)
+        arcpy.PairwiseDissolve_analysis(filename, dissolveFeatureClass, dissolvefields)
 
     arcpy.AddMessage("Repairing Dissolved Geometry ......")
     arcpy.RepairGeometry_management(filename)
@@ -371,58 +309,90 @@ def unitid_dissolve(filename):
     return dissolveFeatureClass
 
 
-try:
+def pairwise_intersect(in_workspace, out_feat_class, layer_type, selection_list=None, run_date=None,
+                       ownership_fc=None):
+    """Intersects a preprocessed layer with ownership and exports it, returns the dissolved feature classes.
+
+    ownership_fc replaces the ownership layer of the workspace, for example with a copy held in memory.
+    """
+
+    # using the now variable to assign year everytime there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    noaa_gdb = ""
+    local_gdb = in_workspace + "\\" + "Input" + "\\" + "Local_Data" + "\\" + curYear + "_Local_CAALB83.gdb" + "\\"
+    outputDir = in_workspace + "\\" + "Output"
+    condor_output = outputDir + "\\" + "Condor" + "\\" + "Condor" + "_" + curYear + "_CAALB83.gdb" + "\\"
+
+    if layer_type == "Local":
+        arcpy.env.workspace = local_gdb
+        localOutputWorkSpace = create_output_gdb(in_workspace, layer_type, curYear)
+    elif layer_type == "Condor_Nest" or layer_type == "Condor_Hacking":
+        arcpy.env.workspace = in_workspace
+        if not arcpy.Exists(condor_output):
+            create_output_gdb(in_workspace, "Condor", curYear)
+    elif layer_type == "NOAA_ESU":
+        noaa_gdb = in_workspace + "\\" + "Output" + "\\" + "NOAA_ESU" + "\\" + layer_type + "_" + curYear + "_CAALB83.gdb"
+        arcpy.env.workspace = noaa_gdb
+    else:
+        arcpy.env.workspace = in_workspace
+
+    arcpy.env.overwriteOutput = True
 
-    if layerType == "Local" or layerType == "NOAA_ESU":
+    create_rank_gdbs(in_workspace, curYear)
+
+    if selection_list is None:
+        selection_list = read_selection_list(summary_table(in_workspace))
+
+    usfsOwnershipFeatureClass = ownership_fc or ownership_feature_class(in_workspace, curYear)
+
+    dissolveList = []
+
+    if layer_type == "Local" or layer_type == "NOAA_ESU":
         fcList = arcpy.ListFeatureClasses()
 
         for fc in fcList:
             arcpy.AddMessage("  fc: " + fc)
-            if layerType == "NOAA_ESU":
+            if layer_type == "NOAA_ESU":
                 if not fc.endswith('_geocomplete'):
                     continue
             arcpy.AddMessage("--------------------------------------------------")
             arcpy.AddMessage("Intersecting " + fc)
-            outFeatClass = fc
-
-            usfsOwnershipFeatureClass = in_workspace + \
-                                        "\\USFS_Ownership_LSRS\\" + curYear + \
-                                        "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + curYear
 
-            intersectFeature = outFeatClass + "_intersect"
+            intersectFeature = fc + "_intersect"
 
             arcpy.AddMessage("Intersecting with USFS Ownership feature class .....")
             arcpy.AddMessage("Please be patient while this runs .....")
 
-            if layerType == "Local":
+            if layer_type == "Local":
                 intersectFeatureClass = localOutputWorkSpace + "\\" + intersectFeature
             else:
                 intersectFeatureClass = noaa_gdb + "\\" + intersectFeature
 
-            if layerType == "Local":
-                arcpy.Intersect_analysis([outFeatClass, usfsOwnershipFeatureClass], intersectFeatureClass)
+            if layer_type == "Local":
+                arcpy.Intersect_analysis([fc, usfsOwnershipFeatureClass], intersectFeatureClass)
             else:
                 if sys.version_info[0] < 3:
                     arcpy.AddMessage("Python version of ArcGIS 10.x requires Intersect_analysis.")
                     arcpy.AddMessage("Switch to ArcGIS Pro to use Pairwise Intersection and reduce runtime.")
-                    arcpy.Intersect_analysis([outFeatClass, usfsOwnershipFeatureClass], intersectFeatureClass)
+                    arcpy.Intersect_analysis([fc, usfsOwnershipFeatureClass], intersectFeatureClass)
                 else:
-                    arcpy.PairwiseIntersect_analysis([outFeatClass, usfsOwnershipFeatureClass], intersectFeatureClass)
+                    arcpy.PairwiseIntersect_analysis([fc, usfsOwnershipFeatureClass], intersectFeatureClass)
 
             arcpy.AddMessage("Completed Intersection")
 
-            copy_to_gdb("Interim", intersectFeatureClass)
+            copy_to_gdb(in_workspace, curYear, layer_type, "Interim", intersectFeatureClass, fc)
 
-            dissolveFC = unitid_dissolve(intersectFeatureClass)
+            dissolveFC = unitid_dissolve(in_workspace, curYear, layer_type, intersectFeatureClass, fc, selection_list)
 
-            copy_to_gdb("Final", dissolveFC)
-    else:
+            copy_to_gdb(in_workspace, curYear, layer_type, "Final", dissolveFC, fc)
 
-        usfsOwnershipFeatureClass = in_workspace + \
-                                        "\\USFS_Ownership_LSRS\\" + curYear + \
-                                        "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + curYear
+            dissolveList.append(dissolveFC)
+    else:
 
-        intersectFeatureClass = outFeatClass + "_intersect"
+        intersectFeatureClass = out_feat_class + "_intersect"
 
         arcpy.AddMessage("Intersecting with USFS Ownership feature class .....")
         arcpy.AddMessage("Please be patient while this runs .....")
@@ -430,30 +400,65 @@ try:
         if sys.version_info[0] < 3:
             arcpy.AddMessage("Python version of ArcGIS 10.x requires Intersect_analysis.")
             arcpy.AddMessage("Switch to ArcGIS Pro to use Pairwise Intersection and reduce runtime.")
-            arcpy.Intersect_analysis([outFeatClass, usfsOwnershipFeatureClass], intersectFeatureClass)
+            arcpy.Intersect_analysis([out_feat_class, usfsOwnershipFeatureClass], intersectFeatureClass)
         else:
-            arcpy.PairwiseIntersect_analysis([outFeatClass, usfsOwnershipFeatureClass], intersectFeatureClass)
+            arcpy.PairwiseIntersect_analysis([out_feat_class, usfsOwnershipFeatureClass], intersectFeatureClass)
 
         arcpy.AddMessage("Completed Intersection")
 
         # These layers are modified first prior to exporting the geodatabases
-        if layerType != "CNDDB" and layerType != "Wildlife_Observations" and layerType != "Critical_Habitat_Polygons":
-            copy_to_gdb("Interim", intersectFeatureClass)
+        if layer_type != "CNDDB" and layer_type != "Wildlife_Observations" and layer_type != "Critical_Habitat_Polygons":
+            copy_to_gdb(in_workspace, curYear, layer_type, "Interim", intersectFeatureClass)
 
-        dissolveFC = unitid_dissolve(intersectFeatureClass)
+        dissolveFC = unitid_dissolve(in_workspace, curYear, layer_type, intersectFeatureClass,
+                                     selection_list=selection_list)
 
-        copy_to_gdb("Final", dissolveFC)
+        copy_to_gdb(in_workspace, curYear, layer_type, "Final", dissolveFC)
 
-        if layerType == "Condor_Nest" or layerType == "Condor_Hacking":
+        if layer_type == "Condor_Nest" or layer_type == "Condor_Hacking":
             arcpy.FeatureClassToGeodatabase_conversion([intersectFeatureClass, dissolveFC], condor_output)
             arcpy.Delete_management(intersectFeatureClass)
             arcpy.Delete_management(dissolveFC)
+        else:
+            dissolveList.append(dissolveFC)
 
     arcpy.AddMessage("Completed Script successfully!!")
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
+    return dissolveList
+
+
+def main():
+
+    # in_workspace = sys.argv[1]
+
+    in_workspace = arcpy.GetParameterAsText(0)
+
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
+
+    # The following is used for testing locally. DELETE when done testing.
+    # -------------------------------------------------------------------------------
+    # outFeatClass = in_workspace + "\\" + "Output" + "\\" + layerType + "\\TESP_Test_2017_CAALB83_newproj.gdb\\TESP_2017_original_buffered_single"
+    # outFeatClass = in_workspace + "\\CondorData_noFOIAnoRelease\\2017_Condor_CAALB83.gdb\\CondorHacking_2015"
+    # outFeatClass = in_workspace + "\\Output\\CNDDB\\CNDDB_Test_2017_CAALB83_newproj.gdb\\CNDDB_2017_original_merge"
+    # -------------------------------------------------------------------------------
+
+    # layerType = "Condor_Hacking"
+    # layerType = "Local"
+    # layerType = "NOAA_ESU"
+    # layerType = "CNDDB"
+
+    outFeatClass = sys.argv[2]
+
+    layerType = sys.argv[3]
+
+    try:
+        pairwise_intersect(in_workspace, outFeatClass, layerType)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,833 @@
+# ---------------------------------------------------------------------------
+# pipeline_runner.py
+#
+# Description: Runs the full FRA processing cycle as a dependency graph instead
+#              of one script after another. Every script is a stage that lists
+#              the stages it depends on. Stages whose dependencies are complete
+#              are handed to a pool of worker processes, so independent branches
+#              run at the same time. For example the TESP, Wildlife_Sites, CNDDB
+#              and Critical_Habitat layers run while hydrology is still processing.
+#              Each worker process imports arcpy and the stage modules once and
+#              calls the stage functions in process, so stages do not pay for a
+#              fresh interpreter. The summary csv table is read once per worker
+#              and the ownership layer is copied into memory once per worker,
+#              both are handed to every stage that needs them.
+#
+#              If a stage fails every stage that depends on it is skipped, the
+#              independent branches keep running.
+#
+#              Stages list their input and output data. A run manifest records
+#              content hashes of both (see run_manifest.py) so stages whose inputs
+#              have not changed since the last run are skipped. Use --force to
+#              rebuild everything. Stages that pull from outside sources (EDW,
+#              USGS, NOAA, FWS) have no known inputs and always run.
+#
+#              select_tes_layer stages write their intermediates to a scratch GDB
+#              named after the stage and its manifest key and promote only their
+#              outputs (see scratch_workspace.py), so a layer run here and the same
+#              layer run through stage_daemon.py do not overwrite each other.
+#
+#              hydrology_processing and noaa_esu_processing start worker processes
+#              of their own (--stage-processes), pool workers cannot have children
+#              so these two stages run in a process of their own started by the
+#              runner. They take as many of the --processes slots as they start
+#              workers, all of them by default, and their memory estimate is
+#              scaled by their workers. --sharded runs hydrology_processing per
+#              subregion.
+#
+#              Overlays such as hydrology_processing hold most of a statewide
+#              layer in memory, so with --memory-mb the runner only starts a stage
+#              when its estimated memory (see stage_costs.py) fits next to the
+#              stages already running. Ready stages are started heaviest first
+#              and smaller stages fill the room that is left.
+#
+#              With --plan nothing runs: every stage gets a predicted run time,
+#              memory and disk from the timings recorded by earlier runs (see
+#              stage_costs.py), and the schedule is simulated for the given
+#              --processes and --memory-mb to predict wall time and peak memory.
+#
+#              With --preflight the inputs of the stages are checked first (see
+#              preflight.py) and nothing runs when a check fails.
+#
+#              With --remote the workspace is kept on the network share: its
+#              inputs are copied to the local in_workspace before the run and the
+#              deliverables are copied back while later stages still run (see
+#              share_staging.py).
+#
+#              With --store the outputs of select_tes_layer, pairwise_intersect,
+#              hydrology_processing and noaa_esu_processing are kept in a store
+#              shared by workstations, keyed by the stage and the content of its
+#              inputs, and a stage found in it is copied from it instead of run
+#              (see output_store.py).
+#
+#              With --gc the intermediates a stage leaves behind are removed as
+#              soon as no later stage needs them, --disk-budget-mb also compresses
+#              finished GDBs while Output is over the budget (see
+#              intermediate_gc.py).
+#
+#              --region runs the stages with the profile of another region (see
+#              region_profile.py), without it Region 5 is processed. Several
+#              regions are run together by region_batch.py, several years by
+#              backfill_years.py.
+#
+# Usage: pipeline_runner.py <in_workspace> [--processes N] [--stages name ...] [--force] [--memory-mb MB]
+#                           [--plan] [--region NAME] [--preflight] [--remote SHARE_WORKSPACE [--streams N]]
+#                           [--gc] [--disk-budget-mb MB] [--store FOLDER] [--stage-processes N] [--sharded]
+#
+# Dependencies: edw_extract_data    -> select_tes_layer (EDW layers)
+#               hydro_download      -> hydrology_processing, select_tes_layer (Critical Habitat)
+#               hydrology_processing -> noaa_esu_processing, wo_hydro
+#               select_tes_layer    -> pairwise_intersect (per layer)
+#               noaa_esu_processing -> pairwise_intersect (NOAA_ESU)
+#               pairwise_intersect  -> final_merge -> wo_deliverable
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import multiprocessing
+import importlib
+import os
+import sys
+import time
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+import intermediate_gc
+import output_store
+import preflight
+import region_profile
+import run_manifest
+import scratch_workspace
+import share_staging
+import stage_costs
+from select_tes_layer import local_data_gdb, localDataDict, read_selection_list
+
+# Summary tables already read by this worker process, keyed by path
+tableCache = {}
+
+# Stage functions that resume from a checkpoint (see checkpoint.py), they are passed the stage key
+checkpointFunctionList = ["hydrology_processing.hydrology_processing", "noaa_esu_processing.noaa_esu_processing"]
+
+# Feature classes this worker process holds in memory, their source and its modification time by in_memory path
+layerCache = {}
+
+selectLayerList = ["TESP", "Wildlife_Sites", "Wildlife_Observations",
+                   "Critical_Habitat_Polygons", "Critical_Habitat_Lines", "CNDDB"]
+
+# Original data used by select_tes_layer.py, relative to the workspace
+layerInputDict = {"TESP": "EDW_Extract\\edw_extract.gdb\\TESP_region5",
+                  "Wildlife_Sites": "EDW_Extract\\edw_extract.gdb\\Wild_Sites_region5",
+                  "Wildlife_Observations": "EDW_Extract\\edw_extract.gdb\\Wild_Obs_region5",
+                  "Critical_Habitat_Polygons": "Downloads\\CHab\\crithab_all_layers\\CRITHAB_POLY.shp",
+                  "Critical_Habitat_Lines": "Downloads\\CHab\\crithab_all_layers\\CRITHAB_LINE.shp",
+                  "CNDDB": "Input\\CNDDB\\gis_gov\\cnddb.shp"}
+
+# Stage that produces the original data of each select layer
+layerSourceDict = {"TESP": "edw_extract_data",
+                   "Wildlife_Sites": "edw_extract_data",
+                   "Wildlife_Observations": "edw_extract_data",
+                   "Critical_Habitat_Polygons": "hydro_download",
+                   "Critical_Habitat_Lines": "hydro_download",
+                   "CNDDB": None}
+
+summaryTable = "csv_tables\\AllMerge_SummaryTable.csv"
+
+# Format of the run_date keyword argument of the stages, it is handed to the stage functions as a datetime
+dateFormat = "%Y-%m-%d"
+
+# Feature classes noaa_esu_processing.py leaves for pairwise_intersect.py
+esuGeocompleteList = ["CKCAC_Chinook_CalifCoastal_geocomplete",
+                      "CKCVS_Chinook_CentralValleySpringRun_geocomplete",
+                      "CKSAC_Chinook_SacRiverWinterRun_geocomplete",
+                      "STCCV_Steelhead_CalifCentralValley_geocomplete",
+                      "STNCA_Steelhead_NorthCalif_geocomplete",
+                      "STSCC_Steelhead_SouthCentralCalif_geocomplete",
+                      "STSCA_Steelhead_SouthernCalif_geocomplete",
+                      "COSNC_Coho_SouthOregNorthCalifCoasts_geocomplete"]
+
+
+def new_stage(name, function, args, deps, inputs=None, outputs=None, tables=None, layers=None, scratch=False,
+              kwargs=None, own_pool=False, processes=None):
+    """Function is module.function of the stage. Inputs of None means the stage reads from an
+    outside source and is always run. Tables maps keyword arguments to csv tables read by the worker,
+    layers maps keyword arguments to feature classes the worker keeps in memory. Scratch stages are
+    passed a scratch_key and keep their intermediates in a private scratch GDB. Kwargs are keyword
+    arguments passed as they are, such as the region. Own pool stages start a pool of processes
+    worker processes of their own, all the worker slots of the runner when it is None, they run in a
+    process of their own instead of a pool worker. processes is kept out of the stage key, it does not change the outputs.
+    """
+
+    return {"name": name, "function": function, "args": args, "deps": deps,
+            "inputs": inputs, "outputs": outputs or [], "tables": tables or {}, "layers": layers or {},
+            "scratch": scratch, "kwargs": kwargs or {}, "own_pool": own_pool, "processes": processes}
+
+
+def stage_date(stage):
+    """Date a stage runs with, its run_date or today."""
+
+    runDate = stage.get("kwargs", {}).get("run_date")
+    if runDate:
+        return datetime.datetime.strptime(runDate, dateFormat)
+
+    return datetime.datetime.today()
+
+
+def geocomplete_list(in_workspace, layer_type, cur_year):
+
+    projWorkspace = in_workspace + "\\" + "Output" + "\\" + layer_type + "\\" + \
+                    layer_type + "_" + cur_year + "_CAALB83.gdb" + "\\"
+
+    # Wildlife Observations is split by rank at the end of select_tes_layer.py
+    if layer_type == "Wildlife_Observations":
+        return [projWorkspace + "EDW_FishWildlife_Observation_" + cur_year + "_" + tesRank[:1]
+                for tesRank in ["Endangered", "Threatened", "Sensitive"]]
+
+    return [projWorkspace + layer_type + "_" + cur_year + "_geocomplete"]
+
+
+def build_stage_graph(in_workspace, cur_year=None, region=None, run_date=None, stage_processes=None,
+                      sharded=False):
+    """Stages of one workspace, run with the profile of region when it is given (see region_profile.py).
+
+    A run_date builds the deliverables of its year instead of the current one. stage_processes is the
+    number of worker processes of hydrology_processing and noaa_esu_processing, sharded buffers,
+    intersects and dissolves the hydro layers per subregion.
+    """
+
+    if run_date is not None:
+        cur_year = str(run_date.year)
+    elif cur_year is None:
+        cur_year = str(datetime.datetime.today().year)
+
+    regionKwargs = {}
+    if region is not None:
+        regionKwargs["region"] = region
+    dateKwargs = {}
+    if run_date is not None:
+        dateKwargs["run_date"] = run_date.strftime(dateFormat)
+    stageKwargs = dict(regionKwargs, **dateKwargs)
+
+    edwGDB = in_workspace + "\\" + "EDW_Extract" + "\\" + "edw_extract.gdb"
+    ownershipFC = in_workspace + "\\USFS_Ownership_LSRS\\" + cur_year + \
+                  "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + cur_year
+    csvFile = in_workspace + "\\" + summaryTable
+    downloadPath = in_workspace + "\\" + "Downloads"
+    hydroGDB = in_workspace + "\\" + "Output" + "\\" + "Hydro" + cur_year + "\\" + "Hydro_" + cur_year + "_CAALB83.gdb"
+    hydroIntersectList = [hydroGDB + "\\" + "NHDFlowline_Merge_Buff_intersect",
+                          hydroGDB + "\\" + "NHDWaterbody_Area_Merge_Buff_intersect"]
+    hydroGeocompleteList = [hydroGDB + "\\" + "NHDFlowline_Merge_geocomplete",
+                            hydroGDB + "\\" + "NHDWaterbody_Area_Merge_geocomplete"]
+    noaaGDB = in_workspace + "\\" + "Output" + "\\" + "NOAA_ESU" + "\\" + "NOAA_ESU_" + cur_year + "_CAALB83.gdb"
+    noaaList = [noaaGDB + "\\" + esuGeocomplete for esuGeocomplete in esuGeocompleteList]
+    rankPathList = [in_workspace + "\\" + cur_year + "_" + tes for tes in ["Endangered", "Threatened", "Sensitive"]]
+    identInterList = [rankPath + "\\" + os.path.basename(rankPath) + "_IdentInter_CAALB83.gdb"
+                      for rankPath in rankPathList]
+    finalDistGDB = in_workspace + "\\" + "WO" + "\\" + "FWS" + "\\" + \
+                   region_profile.distributable_gdb(region_profile.get_profile(region), cur_year)
+    finalList = [finalDistGDB + "\\" + "FireRetardantEIS_" + tes for tes in ["Endangered", "Threatened", "Sensitive"]]
+
+    stages = [new_stage("edw_extract_data", "edw_extract_data.edw_extract_data", [in_workspace], [],
+                        outputs=[edwGDB + "\\" + "TESP_region5", edwGDB + "\\" + "Wild_Obs_region5",
+                                 edwGDB + "\\" + "Wild_Sites_region5"],
+                        kwargs=stageKwargs),
+              new_stage("hydro_download", "hydro_download.hydro_download", [in_workspace], [],
+                        outputs=[downloadPath + "\\" + "Hydro", downloadPath + "\\" + "NOAA_ESU",
+                                 downloadPath + "\\" + "CHab"],
+                        kwargs=regionKwargs),
+              new_stage("hydrology_processing", "hydrology_processing.hydrology_processing", [in_workspace],
+                        ["hydro_download"],
+                        inputs=[downloadPath + "\\" + "Hydro", ownershipFC],
+                        outputs=hydroIntersectList + hydroGeocompleteList,
+                        layers={"ownership_fc": ownershipFC},
+                        kwargs=dict(stageKwargs, sharded=True) if sharded else stageKwargs,
+                        own_pool=True, processes=stage_processes),
+              new_stage("noaa_esu_processing", "noaa_esu_processing.noaa_esu_processing", [in_workspace],
+                        ["hydro_download", "hydrology_processing"],
+                        inputs=[downloadPath + "\\" + "NOAA_ESU"] + hydroIntersectList,
+                        outputs=noaaList, kwargs=stageKwargs, own_pool=True, processes=stage_processes),
+              new_stage("pairwise_intersect:NOAA_ESU", "pairwise_intersect.pairwise_intersect",
+                        [in_workspace, "", "NOAA_ESU"], ["noaa_esu_processing"],
+                        inputs=noaaList + [ownershipFC, csvFile],
+                        outputs=[esu + "_intersect_dissolved" for esu in noaaList],
+                        tables={"selection_list": csvFile}, layers={"ownership_fc": ownershipFC},
+                        kwargs=dateKwargs),
+              new_stage("wo_hydro", "wo_hydro.wo_hydro", [in_workspace], ["hydrology_processing"],
+                        inputs=hydroGeocompleteList,
+                        outputs=[in_workspace + "\\" + "WO" + "\\" + "Hydro_Submitted"], kwargs=stageKwargs)]
+
+    intersectStages = ["pairwise_intersect:NOAA_ESU"]
+
+    for layerType in selectLayerList:
+        selectName = "select_tes_layer:" + layerType
+        selectDeps = []
+        if layerSourceDict.get(layerType):
+            selectDeps.append(layerSourceDict.get(layerType))
+
+        inTable = in_workspace + "\\" + layerInputDict.get(layerType)
+        selectInputs = [inTable, csvFile]
+        if layerType in localDataDict:
+            selectInputs.append(local_data_gdb(in_workspace, cur_year, localDataDict[layerType]))
+
+        geocompleteList = geocomplete_list(in_workspace, layerType, cur_year)
+
+        stages.append(new_stage(selectName, "select_tes_layer.select_tes_layer",
+                                [in_workspace, inTable, csvFile, layerType], selectDeps,
+                                inputs=selectInputs, outputs=geocompleteList,
+                                tables={"selection_list": csvFile}, scratch=True, kwargs=stageKwargs))
+
+        for geocomplete in geocompleteList:
+            intersectName = "pairwise_intersect:" + layerType
+            if len(geocompleteList) > 1:
+                intersectName += ":" + geocomplete[-1:]
+            stages.append(new_stage(intersectName, "pairwise_intersect.pairwise_intersect",
+                                    [in_workspace, geocomplete, layerType], [selectName],
+                                    inputs=[geocomplete, ownershipFC, csvFile],
+                                    outputs=[geocomplete + "_intersect_dissolved"],
+                                    tables={"selection_list": csvFile}, layers={"ownership_fc": ownershipFC},
+                                    kwargs=dateKwargs))
+            intersectStages.append(intersectName)
+
+    stages.append(new_stage("final_merge", "final_merge.final_merge", [in_workspace], intersectStages,
+                            inputs=identInterList, outputs=finalList, kwargs=stageKwargs))
+    stages.append(new_stage("wo_deliverable", "wo_deliverable.wo_deliverable", [in_workspace], ["final_merge"],
+                            inputs=finalList,
+                            outputs=[in_workspace + "\\" + "WO" + "\\" + "TES_Submitted"], kwargs=stageKwargs))
+
+    return stages
+
+
+def select_stages(stages, names):
+    """Keep only the named stages, dependencies outside the selection are treated as already complete."""
+
+    selected = [stage for stage in stages
+                if any(stage["name"] == name or stage["name"].startswith(name + ":") for name in names)]
+    selectedNames = set(stage["name"] for stage in selected)
+
+    return [dict(stage, deps=[dep for dep in stage["deps"] if dep in selectedNames]) for stage in selected]
+
+
+def check_graph(stages):
+
+    stageNames = set(stage["name"] for stage in stages)
+
+    for stage in stages:
+        for dep in stage["deps"]:
+            if dep not in stageNames:
+                raise ValueError("Stage " + stage["name"] + " depends on unknown stage " + dep)
+
+    # Kahn's algorithm, anything left over is part of a cycle
+    remaining = dict((stage["name"], set(stage["deps"])) for stage in stages)
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError("Dependency cycle between stages: " + ", ".join(sorted(remaining)))
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def load_table(csv_file):
+    """Reads a csv table once per worker, it is read again only when the file changes."""
+
+    modified = os.path.getmtime(csv_file)
+    cached = tableCache.get(csv_file)
+    if cached is None or cached[0] != modified:
+        cached = (modified, read_selection_list(csv_file))
+        tableCache[csv_file] = cached
+
+    return cached[1]
+
+
+def load_layer(feature_class, layer_name=None):
+    """Copies a feature class into memory once per worker, it is copied again only when it changes.
+
+    The copy is named layer_name, the name of the feature class by default, intersect outputs name their
+    FID_ field after it. A layer of another region or year with the same name replaces it.
+    """
+
+    if layer_name is None:
+        layer_name = os.path.basename(feature_class.replace("\\", os.sep))
+    memoryFC = "in_memory\\" + layer_name
+
+    modified = run_manifest.dataset_modified(feature_class)
+    if layerCache.get(memoryFC) != (feature_class, modified):
+        arcpy.AddMessage("Loading " + feature_class + " into memory as " + layer_name)
+        if arcpy.Exists(memoryFC):
+            arcpy.Delete_management(memoryFC)
+        arcpy.CopyFeatures_management(feature_class, memoryFC)
+        layerCache[memoryFC] = (feature_class, modified)
+
+    return memoryFC
+
+
+def get_stage_function(stage):
+
+    moduleName, functionName = stage["function"].rsplit(".", 1)
+    return getattr(importlib.import_module(moduleName), functionName)
+
+
+def run_stage(stage):
+    """Calls one stage function inside the current worker process."""
+
+    startTime = time.time()
+    message = ""
+
+    try:
+        if stage.get("restore_entry"):
+            output_store.restore_entry(stage["restore_entry"], stage)
+        else:
+            kwargs = dict(stage.get("kwargs", {}))
+            if "run_date" in kwargs:
+                kwargs["run_date"] = datetime.datetime.strptime(kwargs["run_date"], dateFormat)
+            for name, path in stage["tables"].items():
+                kwargs[name] = load_table(path)
+            for name, path in stage["layers"].items():
+                # Loaded from an identical layer shared with other stages, under the name of its own
+                sharedPath = stage.get("shared_layers", {}).get(name, path)
+                kwargs[name] = load_layer(sharedPath, os.path.basename(path.replace("\\", os.sep)))
+            if stage["scratch"]:
+                kwargs["scratch_key"] = stage["scratch_key"]
+            if stage.get("own_pool"):
+                kwargs["processes"] = stage["processes"]
+            if stage.get("checkpoint_key"):
+                kwargs["checkpoint_key"] = stage["checkpoint_key"]
+            if stage.get("restart"):
+                kwargs["restart"] = True
+            get_stage_function(stage)(*stage["args"], **kwargs)
+            if stage.get("store_key"):
+                store_stage(stage)
+        success = True
+    except arcpy.ExecuteError:
+        success = False
+        message = arcpy.GetMessages(2)
+    except Exception as e:
+        success = False
+        message = str(e)
+
+    return stage["name"], success, time.time() - startTime, message
+
+
+def stage_process_main(stage, result_queue):
+
+    result_queue.put(run_stage(stage))
+
+
+class StageProcess(object):
+    """Runs an own pool stage in a process of its own, pool workers are daemonic and cannot start the
+    worker processes of the stage. Has the ready and get of the AsyncResult of a pool stage.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.startTime = time.time()
+        self.result = None
+        self.queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=stage_process_main, args=(stage, self.queue))
+        self.process.start()
+
+    def ready(self):
+        if self.result is None:
+            alive = self.process.is_alive()
+            try:
+                # A process that has exited may still be flushing its result into the queue
+                self.result = self.queue.get(True, 0.1 if alive else 5)
+            except Empty:
+                if not alive:
+                    self.result = (self.stage["name"], False, time.time() - self.startTime,
+                                   "Stage process exited with code " + str(self.process.exitcode))
+
+        return self.result is not None
+
+    def get(self):
+        self.process.join()
+        return self.result
+
+
+def store_stage(stage):
+    """Copies the outputs of a completed stage into the output store, a store that cannot be written
+    to does not fail the stage.
+    """
+
+    try:
+        output_store.store_outputs(stage["store"], stage["store_key"], stage)
+    except (IOError, OSError, arcpy.ExecuteError) as e:
+        arcpy.AddWarning("Could not store the outputs of " + stage["name"] + ": " + str(e))
+
+
+def stage_is_current(stage, manifest, fingerprints, keys, force):
+    """Computes the stage key and reports whether the last recorded run can be reused."""
+
+    if stage["inputs"] is None:
+        keys[stage["name"]] = None
+        return False
+
+    for path in stage["inputs"]:
+        if path not in fingerprints:
+            fingerprints[path] = run_manifest.fingerprint(path)
+
+    key = run_manifest.stage_key(stage, fingerprints)
+    keys[stage["name"]] = key
+
+    if force or not run_manifest.is_current(manifest, stage, key):
+        return False
+
+    # Reuse the recorded output hashes so downstream keys are computed without rehashing
+    fingerprints.update(manifest["stages"][stage["name"]]["outputs"])
+    return True
+
+
+def checkpoint_stage(stage, fingerprints, keys, force):
+    """Adds the key the checkpoint of a stage is kept for, and restart when the stage is forced.
+
+    A checkpoint written for other inputs is started over by checkpoint.load_checkpoint() itself.
+    """
+
+    if stage["name"] not in keys and stage["inputs"] is not None:
+        # No manifest, the key is still needed for the checkpoint
+        for path in stage["inputs"]:
+            if path not in fingerprints:
+                fingerprints[path] = run_manifest.fingerprint(path)
+        keys[stage["name"]] = run_manifest.stage_key(stage, fingerprints)
+
+    return dict(stage, checkpoint_key=keys.get(stage["name"]), restart=force)
+
+
+def record_outputs(stage, manifest, manifest_file, fingerprints, key, elapsed):
+
+    outputs = {}
+    for path in stage["outputs"]:
+        outputs[path] = run_manifest.fingerprint(path)
+    fingerprints.update(outputs)
+
+    run_manifest.record_stage(manifest, stage, key, outputs, elapsed)
+    run_manifest.save_manifest(manifest_file, manifest)
+
+
+def stage_slots(stage):
+    """Worker slots a running stage takes, the worker processes of an own pool stage."""
+
+    if stage.get("own_pool") and not stage.get("restore_entry"):
+        return stage["processes"]
+    return 1
+
+
+def pool_stage(stage, processes):
+    """Gives an own pool stage the worker slots of the runner it may use, all of them by default."""
+
+    if not stage.get("own_pool"):
+        return stage
+    return dict(stage, processes=min(stage.get("processes") or processes, processes))
+
+
+def start_ready_stages(ready, running, costs, pool, stageDict, processes, memory_budget):
+    """Starts the ready stages that fit in the free worker slots and memory, heaviest first."""
+
+    runningMemory = sum(costs[name] for name in running)
+    runningSlots = sum(stage_slots(stageDict[name]) for name in running)
+
+    for name in sorted(ready, key=lambda readyName: costs[readyName], reverse=True):
+        if runningSlots >= processes:
+            break
+        if running and runningSlots + stage_slots(stageDict[name]) > processes:
+            continue
+        # A stage larger than the whole budget still runs, but only on its own
+        if memory_budget is not None and running and runningMemory + costs[name] > memory_budget:
+            continue
+        arcpy.AddMessage("Starting " + name + " (estimated " + str(int(costs[name])) + " MB)")
+        if stageDict[name].get("own_pool") and not stageDict[name].get("restore_entry"):
+            running[name] = StageProcess(stageDict[name])
+        else:
+            running[name] = pool.apply_async(run_stage, (stageDict[name],))
+        runningMemory += costs[name]
+        runningSlots += stage_slots(stageDict[name])
+        ready.remove(name)
+
+
+def plan_pipeline(stages, processes=None, memory_budget=None, cost_file=None, timing_file=None):
+    """Predicts time, memory and disk of every stage and of the whole run without running anything.
+
+    The schedule is simulated with the same worker count and memory budget rules as run_pipeline.
+    Returns a dictionary of stage name to prediction (see stage_costs.predict_stage).
+    """
+
+    check_graph(stages)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    costCache = {}
+    if cost_file is not None:
+        costCache = stage_costs.load_cost_cache(cost_file)
+    timings = {}
+    if timing_file is not None:
+        timings = stage_costs.load_cost_cache(timing_file)
+
+    stages = [pool_stage(stage, processes) for stage in stages]
+    predictions = {}
+    for stage in stages:
+        predictions[stage["name"]] = stage_costs.predict_stage(stage, costCache, timings)
+
+    if cost_file is not None:
+        stage_costs.save_cost_cache(cost_file, costCache)
+
+    stageDict = dict((stage["name"], stage) for stage in stages)
+    pending = [stage["name"] for stage in stages]
+    running = {}
+    done = []
+    clock = 0.0
+    peakMemory = 0
+
+    while pending or running:
+        ready = [name for name in pending if all(dep in done for dep in stageDict[name]["deps"])]
+        for name in sorted(ready, key=lambda readyName: predictions[readyName]["memory"], reverse=True):
+            runningMemory = sum(predictions[runningName]["memory"] for runningName in running)
+            runningSlots = sum(stage_slots(stageDict[runningName]) for runningName in running)
+            if runningSlots >= processes:
+                break
+            if running and runningSlots + stage_slots(stageDict[name]) > processes:
+                continue
+            if memory_budget is not None and running and runningMemory + predictions[name]["memory"] > memory_budget:
+                continue
+            running[name] = clock + (predictions[name]["seconds"] or 0)
+            peakMemory = max(peakMemory, runningMemory + predictions[name]["memory"])
+            pending.remove(name)
+
+        name = min(running, key=lambda runningName: running[runningName])
+        clock = running.pop(name)
+        done.append(name)
+
+    def duration(seconds):
+        if seconds is None:
+            return "unknown"
+        return str(datetime.timedelta(seconds=int(seconds)))
+
+    arcpy.AddMessage("Plan for " + str(len(stages)) + " stages with " + str(processes) + " worker processes")
+    for stage in stages:
+        prediction = predictions[stage["name"]]
+        disk = "unknown"
+        if prediction["disk"] is not None:
+            disk = str(int(prediction["disk"])) + " MB"
+        arcpy.AddMessage("  " + stage["name"] + ": " + duration(prediction["seconds"]) + ", " +
+                         str(int(prediction["memory"])) + " MB memory, " + disk + " disk (" +
+                         prediction["basis"] + ")")
+
+    unknownList = [name for name in predictions if predictions[name]["seconds"] is None]
+    arcpy.AddMessage("__________________________________________________")
+    arcpy.AddMessage("Serial time:    " + duration(sum(prediction["seconds"] or 0 for prediction in predictions.values())))
+    arcpy.AddMessage("Wall time:      " + duration(clock))
+    arcpy.AddMessage("Peak memory:    " + str(int(peakMemory)) + " MB")
+    arcpy.AddMessage("Disk:           " + str(int(sum(prediction["disk"] or 0 for prediction in predictions.values()))) + " MB")
+    if unknownList:
+        arcpy.AddWarning("No recorded runs for " + ", ".join(sorted(unknownList)) +
+                         ", their time and disk are not included")
+
+    return predictions
+
+
+def run_pipeline(stages, processes=None, manifest_file=None, force=False, pool=None, memory_budget=None,
+                 cost_file=None, timing_file=None, on_complete=None, store=None):
+    """Runs the stages in dependency order and returns a dictionary of stage name to status.
+
+    When a manifest file is given stages with unchanged inputs are reported as current and not run.
+    A pool of already running workers can be passed in, it is left open afterwards.
+    At most processes stages run at once. When a memory budget in MB is given stages only start while
+    the estimated memory of the running stages fits in it (see stage_costs.py), lighter stages fill
+    the room left next to a heavy overlay.
+    on_complete is called with every stage that completes or is current, for example to publish its outputs.
+    With an output store folder stages whose outputs are stored under their key are restored from it
+    instead of run, and the outputs of the stages that do run are stored (see output_store.py).
+    """
+
+    check_graph(stages)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    stageDict = dict((stage["name"], stage) for stage in stages)
+    pending = [stage["name"] for stage in stages]
+    ready = []
+    running = {}
+    status = {}
+    costs = {}
+
+    costCache = {}
+    if cost_file is not None:
+        costCache = stage_costs.load_cost_cache(cost_file)
+    timings = None
+    if timing_file is not None:
+        timings = stage_costs.load_cost_cache(timing_file)
+
+    manifest = None
+    fingerprints = {}
+    keys = {}
+    if manifest_file is not None:
+        manifest = run_manifest.load_manifest(manifest_file)
+
+    ownPool = pool is None
+    if ownPool:
+        arcpy.AddMessage("Running " + str(len(stages)) + " stages with " + str(processes) + " worker processes")
+        pool = multiprocessing.Pool(processes)
+
+    try:
+        while pending or ready or running:
+
+            for name in list(pending):
+                deps = stageDict[name]["deps"]
+                if any(status.get(dep) in ("failed", "skipped") for dep in deps):
+                    arcpy.AddMessage("Skipping " + name + " because an upstream stage did not complete")
+                    status[name] = "skipped"
+                    pending.remove(name)
+                elif all(status.get(dep) in ("complete", "current") for dep in deps):
+                    pending.remove(name)
+                    if manifest is not None and stage_is_current(stageDict[name], manifest, fingerprints, keys, force):
+                        arcpy.AddMessage("Inputs unchanged, skipping " + name)
+                        status[name] = "current"
+                        if on_complete is not None:
+                            on_complete(stageDict[name])
+                        continue
+                    if stageDict[name]["scratch"]:
+                        stageDict[name] = dict(stageDict[name],
+                                               scratch_key=scratch_workspace.scratch_key(stageDict[name], keys.get(name)))
+                    if stageDict[name]["function"] in checkpointFunctionList:
+                        stageDict[name] = checkpoint_stage(stageDict[name], fingerprints, keys, force)
+                    if store is not None and output_store.is_stored(stageDict[name]):
+                        storeKey = output_store.store_key(stageDict[name], fingerprints)
+                        entry = output_store.find_entry(store, storeKey)
+                        if entry and not force:
+                            arcpy.AddMessage("Outputs of " + name + " found in the store, restoring them")
+                            stageDict[name] = dict(stageDict[name], restore_entry=entry)
+                        else:
+                            stageDict[name] = dict(stageDict[name], store=store, store_key=storeKey)
+                    stageDict[name] = pool_stage(stageDict[name], processes)
+                    costs[name] = stage_costs.estimate_stage_cost(stageDict[name], costCache)
+                    ready.append(name)
+
+            start_ready_stages(ready, running, costs, pool, stageDict, processes, memory_budget)
+
+            for name in list(running):
+                if running[name].ready():
+                    stageName, success, elapsed, message = running.pop(name).get()
+                    if success:
+                        status[name] = "complete"
+                        arcpy.AddMessage("Completed " + name + " in " + str(datetime.timedelta(seconds=int(elapsed))))
+                        if manifest is not None:
+                            record_outputs(stageDict[name], manifest, manifest_file, fingerprints,
+                                           keys.get(name), elapsed)
+                        if timings is not None and not stageDict[name].get("restore_entry"):
+                            stage_costs.record_timing(timings, stageDict[name], costCache, elapsed)
+                            stage_costs.save_cost_cache(timing_file, timings)
+                        if on_complete is not None:
+                            on_complete(stageDict[name])
+                    else:
+                        status[name] = "failed"
+                        arcpy.AddError("Stage " + name + " failed: " + message)
+
+            if running:
+                time.sleep(1)
+
+    finally:
+        if ownPool:
+            pool.close()
+            pool.join()
+        if cost_file is not None:
+            stage_costs.save_cost_cache(cost_file, costCache)
+
+    return status
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Runs the FRA processing stages as a dependency graph")
+    parser.add_argument("in_workspace")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="only run these stages, for example select_tes_layer:TESP or pairwise_intersect")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every stage even when its inputs have not changed")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="memory budget in MB shared by the running stages, defaults to no limit")
+    parser.add_argument("--plan", action="store_true",
+                        help="only predict time, memory and disk of the stages from earlier runs")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    parser.add_argument("--preflight", action="store_true",
+                        help="check the inputs of the stages first and do not start when a check fails")
+    parser.add_argument("--remote", default=None,
+                        help="workspace on the network share, its inputs are copied to in_workspace first and "
+                             "the deliverables are copied back as they complete")
+    parser.add_argument("--streams", type=int, default=share_staging.defaultStreams,
+                        help="number of files copied at once with --remote, defaults to " +
+                             str(share_staging.defaultStreams))
+    parser.add_argument("--store", default=None,
+                        help="output store folder shared by workstations, stages found in it are restored "
+                             "instead of run")
+    parser.add_argument("--stage-processes", type=int, default=None,
+                        help="number of worker processes hydrology_processing and noaa_esu_processing start, "
+                             "defaults to --processes")
+    parser.add_argument("--sharded", action="store_true",
+                        help="buffer, intersect and dissolve the hydro layers per subregion")
+    parser.add_argument("--gc", action="store_true",
+                        help="remove the intermediates of every stage as soon as no later stage needs them")
+    parser.add_argument("--disk-budget-mb", type=int, default=None,
+                        help="with --gc, compress finished GDBs while the Output folder is larger than this")
+    args = parser.parse_args()
+
+    stages = build_stage_graph(args.in_workspace, region=args.region, stage_processes=args.stage_processes,
+                               sharded=args.sharded)
+    if args.stages:
+        stages = select_stages(stages, args.stages)
+
+    publisher = None
+    if args.remote and not args.plan:
+        share_staging.stage_in(args.remote, args.in_workspace, args.streams)
+        publisher = share_staging.Publisher(args.in_workspace, args.remote, args.streams)
+
+    if args.preflight and not args.plan:
+        if preflight.has_errors(preflight.preflight(args.in_workspace, stages, args.region, args.processes)):
+            arcpy.AddError("Pre-flight checks failed, no stage was started")
+            sys.exit(1)
+
+    if args.plan:
+        plan_pipeline(stages, args.processes, args.memory_mb, stage_costs.cost_cache_path(args.in_workspace),
+                      stage_costs.timing_path(args.in_workspace))
+        return
+
+    completeList = []
+    if publisher:
+        completeList.append(publisher.stage_complete)
+    policy = None
+    if args.gc or args.disk_budget_mb:
+        policy = intermediate_gc.RetentionPolicy(args.in_workspace, stages, args.disk_budget_mb)
+        completeList.append(policy.stage_complete)
+
+    def on_complete(stage):
+        for function in completeList:
+            function(stage)
+
+    status = run_pipeline(stages, args.processes, run_manifest.manifest_path(args.in_workspace), args.force,
+                          memory_budget=args.memory_mb,
+                          cost_file=stage_costs.cost_cache_path(args.in_workspace),
+                          timing_file=stage_costs.timing_path(args.in_workspace),
+                          on_complete=on_complete if completeList else None, store=args.store)
+
+    publishErrors = publisher.wait() if publisher else []
+    if policy:
+        policy.report()
+
+    arcpy.AddMessage("__________________________________________________")
+    for stage in stages:
+        arcpy.AddMessage("  " + stage["name"] + ": " + status.get(stage["name"]))
+
+    if any(value not in ("complete", "current") for value in status.values()) or publishErrors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# ---------------------------------------------------------------------------
+# preflight.py
+#
+# Description: Checks the inputs of a pipeline run before any long stage starts,
+#              so a missing or malformed input is reported in a minute instead of
+#              failing the run hours in.
+#
+#              The inputs checked are those the stages of the run read and no
+#              stage of the run writes. Data in the Output, WO and YEAR_<rank>
+#              folders is only checked for stages without upstream stages in
+#              the run. A run that starts with edw_extract_data and
+#              hydro_download does not check the EDW extract and downloads, a
+#              run of later stages does. For every input:
+#                  summary table    columns used by the scripts (name, rank,
+#                                   buffer, forest, type, CH) and whole number
+#                                   buffers
+#                  select layers    fields used by the selection queries and
+#                                   populate_fra_attributes, spatial reference,
+#                                   at least one feature
+#                  ownership        UnitID_FS and FORESTNAME, the processing
+#                                   projection and polygons for every forest of
+#                                   the region, wo_deliverable.py fails on the
+#                                   merge of a forest without records
+#                  NHD downloads    NHD_H_<subregion>_HU4_GDB.gdb of every
+#                                   subregion with NHDArea, NHDFlowline and
+#                                   NHDWaterbody and their FCode and FType
+#                  NOAA downloads   the ESU shapefiles and their Class field
+#                  local data       the Shasta crayfish and MYLF study areas in
+#                                   the processing projection, they are merged
+#                                   without being projected
+#
+#              The checks run in a pool of worker processes. Checks that have
+#              not finished after --timeout seconds are reported as errors.
+#              pipeline_runner.py --preflight runs the same checks first and
+#              does not start when one fails.
+#
+# Usage: preflight.py <in_workspace> [--stages name ...] [--region NAME] [--processes N] [--timeout S]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import gdb_writer
+import hydrology_processing
+import noaa_esu_processing
+import pipeline_runner
+import region_profile
+import watch_inputs
+from select_tes_layer import localDataDict, localFeatureDict, read_selection_list, tesvariablelist
+
+# Fields of the original data used by the selection queries and populate_fra_attributes
+layerFieldDict = {"TESP": ["SCIENTIFIC_NAME", "ACCEPTED_SCIENTIFIC_NAME", "ACCEPTED_COMMON_NAME",
+                           "PLANT_FOUND", "FS_UNIT_NAME"],
+                  "Wildlife_Sites": ["SCI_NAME", "COMMON_NAME", "ASSOC_OBS", "SITE_NAME", "FS_UNIT_NAME"],
+                  "Wildlife_Observations": ["SCIENTIFIC_NAME", "COMMON_NAME", "TOTAL_DETECTED", "FS_UNIT_NAME"],
+                  "Critical_Habitat_Polygons": ["sciname", "comname"],
+                  "Critical_Habitat_Lines": ["sciname", "comname"],
+                  "CNDDB": ["SNAME", "CNAME", "PRESENCE", "ACCURACY"]}
+
+ownershipFieldList = ["UnitID_FS", "FORESTNAME"]
+
+nhdFieldList = ["FCode", "FType"]
+
+# Columns of the summary table read by the scripts, the CH column is the seventh
+summaryColumns = 7
+
+# NOAA download folder of each ESU, by the start of its code
+esuFolderDict = {"CK": "Chinook", "ST": "Steelhead", "CO": "Coho"}
+
+defaultTimeout = 60
+
+
+def finding(level, subject, message):
+
+    return [level, subject, message]
+
+
+def check_exists(path):
+
+    if arcpy.Exists(path) or os.path.exists(path):
+        return []
+
+    return [finding("error", path, "does not exist")]
+
+
+def check_feature_class(path, fields, spatial_reference_name=None, empty_level="error"):
+    """Existence, fields, spatial reference and feature count of a feature class or shapefile."""
+
+    if not arcpy.Exists(path):
+        return [finding("error", path, "does not exist")]
+
+    findings = []
+
+    fieldNames = [field.name.upper() for field in arcpy.ListFields(path)]
+    missingList = [field for field in fields if field.upper() not in fieldNames]
+    if missingList:
+        findings.append(finding("error", path, "is missing fields " + ", ".join(missingList)))
+
+    srName = arcpy.Describe(path).spatialReference.name
+    if srName == "Unknown":
+        findings.append(finding("error", path, "has no spatial reference"))
+    elif spatial_reference_name and srName != spatial_reference_name:
+        findings.append(finding("error", path, "is in " + srName + ", expected " + spatial_reference_name))
+
+    count = int(arcpy.GetCount_management(path).getOutput(0))
+    if count == 0:
+        findings.append(finding(empty_level, path, "has no features"))
+
+    if not findings:
+        findings.append(finding("ok", path, str(count) + " features"))
+
+    return findings
+
+
+def check_summary_table(csv_file):
+    """Column shape of the summary table, the buffer column must hold whole feet."""
+
+    if not os.path.exists(csv_file):
+        return [finding("error", csv_file, "does not exist")]
+
+    selectionList = read_selection_list(csv_file)
+    if len(selectionList) < 2:
+        return [finding("error", csv_file, "has no species rows")]
+
+    findings = []
+    if len(selectionList[0]) < summaryColumns:
+        findings.append(finding("error", csv_file, "header has " + str(len(selectionList[0])) +
+                                " columns, expected at least " + str(summaryColumns)))
+
+    for n, row in enumerate(selectionList[1:], 2):
+        line = "line " + str(n)
+        if len(row) < summaryColumns:
+            findings.append(finding("error", csv_file, line + " has " + str(len(row)) + " columns, expected at least " +
+                                    str(summaryColumns)))
+            continue
+        if not row[0].strip():
+            findings.append(finding("error", csv_file, line + " has no species name"))
+        if row[1] not in tesvariablelist:
+            findings.append(finding("warning", csv_file, line + " rank '" + row[1] + "' is not " +
+                                    ", ".join(tesvariablelist)))
+        if not row[2].strip().isdigit():
+            findings.append(finding("error", csv_file, line + " buffer '" + row[2] + "' is not a whole number of feet"))
+
+    if not findings:
+        findings.append(finding("ok", csv_file, str(len(selectionList) - 1) + " species rows"))
+
+    return findings
+
+
+def check_ownership(path, profile):
+    """Ownership fields and projection, and polygons for every forest of the region."""
+
+    findings = check_feature_class(path, ownershipFieldList, profile["spatialReferenceName"])
+    if any(level == "error" for level, subject, message in findings):
+        return findings
+
+    with arcpy.da.SearchCursor(path, ["UnitID_FS"]) as cursor:
+        unitSet = set(row[0] for row in cursor)
+
+    for code, unitID in sorted(profile["forestCodeDict"].items()):
+        if unitID not in unitSet:
+            findings.append(finding("error", path, "has no polygons for " + code + " (" + unitID +
+                                    "), wo_deliverable.py fails on its empty merge"))
+
+    return findings
+
+
+def check_nhd_gdb(gdb):
+    """NHD feature classes of a subregion download and the fields hydrology_processing.py selects on."""
+
+    if not arcpy.Exists(gdb):
+        return [finding("error", gdb, "does not exist, hydrology_processing.py would leave the subregion out")]
+
+    findings = []
+    for waterFeature in hydrology_processing.waterFeatureList:
+        findings.extend(check_feature_class(gdb + hydrology_processing.hydroFeatureDataset + waterFeature,
+                                            nhdFieldList, empty_level="warning"))
+
+    return findings
+
+
+def input_checks(in_workspace, path, profile):
+    """Checks of one stage input, as (function name, args) pairs."""
+
+    layerInputs = dict((in_workspace + "\\" + relative, layerType)
+                       for layerType, relative in pipeline_runner.layerInputDict.items())
+    downloads = in_workspace + "\\" + "Downloads"
+
+    if path.lower().endswith(".csv"):
+        return [("check_summary_table", [path])]
+
+    if path in layerInputs:
+        return [("check_feature_class", [path, layerFieldDict[layerInputs[path]]])]
+
+    if path.split("\\")[-1].startswith("USFS_OwnershipLSRS_"):
+        return [("check_ownership", [path, profile])]
+
+    if path == downloads + "\\" + "Hydro":
+        return [("check_nhd_gdb", [path + "\\" + "NHD_H_" + subregion + "_HU4_GDB.gdb"])
+                for subregion in profile["subRegionList"]]
+
+    if path == downloads + "\\" + "NOAA_ESU":
+        return [("check_feature_class", [path + "\\" + esuFolderDict[species[:2]] + "\\" + species + ".shp",
+                                         ["Class"]])
+                for species in noaa_esu_processing.esuSpeciesList]
+
+    for layerType, name in sorted(localDataDict.items()):
+        if path.endswith("_" + name + "_CAALB83.gdb"):
+            return [("check_feature_class", [path + "\\" + fc, [], profile["spatialReferenceName"]])
+                    for fc in localFeatureDict[layerType]]
+
+    gdb = gdb_writer.gdb_of(path)
+    if gdb is not None and gdb != path:
+        return [("check_feature_class", [path, []])]
+
+    return [("check_exists", [path])]
+
+
+def preflight_checks(in_workspace, stages, profile):
+    """Checks of the inputs of stages that no stage of the run writes, as (function name, args) pairs."""
+
+    producedSet = set(path for stage in stages for path in stage["outputs"])
+
+    checks = []
+    seenSet = set()
+    for stage in stages:
+        for path in stage["inputs"] or []:
+            if path in producedSet or path in seenSet:
+                continue
+            # Written as a side effect by an upstream stage of the run, such as the IdentInter GDBs
+            if stage["deps"] and watch_inputs.written_by_pipeline(in_workspace, path):
+                continue
+            seenSet.add(path)
+            checks.extend(input_checks(in_workspace, path, profile))
+
+    return checks
+
+
+def run_check(check):
+
+    name, args = check
+    try:
+        return globals()[name](*args)
+    except Exception as e:
+        return [finding("error", args[0], "could not be checked: " + str(e))]
+
+
+def report(findings, elapsed):
+
+    arcpy.AddMessage("__________________________________________________")
+    arcpy.AddMessage("Pre-flight checks finished in " + str(int(elapsed)) + " seconds")
+
+    for level in ["error", "warning"]:
+        levelList = sorted((subject, message) for findingLevel, subject, message in findings if findingLevel == level)
+        for subject, message in levelList:
+            text = "  " + level.upper() + ": " + subject + " " + message
+            if level == "error":
+                arcpy.AddError(text)
+            else:
+                arcpy.AddWarning(text)
+
+    okNum = len([level for level, subject, message in findings if level == "ok"])
+    errorNum = len([level for level, subject, message in findings if level == "error"])
+    arcpy.AddMessage(str(okNum) + " inputs passed, " + str(errorNum) + " errors")
+
+
+def preflight(in_workspace, stages, region=None, processes=None, timeout=defaultTimeout):
+    """Runs the checks of the inputs of stages in parallel, returns the [level, subject, message] findings."""
+
+    startTime = time.time()
+
+    profile = region_profile.get_profile(region)
+    checks = preflight_checks(in_workspace, stages, profile)
+    if not checks:
+        arcpy.AddMessage("No inputs to check, every input is written by the run")
+        return []
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(checks)))
+
+    arcpy.AddMessage("Running " + str(len(checks)) + " pre-flight checks on " + str(processes) + " processes")
+
+    pool = multiprocessing.Pool(processes)
+    findings = []
+    try:
+        results = [(check, pool.apply_async(run_check, (check,))) for check in checks]
+        deadline = startTime + timeout
+        for check, result in results:
+            try:
+                findings.extend(result.get(max(0, deadline - time.time())))
+            except multiprocessing.TimeoutError:
+                findings.append(finding("error", check[1][0], "was not checked within " + str(timeout) + " seconds"))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    report(findings, time.time() - startTime)
+
+    return findings
+
+
+def has_errors(findings):
+
+    return any(level == "error" for level, subject, message in findings)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Checks the inputs of the FRA pipeline before a run")
+    parser.add_argument("in_workspace")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="only check the inputs of these stages, for example select_tes_layer:TESP")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--timeout", type=int, default=defaultTimeout,
+                        help="seconds before unfinished checks are reported as errors, defaults to 60")
+    args = parser.parse_args()
+
+    stages = pipeline_runner.build_stage_graph(args.in_workspace, region=args.region)
+    if args.stages:
+        stages = pipeline_runner.select_stages(stages, args.stages)
+
+    findings = preflight(args.in_workspace, stages, args.region, args.processes, args.timeout)
+
+    if has_errors(findings):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
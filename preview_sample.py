@@ -0,0 +1,306 @@
+# ---------------------------------------------------------------------------
+# preview_sample.py
+#
+# Description: Runs the pipeline on a small sample of the inputs so changes to
+#              the select_tes_layer.py queries or the pairwise_intersect.py
+#              unitid_dissolve rules can be checked in minutes instead of after
+#              a statewide run.
+#
+#              The sample is a copy of the workspace under Preview\<name> with
+#              the same folders, geodatabases, feature datasets and feature
+#              class schemas, holding only
+#                  --forest 0512      features intersecting the ownership of
+#                                     one forest (UnitID_FS)
+#                  --subregion 1804   features intersecting one HU4 subregion
+#                                     (WBDHU4 of its NHD download), only that
+#                                     subregion's NHD geodatabase is copied
+#                  --fraction 0.05    that fraction of the features of each
+#                                     species, at least one per species
+#              csv tables and other files are copied unchanged. Output, WO, the
+#              YEAR_Endangered/Threatened/Sensitive folders and zip downloads are
+#              not copied, the pipeline builds them again inside the preview.
+#
+#              The pipeline then runs on the preview workspace with every stage
+#              rebuilt, except the EDW and USGS/NOAA/FWS downloads which would
+#              pull statewide data again. The outputs land in the preview
+#              workspace with the same names and schemas as a full run.
+#
+# Usage: preview_sample.py <in_workspace> (--forest UNITID | --subregion HU4 | --fraction F)
+#                          [--name NAME] [--rebuild] [--stages name ...] [--processes N]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import math
+import os
+import re
+import shutil
+import sys
+
+import pipeline_runner
+import run_manifest
+import stage_costs
+
+# Folders of the workspace that are outputs of the pipeline, not inputs
+outputFolderList = ["Output", "WO", "Preview", "Forest"]
+
+# Stages that pull from outside sources instead of the workspace
+sourceStageList = ["edw_extract_data", "hydro_download"]
+
+# Scientific name fields of the layers, see select_tes_layer.get_layer_fields
+speciesFieldList = ["SCIENTIFIC_NAME", "SCI_NAME", "SNAME", "sciname"]
+
+shapefileExtensionList = [".shp", ".shx", ".dbf", ".prj", ".sbn", ".sbx", ".cpg", ".xml", ".fbn", ".fbx",
+                          ".ain", ".aih", ".atx", ".ixs", ".mxs", ".qix"]
+
+
+def preview_workspace(in_workspace, name):
+
+    return in_workspace + "\\" + "Preview" + "\\" + name
+
+
+def is_output_folder(name):
+
+    return name in outputFolderList or re.match(r"^\d{4}_(Endangered|Threatened|Sensitive)$", name) is not None
+
+
+def forest_area(in_workspace, cur_year, forest):
+    """Ownership polygons of one forest copied to memory."""
+
+    ownershipFC = in_workspace + "\\USFS_Ownership_LSRS\\" + cur_year + \
+        "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + cur_year
+
+    arcpy.MakeFeatureLayer_management(ownershipFC, "preview_area_lyr", "UnitID_FS = '" + forest + "'")
+    arcpy.CopyFeatures_management("preview_area_lyr", "in_memory\\preview_area")
+    arcpy.Delete_management("preview_area_lyr")
+
+    return "in_memory\\preview_area"
+
+
+def subregion_gdb(in_workspace, subregion):
+
+    return in_workspace + "\\" + "Downloads" + "\\" + "Hydro" + "\\" + "NHD_H_" + subregion + "_HU4_GDB.gdb"
+
+
+def subregion_area(in_workspace, subregion):
+
+    return subregion_gdb(in_workspace, subregion) + "\\" + "WBD" + "\\" + "WBDHU4"
+
+
+def species_field(feature_class):
+
+    fieldNames = [field.name.upper() for field in arcpy.ListFields(feature_class)]
+    for field in speciesFieldList:
+        if field.upper() in fieldNames:
+            return field
+
+    return None
+
+
+def fraction_where_clause(feature_class, fraction):
+    """Where clause keeping the first fraction of the features of every species, in ObjectID order."""
+
+    oidField = arcpy.Describe(feature_class).OIDFieldName
+    speciesField = species_field(feature_class)
+
+    speciesDict = {}
+    fields = ["OID@"]
+    if speciesField is not None:
+        fields.append(speciesField)
+    with arcpy.da.SearchCursor(feature_class, fields) as cursor:
+        for row in cursor:
+            species = row[1] if speciesField is not None else None
+            speciesDict.setdefault(species, []).append(row[0])
+
+    keepList = []
+    for species in speciesDict:
+        oidList = sorted(speciesDict[species])
+        keepList.extend(oidList[:int(math.ceil(len(oidList) * fraction))])
+
+    if not keepList:
+        return "1 = 0"
+
+    return arcpy.AddFieldDelimiters(feature_class, oidField) + " IN (" + \
+        ",".join(str(oid) for oid in sorted(keepList)) + ")"
+
+
+def sample_feature_class(source, target, area=None, fraction=None):
+    """Copies the features of source in the sample to target, keeping the schema."""
+
+    where = None
+    if fraction is not None:
+        where = fraction_where_clause(source, fraction)
+
+    arcpy.MakeFeatureLayer_management(source, "preview_lyr", where)
+    if area is not None:
+        arcpy.SelectLayerByLocation_management("preview_lyr", "INTERSECT", area)
+    arcpy.CopyFeatures_management("preview_lyr", target)
+    count = int(arcpy.GetCount_management(target).getOutput(0))
+    arcpy.Delete_management("preview_lyr")
+
+    arcpy.AddMessage("  " + target + ": " + str(count) + " features")
+
+
+def sample_gdb(source_gdb, target_folder, copy_features):
+    """Builds a copy of a geodatabase, its feature classes written by copy_features(source, target)."""
+
+    gdbName = os.path.basename(source_gdb.replace("\\", os.sep))
+    targetGDB = target_folder + "\\" + gdbName
+
+    if arcpy.Exists(targetGDB):
+        arcpy.Delete_management(targetGDB)
+    arcpy.CreateFileGDB_management(target_folder, gdbName)
+
+    arcpy.AddMessage("Sampling " + source_gdb)
+
+    for dirpath, dirnames, filenames in arcpy.da.Walk(source_gdb, datatype=["FeatureClass", "Table"]):
+        relative = dirpath[len(source_gdb):].strip("\\/")
+        targetPath = targetGDB
+        if relative:
+            targetPath = targetGDB + "\\" + relative
+            if not arcpy.Exists(targetPath):
+                arcpy.CreateFeatureDataset_management(targetGDB, relative,
+                                                      arcpy.Describe(dirpath).spatialReference)
+
+        for filename in filenames:
+            source = dirpath + "\\" + filename
+            if hasattr(arcpy.Describe(source), "shapeType"):
+                copy_features(source, targetPath + "\\" + filename)
+            else:
+                arcpy.Copy_management(source, targetPath + "\\" + filename)
+
+
+def copy_workspace(in_workspace, target_workspace, copy_features, keep_gdb=None):
+    """Copies the inputs of the workspace to target_workspace with the same folders and names.
+
+    Feature classes and shapefiles are written by copy_features(source, target), other files are
+    copied unchanged. keep_gdb(source_gdb) returns False for geodatabases to leave out.
+    """
+
+    arcpy.env.overwriteOutput = True
+
+    localRoot = in_workspace.replace("\\", os.sep)
+    for dirpath, dirnames, filenames in os.walk(localRoot):
+        relative = dirpath[len(localRoot):].strip(os.sep)
+
+        if relative == "":
+            dirnames[:] = [dirname for dirname in dirnames if not is_output_folder(dirname)]
+
+        targetFolder = target_workspace
+        if relative:
+            targetFolder = target_workspace + "\\" + relative.replace(os.sep, "\\")
+        if not os.path.exists(targetFolder.replace("\\", os.sep)):
+            os.makedirs(targetFolder.replace("\\", os.sep))
+
+        sourceFolder = in_workspace
+        if relative:
+            sourceFolder = in_workspace + "\\" + relative.replace(os.sep, "\\")
+
+        for dirname in [dirname for dirname in dirnames if dirname.lower().endswith(".gdb")]:
+            dirnames.remove(dirname)
+            sourceGDB = sourceFolder + "\\" + dirname
+            if keep_gdb is not None and not keep_gdb(sourceGDB):
+                continue
+            sample_gdb(sourceGDB, targetFolder, copy_features)
+
+        for filename in filenames:
+            extension = os.path.splitext(filename)[1].lower()
+            if extension == ".zip" or extension == ".lock":
+                continue
+            if extension == ".shp":
+                copy_features(sourceFolder + "\\" + filename, targetFolder + "\\" + filename)
+            elif extension not in shapefileExtensionList:
+                shutil.copy2(os.path.join(dirpath, filename), os.path.join(targetFolder.replace("\\", os.sep), filename))
+
+
+def build_preview(in_workspace, name, forest=None, subregion=None, fraction=None, run_date=None):
+    """Copies the sampled inputs of the workspace to Preview\\<name> and returns its path."""
+
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+
+    previewWorkspace = preview_workspace(in_workspace, name)
+
+    area = None
+    if forest is not None:
+        area = forest_area(in_workspace, curYear, forest)
+    elif subregion is not None:
+        area = subregion_area(in_workspace, subregion)
+
+    def copy_features(source, target):
+        sample_feature_class(source, target, area, fraction)
+
+    def keep_gdb(source_gdb):
+        # Only the NHD geodatabase of the sampled subregion
+        return subregion is None or not source_gdb.split("\\")[-1].startswith("NHD_H_") or \
+            source_gdb == subregion_gdb(in_workspace, subregion)
+
+    copy_workspace(in_workspace, previewWorkspace, copy_features, keep_gdb)
+
+    if forest is not None:
+        arcpy.Delete_management(area)
+
+    return previewWorkspace
+
+
+def sample_name(forest=None, subregion=None, fraction=None):
+
+    if forest is not None:
+        return "forest_" + forest
+    elif subregion is not None:
+        return "hu4_" + subregion
+    return "fraction_" + str(fraction).replace(".", "_")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Runs the FRA pipeline on a sample of the inputs")
+    parser.add_argument("in_workspace")
+    sampleGroup = parser.add_mutually_exclusive_group(required=True)
+    sampleGroup.add_argument("--forest", help="UnitID of the forest whose ownership extent is the sample, e.g. 0512")
+    sampleGroup.add_argument("--subregion", help="HU4 subregion that is the sample, e.g. 1804")
+    sampleGroup.add_argument("--fraction", type=float, help="fraction of the features of every species, e.g. 0.05")
+    parser.add_argument("--name", default=None, help="name of the preview workspace, defaults to the sample")
+    parser.add_argument("--rebuild", action="store_true", help="sample the inputs again even if the preview exists")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="only run these stages, for example select_tes_layer:TESP or pairwise_intersect")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    if args.fraction is not None and not 0 < args.fraction <= 1:
+        parser.error("--fraction must be greater than 0 and at most 1")
+
+    name = args.name or sample_name(args.forest, args.subregion, args.fraction)
+    previewWorkspace = preview_workspace(args.in_workspace, name)
+
+    if args.rebuild or not os.path.exists(previewWorkspace.replace("\\", os.sep)):
+        arcpy.AddMessage("Building preview workspace " + previewWorkspace)
+        build_preview(args.in_workspace, name, args.forest, args.subregion, args.fraction)
+
+    stages = pipeline_runner.build_stage_graph(previewWorkspace)
+    stageNames = args.stages or [stage["name"] for stage in stages]
+    stages = pipeline_runner.select_stages(stages, [stageName for stageName in stageNames
+                                                    if stageName not in sourceStageList])
+
+    if args.subregion is not None:
+        for stage in stages:
+            if stage["name"] == "hydrology_processing":
+                stage["kwargs"] = dict(stage["kwargs"], sub_region_list=[args.subregion])
+
+    status = pipeline_runner.run_pipeline(stages, args.processes, run_manifest.manifest_path(previewWorkspace),
+                                          force=True, cost_file=stage_costs.cost_cache_path(previewWorkspace))
+
+    arcpy.AddMessage("__________________________________________________")
+    for stage in stages:
+        arcpy.AddMessage("  " + stage["name"] + ": " + status.get(stage["name"]))
+    arcpy.AddMessage("Preview outputs are in " + previewWorkspace)
+
+    if any(value not in ("complete", "current") for value in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# ---------------------------------------------------------------------------
+# region_batch.py
+#
+# Description: Runs the FRA pipeline for several regions at the same time. Each
+#              region has its own workspace, <batch_root>\<region>, laid out like
+#              a Region 5 workspace (csv_tables, Input, USFS_Ownership_LSRS) and
+#              processed with its region profile (see region_profile.py).
+#
+#              The stages of every region go into one dependency graph, named
+#              <region>/<stage>, and run on one pool of worker processes, so a
+#              region waiting on its hydrology overlay does not hold workers
+#              that the select layers of another region could use. The NHD, NOAA
+#              and FWS zips are downloaded once into <batch_root>\Download_cache
+#              and unzipped into every region workspace; neighbouring regions
+#              share HU4 subregions and all of them use the same NOAA and FWS
+#              files.
+#
+#              The run manifest, memory estimates and stage timings of the batch
+#              are kept in <batch_root>\Output, apart from those of single region
+#              runs of pipeline_runner.py.
+#
+# Usage: region_batch.py <batch_root> <region> [<region> ...] [--processes N] [--stages name ...] [--force]
+#                        [--memory-mb MB] [--plan]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import sys
+
+import pipeline_runner
+import region_profile
+import run_manifest
+import stage_costs
+
+cacheFolder = "Download_cache"
+
+
+def region_workspace(batch_root, region):
+
+    return batch_root + "\\" + region_profile.get_profile(region)["name"]
+
+
+def region_stages(batch_root, region, stage_names=None):
+    """Stages of one region renamed <region>/<stage>, its downloads going through the batch cache."""
+
+    prefix = region_profile.get_profile(region)["name"] + "/"
+
+    stages = pipeline_runner.build_stage_graph(region_workspace(batch_root, region), region=region)
+    if stage_names:
+        stages = pipeline_runner.select_stages(stages, stage_names)
+
+    regionStages = []
+    for stage in stages:
+        kwargs = dict(stage["kwargs"])
+        if stage["function"] == "hydro_download.hydro_download":
+            kwargs["download_cache"] = batch_root + "\\" + cacheFolder
+        regionStages.append(dict(stage, name=prefix + stage["name"],
+                                 deps=[prefix + dep for dep in stage["deps"]], kwargs=kwargs))
+
+    return regionStages
+
+
+def build_batch_graph(batch_root, regions, stage_names=None):
+
+    stages = []
+    for region in regions:
+        stages.extend(region_stages(batch_root, region, stage_names))
+
+    return stages
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Runs the FRA processing stages of several regions together")
+    parser.add_argument("batch_root", help="folder holding one workspace per region")
+    parser.add_argument("regions", nargs="+", help="region profile names or json files, for example R05 R06")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes shared by the regions, defaults to the number of CPUs")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="only run these stages in every region, for example select_tes_layer:TESP")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every stage even when its inputs have not changed")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="memory budget in MB shared by the running stages, defaults to no limit")
+    parser.add_argument("--plan", action="store_true",
+                        help="only predict time, memory and disk of the stages from earlier runs")
+    args = parser.parse_args()
+
+    stages = build_batch_graph(args.batch_root, args.regions, args.stages)
+
+    if args.plan:
+        pipeline_runner.plan_pipeline(stages, args.processes, args.memory_mb,
+                                      stage_costs.cost_cache_path(args.batch_root),
+                                      stage_costs.timing_path(args.batch_root))
+        return
+
+    status = pipeline_runner.run_pipeline(stages, args.processes, run_manifest.manifest_path(args.batch_root),
+                                          args.force, memory_budget=args.memory_mb,
+                                          cost_file=stage_costs.cost_cache_path(args.batch_root),
+                                          timing_file=stage_costs.timing_path(args.batch_root))
+
+    arcpy.AddMessage("__________________________________________________")
+    for stage in stages:
+        arcpy.AddMessage("  " + stage["name"] + ": " + status.get(stage["name"]))
+
+    if any(value not in ("complete", "current") for value in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
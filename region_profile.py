@@ -0,0 +1,136 @@
+# ---------------------------------------------------------------------------
+# region_profile.py
+#
+# Description: Region specific values used by the processing scripts. The
+#              scripts were written for Region 5 and used to carry its forests,
+#              NHD subregions, EDW queries and the California Teale Albers
+#              projection as constants. They now take a region name and read
+#              these values from its profile; without a region they use the
+#              built in R05 profile and behave as before.
+#
+#              A profile for another region is a json file named after the
+#              region in the region_profiles folder next to the scripts (for
+#              example region_profiles\R06.json), or any json file given by path,
+#              with the same keys as the R05 profile below:
+#                  name                 region code used in deliverable names
+#                  regionNumber         two digit region number
+#                  edwSelectQuery       selection of the EDW TESP and wildlife layers
+#                  landSelectQuery      selection of the EDW BasicOwnership layer
+#                  forestUnitDict       FORESTNAME of the ownership layer -> UnitID
+#                  forestCodeDict       forest abbreviation -> UnitID, used for the
+#                                       S_<name>_<abbreviation>_FireRetardantEIS GDBs
+#                  subRegionList        HU4 subregions covering the region
+#                  spatialReference     factory code of the processing projection
+#                  spatialReferenceName name arcpy reports for that projection
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import json
+import os
+
+defaultRegion = "R05"
+
+profileFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "region_profiles")
+
+regionProfileDict = {
+    "R05": {"name": "R05",
+            "regionNumber": "05",
+            "edwSelectQuery": "FS_UNIT_ID LIKE '05%'",
+            "landSelectQuery": "((REGION = '05') OR (FORESTNAME = 'Lake Tahoe Basin Management Unit')) "
+                               "AND (OWNERCLASSIFICATION = 'USDA FOREST SERVICE')",
+            "forestUnitDict": {"Angeles National Forest": "0501",
+                               "San Bernardino National Forest": "0512",
+                               "Cleveland National Forest": "0502",
+                               "Eldorado National Forest": "0503",
+                               "Inyo National Forest": "0504",
+                               "Klamath National Forest": "0505",
+                               "Lassen National Forest": "0506",
+                               "Los Padres National Forest": "0507",
+                               "Modoc National Forest": "0509",
+                               "Mendocino National Forest": "0508",
+                               "Plumas National Forest": "0511",
+                               "Shasta-Trinity National Forest": "0514",
+                               "Sierra National Forest": "0515",
+                               "Sequoia National Forest": "0513",
+                               "Six Rivers National Forest": "0510",
+                               "Stanislaus National Forest": "0516",
+                               "Lake Tahoe Basin Management Unit": "0519",
+                               "Tahoe National Forest": "0517"},
+            "forestCodeDict": {"ANF": "0501",
+                               "BDF": "0512",
+                               "CNF": "0502",
+                               "ENF": "0503",
+                               "INF": "0504",
+                               "KNF": "0505",
+                               "LNF": "0506",
+                               "LPF": "0507",
+                               "MDF": "0509",
+                               "MNF": "0508",
+                               "PNF": "0511",
+                               "SHU": "0514",
+                               "SNF": "0515",
+                               "SQF": "0513",
+                               "SRF": "0510",
+                               "STF": "0516",
+                               "TMU": "0519",
+                               "TNF": "0517"},
+            "subRegionList": ["1503", "1604", "1605", "1606", "1710", "1712",
+                              "1801", "1802", "1803", "1804", "1805", "1806",
+                              "1807", "1808", "1809", "1810"],
+            "spatialReference": 3310,
+            "spatialReferenceName": "NAD_1983_California_Teale_Albers"}}
+
+profileKeyList = sorted(regionProfileDict[defaultRegion])
+
+# Profiles already read in this process, keyed by region name or path
+profileCache = {}
+
+
+def get_profile(region=None):
+    """Returns the profile of a region name or profile json path, the R05 profile when region is None."""
+
+    if region is None:
+        region = defaultRegion
+
+    if region in regionProfileDict:
+        return regionProfileDict[region]
+
+    if region not in profileCache:
+        path = region
+        if not path.lower().endswith(".json"):
+            path = os.path.join(profileFolder, region + ".json")
+        if not os.path.exists(path):
+            raise ValueError("No region profile for " + region + ", expected " + path)
+
+        with open(path) as f:
+            profile = json.load(f)
+
+        missingList = [key for key in profileKeyList if key not in profile]
+        if missingList:
+            raise ValueError("Region profile " + path + " is missing " + ", ".join(missingList))
+        profileCache[region] = profile
+
+    return profileCache[region]
+
+
+def spatial_reference(profile):
+
+    return arcpy.SpatialReference(profile["spatialReference"])
+
+
+def forest_gdb_dict(profile, suffix=""):
+    """Forest deliverable GDB names of a region, S_R05_ANF_FireRetardantEIS<suffix>.gdb -> UnitID."""
+
+    return dict(("S_" + profile["name"] + "_" + code + "_FireRetardantEIS" + suffix + ".gdb", unitID)
+                for code, unitID in profile["forestCodeDict"].items())
+
+
+def distributable_gdb(profile, cur_year):
+
+    return cur_year + "_S_" + profile["name"] + "_FireRetardantEIS_CAALB83_DistributableDatasets.gdb"
+
+
+def no_distribution_gdb(profile, cur_year):
+
+    return cur_year + "_S_" + profile["name"] + "_FireRetardantEIS_CAALB83_NoDistribution_FWS.gdb"
@@ -0,0 +1,202 @@
+# ---------------------------------------------------------------------------
+# run_manifest.py
+#
+# Description: Keeps a manifest of every pipeline stage that has been run. For
+#              each stage it records a key built from content hashes of the
+#              stage inputs and its parameters, and the content hashes of the
+#              outputs it produced. pipeline_runner.py uses the manifest to skip
+#              stages whose key has not changed since the last run.
+#
+#              Downstream stages list the outputs of upstream stages as inputs,
+#              so when a stage is rebuilt but produces the same output as last
+#              time the downstream keys do not change and they are skipped too
+#              (early cutoff).
+#
+#              Plain files (csv tables, zip downloads) are hashed by their bytes.
+#              Feature classes and tables are hashed by content through a search
+#              cursor so that geodatabase internals that change on every write
+#              do not count as a change. Geodatabases and folders are hashed by
+#              the datasets or files they contain.
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import datetime
+import hashlib
+import json
+import os
+
+manifestVersion = 1
+
+
+def manifest_path(in_workspace):
+
+    return in_workspace + "\\" + "Output" + "\\" + "run_manifest.json"
+
+
+def load_manifest(path):
+
+    if not os.path.exists(path):
+        return {"version": manifestVersion, "stages": {}}
+
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != manifestVersion:
+        arcpy.AddMessage("Run manifest was written by a different version, rebuilding all stages")
+        return {"version": manifestVersion, "stages": {}}
+
+    return manifest
+
+
+def save_manifest(path, manifest):
+
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    # Write to a temporary file first so a crash never leaves a half written manifest
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if hasattr(os, "replace"):
+        os.replace(tmpPath, path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+
+
+def hash_file(path, digest):
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+
+def hash_folder(path, digest):
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            # Lock files appear and disappear while data is being read
+            if filename.endswith(".lock"):
+                continue
+            filePath = os.path.join(root, filename)
+            digest.update(os.path.relpath(filePath, path).encode("utf-8"))
+            hash_file(filePath, digest)
+
+
+def hash_dataset(path, digest):
+
+    fieldNames = sorted(field.name for field in arcpy.ListFields(path)
+                        if field.type not in ("OID", "Geometry", "GlobalID")
+                        and not field.name.upper().startswith("SHAPE_"))
+    digest.update(";".join(fieldNames).encode("utf-8"))
+
+    cursorFields = list(fieldNames)
+    if hasattr(arcpy.Describe(path), "shapeType"):
+        cursorFields.append("SHAPE@WKB")
+
+    with arcpy.da.SearchCursor(path, cursorFields) as cursor:
+        for row in cursor:
+            for value in row:
+                if isinstance(value, (bytes, bytearray)):
+                    digest.update(bytes(value))
+                else:
+                    digest.update(repr(value).encode("utf-8"))
+            digest.update(b"|")
+
+
+def hash_workspace(path, digest):
+
+    savedWorkspace = arcpy.env.workspace
+    arcpy.env.workspace = path
+    try:
+        datasetList = sorted((arcpy.ListFeatureClasses() or []) + (arcpy.ListTables() or []))
+        for fd in sorted(arcpy.ListDatasets("", "Feature") or []):
+            datasetList += sorted(fd + "\\" + fc for fc in arcpy.ListFeatureClasses("", "", fd) or [])
+    finally:
+        arcpy.env.workspace = savedWorkspace
+
+    for dataset in datasetList:
+        digest.update(dataset.encode("utf-8"))
+        hash_dataset(path + "\\" + dataset, digest)
+
+
+def dataset_modified(path):
+    """Latest modification time of a dataset, for a geodatabase feature class the whole gdb is checked."""
+
+    path = path.replace("\\", os.sep)
+    gdbPath = path
+    while gdbPath and not gdbPath.lower().endswith(".gdb"):
+        parent = os.path.dirname(gdbPath)
+        if parent == gdbPath:
+            gdbPath = ""
+        else:
+            gdbPath = parent
+
+    if gdbPath and os.path.isdir(gdbPath):
+        return max([os.path.getmtime(os.path.join(gdbPath, name)) for name in os.listdir(gdbPath)] +
+                   [os.path.getmtime(gdbPath)])
+
+    if os.path.exists(path):
+        return os.path.getmtime(path)
+
+    return None
+
+
+def fingerprint(path):
+    """Returns a content hash of the file, folder, geodatabase or dataset, None if it does not exist."""
+
+    digest = hashlib.sha1()
+
+    if path.lower().endswith(".gdb") and os.path.isdir(path):
+        hash_workspace(path, digest)
+    elif os.path.isdir(path):
+        hash_folder(path, digest)
+    elif os.path.isfile(path) and not path.lower().endswith(".shp"):
+        hash_file(path, digest)
+    elif arcpy.Exists(path):
+        hash_dataset(path, digest)
+    else:
+        return None
+
+    return digest.hexdigest()
+
+
+def stage_key(stage, fingerprints):
+    """Builds the key of a stage from its function, parameters and input fingerprints."""
+
+    digest = hashlib.sha1()
+    digest.update(stage["function"].encode("utf-8"))
+    digest.update(json.dumps(stage["args"]).encode("utf-8"))
+    if stage.get("kwargs"):
+        digest.update(json.dumps(stage["kwargs"], sort_keys=True).encode("utf-8"))
+    for path in sorted(stage["inputs"]):
+        digest.update(path.encode("utf-8"))
+        digest.update(str(fingerprints.get(path)).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def is_current(manifest, stage, key):
+    """A stage is current when its key is unchanged and every output it recorded still exists."""
+
+    entry = manifest["stages"].get(stage["name"])
+    if entry is None or entry.get("key") != key:
+        return False
+
+    for path in entry.get("outputs", {}):
+        if not arcpy.Exists(path):
+            return False
+
+    return True
+
+
+def record_stage(manifest, stage, key, outputs, elapsed):
+
+    manifest["stages"][stage["name"]] = {"key": key,
+                                         "outputs": outputs,
+                                         "elapsed": elapsed,
+                                         "completed": datetime.datetime.now().isoformat()}
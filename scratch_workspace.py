@@ -0,0 +1,100 @@
+# ---------------------------------------------------------------------------
+# scratch_workspace.py
+#
+# Description: Private scratch geodatabases for stages that can run more than
+#              once at the same time. select_tes_layer.py writes its
+#              intermediates (_original, _selection, _singlepart, _buffer,
+#              _buffered_single, _merge, _geocomplete) under fixed names in the
+#              projected GDB of the layer, so two runs of the same layer, for
+#              example a pipeline run and a job submitted to stage_daemon.py,
+#              overwrite each other half way through.
+#
+#              With a scratch key a run writes every intermediate to its own
+#              GDB, Output\scratch\<host>_<pid>\<stage>_<key>.gdb, where the key
+#              is the run manifest key of the stage (function, parameters and
+#              input hashes). The name is the same every time the same worker
+#              runs the same stage on the same inputs and differs between workers
+#              and between inputs. When the run is finished only its final
+#              outputs are promoted into the shared GDB under the normal names,
+#              one writer at a time (see gdb_writer.py), and the scratch GDB is
+#              deleted. A run that fails leaves the shared GDB untouched and its
+#              scratch GDB in place for inspection.
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import hashlib
+import json
+import os
+import re
+import socket
+
+import gdb_writer
+
+# Characters of the scratch key kept in the scratch GDB name
+keyLength = 12
+
+
+def scratch_key(stage, key=None):
+    """Returns the run manifest key of a stage, or a key from its function and parameters when there is none."""
+
+    if key:
+        return key
+
+    digest = hashlib.sha1()
+    digest.update(stage["function"].encode("utf-8"))
+    digest.update(json.dumps(stage["args"]).encode("utf-8"))
+    if stage.get("kwargs"):
+        digest.update(json.dumps(stage["kwargs"], sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def worker_folder(in_workspace):
+
+    return in_workspace + "\\" + "Output" + "\\" + "scratch" + "\\" + \
+        socket.gethostname() + "_" + str(os.getpid())
+
+
+def create_scratch_gdb(in_workspace, stage_name, key):
+    """Creates the scratch GDB of a stage run and returns its path ending in a backslash."""
+
+    folder = worker_folder(in_workspace)
+    gdbName = re.sub(r"[^A-Za-z0-9_]", "_", stage_name) + "_" + key[:keyLength] + ".gdb"
+
+    if not os.path.exists(folder.replace("\\", os.sep)):
+        os.makedirs(folder.replace("\\", os.sep))
+
+    if arcpy.Exists(folder + "\\" + gdbName):
+        # Left by an earlier failed run of the same stage on the same inputs
+        arcpy.Delete_management(folder + "\\" + gdbName)
+
+    arcpy.AddMessage("Writing intermediates to scratch GDB " + folder + "\\" + gdbName)
+    arcpy.CreateFileGDB_management(folder, gdbName)
+
+    return folder + "\\" + gdbName + "\\"
+
+
+def promote(scratch_fc, final_fc):
+    """Copies a finished output from the scratch GDB to its final name, returns the final name."""
+
+    arcpy.AddMessage("Promoting " + os.path.basename(scratch_fc.replace("\\", os.sep)) + " to " + final_fc)
+
+    gdb = gdb_writer.gdb_of(final_fc)
+    with gdb_writer.gdb_write_lock(gdb):
+        if arcpy.Exists(final_fc):
+            arcpy.Delete_management(final_fc)
+        arcpy.Copy_management(scratch_fc, final_fc)
+
+    return final_fc
+
+
+def remove_scratch_gdb(scratch_gdb):
+
+    arcpy.Delete_management(scratch_gdb.rstrip("\\"))
+
+    folder = os.path.dirname(scratch_gdb.rstrip("\\").replace("\\", os.sep))
+    try:
+        os.rmdir(folder)
+    except OSError:
+        # Another scratch GDB of this worker is still there
+        pass
@@ -13,6 +13,19 @@
 #              This step has several distinct approaches based on what dataset
 #              is processing. After this and explode and repair occurs.
 #              Certain datasets will require a final merge with special feature classes.
+#              The select, explode, repair and buffer steps run as a layer_plan.py plan,
+#              so only the selection and the _geocomplete feature class are written to
+#              the GDB and the singlepart and buffer intermediates stay in memory.
+#
+# Usage: select_tes_layer.py <in_workspace> <inTable> <csvFile> <layerType>
+#        or import the module and call select_tes_layer() with the same values.
+#        The csv table can be passed in already read as selection_list.
+#        Copies into the shared FWS deliverable GDBs go through gdb_writer.py so
+#        several layers can run at the same time. Passing scratch_key keeps the
+#        intermediates in a private scratch GDB (see scratch_workspace.py) so the
+#        same layer can also run twice at once. Passing local_data reads the
+#        Shasta crayfish and MYLF study areas from a folder shared by several
+#        years (see backfill_years.py) instead of Input\Local_Data.
 #
 # Arcpy Usage: Project_management, FeatureClassToGeodatabase_conversion, MakeFeatureLayer_management,
 #              CopyFeatures_management, GetCount_management, AddField_management, UpdateCursor, Merge_management,
@@ -35,279 +48,166 @@ import csv
 import os
 import datetime
 
-# Set workspace or obtain from user input
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
-in_workspace = sys.argv[1]
-
-arcpy.env.workspace = in_workspace
-arcpy.env.overwriteOutput = True
-
-# using the now variable to assign year everytime there is a hardcoded 2017
-now = datetime.datetime.today()
-curMonth = str(now.month)
-curYear = str(now.year)
-arcpy.AddMessage("Year is " + curYear)
-
-sciNameField = ""
-commonNameField = ""
-sourceField = ""
-
-# -------------------------------------------------------------------------------
-# the following section will create folders and geodatabases to store Deliverables
-# for different stages of the processing of the individual databases
-# -------------------------------------------------------------------------------
+import gdb_writer
+import layer_plan
+import region_profile
+import scratch_workspace
 
 tesvariablelist = ["Endangered", "Threatened", "Sensitive"]
 
-for tes in tesvariablelist:
-    newPath = in_workspace + "\\" + curYear + "_" + tes
-    tesGDB = curYear + "_FRA_" + tes + "_OriginalDataNoBuffers_FWSDeliverable_CAALB83.gdb"
-
-    if not os.path.exists(newPath):
-        arcpy.AddMessage("Creating directory for " + tes + " Data Deliverables ....")
-        os.makedirs(newPath)
-        arcpy.AddMessage("Creating Geodatabase for " + tes + " Data Deliverables ....")
-        arcpy.CreateFileGDB_management(newPath, tesGDB)
-
-# --------------------------------------------------------------------------------
-#  Please note the following selections of inTable and csv are file dependent
-# --------------------------------------------------------------------------------
-
-layerType = sys.argv[4]
-
-# layerType = "TESP"
-
-outputDir = in_workspace + "\\" + "Output"
-if not os.path.exists(outputDir):
-    arcpy.AddMessage("Creating directory for Output")
-    os.makedirs(outputDir)
-
-if not os.path.exists(outputDir + "\\" + layerType):
-    arcpy.AddMessage("Creating output directory for " + layerType)
-    os.makedirs(outputDir + "\\" + layerType)
-
-layerWorkspace = outputDir + "\\" + layerType + "\\"
-projectedGDB = layerType + "_" + curYear + "_CAALB83.gdb"
-fcFilename = layerType + "_" + curYear
-originalFC = fcFilename + "_original"
-
-projWorkspace = layerWorkspace + "\\" + projectedGDB + "\\"
-fileRoot = projWorkspace + fcFilename
-selectFC = fileRoot + "_selection"
-
-arcpy.AddMessage("Layer Type: " + layerType)
-
-#-------------------------------------------------------------------------------------------
-# the below is hardcoded values used for testing and debugging
-# inTable = in_workspace + "Input"
-
-inTable = sys.argv[2]
-
-# if layerType == "TESP":
-#     inTable += "\\USFS_EDW\\EDW_TESP_r05_021617_Everything.gdb\\TESP\\TESP_OccurrenceAll"
-# elif layerType == "Wildlife_Sites":
-#     inTable += "\\USFS_EDW\\EDW_FishWildlife_R05_021617_Everything.gdb\\Fish_and_Wildlife\\WildlifeSites"
-# elif layerType == "Wildlife_Observations":
-#     inTable += "\\USFS_EDW\\EDW_FishWildlife_R05_021617_Everything.gdb\\Fish_and_Wildlife\\FishWildlife_Observation"
-# elif layerType == "Critical_Habitat_Lines":
-#     inTable += "\\CHab\\crithab_all_layers\\CRITHAB_LINE.shp"
-# elif layerType == "Critical_Habitat_Polygons":
-#     inTable += "\\CHab\\crithab_all_layers\\CRITHAB_POLY.shp"
-# elif layerType == "CNDDB":
-#     inTable += "\\CNDDB\\gis_gov\\cnddb.shp"
-
-#------------------------------------------------------------------------------
-# Testing to see if data is projected in NAD 1983 California Teale Albers
-# If not run Project_management to project the data
-#------------------------------------------------------------------------------
-
-if arcpy.Exists(layerWorkspace + "\\" + projectedGDB):
-    newProjectWorkspace = projWorkspace + originalFC
-else:
-    arcpy.CreateFileGDB_management(layerWorkspace, projectedGDB)
-    newProjectWorkspace = projWorkspace + originalFC
-
-arcpy.AddMessage("Origin of Data: " + inTable)
-
-spatial_ref = arcpy.Describe(inTable).spatialReference
-
-arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
-
-sr = arcpy.SpatialReference(3310)
-
-if spatial_ref.name != "NAD_1983_California_Teale_Albers":
-    arcpy.AddMessage("Reprojecting layer to NAD 1983 California Teale Albers ....")
-    arcpy.Project_management(inTable, newProjectWorkspace, sr)
-
-# ------------------------------------------------------------------------------------------
-# Adding fields to store information that will be used for final deliverables
-# ------------------------------------------------------------------------------------------
-
-arcpy.AddMessage("Adding fields [UnitID, GRANK_FIRE, SOURCEFIRE, SNAME_FIRE, CNAME_FIRE]")
-arcpy.AddMessage("Adding fields [BUFFT_FIRE, BUFFM_FIRE, CMNT_FIRE, INST_FIRE]")
-if layerType == "CNDDB":
-    arcpy.AddMessage("Adding field Type to record Plant vs Animal to filter later after intersection for removal of BDF")
-
-arcpy.AddField_management(newProjectWorkspace, "UnitID", "TEXT", "", "", "5", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "GRANK_FIRE", "TEXT", "", "", "50", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "SOURCEFIRE", "TEXT", "", "", "50", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "SNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "CNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "BUFFT_FIRE", "SHORT", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "BUFFM_FIRE", "SHORT", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "CMNT_FIRE", "TEXT", "", "", "150", "", "NULLABLE", "NON_REQUIRED", "")
-arcpy.AddField_management(newProjectWorkspace, "INST_FIRE", "TEXT", "", "", "150", "", "NULLABLE", "NON_REQUIRED", "")
-if layerType == "CNDDB":
-    arcpy.AddField_management(newProjectWorkspace, "Type", "TEXT", "", "", "50", "", "NULLABLE", "NON_REQUIRED", "")
-
-# Note the different ways of bringing in a csv for lookup data on the buffer amount, forest, and status
-# _____________________________________________________________________________________________________
-
-csvFile = sys.argv[3]
-
-# csvFile = in_workspace + "\\" + "csv_tables" + "\\" + "AllMerge_SummaryTable.csv"
-
-# if layerType == "TESP":
-#     csvFile += "\\TESP_SummaryTable.csv"
-# elif layerType == "Wildlife_Sites":
-#     csvFile += "\\Wildlife_Sites_SummaryTable.csv"
-# elif layerType == "Wildlife_Observations":
-#     csvFile += "\\Wildlife_Observations_SummaryTable.csv"
-# elif layerType == "Critical_Habitat_Polygons":
-#     csvFile += "\\crithab.csv"
-# elif layerType == "Critical_Habitat_Lines":
-#     csvFile += "\\crithab.csv"
-# elif layerType == "CNDDB":
-#     csvFile += "\\CNDDB_SummaryTable.csv"
-
-arcpy.AddMessage("csv File: " + csvFile)
-arcpy.AddMessage("NOTE: Code will operate differently for csv in Pro vs 10.x!!!!!")
-arcpy.AddMessage("Version of Python: " + sys.version)
-
-if sys.version_info[0] < 3:
-    # uncomment when using arcgis 10.3
-    with open(csvFile, 'rb') as f:
-        reader = csv.reader(f)
-        selectionList = list(reader)
-else:
-    # use when using arcgis pro
-    with open(csvFile) as f:
-        reader = csv.reader(f)
-        selectionList = list(reader)
-
-arcpy.AddMessage("Listing of csv table data: ")
-for item in selectionList:
-    arcpy.AddMessage("  " + str(item))
-
-pulldate = curMonth + "/" + curYear
-
-if layerType == "TESP":
-    sciNameField = "SCIENTIFIC_NAME"
-    commonNameField = "ACCEPTED_COMMON_NAME"
-    sourceField = "EDW TESP OccurrencesALL_FoundPlant pulled " + pulldate
-elif layerType == "Wildlife_Sites":
-    sciNameField = "SCI_NAME"
-    commonNameField = "COMMON_NAME"
-    sourceField = "EDW Wildlife Sites pulled " + pulldate
-elif layerType == "Wildlife_Observations":
-    sciNameField = "SCIENTIFIC_NAME"
-    commonNameField = "COMMON_NAME"
-    sourceField = "EDW OBS FishWildlife pulled " + pulldate
-elif layerType == "Critical_Habitat_Polygons":
-    sciNameField = "sciname"
-    commonNameField = "comname"
-    sourceField = "FWS Critical Habitat pulled " + pulldate
-elif layerType == "Critical_Habitat_Lines":
-    sciNameField = "sciname"
-    commonNameField = "comname"
-    sourceField = "FWS Critical Habitat pulled " + pulldate
-elif layerType == "CNDDB":
-    sciNameField = "SNAME"
-    commonNameField = "CNAME"
-    sourceField = "CA CNDDB GOV version pulled " + pulldate
-
-# --------------------------------------------------------------------
-# Builds the selection query used in SelectLayerByAttribute_management
-# customized based on what the Scientific name field is and what other
-# specifics we need to filter the data on based on the type of database
-# --------------------------------------------------------------------
-selectQuery = "(" + sciNameField + " = "
-
-selectionListLength = len(selectionList)
-
-for n in range(1, selectionListLength-1):
-    if layerType == "Critical_Habitat_Lines" or layerType == "Critical_Habitat_Polygons":
-        if selectionList[n][6] == "CH":
-            selectQuery += "'" + selectionList[n][0] + "' OR " + sciNameField + " = "
-    else:
-        selectQuery += "'" + selectionList[n][0] + "' OR " + sciNameField + " = "
-    # selectQuery += "'" + selectionList[n][0] + "' OR " + sciNameField + " = "
-
-selectQuery += "'" + selectionList[selectionListLength-1][0] + "')"
-
-if layerType == "CNDDB":
-    selectQuery += """
-                   AND (SNAME <> 'Gymnogyps californianus')
-                   AND (PRESENCE = 'Presumed Extant') 
-                   AND (ACCURACY = '1/10 mile' OR ACCURACY = '1/5 mile' 
-                     OR ACCURACY = '80 meters' OR ACCURACY = 'specific area')
-                   """
-elif layerType == "Wildlife_Sites":
-    selectQuery += " AND (ASSOC_OBS > 0) AND (SITE_NAME NOT LIKE '%Study%') "
-elif layerType == "Wildlife_Observations":
-    selectQuery += " AND (TOTAL_DETECTED > 0 OR TOTAL_DETECTED IS NULL )"
-# elif layerType == "Critical_Habitat_Lines":
-#     selectQuery += " OR sciname = 'Oncorhynchus (=Salmo) mykiss' OR sciname = 'Catostomus microps'"
-# elif layerType == "Critical_Habitat_Lines" or layerType == "Critical_Habitat_Polygons":
-#     selectQuery += " AND ( CH = " + "'" + selectionList[n][6] + "')"
-elif layerType == "TESP":
-    for n in range(1, selectionListLength-1):
-        selectQuery += " OR (ACCEPTED_SCIENTIFIC_NAME = " + "'" + selectionList[n][0] + "')"
-        selectQuery += " AND (PLANT_FOUND = 'YES') "
-
-    # Old Hardcoded values for ACCEPTED_SCIENTIFIC_NAME
-    # Stacey decided to pull all - which found other hits but not in relevant forests
-
-    # selectQuery += """
-    #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Mahonia nevinii'
-    #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Stanfordia californica'
-    #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Clarkia springvillensis'
-    #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Abronia alpina'
-    #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Calochortus persistens'
-    #                 """
-
-arcpy.AddMessage("The Selection Query will be : " + selectQuery)
-
-# Need to clean this up so select query can be viewed:
-# sqLength = int(len(selectQuery))
-# n = int(round(len(selectQuery) / 100))
-#
-# arcpy.AddMessage("The Selection Query will be : " )
-# arcpy.AddMessage("  " + selectQuery[0:n])
-# arcpy.AddMessage("  " + selectQuery[n:n+100])
-# arcpy.AddMessage("  " + selectQuery[n+100:n+200])
-# arcpy.AddMessage("  " + selectQuery[n+200:n+300])
-# arcpy.AddMessage("  " + selectQuery[n+300:n+400])
-# arcpy.AddMessage("  " + selectQuery[n+400:n+800])
-# arcpy.AddMessage("  " + selectQuery[n+800:sqLength-100])
-# arcpy.AddMessage("  " + selectQuery[n+800:sqLength-100])
-# arcpy.AddMessage("  " + selectQuery[sqLength-100:sqLength])
-
-# -----------------------------------------------------------------------------------------
+# Local study area data merged into a layer, <year>_<name>_CAALB83.gdb in Input\Local_Data
+localDataDict = {"CNDDB": "ShastaCrayfish",
+                 "Wildlife_Sites": "MYLF"}
 
-try:
+# Feature classes of the local study area GDBs, flowlines then waterbodies
+localFeatureDict = {"CNDDB": ["CNDDB_Endangered_ShastaCrayfish_NHDFlowlines",
+                              "CNDDB_Endangered_ShastaCrayfish_NHDWaterbodies"],
+                    "Wildlife_Sites": ["EDW_WildlifeSites_NHDFlowlines_MYLF_StudyAreas_buffered",
+                                       "EDW_WildlifeSites_NHDWaterbodys_MYLF_StudyAreas_buffered"]}
 
-    arcpy.MakeFeatureLayer_management(newProjectWorkspace, "lyr" )
 
-    arcpy.AddMessage("Selecting layers based on selection ....")
-    arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", selectQuery )
+def read_selection_list(csv_file):
 
-    arcpy.AddMessage("Copying selected records to new feature ......")
-    arcpy.CopyFeatures_management("lyr", selectFC)
+    if sys.version_info[0] < 3:
+        # uncomment when using arcgis 10.3
+        with open(csv_file, 'rb') as f:
+            reader = csv.reader(f)
+            selectionList = list(reader)
+    else:
+        # use when using arcgis pro
+        with open(csv_file) as f:
+            reader = csv.reader(f)
+            selectionList = list(reader)
+
+    return selectionList
+
+
+def create_deliverable_gdbs(in_workspace, cur_year):
+
+    # -------------------------------------------------------------------------------
+    # the following section will create folders and geodatabases to store Deliverables
+    # for different stages of the processing of the individual databases
+    # -------------------------------------------------------------------------------
+
+    for tes in tesvariablelist:
+        newPath = in_workspace + "\\" + cur_year + "_" + tes
+        tesGDB = cur_year + "_FRA_" + tes + "_OriginalDataNoBuffers_FWSDeliverable_CAALB83.gdb"
+
+        if not arcpy.Exists(newPath + "\\" + tesGDB):
+            arcpy.AddMessage("Creating Geodatabase for " + tes + " Data Deliverables ....")
+            gdb_writer.create_file_gdb(newPath, tesGDB)
+
+
+def add_fra_fields(feature_class, layer_type):
+
+    arcpy.AddMessage("Adding fields [UnitID, GRANK_FIRE, SOURCEFIRE, SNAME_FIRE, CNAME_FIRE]")
+    arcpy.AddMessage("Adding fields [BUFFT_FIRE, BUFFM_FIRE, CMNT_FIRE, INST_FIRE]")
+    if layer_type == "CNDDB":
+        arcpy.AddMessage("Adding field Type to record Plant vs Animal to filter later after intersection for removal of BDF")
+
+    arcpy.AddField_management(feature_class, "UnitID", "TEXT", "", "", "5", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "GRANK_FIRE", "TEXT", "", "", "50", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "SOURCEFIRE", "TEXT", "", "", "50", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "SNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "CNAME_FIRE", "TEXT", "", "", "60", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "BUFFT_FIRE", "SHORT", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "BUFFM_FIRE", "SHORT", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "CMNT_FIRE", "TEXT", "", "", "150", "", "NULLABLE", "NON_REQUIRED", "")
+    arcpy.AddField_management(feature_class, "INST_FIRE", "TEXT", "", "", "150", "", "NULLABLE", "NON_REQUIRED", "")
+    if layer_type == "CNDDB":
+        arcpy.AddField_management(feature_class, "Type", "TEXT", "", "", "50", "", "NULLABLE", "NON_REQUIRED", "")
+
+
+def get_layer_fields(layer_type, pulldate):
+
+    sciNameField = ""
+    commonNameField = ""
+    sourceField = ""
+
+    if layer_type == "TESP":
+        sciNameField = "SCIENTIFIC_NAME"
+        commonNameField = "ACCEPTED_COMMON_NAME"
+        sourceField = "EDW TESP OccurrencesALL_FoundPlant pulled " + pulldate
+    elif layer_type == "Wildlife_Sites":
+        sciNameField = "SCI_NAME"
+        commonNameField = "COMMON_NAME"
+        sourceField = "EDW Wildlife Sites pulled " + pulldate
+    elif layer_type == "Wildlife_Observations":
+        sciNameField = "SCIENTIFIC_NAME"
+        commonNameField = "COMMON_NAME"
+        sourceField = "EDW OBS FishWildlife pulled " + pulldate
+    elif layer_type == "Critical_Habitat_Polygons":
+        sciNameField = "sciname"
+        commonNameField = "comname"
+        sourceField = "FWS Critical Habitat pulled " + pulldate
+    elif layer_type == "Critical_Habitat_Lines":
+        sciNameField = "sciname"
+        commonNameField = "comname"
+        sourceField = "FWS Critical Habitat pulled " + pulldate
+    elif layer_type == "CNDDB":
+        sciNameField = "SNAME"
+        commonNameField = "CNAME"
+        sourceField = "CA CNDDB GOV version pulled " + pulldate
+
+    return sciNameField, commonNameField, sourceField
+
+
+def build_select_query(layer_type, sci_name_field, selection_list):
+
+    # --------------------------------------------------------------------
+    # Builds the selection query used in SelectLayerByAttribute_management
+    # customized based on what the Scientific name field is and what other
+    # specifics we need to filter the data on based on the type of database
+    # --------------------------------------------------------------------
+    selectQuery = "(" + sci_name_field + " = "
+
+    selectionListLength = len(selection_list)
 
-    result = arcpy.GetCount_management(selectFC)
-    count = int(result.getOutput(0))
-    arcpy.AddMessage("Total Number of Records: " + str(count))
+    for n in range(1, selectionListLength-1):
+        if layer_type == "Critical_Habitat_Lines" or layer_type == "Critical_Habitat_Polygons":
+            if selection_list[n][6] == "CH":
+                selectQuery += "'" + selection_list[n][0] + "' OR " + sci_name_field + " = "
+        else:
+            selectQuery += "'" + selection_list[n][0] + "' OR " + sci_name_field + " = "
+        # selectQuery += "'" + selection_list[n][0] + "' OR " + sci_name_field + " = "
+
+    selectQuery += "'" + selection_list[selectionListLength-1][0] + "')"
+
+    if layer_type == "CNDDB":
+        selectQuery += """
+                       AND (SNAME <> 'Gymnogyps californianus')
+                       AND (PRESENCE = 'Presumed Extant')
+                       AND (ACCURACY = '1/10 mile' OR ACCURACY = '1/5 mile'
+                         OR ACCURACY = '80 meters' OR ACCURACY = 'specific area')
+                       """
+    elif layer_type == "Wildlife_Sites":
+        selectQuery += " AND (ASSOC_OBS > 0) AND (SITE_NAME NOT LIKE '%Study%') "
+    elif layer_type == "Wildlife_Observations":
+        selectQuery += " AND (TOTAL_DETECTED > 0 OR TOTAL_DETECTED IS NULL )"
+    # elif layer_type == "Critical_Habitat_Lines":
+    #     selectQuery += " OR sciname = 'Oncorhynchus (=Salmo) mykiss' OR sciname = 'Catostomus microps'"
+    # elif layer_type == "Critical_Habitat_Lines" or layer_type == "Critical_Habitat_Polygons":
+    #     selectQuery += " AND ( CH = " + "'" + selection_list[n][6] + "')"
+    elif layer_type == "TESP":
+        for n in range(1, selectionListLength-1):
+            selectQuery += " OR (ACCEPTED_SCIENTIFIC_NAME = " + "'" + selection_list[n][0] + "')"
+            selectQuery += " AND (PLANT_FOUND = 'YES') "
+
+        # Old Hardcoded values for ACCEPTED_SCIENTIFIC_NAME
+        # Stacey decided to pull all - which found other hits but not in relevant forests
+
+        # selectQuery += """
+        #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Mahonia nevinii'
+        #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Stanfordia californica'
+        #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Clarkia springvillensis'
+        #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Abronia alpina'
+        #                 OR ACCEPTED_SCIENTIFIC_NAME = 'Calochortus persistens'
+        #                 """
+
+    return selectQuery
+
+
+def populate_fra_attributes(select_fc, layer_type, selection_list, sci_name_field, common_name_field, source_field):
 
     threatNum = 0
     sensitiveNum = 0
@@ -315,24 +215,24 @@ try:
     otherNum = 0
     arcpy.AddMessage("Populating attributes .....")
 
-    if layerType == "Critical_Habitat_Polygons" or layerType == "Critical_Habitat_Lines":
-        cur = arcpy.UpdateCursor(selectFC)
+    if layer_type == "Critical_Habitat_Polygons" or layer_type == "Critical_Habitat_Lines":
+        cur = arcpy.UpdateCursor(select_fc)
 
         for row in cur:
-            speciesrow = row.getValue(sciNameField)
+            speciesrow = row.getValue(sci_name_field)
             bufferAmount = 0
-            if layerType == "Critical_Habitat_Lines":
+            if layer_type == "Critical_Habitat_Lines":
                 bufferAmount = 300
 
-            row.SOURCEFIRE = sourceField
+            row.SOURCEFIRE = source_field
             row.SNAME_FIRE = speciesrow
-            row.CNAME_FIRE = row.getValue(commonNameField)
+            row.CNAME_FIRE = row.getValue(common_name_field)
             row.BUFFT_FIRE = bufferAmount
             row.BUFFM_FIRE = bufferAmount * 0.3048
             row.CMNT_FIRE = " "
             row.INST_FIRE = " "
 
-            for item in selectionList:
+            for item in selection_list:
                 if item[0].startswith(speciesrow):
                     row.GRANK_FIRE = item[1]
                     if item[1] == "Threatened":
@@ -351,21 +251,21 @@ try:
 
         del cur
 
-    elif layerType == "CNDDB":
-        cur = arcpy.UpdateCursor(selectFC)
+    elif layer_type == "CNDDB":
+        cur = arcpy.UpdateCursor(select_fc)
         accuracyField = "ACCURACY"
 
         for row in cur:
-            speciesrow = row.getValue(sciNameField)
+            speciesrow = row.getValue(sci_name_field)
             bufferAmount = 0
             accuracy = row.getValue(accuracyField)
 
-            row.SOURCEFIRE = sourceField
+            row.SOURCEFIRE = source_field
             row.SNAME_FIRE = speciesrow
-            row.CNAME_FIRE = row.getValue(commonNameField)
+            row.CNAME_FIRE = row.getValue(common_name_field)
             row.CMNT_FIRE = " "
 
-            for item in selectionList:
+            for item in selection_list:
 
                 if item[0].startswith(speciesrow):
                     row.GRANK_FIRE = item[1]
@@ -416,20 +316,20 @@ try:
     else:
 
         forestField = "FS_UNIT_NAME"
-        cur = arcpy.UpdateCursor(selectFC)
+        cur = arcpy.UpdateCursor(select_fc)
 
         for row in cur:
-            speciesrow = row.getValue(sciNameField)
+            speciesrow = row.getValue(sci_name_field)
             forestrow  = row.getValue(forestField)
             bufferAmount = 1
 
-            row.SOURCEFIRE = sourceField
+            row.SOURCEFIRE = source_field
             row.SNAME_FIRE = speciesrow
-            row.CNAME_FIRE = row.getValue(commonNameField)
+            row.CNAME_FIRE = row.getValue(common_name_field)
             row.CMNT_FIRE = " "
             row.INST_FIRE = " "
 
-            for item in selectionList:
+            for item in selection_list:
 
                 if item[0].startswith(speciesrow) and item[3] == "":
                     row.GRANK_FIRE = item[1]
@@ -466,31 +366,46 @@ try:
     arcpy.AddMessage("Number of Sensitive = " + str(sensitiveNum))
     arcpy.AddMessage("Number of Other = " + str(otherNum))
 
-    arcpy.AddMessage("Splitting current state of data into deliverable Geodatabases .....")
+    return {"Endangered": endangerNum, "Threatened": threatNum, "Sensitive": sensitiveNum, "Other": otherNum}
+
+
+def get_nobuf_name(layer_type, cur_year, tes_rank):
+
+    filename = ""
+    if layer_type == "TESP":
+        filename = "EDW_TESP_" + cur_year + "_" + tes_rank + "_OccurrenceAll_FoundPlants_nobuf"
+    elif layer_type == "Wildlife_Sites":
+        filename = "EDW_WildlifeSites_" + cur_year + "_" + tes_rank + "_nobuf"
+    elif layer_type == "Wildlife_Observations":
+        filename = "EDW_FishWildlife_Observation_" + cur_year + "_" + tes_rank + "_nobuf"
+    elif layer_type == "Critical_Habitat_Polygons":
+        filename = "CHabPolyAllSelectedSpecies_" + cur_year + "_" + tes_rank + "_nobuf"
+    elif layer_type == "Critical_Habitat_Lines":
+        filename = "CHabLineAllSelectedSpecies_" + cur_year + "_" + tes_rank + "_nobuf"
+    elif layer_type == "CNDDB":
+        filename = "CNDDB_selects_" + cur_year + "_" + tes_rank + "_nobuf"
 
-    tesRankList = ["Endangered", "Threatened", "Sensitive"]
+    return filename
 
-    for tesRank in tesRankList:
-        arcpy.MakeFeatureLayer_management(selectFC, "lyr")
+
+def nobuf_feature_class(in_workspace, cur_year, layer_type, tes_rank):
+
+    return in_workspace + "\\" + cur_year + "_" + tes_rank + "\\" + cur_year + "_FRA_" + \
+        tes_rank + "_OriginalDataNoBuffers_FWSDeliverable_CAALB83.gdb" + "\\" + \
+        get_nobuf_name(layer_type, cur_year, tes_rank)
+
+
+def split_by_rank(select_fc, in_workspace, cur_year, layer_type):
+
+    arcpy.AddMessage("Splitting current state of data into deliverable Geodatabases .....")
+
+    for tesRank in tesvariablelist:
+        arcpy.MakeFeatureLayer_management(select_fc, "lyr")
 
         arcpy.AddMessage("Selecting records based on " + tesRank + " rank ....")
         arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "GRANK_FIRE = '" + tesRank + "'")
 
-        outlocation = in_workspace + "\\" + curYear + "_" + tesRank + "\\" + curYear + "_FRA_" + \
-                      tesRank + "_OriginalDataNoBuffers_FWSDeliverable_CAALB83.gdb" + "\\"
-
-        if layerType == "TESP":
-            outlocation += "EDW_TESP_" + curYear + "_" + tesRank + "_OccurrenceAll_FoundPlants_nobuf"
-        elif layerType == "Wildlife_Sites":
-            outlocation += "EDW_WildlifeSites_" + curYear + "_" + tesRank + "_nobuf"
-        elif layerType == "Wildlife_Observations":
-            outlocation += "EDW_FishWildlife_Observation_" + curYear + "_" + tesRank + "_nobuf"
-        elif layerType == "Critical_Habitat_Polygons":
-            outlocation += "CHabPolyAllSelectedSpecies_" + curYear + "_" + tesRank + "_nobuf"
-        elif layerType == "Critical_Habitat_Lines":
-            outlocation += "CHabLineAllSelectedSpecies_" + curYear + "_" + tesRank + "_nobuf"
-        elif layerType == "CNDDB":
-            outlocation += "CNDDB_selects_" + curYear + "_" + tesRank + "_nobuf"
+        outlocation = nobuf_feature_class(in_workspace, cur_year, layer_type, tesRank)
 
         result = arcpy.GetCount_management("lyr")
         count = int(result.getOutput(0))
@@ -498,67 +413,62 @@ try:
 
         if count > 0:
             arcpy.AddMessage("Copying selected records to " + tesRank + " Geodatabase ......")
-            arcpy.CopyFeatures_management("lyr", outlocation)
+            gdb_writer.copy_features("lyr", outlocation)
 
-# ----------------------------------------------------------------------
 
-    singlePartFeatureClass = fileRoot + "_singlepart"
-    bufferFC = fileRoot + "_buffer"
-    singlePartBufferedFC = fileRoot + "_buffered_single"
-    fileMerge = fileRoot + "_merge"
-    interimfc = fileRoot + "_geocomplete"
+def explode_and_buffer(select_fc, file_root, layer_type):
+    """Explodes, repairs and buffers the selection into the _geocomplete feature class and returns it.
 
-    arcpy.AddMessage("Converting multipart geometry to singlepart .....")
+    The steps run as a layer_plan so only _geocomplete is written to the GDB, the singlepart and
+    buffer intermediates stay in memory.
+    """
 
-    arcpy.MultipartToSinglepart_management(selectFC, singlePartFeatureClass)
+    interimfc = file_root + "_geocomplete"
 
-    inCount = int(arcpy.GetCount_management(selectFC).getOutput(0))
-    outCount = int(arcpy.GetCount_management(singlePartFeatureClass).getOutput(0))
+    plan = layer_plan.LayerPlan(select_fc, layer_type + "_explode").explode().repair()
 
-    arcpy.AddMessage("Number of new records: " + str(outCount - inCount))
+    if layer_type != "Critical_Habitat_Polygons":
+        bufferField = "BUFFM_FIRE"
+        plan.buffer(bufferField).explode().repair()
 
-    arcpy.AddMessage("Repairing Geometry ......")
-    arcpy.RepairGeometry_management(singlePartFeatureClass)
+    arcpy.AddMessage(plan.explain(interimfc))
+    plan.materialize(interimfc)
 
-    if layerType != "Critical_Habitat_Polygons":
-        arcpy.AddMessage("Buffering features ....")
-        bufferField = "BUFFM_FIRE"
-        arcpy.Buffer_analysis(singlePartFeatureClass, bufferFC, bufferField)
+    return interimfc
 
-        arcpy.AddMessage("Converting buffer layer from multipart geometry to singlepart .....")
 
-        arcpy.MultipartToSinglepart_management(bufferFC, singlePartBufferedFC)
+def local_data_gdb(in_workspace, cur_year, name, local_data=None):
+    """Local study area GDB of the workspace, or <name>_CAALB83.gdb of a shared local_data folder."""
 
-        inCount = int(arcpy.GetCount_management(bufferFC).getOutput(0))
-        outCount = int(arcpy.GetCount_management(singlePartBufferedFC).getOutput(0))
+    if local_data:
+        return local_data + "\\" + name + "_CAALB83.gdb"
 
-        arcpy.AddMessage("Number of new records: " + str(outCount - inCount))
+    return in_workspace + "\\" + "Input" + "\\" + "Local_Data" + "\\" + cur_year + "_" + name + "_CAALB83.gdb"
 
-        arcpy.AddMessage("Repairing Geometry of singlepart buffer layer ......")
-        arcpy.RepairGeometry_management(singlePartBufferedFC)
 
-        arcpy.CopyFeatures_management(singlePartBufferedFC, interimfc)
-    else:
-        arcpy.CopyFeatures_management(singlePartFeatureClass, interimfc)
+def finish_layer(in_workspace, cur_year, layer_type, proj_workspace, file_root, buffered_fc, local_data=None):
+    """Merges the local study area data or splits by rank, returns the feature classes to intersect."""
 
-    localdataWorkSpace = in_workspace + "\\" + "Input" + "\\" + "Local_Data" + "\\"
+    fileMerge = file_root + "_merge"
+    interimfc = file_root + "_geocomplete"
+    outputList = [interimfc]
 
-    if layerType == "CNDDB":
+    if layer_type == "CNDDB":
 
         arcpy.AddMessage("Moving Shasta Crayfish files into Geodatabase")
         # May need to change where this is being pulled
 
-        crayfishWorkSpace = localdataWorkSpace + curYear + "_ShastaCrayfish_CAALB83.gdb" + "\\"
-        crayFlowLines = crayfishWorkSpace + "CNDDB_Endangered_ShastaCrayfish_NHDFlowlines"
-        crayWaterBodies = crayfishWorkSpace + "CNDDB_Endangered_ShastaCrayfish_NHDWaterbodies"
-        arcpy.FeatureClassToGeodatabase_conversion([crayFlowLines, crayWaterBodies], projWorkspace)
+        crayfishWorkSpace = local_data_gdb(in_workspace, cur_year, localDataDict[layer_type], local_data) + "\\"
+        crayFlowLines = crayfishWorkSpace + localFeatureDict[layer_type][0]
+        crayWaterBodies = crayfishWorkSpace + localFeatureDict[layer_type][1]
+        arcpy.FeatureClassToGeodatabase_conversion([crayFlowLines, crayWaterBodies], proj_workspace)
 
         arcpy.AddMessage("Merging the CNDDDB feature class with the Shasta Crayfish files")
         arcpy.AddMessage("Using the following feature classes:")
         arcpy.AddMessage("Shasta Crayfish flowlines:  " + crayFlowLines)
         arcpy.AddMessage("Shasta Crayfish waterbodies:  " + crayWaterBodies)
 
-        arcpy.Merge_management([crayFlowLines, crayWaterBodies, singlePartBufferedFC], fileMerge)
+        arcpy.Merge_management([crayFlowLines, crayWaterBodies, buffered_fc], fileMerge)
         arcpy.AddMessage("Finished with merge")
 
         arcpy.AddMessage("Repairing Geometry of merged layer")
@@ -566,35 +476,29 @@ try:
 
         arcpy.CopyFeatures_management(fileMerge, interimfc)
 
-    elif layerType == "Wildlife_Observations":
+    elif layer_type == "Wildlife_Observations":
 
         arcpy.AddMessage("Breaking up into three layers prior to intersect")
-        arcpy.MakeFeatureLayer_management(singlePartBufferedFC, "lyr")
-
-        tesRankList = ["Endangered", "Threatened", "Sensitive"]
 
-        for tesRank in tesRankList:
-            finalWorkSpace = projWorkspace + "EDW_FishWildlife_Observation_" + curYear + "_" + tesRank[:1]
+        rankOutputs = [(tesRank, proj_workspace + "EDW_FishWildlife_Observation_" + cur_year + "_" + tesRank[:1])
+                       for tesRank in tesvariablelist]
 
-            arcpy.AddMessage("Selecting records based on " + tesRank + " rank ....")
-            arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "GRANK_FIRE = '" + tesRank + "'")
-            arcpy.AddMessage("Copying selected records to " + tesRank + " Feature Class ......")
-            arcpy.CopyFeatures_management("lyr", finalWorkSpace)
+        outputList = layer_plan.LayerPlan(buffered_fc, layer_type + "_split").rank_split("GRANK_FIRE", rankOutputs)
 
-    elif layerType == "Wildlife_Sites":
+    elif layer_type == "Wildlife_Sites":
         arcpy.AddMessage("Moving two MYLF study area files into Geodatabase")
         # May need to fix where this data is being pulled
-        mylfWorkSpace = localdataWorkSpace + curYear + "_MYLF_CAALB83.gdb" + "\\"
-        studyFlowLines = mylfWorkSpace + "EDW_WildlifeSites_NHDFlowlines_MYLF_StudyAreas_buffered"
-        studyWaterBodies = mylfWorkSpace + "EDW_WildlifeSites_NHDWaterbodys_MYLF_StudyAreas_buffered"
-        arcpy.FeatureClassToGeodatabase_conversion([studyFlowLines, studyWaterBodies], projWorkspace)
+        mylfWorkSpace = local_data_gdb(in_workspace, cur_year, localDataDict[layer_type], local_data) + "\\"
+        studyFlowLines = mylfWorkSpace + localFeatureDict[layer_type][0]
+        studyWaterBodies = mylfWorkSpace + localFeatureDict[layer_type][1]
+        arcpy.FeatureClassToGeodatabase_conversion([studyFlowLines, studyWaterBodies], proj_workspace)
 
         arcpy.AddMessage("Merging the Wildlife Sites feature class with the two MYLF study area")
         arcpy.AddMessage("Using the following feature classes:")
         arcpy.AddMessage("MYLF flowlines:  " + studyFlowLines)
         arcpy.AddMessage("MYLF water bodies:  " + studyWaterBodies)
 
-        arcpy.Merge_management([studyFlowLines, studyWaterBodies, singlePartBufferedFC], fileMerge)
+        arcpy.Merge_management([studyFlowLines, studyWaterBodies, buffered_fc], fileMerge)
         arcpy.AddMessage("Finished with merge")
 
         arcpy.AddMessage("Repairing Geometry of merged layer")
@@ -602,12 +506,171 @@ try:
 
         arcpy.CopyFeatures_management(fileMerge, interimfc)
 
-    if layerType == "Wildlife_Observations":
+    return outputList
+
+
+def select_tes_layer(in_workspace, in_table, csv_file, layer_type, selection_list=None, run_date=None,
+                     scratch_key=None, region=None, local_data=None):
+    """Runs the selection and preprocessing of one layer, returns the feature classes ready for intersection.
+
+    With a scratch_key the intermediates are written to a private scratch GDB and only the
+    returned feature classes are promoted into the projected GDB of the layer. A local_data folder
+    holds the local study area GDBs without their year prefix.
+    """
+
+    arcpy.env.workspace = in_workspace
+    arcpy.env.overwriteOutput = True
+
+    profile = region_profile.get_profile(region)
+
+    # using the now variable to assign year everytime there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curMonth = str(now.month)
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    create_deliverable_gdbs(in_workspace, curYear)
+
+    # --------------------------------------------------------------------------------
+    #  Please note the following selections of inTable and csv are file dependent
+    # --------------------------------------------------------------------------------
+
+    outputDir = in_workspace + "\\" + "Output"
+    if not os.path.exists(outputDir):
+        arcpy.AddMessage("Creating directory for Output")
+        os.makedirs(outputDir)
+
+    if not os.path.exists(outputDir + "\\" + layer_type):
+        arcpy.AddMessage("Creating output directory for " + layer_type)
+        os.makedirs(outputDir + "\\" + layer_type)
+
+    layerWorkspace = outputDir + "\\" + layer_type + "\\"
+    projectedGDB = layer_type + "_" + curYear + "_CAALB83.gdb"
+    fcFilename = layer_type + "_" + curYear
+    originalFC = fcFilename + "_original"
+
+    projWorkspace = layerWorkspace + "\\" + projectedGDB + "\\"
+
+    arcpy.AddMessage("Layer Type: " + layer_type)
+
+    if not arcpy.Exists(layerWorkspace + "\\" + projectedGDB):
+        gdb_writer.create_file_gdb(layerWorkspace, projectedGDB)
+
+    if scratch_key:
+        workWorkspace = scratch_workspace.create_scratch_gdb(in_workspace, "select_tes_layer_" + layer_type,
+                                                             scratch_key)
+    else:
+        workWorkspace = projWorkspace
+
+    fileRoot = workWorkspace + fcFilename
+    selectFC = fileRoot + "_selection"
+
+    #------------------------------------------------------------------------------
+    # Testing to see if data is projected in NAD 1983 California Teale Albers
+    # If not run Project_management to project the data
+    #------------------------------------------------------------------------------
+
+    newProjectWorkspace = workWorkspace + originalFC
+
+    arcpy.AddMessage("Origin of Data: " + in_table)
+
+    spatial_ref = arcpy.Describe(in_table).spatialReference
+
+    arcpy.AddMessage("Current Spatial Reference is : " + spatial_ref.name)
+
+    sr = region_profile.spatial_reference(profile)
+
+    if spatial_ref.name != profile["spatialReferenceName"]:
+        arcpy.AddMessage("Reprojecting layer to " + profile["spatialReferenceName"] + " ....")
+        arcpy.Project_management(in_table, newProjectWorkspace, sr)
+
+    # ------------------------------------------------------------------------------------------
+    # Adding fields to store information that will be used for final deliverables
+    # ------------------------------------------------------------------------------------------
+
+    add_fra_fields(newProjectWorkspace, layer_type)
+
+    # Note the different ways of bringing in a csv for lookup data on the buffer amount, forest, and status
+    # _____________________________________________________________________________________________________
+
+    arcpy.AddMessage("csv File: " + csv_file)
+    arcpy.AddMessage("NOTE: Code will operate differently for csv in Pro vs 10.x!!!!!")
+    arcpy.AddMessage("Version of Python: " + sys.version)
+
+    if selection_list is None:
+        selection_list = read_selection_list(csv_file)
+
+    arcpy.AddMessage("Listing of csv table data: ")
+    for item in selection_list:
+        arcpy.AddMessage("  " + str(item))
+
+    pulldate = curMonth + "/" + curYear
+
+    sciNameField, commonNameField, sourceField = get_layer_fields(layer_type, pulldate)
+
+    selectQuery = build_select_query(layer_type, sciNameField, selection_list)
+
+    arcpy.AddMessage("The Selection Query will be : " + selectQuery)
+
+    # -----------------------------------------------------------------------------------------
+
+    arcpy.AddMessage("Selecting layers based on selection ....")
+
+    selectPlan = layer_plan.LayerPlan(newProjectWorkspace, layer_type + "_select").select(selectQuery)
+    selectPlan.annotate(lambda fc: populate_fra_attributes(fc, layer_type, selection_list, sciNameField,
+                                                           commonNameField, sourceField),
+                        "populate_fra_attributes")
+
+    arcpy.AddMessage(selectPlan.explain(selectFC))
+    selectPlan.materialize(selectFC)
+
+    result = arcpy.GetCount_management(selectFC)
+    count = int(result.getOutput(0))
+    arcpy.AddMessage("Total Number of Records: " + str(count))
+
+    split_by_rank(selectFC, in_workspace, curYear, layer_type)
+
+    # ----------------------------------------------------------------------
+
+    interimFC = explode_and_buffer(selectFC, fileRoot, layer_type)
+
+    outputList = finish_layer(in_workspace, curYear, layer_type, workWorkspace, fileRoot, interimFC, local_data)
+
+    if scratch_key:
+        outputList = [scratch_workspace.promote(fc, projWorkspace + fc.split("\\")[-1]) for fc in outputList]
+        scratch_workspace.remove_scratch_gdb(workWorkspace)
+
+    if layer_type == "Wildlife_Observations":
         arcpy.AddMessage("Ensure the removal of Acipenser medirostris from SRF due to bad data!!!!")
     arcpy.AddMessage("Script complete ... check data and make changes.")
     arcpy.AddMessage("Use the geocomplete file and proceed to intersection.")
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
+    return outputList
+
+
+def main():
+
+    # Set workspace or obtain from user input
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
+    in_workspace = sys.argv[1]
+
+    # inTable = in_workspace + "Input" + "\\USFS_EDW\\EDW_TESP_r05_021617_Everything.gdb\\TESP\\TESP_OccurrenceAll"
+    inTable = sys.argv[2]
+
+    # csvFile = in_workspace + "\\" + "csv_tables" + "\\" + "AllMerge_SummaryTable.csv"
+    csvFile = sys.argv[3]
+
+    # layerType = "TESP"
+    layerType = sys.argv[4]
+
+    try:
+        select_tes_layer(in_workspace, inTable, csvFile, layerType)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# ---------------------------------------------------------------------------
+# share_staging.py
+#
+# Description: Moves a workspace between the network share it is kept on and a
+#              local scratch disk, so the stages read and write local files
+#              instead of working over the network. This replaces copying the
+#              EDW extract and inputs from the T drive to a local drive by hand
+#              and copying the WO deliverables back.
+#
+#              stage_in copies the inputs of the share workspace, everything but
+#              the Output, WO, Preview, Forest and YEAR_<rank> folders, to the
+#              local workspace. Files are copied by several streams at once, each
+#              into <file>.part, so a copy that was interrupted resumes where it
+#              stopped on the next run. Every copy is checked by comparing the
+#              SHA-1 of the source and of the copy before the .part file takes the
+#              real name. Files whose size and modification time already match
+#              are not copied again, and local files no longer on the share are
+#              removed.
+#
+#              A Publisher copies the deliverables back to the share in the
+#              background as soon as the stage writing them completes, while the
+#              later stages keep running:
+#                  final_merge      WO\FWS and the YEAR_<rank> folders
+#                  wo_deliverable   WO\TES_Submitted
+#                  wo_hydro         WO\Hydro_Submitted
+#              The published folders are mirrored, files removed locally are
+#              removed on the share.
+#
+#              pipeline_runner.py --remote <share workspace> stages in, runs
+#              and publishes in one go.
+#
+# Usage: share_staging.py pull <share_workspace> <local_workspace> [--streams N]
+#        share_staging.py push <local_workspace> <share_workspace> [--streams N] [--year YYYY]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import hashlib
+import os
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import preview_sample
+
+chunkSize = 1024 * 1024
+
+partSuffix = ".part"
+
+# Files of a geodatabase or folder that are never copied
+skippedSuffixList = [".lock", ".writelock", partSuffix]
+
+# Difference in seconds still taken as the same modification time, shares keep 2 second times
+mtimeTolerance = 2
+
+defaultStreams = 8
+
+tesVariableList = ["Endangered", "Threatened", "Sensitive"]
+
+
+def local_path(path):
+
+    return path.replace("\\", os.sep)
+
+
+def file_digest(path, digest=None, limit=None):
+    """SHA-1 of a file, or of its first limit bytes added to digest."""
+
+    if digest is None:
+        digest = hashlib.sha1()
+
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            block = f.read(chunkSize if remaining is None else min(chunkSize, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+
+    return digest
+
+
+def is_copied(source, target):
+    """True when target has the size and modification time of source."""
+
+    if not os.path.exists(target):
+        return False
+
+    sourceStat = os.stat(source)
+    targetStat = os.stat(target)
+
+    return sourceStat.st_size == targetStat.st_size and abs(sourceStat.st_mtime - targetStat.st_mtime) <= mtimeTolerance
+
+
+def copy_file(source, target):
+    """Copies source to target through target.part, resuming a part left by an earlier copy.
+
+    The SHA-1 of the bytes read from source is compared with that of the copy before it is renamed, a resumed
+    copy that does not match is copied again from the start. Returns the number of bytes copied in this call.
+    """
+
+    partPath = target + partSuffix
+    sourceSize = os.path.getsize(source)
+
+    folder = os.path.dirname(target)
+    if folder and not os.path.exists(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # Created by another stream in the meantime
+            if not os.path.isdir(folder):
+                raise
+
+    offset = 0
+    if os.path.exists(partPath):
+        offset = os.path.getsize(partPath)
+        if offset > sourceSize:
+            os.remove(partPath)
+            offset = 0
+
+    # A resumed copy reads the part already copied once more to checksum it
+    sourceDigest = hashlib.sha1()
+    if offset:
+        file_digest(source, sourceDigest, offset)
+
+    with open(source, "rb") as src:
+        src.seek(offset)
+        with open(partPath, "ab" if offset else "wb") as dst:
+            for block in iter(lambda: src.read(chunkSize), b""):
+                sourceDigest.update(block)
+                dst.write(block)
+
+    if file_digest(partPath).hexdigest() != sourceDigest.hexdigest():
+        os.remove(partPath)
+        if offset:
+            # The part left behind does not match, copy the whole file once more
+            return copy_file(source, target)
+        raise IOError("Checksum of " + target + " does not match " + source + ", the copy was removed")
+
+    if os.path.exists(target):
+        os.remove(target)
+    os.rename(partPath, target)
+
+    sourceStat = os.stat(source)
+    os.utime(target, (sourceStat.st_atime, sourceStat.st_mtime))
+
+    return sourceSize - offset
+
+
+def tree_files(root, skip_outputs=False):
+    """Files under root relative to it, without lock and part files, or root itself when it is a file."""
+
+    if os.path.isfile(root):
+        return [""]
+
+    fileList = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative = dirpath[len(root):].strip(os.sep)
+        if skip_outputs and relative == "":
+            dirnames[:] = [dirname for dirname in dirnames if not preview_sample.is_output_folder(dirname)]
+        for filename in filenames:
+            if any(filename.lower().endswith(suffix) for suffix in skippedSuffixList):
+                continue
+            fileList.append(os.path.join(relative, filename))
+
+    return fileList
+
+
+def remove_stale_files(source_root, target_root, file_list, skip_outputs=False):
+    """Removes the files under target_root that are not in file_list, returns how many."""
+
+    if not os.path.isdir(target_root):
+        return 0
+
+    keepSet = set(file_list)
+    removed = 0
+    for relative in tree_files(target_root, skip_outputs):
+        if relative not in keepSet:
+            os.remove(os.path.join(target_root, relative))
+            removed += 1
+
+    return removed
+
+
+def sync_tree(source_root, target_root, streams=defaultStreams, skip_outputs=False, pool=None):
+    """Mirrors source_root to target_root with several copy streams, returns (files copied, bytes copied)."""
+
+    fileList = tree_files(source_root, skip_outputs)
+
+    pairs = []
+    for relative in fileList:
+        source = os.path.join(source_root, relative) if relative else source_root
+        target = os.path.join(target_root, relative) if relative else target_root
+        if not is_copied(source, target):
+            pairs.append((source, target))
+
+    if os.path.isdir(source_root):
+        removed = remove_stale_files(source_root, target_root, fileList, skip_outputs)
+        if removed:
+            arcpy.AddMessage("Removed " + str(removed) + " files no longer in " + source_root + " from " + target_root)
+
+    if not pairs:
+        return 0, 0
+
+    ownPool = pool is None
+    if ownPool:
+        pool = ThreadPool(streams)
+    try:
+        copied = pool.map(lambda pair: copy_file(pair[0], pair[1]), pairs)
+    finally:
+        if ownPool:
+            pool.close()
+            pool.join()
+
+    return len(pairs), sum(copied)
+
+
+def transfer_message(action, files, copied, elapsed):
+
+    megabytes = copied / (1024.0 * 1024.0)
+    rate = megabytes / elapsed if elapsed > 0 else 0
+
+    return action + " " + str(files) + " files, " + str(int(megabytes)) + " MB in " + \
+        str(datetime.timedelta(seconds=int(elapsed))) + " (" + str(int(rate)) + " MB/s)"
+
+
+def stage_in(share_workspace, local_workspace, streams=defaultStreams):
+    """Copies the inputs of the share workspace to the local workspace, returns (files copied, bytes copied)."""
+
+    arcpy.AddMessage("Staging inputs from " + share_workspace + " to " + local_workspace + " with " +
+                     str(streams) + " streams")
+
+    startTime = time.time()
+    files, copied = sync_tree(local_path(share_workspace), local_path(local_workspace), streams, skip_outputs=True)
+    arcpy.AddMessage(transfer_message("Staged", files, copied, time.time() - startTime))
+
+    return files, copied
+
+
+def publish_paths(function, cur_year):
+    """Folders a stage function leaves for the share, relative to the workspace."""
+
+    if function == "final_merge.final_merge":
+        return ["WO\\FWS"] + [cur_year + "_" + tes for tes in tesVariableList]
+    elif function == "wo_deliverable.wo_deliverable":
+        return ["WO\\TES_Submitted"]
+    elif function == "wo_hydro.wo_hydro":
+        return ["WO\\Hydro_Submitted"]
+
+    return []
+
+
+class Publisher(object):
+    """Copies the deliverables of completed stages back to the share in background threads."""
+
+    def __init__(self, local_workspace, share_workspace, streams=defaultStreams, cur_year=None):
+        self.localWorkspace = local_workspace
+        self.shareWorkspace = share_workspace
+        self.curYear = cur_year or str(datetime.datetime.today().year)
+        self.pool = ThreadPool(streams)
+        # One thread per published folder, they share the copy streams of the pool
+        self.threads = []
+        self.errors = []
+        self.lock = threading.Lock()
+        self.files = 0
+        self.copied = 0
+        self.startTime = time.time()
+
+    def publish(self, relative):
+
+        source = local_path(self.localWorkspace + "\\" + relative)
+        target = local_path(self.shareWorkspace + "\\" + relative)
+        if not os.path.exists(source):
+            return
+
+        def run():
+            try:
+                files, copied = sync_tree(source, target, pool=self.pool)
+                with self.lock:
+                    self.files += files
+                    self.copied += copied
+                arcpy.AddMessage("Published " + relative + " to " + self.shareWorkspace)
+            except (IOError, OSError) as e:
+                with self.lock:
+                    self.errors.append(relative + ": " + str(e))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def stage_complete(self, stage):
+        """Publishes the deliverables of a stage of the local workspace, used as on_complete of run_pipeline."""
+
+        if stage["args"] and stage["args"][0] != self.localWorkspace:
+            return
+
+        curYear = stage.get("kwargs", {}).get("run_date", self.curYear)[:4]
+        for relative in publish_paths(stage["function"], curYear):
+            self.publish(relative)
+
+    def wait(self):
+        """Waits for every publish to finish, returns the errors."""
+
+        for thread in self.threads:
+            thread.join()
+        self.pool.close()
+        self.pool.join()
+
+        arcpy.AddMessage(transfer_message("Published", self.files, self.copied, time.time() - self.startTime))
+        for error in self.errors:
+            arcpy.AddError("Publishing failed for " + error)
+
+        return self.errors
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Copies FRA workspaces between the network share and a local disk")
+    parser.add_argument("direction", choices=["pull", "push"],
+                        help="pull the inputs from the share, or push the deliverables to it")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--streams", type=int, default=defaultStreams,
+                        help="number of files copied at once, defaults to " + str(defaultStreams))
+    parser.add_argument("--year", default=None, help="year of the deliverables to push, defaults to this year")
+    args = parser.parse_args()
+
+    if args.direction == "pull":
+        stage_in(args.source, args.target, args.streams)
+        return
+
+    publisher = Publisher(args.source, args.target, args.streams, args.year)
+    for function in ["final_merge.final_merge", "wo_deliverable.wo_deliverable", "wo_hydro.wo_hydro"]:
+        for relative in publish_paths(function, publisher.curYear):
+            publisher.publish(relative)
+
+    if publisher.wait():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
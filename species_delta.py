@@ -0,0 +1,573 @@
+# ---------------------------------------------------------------------------
+# species_delta.py
+#
+# Description: Recomputes only the species whose rows changed in
+#              AllMerge_SummaryTable.csv and patches them into the deliverables
+#              of the last full run, instead of rerunning select_tes_layer.py and
+#              pairwise_intersect.py for whole layers after a buffer distance or
+#              rank is corrected.
+#
+#              The csv is compared with the copy recorded after the last full run
+#              (Output\species_delta\AllMerge_SummaryTable_baseline.csv, written
+#              with --baseline). A species has changed when its rows were added,
+#              removed or edited; species whose name is the start of a changed
+#              name are recomputed as well, populate_fra_attributes matches rows
+#              by prefix.
+#
+#              For every select layer the features of the changed species go
+#              through the same select, attribute, buffer, local data merge,
+#              ownership intersect and UnitID dissolve as a full run, in a scratch
+#              GDB. Their rows are then replaced in
+#                  YEAR_<rank>\..._OriginalDataNoBuffers_FWSDeliverable_CAALB83.gdb
+#                  Output\<layer>\<layer>_YEAR_CAALB83.gdb (_geocomplete, _intersect
+#                      and _intersect_dissolved)
+#                  YEAR_<rank>\..._OriginalDataBufferedAndNonBufferedAreas_CAALB83.gdb
+#                  YEAR_<rank>\YEAR_<rank>_IdentInter_CAALB83.gdb
+#                  YEAR_<rank>\YEAR_<rank>_Merged_CAALB83.gdb and the FWS
+#                      NoDistribution GDB
+#              Rows of a species are found by SNAME_FIRE, so a rank change moves
+#              them between the rank GDBs. The distributable FireRetardantEIS_<rank>
+#              feature classes are dissolved again only for the UnitIDs that had
+#              rows replaced, and only the TES_Submitted forest GDBs of those
+#              UnitIDs are rebuilt.
+#
+#              The NOAA ESU, hydrology and Local layers are not recomputed, a
+#              change to the rows of their species still needs a full run.
+#              A change to the csv header also needs a full run.
+#
+#              With --record-manifest the patched stages are recorded in the run
+#              manifest as current for the new csv, when they were current for the
+#              old one, so the next pipeline_runner.py run does not redo them.
+#
+# Usage: species_delta.py <in_workspace> [--baseline] [--dry-run] [--record-manifest] [--region NAME]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import os
+import shutil
+import sys
+
+import gdb_writer
+import pairwise_intersect
+import pipeline_runner
+import region_profile
+import run_manifest
+import scratch_workspace
+import select_tes_layer
+import wo_deliverable
+from select_tes_layer import read_selection_list, tesvariablelist
+
+nameField = "SNAME_FIRE"
+
+rowFields = [nameField, "SOURCEFIRE", "UnitID"]
+
+# Layers pairwise_intersect.unitid_dissolve filters before their copy into the Interim GDBs
+filteredLayerList = ["CNDDB", "Wildlife_Observations", "Critical_Habitat_Polygons"]
+
+
+def baseline_path(in_workspace):
+
+    return in_workspace + "\\" + "Output" + "\\" + "species_delta" + "\\" + "AllMerge_SummaryTable_baseline.csv"
+
+
+def record_baseline(in_workspace, csv_file):
+    """Keeps a copy of the csv the deliverables were built from, the next run is compared with it."""
+
+    path = baseline_path(in_workspace)
+
+    folder = os.path.dirname(path.replace("\\", os.sep))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    shutil.copy2(csv_file.replace("\\", os.sep), path.replace("\\", os.sep))
+    arcpy.AddMessage("Recorded " + csv_file + " as the baseline in " + path)
+
+
+def species_rows(selection_list):
+    """Rows of the summary table grouped by species name, in table order, without the header."""
+
+    rowDict = {}
+    for row in selection_list[1:]:
+        if row:
+            rowDict.setdefault(row[0], []).append(list(row))
+
+    return rowDict
+
+
+def changed_species(old_list, new_list):
+    """Names of the species whose rows were added, removed or edited."""
+
+    if old_list[:1] != new_list[:1]:
+        raise ValueError("The header of the summary table changed, run the full pipeline")
+
+    oldRows = species_rows(old_list)
+    newRows = species_rows(new_list)
+
+    return sorted(name for name in set(oldRows) | set(newRows) if oldRows.get(name) != newRows.get(name))
+
+
+def affected_species(changed, old_list, new_list):
+    """Changed species plus the species whose name starts a changed name.
+
+    populate_fra_attributes takes the attributes of a feature from the first row whose name starts
+    with the species name of the feature, so such species can pick up a changed row.
+    """
+
+    names = set(changed)
+    for name in set(species_rows(old_list)) | set(species_rows(new_list)):
+        if any(changedName != name and changedName.startswith(name) for changedName in changed):
+            names.add(name)
+
+    return sorted(names)
+
+
+def quoted(values):
+
+    return ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+
+
+def name_where(field, names):
+
+    return field + " IN (" + quoted(names) + ")"
+
+
+def rank_where(tes_rank):
+
+    return "GRANK_FIRE = '" + tes_rank + "'"
+
+
+def unit_where(units):
+    """Where clause on UnitID for a set of UnitIDs that may hold None."""
+
+    clauses = []
+    unitList = sorted(unit for unit in units if unit)
+    if unitList:
+        clauses.append(name_where("UnitID", unitList))
+    if None in units or "" in units:
+        clauses.append("UnitID IS NULL OR UnitID = ''")
+
+    return " OR ".join(clauses)
+
+
+def pair_where(rows):
+    """Where clause on SNAME_FIRE and SOURCEFIRE matching the (SNAME_FIRE, SOURCEFIRE, UnitID) rows."""
+
+    sourceDict = {}
+    for name, source, unit in rows:
+        sourceDict.setdefault(source, set()).add(name)
+
+    return " OR ".join("(SOURCEFIRE = " + quoted([source]) + " AND " + name_where(nameField, sorted(names)) + ")"
+                       for source, names in sorted(sourceDict.items()))
+
+
+def read_rows(feature_class):
+
+    with arcpy.da.SearchCursor(feature_class, rowFields) as cursor:
+        return [tuple(row) for row in cursor]
+
+
+def delete_rows(feature_class, where):
+    """Deletes the rows matching where, returns their (SNAME_FIRE, SOURCEFIRE, UnitID)."""
+
+    deleted = []
+    with arcpy.da.UpdateCursor(feature_class, rowFields, where) as cursor:
+        for row in cursor:
+            deleted.append(tuple(row))
+            cursor.deleteRow()
+
+    return deleted
+
+
+def patch_feature_class(target, sources, delete_where):
+    """Replaces the rows of target matching delete_where with the rows of sources.
+
+    sources is a list of (feature class, where clause) pairs. A target that does not exist yet is
+    created from them. Returns the (SNAME_FIRE, SOURCEFIRE, UnitID) of the rows removed and added.
+    """
+
+    layerList = []
+    added = []
+    for n, (source, where) in enumerate(sources):
+        layer = "delta_lyr_" + str(n)
+        arcpy.MakeFeatureLayer_management(source, layer, where)
+        rows = read_rows(layer)
+        if rows:
+            layerList.append(layer)
+            added.extend(rows)
+        else:
+            arcpy.Delete_management(layer)
+
+    removed = []
+    with gdb_writer.gdb_write_lock(gdb_writer.gdb_of(target)):
+        if arcpy.Exists(target):
+            if delete_where:
+                removed = delete_rows(target, delete_where)
+            if layerList:
+                arcpy.Append_management(layerList, target, "NO_TEST")
+        elif layerList:
+            arcpy.Merge_management(layerList, target)
+
+    for layer in layerList:
+        arcpy.Delete_management(layer)
+
+    arcpy.AddMessage("  " + target + ": " + str(len(removed)) + " removed, " + str(len(added)) + " added")
+
+    return removed, added
+
+
+def layer_source(layer_type, geocomplete, cur_month, cur_year):
+    """SOURCEFIRE written by the last full run of the layer, so patched rows keep its pull date."""
+
+    sciNameField, commonNameField, sourceField = select_tes_layer.get_layer_fields(layer_type, "")
+
+    if arcpy.Exists(geocomplete):
+        with arcpy.da.SearchCursor(geocomplete, ["SOURCEFIRE"], "SOURCEFIRE LIKE '" + sourceField + "%'") as cursor:
+            for row in cursor:
+                return row[0]
+
+    return sourceField + cur_month + "/" + cur_year
+
+
+def layer_names(layer_type, in_table, sci_name_field, names):
+    """Species names of the features of a layer to recompute.
+
+    TESP also selects features by ACCEPTED_SCIENTIFIC_NAME, their own SCIENTIFIC_NAME is added.
+    """
+
+    if layer_type != "TESP":
+        return names
+
+    with arcpy.da.SearchCursor(in_table, [sci_name_field], name_where("ACCEPTED_SCIENTIFIC_NAME", names)) as cursor:
+        return sorted(set(names) | set(row[0] for row in cursor if row[0]))
+
+
+def recompute_layer(in_workspace, cur_year, cur_month, layer_type, names, selection_list, work_gdb,
+                    ownership_fc, profile, local_data=None):
+    """Reruns one layer for the named species only and patches its outputs up to the IdentInter GDBs.
+
+    Returns the rows removed from the IdentInter GDBs by rank and the dissolved feature class holding
+    the new rows.
+    """
+
+    arcpy.AddMessage("__________________________________________________")
+    arcpy.AddMessage("Recomputing " + layer_type)
+
+    inTable = in_workspace + "\\" + pipeline_runner.layerInputDict[layer_type]
+    geocompleteList = pipeline_runner.geocomplete_list(in_workspace, layer_type, cur_year)
+
+    sciNameField, commonNameField, sourceField = select_tes_layer.get_layer_fields(layer_type, "")
+    sourceField = layer_source(layer_type, geocompleteList[0], cur_month, cur_year)
+
+    layerNames = layer_names(layer_type, inTable, sciNameField, names)
+    deleteWhere = name_where(nameField, layerNames)
+
+    fileRoot = work_gdb + layer_type + "_" + cur_year
+    selectFC = fileRoot + "_selection"
+
+    selectQuery = "(" + select_tes_layer.build_select_query(layer_type, sciNameField, selection_list) + \
+        ") AND (" + name_where(sciNameField, layerNames) + ")"
+
+    arcpy.MakeFeatureLayer_management(inTable, "delta_select_lyr", selectQuery)
+    if arcpy.Describe(inTable).spatialReference.name != profile["spatialReferenceName"]:
+        arcpy.Project_management("delta_select_lyr", selectFC, region_profile.spatial_reference(profile))
+    else:
+        arcpy.CopyFeatures_management("delta_select_lyr", selectFC)
+    arcpy.Delete_management("delta_select_lyr")
+
+    arcpy.AddMessage("Total Number of Records: " + arcpy.GetCount_management(selectFC).getOutput(0))
+
+    select_tes_layer.add_fra_fields(selectFC, layer_type)
+    select_tes_layer.populate_fra_attributes(selectFC, layer_type, selection_list, sciNameField,
+                                             commonNameField, sourceField)
+
+    for tesRank in tesvariablelist:
+        patch_feature_class(select_tes_layer.nobuf_feature_class(in_workspace, cur_year, layer_type, tesRank),
+                            [(selectFC, rank_where(tesRank))], deleteWhere)
+
+    geocompleteFC = select_tes_layer.explode_and_buffer(selectFC, fileRoot, layer_type)
+
+    if layer_type in select_tes_layer.localFeatureDict:
+        localGDB = select_tes_layer.local_data_gdb(in_workspace, cur_year, select_tes_layer.localDataDict[layer_type],
+                                                   local_data)
+        localLayerList = []
+        for fc in select_tes_layer.localFeatureDict[layer_type]:
+            localFC = localGDB + "\\" + fc
+            # Study areas without species names are left as they are
+            if nameField in [field.name for field in arcpy.ListFields(localFC)]:
+                localLayer = "delta_local_lyr_" + str(len(localLayerList))
+                arcpy.MakeFeatureLayer_management(localFC, localLayer, deleteWhere)
+                localLayerList.append(localLayer)
+
+        if localLayerList:
+            mergeFC = fileRoot + "_merge"
+            arcpy.Merge_management(localLayerList + [geocompleteFC], mergeFC)
+            arcpy.RepairGeometry_management(mergeFC)
+            geocompleteFC = mergeFC
+            for localLayer in localLayerList:
+                arcpy.Delete_management(localLayer)
+
+    # Wildlife Observations keeps one geocomplete per rank, the others one for all ranks
+    if len(geocompleteList) > 1:
+        rankGeocompleteList = [(geocomplete, rank_where(tesRank))
+                               for tesRank, geocomplete in zip(tesvariablelist, geocompleteList)]
+    else:
+        rankGeocompleteList = [(geocompleteList[0], None)]
+
+    for geocomplete, where in rankGeocompleteList:
+        patch_feature_class(geocomplete, [(geocompleteFC, where)], deleteWhere)
+
+    intersectFC = fileRoot + "_intersect"
+
+    if sys.version_info[0] < 3:
+        arcpy.Intersect_analysis([geocompleteFC, ownership_fc], intersectFC)
+    else:
+        arcpy.PairwiseIntersect_analysis([geocompleteFC, ownership_fc], intersectFC)
+
+    interimList = [(pairwise_intersect.rank_gdb(in_workspace, cur_year, tesRank, "Interim") + "\\" +
+                    pairwise_intersect.get_filename(layer_type, cur_year, tesRank, ""), tesRank)
+                   for tesRank in tesvariablelist]
+
+    if layer_type not in filteredLayerList:
+        for interimFC, tesRank in interimList:
+            patch_feature_class(interimFC, [(intersectFC, rank_where(tesRank))], deleteWhere)
+
+    dissolveFC = pairwise_intersect.unitid_dissolve(in_workspace, cur_year, layer_type, intersectFC,
+                                                    selection_list=selection_list, copy_interim=False)
+
+    if layer_type in filteredLayerList:
+        for interimFC, tesRank in interimList:
+            patch_feature_class(interimFC, [(intersectFC, rank_where(tesRank))], deleteWhere)
+
+    for geocomplete, where in rankGeocompleteList:
+        patch_feature_class(geocomplete + "_intersect", [(intersectFC, where)], deleteWhere)
+        patch_feature_class(geocomplete + "_intersect_dissolved", [(dissolveFC, where)], deleteWhere)
+
+    removedDict = {}
+    for tesRank in tesvariablelist:
+        identFC = pairwise_intersect.rank_gdb(in_workspace, cur_year, tesRank, "Final") + "\\" + \
+            pairwise_intersect.get_filename(layer_type, cur_year, tesRank, "")
+        removed, added = patch_feature_class(identFC, [(dissolveFC, rank_where(tesRank))], deleteWhere)
+        removedDict[tesRank] = removed
+
+    return removedDict, dissolveFC
+
+
+def patch_final(in_workspace, cur_year, profile, removed_dict, dissolve_list):
+    """Patches the merged and NoDistribution feature classes of every rank and dissolves the distributable
+    ones again for the UnitIDs that changed, returns those UnitIDs.
+    """
+
+    arcpy.AddMessage("__________________________________________________")
+    arcpy.AddMessage("Patching the merged deliverables")
+
+    fwsFolder = in_workspace + "\\" + "WO" + "\\" + "FWS"
+    noDistGDB = fwsFolder + "\\" + region_profile.no_distribution_gdb(profile, cur_year)
+    distGDB = fwsFolder + "\\" + region_profile.distributable_gdb(profile, cur_year)
+
+    touchedUnits = set()
+
+    for tes in tesvariablelist:
+        deleteWhere = pair_where(removed_dict[tes])
+        sources = [(dissolveFC, rank_where(tes)) for dissolveFC in dissolve_list]
+
+        mergedFC = in_workspace + "\\" + cur_year + "_" + tes + "\\" + cur_year + "_" + tes + "_Merged_CAALB83.gdb" + \
+            "\\" + "FireRetardantEIS_" + tes + "_Merged"
+        noDistFC = noDistGDB + "\\" + "FireRetardantEIS_" + tes + "_NoDistribution"
+
+        patch_feature_class(mergedFC, sources, deleteWhere)
+        removed, added = patch_feature_class(noDistFC, sources, deleteWhere)
+
+        rankUnits = set(unit for name, source, unit in removed + added)
+        if not rankUnits:
+            continue
+        touchedUnits.update(rankUnits)
+
+        unitWhere = unit_where(rankUnits)
+        distFC = distGDB + "\\" + "FireRetardantEIS_" + tes
+        dissolveFC = "in_memory\\delta_" + tes + "_dissolved"
+
+        arcpy.AddMessage("Dissolving " + tes + " again for UnitIDs " + ", ".join(sorted(str(unit) for unit in rankUnits)))
+        arcpy.MakeFeatureLayer_management(noDistFC, "delta_nodist_lyr", unitWhere)
+        if sys.version_info[0] < 3:
+            arcpy.Dissolve_management("delta_nodist_lyr", dissolveFC, ["UnitID", "GRANK_FIRE"], "", "SINGLE_PART")
+        else:
+            arcpy.PairwiseDissolve_analysis("delta_nodist_lyr", dissolveFC, ["UnitID", "GRANK_FIRE"])
+        arcpy.Delete_management("delta_nodist_lyr")
+        arcpy.RepairGeometry_management(dissolveFC)
+
+        with gdb_writer.gdb_write_lock(distGDB):
+            with arcpy.da.UpdateCursor(distFC, ["UnitID"], unitWhere) as cursor:
+                for row in cursor:
+                    cursor.deleteRow()
+            arcpy.Append_management(dissolveFC, distFC, "NO_TEST")
+
+        arcpy.Delete_management(dissolveFC)
+
+    return touchedUnits
+
+
+def patch_forests(in_workspace, cur_year, profile, units):
+    """Rebuilds the TES_Submitted GDBs of the forests with changed UnitIDs, returns their names."""
+
+    forestGDBDict = region_profile.forest_gdb_dict(profile)
+    tesFolder = in_workspace + "\\" + "WO" + "\\" + "TES_Submitted" + "\\"
+    finalWorkspace = wo_deliverable.final_workspace(in_workspace, cur_year, profile)
+
+    forestList = [forest for forest in sorted(forestGDBDict) if forestGDBDict[forest] in units]
+
+    for forest in forestList:
+        if not arcpy.Exists(tesFolder + forest):
+            arcpy.CreateFileGDB_management(tesFolder, forest)
+
+        # A rank left without records for the forest must not keep its old feature class
+        for tes in tesvariablelist:
+            if arcpy.Exists(tesFolder + forest + "\\" + "FireRetardantEIS_" + tes):
+                arcpy.Delete_management(tesFolder + forest + "\\" + "FireRetardantEIS_" + tes)
+
+        wo_deliverable.build_forest_gdb(forest, finalWorkspace, tesFolder, forestGDBDict)
+
+    return forestList
+
+
+def record_manifest(in_workspace, stages, baseline_csv, csv_file):
+    """Records the patched stages as current for the new csv when they were current for the baseline."""
+
+    manifestFile = run_manifest.manifest_path(in_workspace)
+    manifest = run_manifest.load_manifest(manifestFile)
+
+    oldPrints = {csv_file: run_manifest.fingerprint(baseline_csv)}
+    newPrints = {csv_file: run_manifest.fingerprint(csv_file)}
+
+    for stage in stages:
+        entry = manifest["stages"].get(stage["name"])
+        if entry is None:
+            continue
+
+        for path in stage["inputs"]:
+            if path not in newPrints:
+                newPrints[path] = run_manifest.fingerprint(path)
+            if path not in oldPrints:
+                oldPrints[path] = newPrints[path]
+
+        wasCurrent = run_manifest.stage_key(stage, oldPrints) == entry["key"]
+        # Downstream keys were built from the outputs as recorded
+        oldPrints.update(entry["outputs"])
+
+        if not wasCurrent:
+            arcpy.AddMessage(stage["name"] + " was not current before the change, left for the next pipeline run")
+            continue
+
+        pipeline_runner.record_outputs(stage, manifest, manifestFile, newPrints,
+                                       run_manifest.stage_key(stage, newPrints), entry.get("elapsed", 0))
+        arcpy.AddMessage("Recorded " + stage["name"] + " as current")
+
+
+def patched_stages(in_workspace, cur_year, region=None, run_date=None):
+    """Stages of the pipeline whose outputs species_delta patches, in graph order."""
+
+    stages = pipeline_runner.build_stage_graph(in_workspace, cur_year, region=region, run_date=run_date)
+
+    stageNames = ["final_merge", "wo_deliverable"]
+    for layerType in pipeline_runner.selectLayerList:
+        stageNames.append("select_tes_layer:" + layerType)
+        stageNames.extend(stage["name"] for stage in stages
+                          if stage["name"].split(":")[:2] == ["pairwise_intersect", layerType])
+
+    return [stage for stage in stages if stage["name"] in stageNames]
+
+
+def species_delta(in_workspace, run_date=None, region=None, dry_run=False, record=False, local_data=None):
+    """Recomputes the species changed in the summary table since the baseline, returns their names."""
+
+    arcpy.env.overwriteOutput = True
+
+    profile = region_profile.get_profile(region)
+
+    now = run_date or datetime.datetime.today()
+    curMonth = str(now.month)
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    csvFile = pairwise_intersect.summary_table(in_workspace)
+    baselineFile = baseline_path(in_workspace)
+    if not os.path.exists(baselineFile.replace("\\", os.sep)):
+        raise ValueError("No baseline in " + baselineFile + ", run the full pipeline and then --baseline")
+
+    oldList = read_selection_list(baselineFile.replace("\\", os.sep))
+    selectionList = read_selection_list(csvFile)
+
+    changed = changed_species(oldList, selectionList)
+    if not changed:
+        arcpy.AddMessage("No species changed since the baseline")
+        return []
+
+    names = affected_species(changed, oldList, selectionList)
+    arcpy.AddMessage("Changed species: " + ", ".join(changed))
+    arcpy.AddMessage("Recomputing: " + ", ".join(names))
+
+    if dry_run:
+        return names
+
+    key = scratch_workspace.scratch_key({"function": "species_delta.species_delta", "args": names})
+    workGDB = scratch_workspace.create_scratch_gdb(in_workspace, "species_delta", key)
+
+    ownershipFC = pairwise_intersect.ownership_feature_class(in_workspace, curYear)
+
+    removedDict = dict((tes, []) for tes in tesvariablelist)
+    dissolveList = []
+    for layerType in pipeline_runner.selectLayerList:
+        layerRemoved, dissolveFC = recompute_layer(in_workspace, curYear, curMonth, layerType, names, selectionList,
+                                                   workGDB, ownershipFC, profile, local_data)
+        for tes in tesvariablelist:
+            removedDict[tes].extend(layerRemoved[tes])
+        dissolveList.append(dissolveFC)
+
+    units = patch_final(in_workspace, curYear, profile, removedDict, dissolveList)
+    forestList = patch_forests(in_workspace, curYear, profile, units)
+    arcpy.AddMessage("Rebuilt forest GDBs: " + (", ".join(forestList) or "none"))
+
+    scratch_workspace.remove_scratch_gdb(workGDB)
+
+    if record:
+        record_manifest(in_workspace, patched_stages(in_workspace, curYear, region, run_date),
+                        baselineFile.replace("\\", os.sep), csvFile)
+
+    record_baseline(in_workspace, csvFile)
+
+    return names
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Recomputes the species changed in the FRA summary table")
+    parser.add_argument("in_workspace")
+    parser.add_argument("--baseline", action="store_true",
+                        help="only record the current summary table as the baseline, after a full run")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only list the species that would be recomputed")
+    parser.add_argument("--record-manifest", action="store_true",
+                        help="record the patched stages as current in the run manifest")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    args = parser.parse_args()
+
+    if args.baseline:
+        record_baseline(args.in_workspace, pairwise_intersect.summary_table(args.in_workspace))
+        return
+
+    try:
+        species_delta(args.in_workspace, region=args.region, dry_run=args.dry_run, record=args.record_manifest)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+        sys.exit(1)
+    except ValueError as e:
+        arcpy.AddError(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
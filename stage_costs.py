@@ -0,0 +1,246 @@
+# ---------------------------------------------------------------------------
+# stage_costs.py
+#
+# Description: Estimates how much memory each pipeline stage needs so that
+#              pipeline_runner.py can run as many stages at once as the machine
+#              allows without running several statewide overlays side by side.
+#
+#              The estimate is built from the feature count and vertex total of
+#              each input feature class. Overlays (buffer, intersect, dissolve)
+#              hold several copies of their input geometry, so vertices are
+#              weighted by an overlay factor. Counts are cached in
+#              Output\stage_costs.json and only taken again when the dataset
+#              changes. Inputs that are folders or geodatabases, such as the NHD
+#              downloads, cannot be counted cheaply and use the fallback cost of
+#              their stage function.
+#
+#              Every completed stage is also recorded in Output\stage_timings.json
+#              with its elapsed time, input size and the disk used by the GDBs it
+#              writes. pipeline_runner.py --plan predicts time and disk of a
+#              stage from these runs, scaled by its input size now.
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import datetime
+import json
+import os
+
+import run_manifest
+
+# Memory of a worker process running a stage, before any data is loaded
+baseStageMemory = 300
+
+# Bytes held per vertex and per feature while a stage works on its input
+vertexBytes = 16
+featureBytes = 1024
+
+# Recorded runs kept per stage for the --plan predictions
+timingHistory = 10
+
+# Stage functions that buffer, intersect or dissolve their input
+overlayFunctionDict = {"select_tes_layer.select_tes_layer": 4,
+                       "pairwise_intersect.pairwise_intersect": 8,
+                       "hydrology_processing.hydrology_processing": 8,
+                       "noaa_esu_processing.noaa_esu_processing": 4,
+                       "final_merge.final_merge": 4,
+                       "wo_deliverable.wo_deliverable": 2,
+                       "wo_hydro.wo_hydro": 2}
+
+# Memory in MB used when the inputs of a stage cannot be counted, per worker of the stages
+# starting worker processes of their own
+fallbackCostDict = {"hydrology_processing.hydrology_processing": 6000,
+                    "noaa_esu_processing.noaa_esu_processing": 2000,
+                    "final_merge.final_merge": 2000,
+                    "edw_extract_data.edw_extract_data": 1000,
+                    "hydro_download.hydro_download": 500}
+
+
+def cost_cache_path(in_workspace):
+
+    return in_workspace + "\\" + "Output" + "\\" + "stage_costs.json"
+
+
+def load_cost_cache(path):
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_cost_cache(path, cache):
+
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    if hasattr(os, "replace"):
+        os.replace(tmpPath, path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+
+
+def count_dataset(path):
+    """Returns the feature count and vertex total of a feature class or table."""
+
+    features = 0
+    vertices = 0
+
+    if hasattr(arcpy.Describe(path), "shapeType"):
+        with arcpy.da.SearchCursor(path, ["SHAPE@"]) as cursor:
+            for row in cursor:
+                features += 1
+                if row[0] is not None:
+                    vertices += row[0].pointCount
+    else:
+        features = int(arcpy.GetCount_management(path).getOutput(0))
+
+    return features, vertices
+
+
+def dataset_size(path, cache):
+    """Cached feature count and vertex total of a dataset, None when it is missing or not a dataset."""
+
+    modified = run_manifest.dataset_modified(path)
+    if modified is None:
+        return None
+
+    cached = cache.get(path)
+    if cached is not None and cached["modified"] == modified:
+        return cached["features"], cached["vertices"]
+
+    if os.path.isdir(path.replace("\\", os.sep)) or path.lower().endswith(".csv") or not arcpy.Exists(path):
+        return None
+
+    features, vertices = count_dataset(path)
+    cache[path] = {"modified": modified, "features": features, "vertices": vertices}
+
+    return features, vertices
+
+
+def input_sizes(stage, cache):
+
+    sizeList = []
+    for path in stage["inputs"] or []:
+        size = dataset_size(path, cache)
+        if size is not None:
+            sizeList.append(size)
+
+    return sizeList
+
+
+def estimate_stage_cost(stage, cache):
+    """Estimated memory in MB a stage needs while it runs, for every worker process it starts."""
+
+    workers = 1
+    if stage.get("own_pool") and not stage.get("restore_entry"):
+        workers = stage.get("processes") or 1
+
+    sizeList = input_sizes(stage, cache)
+
+    if not sizeList:
+        return fallbackCostDict.get(stage["function"], baseStageMemory) * workers
+
+    factor = overlayFunctionDict.get(stage["function"], 1)
+    dataBytes = sum(features * featureBytes + vertices * vertexBytes * factor for features, vertices in sizeList)
+
+    return max(baseStageMemory + dataBytes / (1024.0 * 1024), fallbackCostDict.get(stage["function"], 0)) * workers
+
+
+def timing_path(in_workspace):
+
+    return in_workspace + "\\" + "Output" + "\\" + "stage_timings.json"
+
+
+def folder_size(path):
+
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+
+    return total
+
+
+def output_disk(stage):
+    """MB on disk of the geodatabases and folders holding the outputs of a stage."""
+
+    folderList = []
+    for path in stage["outputs"]:
+        parts = path.replace("/", "\\").split("\\")
+        folder = "\\".join(parts[:-1])
+        for index in range(len(parts)):
+            if parts[index].lower().endswith(".gdb"):
+                folder = "\\".join(parts[:index + 1])
+                break
+        if folder not in folderList:
+            folderList.append(folder)
+
+    return sum(folder_size(folder.replace("\\", os.sep)) for folder in folderList) / (1024.0 * 1024)
+
+
+def record_timing(timings, stage, cache, elapsed):
+    """Adds a completed run of a stage to the timing history, keeping the last timingHistory runs."""
+
+    sizeList = input_sizes(stage, cache)
+    run = {"elapsed": elapsed, "disk": output_disk(stage),
+           "completed": datetime.datetime.now().isoformat()}
+    if sizeList:
+        run["features"] = sum(features for features, vertices in sizeList)
+        run["vertices"] = sum(vertices for features, vertices in sizeList)
+
+    history = timings.setdefault(stage["name"], [])
+    history.append(run)
+    del history[:-timingHistory]
+
+
+def median(values):
+
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def predict_stage(stage, cache, timings):
+    """Predicts seconds, memory MB and disk MB of a stage from the recorded runs of the stage.
+
+    Runs are scaled by the input features plus vertices now against then when both are known.
+    Seconds and disk are None when the stage has never been recorded.
+    """
+
+    sizeList = input_sizes(stage, cache)
+    prediction = {"memory": estimate_stage_cost(stage, cache), "seconds": None, "disk": None,
+                  "basis": "no recorded runs"}
+
+    history = timings.get(stage["name"], [])
+    if not history:
+        return prediction
+
+    work = None
+    if sizeList:
+        work = sum(features + vertices for features, vertices in sizeList)
+
+    scaled = [run for run in history if run.get("vertices") is not None and run["features"] + run["vertices"] > 0]
+    if work is not None and scaled:
+        prediction["seconds"] = median([run["elapsed"] / float(run["features"] + run["vertices"])
+                                        for run in scaled]) * work
+        prediction["disk"] = median([run["disk"] / float(run["features"] + run["vertices"]) for run in scaled]) * work
+        prediction["basis"] = str(len(scaled)) + " runs scaled by input size"
+    else:
+        prediction["seconds"] = median([run["elapsed"] for run in history])
+        prediction["disk"] = median([run["disk"] for run in history])
+        prediction["basis"] = str(len(history)) + " runs"
+
+    return prediction
@@ -0,0 +1,261 @@
+# ---------------------------------------------------------------------------
+# stage_daemon.py
+#
+# Description: Long running worker service for the "check data and make changes"
+#              loop. Importing arcpy and checking out a license costs several
+#              seconds every time a script starts, so instead of launching
+#              select_tes_layer.py, pairwise_intersect.py or the WO scripts again
+#              and again the analyst starts this service once and submits jobs
+#              to it.
+#
+#              The service keeps a pool of warm worker processes. Every worker
+#              imports arcpy and the stage modules (with their spatial references)
+#              at start up, reads the summary csv table and copies the projected
+#              ownership layer into memory. Jobs then reuse all of it; the csv and
+#              ownership layer are only loaded again when they change on disk.
+#
+#              Jobs are json files in a spool directory under Output\job_spool:
+#                  incoming  jobs waiting to run
+#                  running   the job being run
+#                  done      results of jobs where every stage completed
+#                  failed    results of jobs where a stage failed
+#              A job lists pipeline stage names (see pipeline_runner.py), for
+#              example select_tes_layer:TESP pairwise_intersect:TESP. Jobs run one
+#              at a time in the order submitted, the stages of a job run in
+#              dependency order across the workers and stages with unchanged
+#              inputs are skipped through the run manifest.
+#
+# Usage: stage_daemon.py serve <in_workspace> [--workers N]
+#        stage_daemon.py submit <in_workspace> <stage> [<stage> ...] [--force] [--wait]
+#        stage_daemon.py stop <in_workspace>
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import pipeline_runner
+import run_manifest
+import stage_costs
+
+spoolFolders = ["incoming", "running", "done", "failed"]
+
+stopFile = "stop"
+
+# Modules imported by every worker when it starts
+stageModuleList = ["select_tes_layer", "pairwise_intersect", "hydrology_processing", "noaa_esu_processing",
+                   "final_merge", "wo_deliverable", "wo_hydro"]
+
+
+def spool_path(in_workspace):
+
+    return in_workspace + "\\" + "Output" + "\\" + "job_spool"
+
+
+def create_spool(spool):
+
+    for folder in spoolFolders:
+        if not os.path.exists(os.path.join(spool, folder)):
+            os.makedirs(os.path.join(spool, folder))
+
+
+def write_json(path, data):
+
+    # Written under a temporary name first so a reader never sees half a job
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.rename(tmpPath, path)
+
+
+def warm_worker(in_workspace, cur_year):
+    """Pool initializer, loads everything the stages share once per worker process."""
+
+    for moduleName in stageModuleList:
+        __import__(moduleName)
+
+    csvFile = in_workspace + "\\" + pipeline_runner.summaryTable
+    ownershipFC = in_workspace + "\\USFS_Ownership_LSRS\\" + cur_year + \
+        "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + cur_year
+
+    # Not fatal when these fail, the stages load them on first use
+    try:
+        pipeline_runner.load_table(csvFile)
+    except Exception as e:
+        arcpy.AddWarning("Could not preload " + csvFile + ": " + str(e))
+
+    try:
+        pipeline_runner.load_layer(ownershipFC)
+    except Exception as e:
+        arcpy.AddWarning("Could not preload " + ownershipFC + ": " + str(e))
+
+
+def submit_job(in_workspace, stage_names, force=False):
+    """Queues a job for the service and returns its id."""
+
+    spool = spool_path(in_workspace)
+    create_spool(spool)
+
+    jobId = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f") + "_" + str(os.getpid())
+    write_json(os.path.join(spool, "incoming", jobId + ".json"),
+               {"id": jobId, "stages": stage_names, "force": force,
+                "submitted": datetime.datetime.now().isoformat()})
+
+    arcpy.AddMessage("Submitted job " + jobId + ": " + " ".join(stage_names))
+    return jobId
+
+
+def wait_for_job(in_workspace, job_id, poll_interval=2):
+    """Blocks until the service has finished the job and returns its result."""
+
+    spool = spool_path(in_workspace)
+    while True:
+        for folder in ["done", "failed"]:
+            resultPath = os.path.join(spool, folder, job_id + ".json")
+            if os.path.exists(resultPath):
+                with open(resultPath) as f:
+                    return json.load(f)
+        time.sleep(poll_interval)
+
+
+def claim_next_job(spool):
+    """Moves the oldest waiting job to running and returns it, or None when nothing is waiting."""
+
+    incoming = os.path.join(spool, "incoming")
+    for filename in sorted(os.listdir(incoming)):
+        if not filename.endswith(".json"):
+            continue
+        runningPath = os.path.join(spool, "running", filename)
+        try:
+            os.rename(os.path.join(incoming, filename), runningPath)
+        except OSError:
+            continue
+        with open(runningPath) as f:
+            return json.load(f)
+
+    return None
+
+
+def run_job(in_workspace, job, pool):
+
+    startTime = time.time()
+    stages = pipeline_runner.select_stages(pipeline_runner.build_stage_graph(in_workspace), job["stages"])
+
+    if not stages:
+        status = {}
+        message = "No stages match " + " ".join(job["stages"])
+    else:
+        status = pipeline_runner.run_pipeline(stages, manifest_file=run_manifest.manifest_path(in_workspace),
+                                              force=job.get("force", False), pool=pool,
+                                              cost_file=stage_costs.cost_cache_path(in_workspace),
+                                              timing_file=stage_costs.timing_path(in_workspace))
+        message = ""
+
+    result = dict(job)
+    result["status"] = status
+    result["message"] = message
+    result["elapsed"] = time.time() - startTime
+    result["finished"] = datetime.datetime.now().isoformat()
+    result["success"] = bool(stages) and all(value in ("complete", "current") for value in status.values())
+
+    return result
+
+
+def serve(in_workspace, workers=None, poll_interval=2):
+
+    spool = spool_path(in_workspace)
+    create_spool(spool)
+
+    if os.path.exists(os.path.join(spool, stopFile)):
+        os.remove(os.path.join(spool, stopFile))
+
+    # A job left in running was interrupted by the last shutdown, queue it again
+    for filename in os.listdir(os.path.join(spool, "running")):
+        os.rename(os.path.join(spool, "running", filename), os.path.join(spool, "incoming", filename))
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    curYear = str(datetime.datetime.today().year)
+    arcpy.AddMessage("Starting " + str(workers) + " warm workers, spool directory " + spool)
+    pool = multiprocessing.Pool(workers, warm_worker, (in_workspace, curYear))
+
+    try:
+        while not os.path.exists(os.path.join(spool, stopFile)):
+            job = claim_next_job(spool)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+
+            arcpy.AddMessage("__________________________________________________")
+            arcpy.AddMessage("Running job " + job["id"] + ": " + " ".join(job["stages"]))
+            result = run_job(in_workspace, job, pool)
+
+            if result["success"]:
+                folder = "done"
+            else:
+                folder = "failed"
+            write_json(os.path.join(spool, folder, job["id"] + ".json"), result)
+            os.remove(os.path.join(spool, "running", job["id"] + ".json"))
+            arcpy.AddMessage("Job " + job["id"] + " " + folder + " in " +
+                             str(datetime.timedelta(seconds=int(result["elapsed"]))))
+
+    finally:
+        pool.close()
+        pool.join()
+
+    arcpy.AddMessage("Worker service stopped")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Warm worker service for FRA processing stages")
+    subparsers = parser.add_subparsers(dest="command")
+
+    serveParser = subparsers.add_parser("serve", help="start the service")
+    serveParser.add_argument("in_workspace")
+    serveParser.add_argument("--workers", type=int, default=None,
+                             help="number of warm worker processes, defaults to the number of CPUs")
+
+    submitParser = subparsers.add_parser("submit", help="queue stages as a job")
+    submitParser.add_argument("in_workspace")
+    submitParser.add_argument("stages", nargs="+",
+                              help="stage names, for example select_tes_layer:TESP pairwise_intersect:TESP")
+    submitParser.add_argument("--force", action="store_true",
+                              help="rebuild the stages even when their inputs have not changed")
+    submitParser.add_argument("--wait", action="store_true", help="wait for the job to finish")
+
+    stopParser = subparsers.add_parser("stop", help="stop the service after the running job")
+    stopParser.add_argument("in_workspace")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.in_workspace, args.workers)
+    elif args.command == "submit":
+        jobId = submit_job(args.in_workspace, args.stages, args.force)
+        if args.wait:
+            result = wait_for_job(args.in_workspace, jobId)
+            for name in sorted(result["status"]):
+                arcpy.AddMessage("  " + name + ": " + result["status"][name])
+            if result["message"]:
+                arcpy.AddMessage(result["message"])
+            if not result["success"]:
+                sys.exit(1)
+    elif args.command == "stop":
+        spool = spool_path(args.in_workspace)
+        create_spool(spool)
+        open(os.path.join(spool, stopFile), "w").close()
+        arcpy.AddMessage("Stop requested")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# ---------------------------------------------------------------------------
+# watch_inputs.py
+#
+# Description: Watches the inputs of the pipeline during the season and reruns
+#              the stages that depend on an input as soon as it changes, so an
+#              updated deliverable does not have to wait for the next full run
+#              or for someone to remember which scripts read the file.
+#
+#              The watched inputs are the data the stages read that no stage
+#              writes: the csv_tables summary table, the Input\Local_Data and
+#              Input\CNDDB data and the ownership GDB, plus the EDW extract and
+#              the downloads, which are written by edw_extract_data.py and
+#              hydro_download.py when they are run by hand. Datasets inside a
+#              geodatabase are watched through the whole geodatabase.
+#
+#              Changes are seen through inotify when the inotify_simple package
+#              is installed and the workspace is on a local Linux disk, otherwise
+#              the inputs are polled every --poll-seconds. Either way a change
+#              only counts once the sizes and modification times of the files
+#              have stayed the same for --quiet-seconds, so a geodatabase that is
+#              still being copied in or a csv saved several times in a row
+#              triggers one run.
+#
+#              Only the stages reading a changed input and the stages downstream
+#              of them are run, on a pool of warm workers (see stage_daemon.py)
+#              kept for the whole session. Stages whose outputs come out the same
+#              stop there through the run manifest (see run_manifest.py).
+#              edw_extract_data and hydro_download are never run by the watcher.
+#
+# Usage: watch_inputs.py <in_workspace> [--workers N] [--quiet-seconds S] [--poll-seconds S] [--region NAME]
+#                        [--force]
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import multiprocessing
+import os
+import sys
+import time
+
+import gdb_writer
+import pipeline_runner
+import preview_sample
+import run_manifest
+import stage_costs
+import stage_daemon
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+# Stages that pull from outside sources, their outputs are watched instead of run
+sourceStageList = ["edw_extract_data", "hydro_download"]
+
+# Files that change while a geodatabase is only being read
+ignoredSuffixList = [".lock", gdb_writer.lockSuffix, ".tmp", ".part"]
+
+
+def watch_target(path):
+    """File or folder that is watched for an input: its geodatabase, or the path itself."""
+
+    gdb = gdb_writer.gdb_of(path)
+    if gdb is not None:
+        return gdb
+
+    return path
+
+
+def written_by_pipeline(in_workspace, target):
+    """True for data in the Output, WO and YEAR_<rank> folders the stages write to."""
+
+    relative = target.replace("/", "\\")[len(in_workspace.replace("/", "\\")):].strip("\\")
+
+    return preview_sample.is_output_folder(relative.split("\\")[0])
+
+
+def watched_inputs(in_workspace, stages):
+    """Maps every watched file or folder to the names of the stages reading it."""
+
+    producedList = []
+    for stage in stages:
+        if stage["name"] not in sourceStageList:
+            producedList.extend(watch_target(path) for path in stage["outputs"])
+
+    readerDict = {}
+    for stage in stages:
+        for path in stage["inputs"] or []:
+            target = watch_target(path)
+            if target not in producedList and not written_by_pipeline(in_workspace, target):
+                readerDict.setdefault(target, []).append(stage["name"])
+
+    return readerDict
+
+
+def signature(target):
+    """Sizes and modification times of the files of a watched input, None when it does not exist."""
+
+    localPath = target.replace("\\", os.sep)
+
+    if os.path.isdir(localPath):
+        fileList = []
+        for dirpath, dirnames, filenames in os.walk(localPath):
+            for filename in filenames:
+                fileList.append(os.path.join(dirpath, filename))
+    elif localPath.lower().endswith(".shp"):
+        # A shapefile is all the files sharing its name
+        folder, shpName = os.path.split(localPath)
+        stem = os.path.splitext(shpName)[0].lower()
+        if not os.path.isdir(folder):
+            return None
+        fileList = [os.path.join(folder, filename) for filename in os.listdir(folder)
+                    if os.path.splitext(filename)[0].lower() == stem]
+    elif os.path.isfile(localPath):
+        fileList = [localPath]
+    else:
+        return None
+
+    entryList = []
+    for filePath in sorted(fileList):
+        if any(filePath.lower().endswith(suffix) for suffix in ignoredSuffixList):
+            continue
+        try:
+            stat = os.stat(filePath)
+        except OSError:
+            # Removed while walking, the next look sees it gone
+            continue
+        entryList.append((filePath, stat.st_size, stat.st_mtime))
+
+    return entryList
+
+
+def take_signatures(targets):
+
+    return dict((target, signature(target)) for target in targets)
+
+
+def affected_stages(stages, changed, reader_dict):
+    """Names of the stages reading a changed input and every stage downstream of them."""
+
+    affected = set()
+    for target in changed:
+        affected.update(reader_dict.get(target, []))
+
+    grown = True
+    while grown:
+        grown = False
+        for stage in stages:
+            if stage["name"] not in affected and any(dep in affected for dep in stage["deps"]):
+                affected.add(stage["name"])
+                grown = True
+
+    return [stage["name"] for stage in stages if stage["name"] in affected]
+
+
+class InputWatcher(object):
+    """Waits for the watched inputs to change, through inotify when it can or by polling."""
+
+    def __init__(self, targets, poll_seconds):
+        self.targets = targets
+        self.pollSeconds = poll_seconds
+        self.inotify = None
+
+        if inotify_simple is not None and sys.platform.startswith("linux"):
+            try:
+                self.inotify = inotify_simple.INotify()
+                self.add_watches()
+                arcpy.AddMessage("Watching inputs with inotify")
+            except OSError as e:
+                arcpy.AddWarning("inotify not available, polling instead: " + str(e))
+                self.inotify = None
+
+        if self.inotify is None:
+            arcpy.AddMessage("Polling inputs every " + str(poll_seconds) + " seconds")
+
+    def add_watches(self):
+
+        flags = inotify_simple.flags
+        mask = flags.CREATE | flags.DELETE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_FROM | flags.MOVED_TO
+
+        folderList = []
+        for target in self.targets:
+            localPath = target.replace("\\", os.sep)
+            if os.path.isdir(localPath):
+                for dirpath, dirnames, filenames in os.walk(localPath):
+                    folderList.append(dirpath)
+            else:
+                # A file, or a geodatabase not created yet, is seen through its folder
+                folder = os.path.dirname(localPath)
+                while folder and not os.path.isdir(folder):
+                    folder = os.path.dirname(folder)
+                if folder:
+                    folderList.append(folder)
+
+        for folder in sorted(set(folderList)):
+            self.inotify.add_watch(folder, mask)
+
+    def wait(self):
+        """Returns after something may have changed, the caller compares signatures to find out."""
+
+        if self.inotify is None:
+            time.sleep(self.pollSeconds)
+            return
+
+        # Also wakes up every poll interval, inotify misses changes made from other machines on a share
+        if self.inotify.read(timeout=int(self.pollSeconds * 1000)):
+            # New folders such as a geodatabase copied in need their own watch
+            self.add_watches()
+
+
+def wait_for_changes(watcher, signatures, quiet_seconds):
+    """Blocks until some inputs changed and then stayed the same for quiet_seconds, returns them."""
+
+    while True:
+        watcher.wait()
+        current = take_signatures(signatures)
+        changed = [target for target in signatures if current[target] != signatures[target]]
+        if not changed:
+            continue
+
+        arcpy.AddMessage("Change seen in " + ", ".join(changed) + ", waiting for it to settle")
+        settled = time.time() + quiet_seconds
+        while time.time() < settled:
+            time.sleep(min(quiet_seconds, watcher.pollSeconds))
+            latest = take_signatures(signatures)
+            if latest != current:
+                current = latest
+                settled = time.time() + quiet_seconds
+
+        changed = [target for target in signatures if current[target] != signatures[target]]
+        signatures.update(current)
+        if changed:
+            return changed
+
+
+def watch(in_workspace, workers=None, quiet_seconds=30, poll_seconds=10, region=None, force=False):
+    """Reruns the stages affected by every settled change of the inputs until interrupted."""
+
+    stages = pipeline_runner.build_stage_graph(in_workspace, region=region)
+    readerDict = watched_inputs(in_workspace, stages)
+    stages = [stage for stage in stages if stage["name"] not in sourceStageList]
+
+    signatures = take_signatures(readerDict)
+    watcher = InputWatcher(sorted(readerDict), poll_seconds)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    curYear = str(datetime.datetime.today().year)
+    arcpy.AddMessage("Watching " + str(len(readerDict)) + " inputs of " + in_workspace +
+                     " with " + str(workers) + " warm workers")
+    pool = multiprocessing.Pool(workers, stage_daemon.warm_worker, (in_workspace, curYear))
+
+    try:
+        while True:
+            changed = wait_for_changes(watcher, signatures, quiet_seconds)
+
+            stageNames = affected_stages(stages, changed, readerDict)
+            if not stageNames:
+                continue
+
+            arcpy.AddMessage("__________________________________________________")
+            arcpy.AddMessage("Inputs changed: " + ", ".join(changed))
+            arcpy.AddMessage("Rerunning " + " ".join(stageNames))
+
+            startTime = time.time()
+            status = pipeline_runner.run_pipeline(pipeline_runner.select_stages(stages, stageNames),
+                                                  manifest_file=run_manifest.manifest_path(in_workspace),
+                                                  force=force, pool=pool,
+                                                  cost_file=stage_costs.cost_cache_path(in_workspace),
+                                                  timing_file=stage_costs.timing_path(in_workspace))
+
+            for name in stageNames:
+                arcpy.AddMessage("  " + name + ": " + status.get(name))
+            arcpy.AddMessage("Finished in " + str(datetime.timedelta(seconds=int(time.time() - startTime))) +
+                             ", watching again")
+
+    except KeyboardInterrupt:
+        arcpy.AddMessage("Stopped watching")
+
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Reruns the FRA stages affected when an input changes")
+    parser.add_argument("in_workspace")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of warm worker processes, defaults to the number of CPUs")
+    parser.add_argument("--quiet-seconds", type=float, default=30,
+                        help="seconds an input has to stay unchanged before the stages run, defaults to 30")
+    parser.add_argument("--poll-seconds", type=float, default=10,
+                        help="seconds between looks at the inputs when polling, defaults to 10")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file, defaults to Region 5")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild the affected stages even when the manifest finds their inputs unchanged")
+    args = parser.parse_args()
+
+    watch(args.in_workspace, args.workers, args.quiet_seconds, args.poll_seconds, args.region, args.force)
+
+
+if __name__ == "__main__":
+    main()
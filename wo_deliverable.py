@@ -5,6 +5,9 @@
 #              This includes generating geodatabases for each forest
 #              that contains only the status and unitID information
 #
+#              wo_deliverable.py <in_workspace>
+#              or import the module and call wo_deliverable().
+#
 # Runtime estimates: 3 min 17 sec
 #
 # Created by: Josh Klaus 08/17/2017 jklaus@fs.fed.us
@@ -16,73 +19,97 @@ import os
 import sys
 import datetime
 
-in_workspace = sys.argv[1]
-
-# in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
-
-# using the now variable to assign year every time there is a hardcoded 2017
-now = datetime.datetime.today()
-curMonth = str(now.month)
-curYear = str(now.year)
-arcpy.AddMessage("Year is " + curYear)
-
-arcpy.env.workspace = in_workspace
-
-arcpy.env.overwriteOutput = True
-
-# final_end_fc = final_wksp + "\\" + "FireRetardantEIS_Endangered"
-# final_thr_fc = final_wksp + "\\" + "FireRetardantEIS_Threatened"
-# final_sen_fc = final_wksp + "\\" + "FireRetardantEIS_Sensitive"
-
-wo_folder = in_workspace + "\\" + "WO"
-tes_folder = wo_folder + "\\" + "TES_Submitted" + "\\"
-fws_folder = wo_folder + "\\" + "FWS" + "\\"
-
-final_r05_nodist_gdb = curYear + "_S_R05_FireRetardantEIS_CAALB83_NoDistribution_FWS.gdb"
-final_r05_dist_gdb   = curYear + "_S_R05_FireRetardantEIS_CAALB83_DistributableDatasets.gdb"
-
-final_no_wksp = fws_folder + "\\" + final_r05_nodist_gdb
-final_wksp    = fws_folder + "\\" + final_r05_dist_gdb
-
-forestGDBList = ["S_R05_ANF_FireRetardantEIS.gdb",
-                 "S_R05_BDF_FireRetardantEIS.gdb",
-                 "S_R05_CNF_FireRetardantEIS.gdb",
-                 "S_R05_ENF_FireRetardantEIS.gdb",
-                 "S_R05_INF_FireRetardantEIS.gdb",
-                 "S_R05_KNF_FireRetardantEIS.gdb",
-                 "S_R05_LNF_FireRetardantEIS.gdb",
-                 "S_R05_LPF_FireRetardantEIS.gdb",
-                 "S_R05_MDF_FireRetardantEIS.gdb",
-                 "S_R05_MNF_FireRetardantEIS.gdb",
-                 "S_R05_PNF_FireRetardantEIS.gdb",
-                 "S_R05_SHU_FireRetardantEIS.gdb",
-                 "S_R05_SNF_FireRetardantEIS.gdb",
-                 "S_R05_SQF_FireRetardantEIS.gdb",
-                 "S_R05_SRF_FireRetardantEIS.gdb",
-                 "S_R05_STF_FireRetardantEIS.gdb",
-                 "S_R05_TMU_FireRetardantEIS.gdb",
-                 "S_R05_TNF_FireRetardantEIS.gdb" ]
-
-forestGDBDict = {"S_R05_ANF_FireRetardantEIS.gdb": "0501",
-                 "S_R05_BDF_FireRetardantEIS.gdb": "0512",
-                 "S_R05_CNF_FireRetardantEIS.gdb": "0502",
-                 "S_R05_ENF_FireRetardantEIS.gdb": "0503",
-                 "S_R05_INF_FireRetardantEIS.gdb": "0504",
-                 "S_R05_KNF_FireRetardantEIS.gdb": "0505",
-                 "S_R05_LNF_FireRetardantEIS.gdb": "0506",
-                 "S_R05_LPF_FireRetardantEIS.gdb": "0507",
-                 "S_R05_MDF_FireRetardantEIS.gdb": "0509",
-                 "S_R05_MNF_FireRetardantEIS.gdb": "0508",
-                 "S_R05_PNF_FireRetardantEIS.gdb": "0511",
-                 "S_R05_SHU_FireRetardantEIS.gdb": "0514",
-                 "S_R05_SNF_FireRetardantEIS.gdb": "0515",
-                 "S_R05_SQF_FireRetardantEIS.gdb": "0513",
-                 "S_R05_SRF_FireRetardantEIS.gdb": "0510",
-                 "S_R05_STF_FireRetardantEIS.gdb": "0516",
-                 "S_R05_TMU_FireRetardantEIS.gdb": "0519",
-                 "S_R05_TNF_FireRetardantEIS.gdb": "0517"}
-
-try:
+import region_profile
+
+# Region 5 forest GDBs, other regions pass their region to wo_deliverable()
+forestGDBDict = region_profile.forest_gdb_dict(region_profile.get_profile())
+
+forestGDBList = sorted(forestGDBDict)
+
+tesVariableList = ["Endangered", "Threatened", "Sensitive"]
+
+
+def build_forest_gdb(forest, final_workspace, tes_folder, forest_gdb_dict=None):
+    """Selects, merges and dissolves one forest's records into its TES_Submitted GDB, returns the dissolve."""
+
+    if forest_gdb_dict is None:
+        forest_gdb_dict = forestGDBDict
+
+    arcpy.AddMessage("-----------------------------------------------------------")
+    arcpy.AddMessage("Populating " + forest)
+    forestFCList = []
+    for tes in tesVariableList:
+        final_fc = final_workspace + "\\" + "FireRetardantEIS_" + tes
+        arcpy.MakeFeatureLayer_management(final_fc, "lyr")
+        arcpy.AddMessage("Selecting records based on " + tes + " rank")
+        unitIDnum = forest_gdb_dict.get(forest)
+        arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "UnitID = '" + unitIDnum + "'")
+
+        final_wo_space = tes_folder + forest + "\\" + "FireRetardantEIS_" + tes
+
+        result = arcpy.GetCount_management("lyr")
+        count = int(result.getOutput(0))
+        if count > 0:
+            arcpy.AddMessage("Adding feature class for " + tes + " for forest " + unitIDnum)
+        else:
+            arcpy.AddMessage("There were no records found in " + unitIDnum + " for " + tes)
+
+        if count > 0:
+            arcpy.AddMessage("Copying selected records to " + forest + "  Geodatabase ......")
+            arcpy.CopyFeatures_management("lyr", final_wo_space)
+            forestFCList.append(final_wo_space)
+
+    mergeFeatureClass = tes_folder + forest + "\\" + "FireRetardantEIS_merge"
+    arcpy.AddMessage("Merging Feature Classes")
+    arcpy.AddMessage("If there are no files to merge this will error until a workaround is produced!")
+    arcpy.Merge_management(forestFCList, mergeFeatureClass)
+
+    arcpy.AddMessage("Dissolving Features")
+
+    dissolveFeatureClass = tes_folder + forest + "\\" + "FireRetardantEIS_Dissolve"
+
+    if sys.version_info[0] < 3:
+        arcpy.Dissolve_management(mergeFeatureClass, dissolveFeatureClass, "UnitID")
+    else:
+        arcpy.PairwiseDissolve_analysis(mergeFeatureClass, dissolveFeatureClass, "UnitID")
+
+    return dissolveFeatureClass
+
+
+def final_workspace(in_workspace, cur_year, profile=None):
+    """Distributable GDB written by final_merge.py that the forest GDBs are selected from."""
+
+    fws_folder = in_workspace + "\\" + "WO" + "\\" + "FWS" + "\\"
+
+    final_r05_dist_gdb   = region_profile.distributable_gdb(profile or region_profile.get_profile(), cur_year)
+
+    return fws_folder + "\\" + final_r05_dist_gdb
+
+
+def wo_deliverable(in_workspace, run_date=None, region=None):
+    """Builds every forest deliverable GDB of the region (Region 5 by default), returns the dissolved feature classes."""
+
+    profile = region_profile.get_profile(region)
+    forest_gdb_dict = region_profile.forest_gdb_dict(profile)
+
+    # using the now variable to assign year every time there is a hardcoded 2017
+    now = run_date or datetime.datetime.today()
+    curYear = str(now.year)
+    arcpy.AddMessage("Year is " + curYear)
+
+    arcpy.env.workspace = in_workspace
+
+    arcpy.env.overwriteOutput = True
+
+    # final_end_fc = final_wksp + "\\" + "FireRetardantEIS_Endangered"
+    # final_thr_fc = final_wksp + "\\" + "FireRetardantEIS_Threatened"
+    # final_sen_fc = final_wksp + "\\" + "FireRetardantEIS_Sensitive"
+
+    wo_folder = in_workspace + "\\" + "WO"
+    tes_folder = wo_folder + "\\" + "TES_Submitted" + "\\"
+
+    final_wksp = final_workspace(in_workspace, curYear, profile)
+
     if not os.path.exists(wo_folder):
         arcpy.AddMessage("Creating directory for WO Data Deliverables ....")
         os.makedirs(wo_folder)
@@ -92,51 +119,31 @@ try:
         os.makedirs(tes_folder)
 
     arcpy.AddMessage("Creating Geodatabase for Forest Data Deliverables ....")
-    for forest in forestGDBList:
+    for forest in sorted(forest_gdb_dict):
         arcpy.CreateFileGDB_management(tes_folder, forest)
 
-    tesVariableList = ["Endangered", "Threatened", "Sensitive"]
+    dissolveList = []
 
-    for forest in forestGDBList:
-        arcpy.AddMessage("-----------------------------------------------------------")
-        arcpy.AddMessage("Populating " + forest)
-        forestFCList = []
-        for tes in tesVariableList:
-            final_fc = final_wksp + "\\" + "FireRetardantEIS_" + tes
-            arcpy.MakeFeatureLayer_management(final_fc, "lyr")
-            arcpy.AddMessage("Selecting records based on " + tes + " rank")
-            unitIDnum = forestGDBDict.get(forest)
-            arcpy.SelectLayerByAttribute_management("lyr", "NEW_SELECTION", "UnitID = '" + unitIDnum + "'")
+    for forest in sorted(forest_gdb_dict):
+        dissolveList.append(build_forest_gdb(forest, final_wksp, tes_folder, forest_gdb_dict))
 
-            final_wo_space = tes_folder + forest + "\\" + "FireRetardantEIS_" + tes
+    return dissolveList
 
-            result = arcpy.GetCount_management("lyr")
-            count = int(result.getOutput(0))
-            if count > 0:
-                arcpy.AddMessage("Adding feature class for " + tes + " for forest " + forestGDBDict.get(forest))
-            else:
-                arcpy.AddMessage("There were no records found in " + forestGDBDict.get(forest) + " for " + tes)
 
-            if count > 0:
-                arcpy.AddMessage("Copying selected records to " + forest + "  Geodatabase ......")
-                arcpy.CopyFeatures_management("lyr", final_wo_space)
-                forestFCList.append(final_wo_space)
+def main():
 
-        mergeFeatureClass = tes_folder + forest + "\\" + "FireRetardantEIS_merge"
-        arcpy.AddMessage("Merging Feature Classes")
-        arcpy.AddMessage("If there are no files to merge this will error until a workaround is produced!")
-        arcpy.Merge_management(forestFCList, mergeFeatureClass)
+    in_workspace = sys.argv[1]
 
-        arcpy.AddMessage("Dissolving Features")
+    # in_workspace = "C:\\Users\\jklaus\\Documents\\Python_Testing\\fire_retardant\\"
 
-        dissolveFeatureClass = tes_folder + forest + "\\" + "FireRetardantEIS_Dissolve"
+    try:
+        wo_deliverable(in_workspace)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+    except Exception as e:
+        arcpy.AddMessage(e)
 
-        if sys.version_info[0] < 3:
-            arcpy.Dissolve_management(mergeFeatureClass, dissolveFeatureClass, "UnitID")
-        else:
-            arcpy.PairwiseDissolve_analysis(mergeFeatureClass, dissolveFeatureClass, "UnitID")
 
-except arcpy.ExecuteError:
-    arcpy.AddError(arcpy.GetMessages(2))
-except Exception as e:
-    arcpy.AddMessage(e)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+# ---------------------------------------------------------------------------
+# work_queue.py
+#
+# Description: Spreads the independent units of the long running scripts over
+#              several machines that share a filesystem. The units are
+#                  hydrology  one NHD feature class of one subregion
+#                             (hydrology_processing.ingest_subregion_feature)
+#                  noaa       one ESU (noaa_esu_processing.process_esu)
+#                  wo         one forest GDB (wo_deliverable.build_forest_gdb)
+#
+#              The coordinator writes one json task file per unit to a queue
+#              directory on the share. Every node runs "work" against the same
+#              queue and claims tasks by creating a lock file next to the task.
+#              A lock file is a lease: it names the node and the time it expires,
+#              and the node renews it while the task runs. If a node dies its
+#              lease runs out and another node takes the task over. Each node
+#              writes its data to its own scratch folder under the queue
+#              directory so nodes never write into the same GDB, and records the
+#              outputs in a result file. Once every task has a result the
+#              coordinator runs "merge", which brings the scratch outputs into the
+#              normal Output and WO layout in a fixed order and runs the steps
+#              that need all units (the hydro merges, buffer, intersect and
+#              dissolve).
+#
+#              The workspace has to be reachable under the same path on every
+#              node and the node clocks should be kept in sync for the leases.
+#              Failed tasks are recorded and queued again by the next enqueue.
+#
+#              The subregions, forests and projection come from the region
+#              profile given to enqueue (--region, Region 5 by default). Every
+#              task carries the region so the nodes and the merge use the same one.
+#
+# Usage: work_queue.py enqueue <in_workspace> <queue_dir> hydrology|noaa|wo [--reset] [--region NAME]
+#        work_queue.py work <in_workspace> <queue_dir> [--node NAME] [--lease SECONDS]
+#        work_queue.py merge <in_workspace> <queue_dir> hydrology|noaa|wo
+#        work_queue.py status <in_workspace> <queue_dir>
+# ---------------------------------------------------------------------------
+
+# Import arcpy module
+import arcpy
+import argparse
+import datetime
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+import checkpoint
+import hydrology_processing
+import noaa_esu_processing
+import region_profile
+import wo_deliverable
+
+queueFolders = ["tasks", "leases", "results", "scratch"]
+
+taskKindList = ["hydrology", "noaa", "wo"]
+
+dateFormat = "%Y-%m-%dT%H:%M:%S"
+
+
+def queue_folder(queue_dir, folder):
+
+    return os.path.join(queue_dir, folder)
+
+
+def write_json(path, data):
+
+    # Written under a temporary name first so other nodes never read half a file
+    tmpPath = path + "." + str(os.getpid()) + ".tmp"
+    with open(tmpPath, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    if hasattr(os, "replace"):
+        os.replace(tmpPath, path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+
+
+def read_json(path):
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def list_tasks(queue_dir, kind=None):
+
+    tasks = []
+    taskFolder = queue_folder(queue_dir, "tasks")
+    if not os.path.exists(taskFolder):
+        return tasks
+
+    for filename in sorted(os.listdir(taskFolder)):
+        if not filename.endswith(".json"):
+            continue
+        task = read_json(os.path.join(taskFolder, filename))
+        if task is not None and (kind is None or task["kind"] == kind):
+            tasks.append(task)
+
+    return tasks
+
+
+def get_result(queue_dir, task_id):
+
+    return read_json(os.path.join(queue_folder(queue_dir, "results"), task_id + ".json"))
+
+
+def build_tasks(in_workspace, kind, region=None):
+    """Lists the independent units of a script as task dictionaries, in the order they are merged."""
+
+    profile = region_profile.get_profile(region)
+    tasks = []
+
+    if kind == "hydrology":
+        hydroWorkspace = in_workspace + "\\" + "Downloads" + "\\" + "Hydro" + "\\"
+        for subRegion in profile["subRegionList"]:
+            hydroGDB = "NHD_H_" + subRegion + "_HU4_GDB.gdb"
+            if not arcpy.Exists(hydroWorkspace + hydroGDB):
+                arcpy.AddMessage(subRegion + " GDB does not exist may need to download and unzip")
+                continue
+            for waterFeature in hydrology_processing.waterFeatureList:
+                tasks.append({"id": "hydrology_" + subRegion + "_" + waterFeature, "kind": kind,
+                              "region": subRegion, "water_feature": waterFeature})
+    elif kind == "noaa":
+        for species in noaa_esu_processing.esuSpeciesList:
+            tasks.append({"id": "noaa_" + species, "kind": kind, "species": species})
+    elif kind == "wo":
+        for forest in sorted(region_profile.forest_gdb_dict(profile)):
+            tasks.append({"id": "wo_" + forest[:-4], "kind": kind, "forest": forest})
+    else:
+        raise ValueError("Unknown task kind " + kind)
+
+    for order, task in enumerate(tasks):
+        task["order"] = order
+        task["profile"] = region
+
+    return tasks
+
+
+def enqueue(in_workspace, queue_dir, kind, run_date=None, reset=False, region=None):
+    """Writes the task files of a script. Tasks that already succeeded are kept unless reset is set."""
+
+    for folder in queueFolders:
+        if not os.path.exists(queue_folder(queue_dir, folder)):
+            os.makedirs(queue_folder(queue_dir, folder))
+
+    now = run_date or datetime.datetime.today()
+
+    tasks = build_tasks(in_workspace, kind, region)
+    queued = 0
+
+    for task in tasks:
+        task["run_date"] = now.strftime(dateFormat)
+
+        result = get_result(queue_dir, task["id"])
+        if result is not None:
+            if result["success"] and not reset:
+                continue
+            os.remove(os.path.join(queue_folder(queue_dir, "results"), task["id"] + ".json"))
+
+        write_json(os.path.join(queue_folder(queue_dir, "tasks"), task["id"] + ".json"), task)
+        queued += 1
+
+    arcpy.AddMessage("Queued " + str(queued) + " of " + str(len(tasks)) + " " + kind + " tasks in " + queue_dir)
+    return queued
+
+
+def lease_path(queue_dir, task_id):
+
+    return os.path.join(queue_folder(queue_dir, "leases"), task_id + ".lock")
+
+
+def acquire_lease(queue_dir, task_id, node, lease_seconds):
+    """Creates the lock file of a task, or takes over an expired one. Returns the lease token or None."""
+
+    path = lease_path(queue_dir, task_id)
+    token = node + ":" + uuid.uuid4().hex
+
+    for attempt in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            lease = read_json(path)
+            if lease is not None and lease["expires"] > time.time():
+                return None
+            if lease is None:
+                try:
+                    age = time.time() - os.path.getmtime(path)
+                except OSError:
+                    # Released between the two calls
+                    return None
+                if age < lease_seconds:
+                    # Being written by the node that created it
+                    return None
+
+            # Expired, only one node can rename the stale lock away
+            stalePath = path + ".stale." + token.replace(":", "_")
+            try:
+                os.rename(path, stalePath)
+            except OSError:
+                return None
+            if read_json(stalePath) != lease:
+                # Another node took the lease over and renewed it after it was read, give it back
+                try:
+                    os.rename(stalePath, path)
+                except OSError:
+                    pass
+                return None
+            os.remove(stalePath)
+            arcpy.AddMessage("Lease on " + task_id + " expired, taking the task over")
+            continue
+
+        with os.fdopen(fd, "w") as f:
+            json.dump({"node": node, "token": token, "expires": time.time() + lease_seconds}, f)
+        return token
+
+    return None
+
+
+def renew_lease(queue_dir, task_id, token, lease_seconds):
+    """Extends a lease, returns False when the lease now belongs to someone else."""
+
+    path = lease_path(queue_dir, task_id)
+    lease = read_json(path)
+    if lease is None or lease["token"] != token:
+        return False
+
+    lease["expires"] = time.time() + lease_seconds
+    write_json(path, lease)
+    return True
+
+
+def release_lease(queue_dir, task_id, token):
+
+    path = lease_path(queue_dir, task_id)
+    lease = read_json(path)
+    if lease is not None and lease["token"] == token:
+        os.remove(path)
+
+
+class LeaseKeeper(threading.Thread):
+    """Renews a lease in the background while the task runs."""
+
+    def __init__(self, queue_dir, task_id, token, lease_seconds):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.queue_dir = queue_dir
+        self.task_id = task_id
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.lease_seconds / 3.0):
+            if not renew_lease(self.queue_dir, self.task_id, self.token, self.lease_seconds):
+                arcpy.AddWarning("Lost the lease on " + self.task_id)
+                self.lost = True
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def node_scratch(queue_dir, node, folder):
+    """Scratch folder of this node, created on first use."""
+
+    scratchFolder = os.path.join(queue_folder(queue_dir, "scratch"), node, folder)
+    if not os.path.exists(scratchFolder):
+        os.makedirs(scratchFolder)
+
+    return scratchFolder
+
+
+def scratch_gdb(scratch_folder, gdb_name):
+
+    if not arcpy.Exists(os.path.join(scratch_folder, gdb_name)):
+        arcpy.CreateFileGDB_management(scratch_folder, gdb_name)
+
+    return os.path.join(scratch_folder, gdb_name)
+
+
+def run_task(in_workspace, queue_dir, node, task):
+    """Runs one unit into the scratch folder of this node and returns its outputs."""
+
+    now = datetime.datetime.strptime(task["run_date"], dateFormat)
+    curYear = str(now.year)
+    profile = region_profile.get_profile(task.get("profile"))
+
+    arcpy.env.overwriteOutput = True
+
+    if task["kind"] == "hydrology":
+        scratchFolder = node_scratch(queue_dir, node, "Hydro" + curYear)
+        scratchGDB = scratch_gdb(scratchFolder, "Hydro_" + curYear + "_CAALB83.gdb")
+        hydroGDB = in_workspace + "\\" + "Downloads" + "\\" + "Hydro" + "\\" + \
+            "NHD_H_" + task["region"] + "_HU4_GDB.gdb"
+        selectFC = hydrology_processing.ingest_subregion_feature(hydroGDB, task["water_feature"], task["region"],
+                                                                 scratchFolder + os.sep, scratchGDB + os.sep,
+                                                                 str(now.month), curYear, profile)
+        return [selectFC]
+
+    if task["kind"] == "noaa":
+        scratchFolder = node_scratch(queue_dir, node, "NOAA_ESU" + curYear)
+        scratchGDB = scratch_gdb(scratchFolder, "NOAA_ESU_" + curYear + "_CAALB83.gdb")
+        noaaWorkspace, flowClipFeatClass, bodyClipFeatClass = noaa_esu_processing.esu_inputs(in_workspace, curYear)
+        interimfc = noaa_esu_processing.process_esu(task["species"], noaaWorkspace, scratchFolder + os.sep,
+                                                    scratchGDB + os.sep, flowClipFeatClass, bodyClipFeatClass,
+                                                    now.strftime("%B"), curYear, profile)
+        return [interimfc]
+
+    if task["kind"] == "wo":
+        scratchFolder = node_scratch(queue_dir, node, "TES_Submitted" + curYear)
+        forestGDB = os.path.join(scratchFolder, task["forest"])
+        if arcpy.Exists(forestGDB):
+            arcpy.Delete_management(forestGDB)
+        arcpy.CreateFileGDB_management(scratchFolder, task["forest"])
+        wo_deliverable.build_forest_gdb(task["forest"], wo_deliverable.final_workspace(in_workspace, curYear, profile),
+                                        scratchFolder + os.sep, region_profile.forest_gdb_dict(profile))
+        return [forestGDB]
+
+    raise ValueError("Unknown task kind " + task["kind"])
+
+
+def work(in_workspace, queue_dir, node=None, lease_seconds=900, poll_interval=30):
+    """Claims and runs tasks until every task in the queue has a result."""
+
+    if node is None:
+        node = socket.gethostname()
+
+    arcpy.AddMessage("Node " + node + " working on " + queue_dir)
+    completed = 0
+
+    while True:
+        pending = [task for task in list_tasks(queue_dir) if get_result(queue_dir, task["id"]) is None]
+        if not pending:
+            break
+
+        claimed = None
+        for task in pending:
+            token = acquire_lease(queue_dir, task["id"], node, lease_seconds)
+            if token is not None:
+                claimed = task
+                break
+
+        if claimed is None:
+            # Everything left is leased by other nodes, wait in case one of them dies
+            time.sleep(poll_interval)
+            continue
+
+        # Another node may have finished it between listing and claiming
+        if get_result(queue_dir, claimed["id"]) is not None:
+            release_lease(queue_dir, claimed["id"], token)
+            continue
+
+        arcpy.AddMessage("__________________________________________________")
+        arcpy.AddMessage("Running task " + claimed["id"])
+
+        keeper = LeaseKeeper(queue_dir, claimed["id"], token, lease_seconds)
+        keeper.start()
+        startTime = time.time()
+        result = {"id": claimed["id"], "node": node, "outputs": [], "message": ""}
+        try:
+            result["outputs"] = run_task(in_workspace, queue_dir, node, claimed)
+            result["success"] = True
+        except arcpy.ExecuteError:
+            result["success"] = False
+            result["message"] = arcpy.GetMessages(2)
+        except Exception as e:
+            result["success"] = False
+            result["message"] = str(e)
+        finally:
+            keeper.stop()
+
+        result["elapsed"] = time.time() - startTime
+        result["finished"] = datetime.datetime.now().strftime(dateFormat)
+
+        if keeper.lost:
+            arcpy.AddWarning("Discarding result of " + claimed["id"] + ", another node owns the task now")
+            continue
+
+        write_json(os.path.join(queue_folder(queue_dir, "results"), claimed["id"] + ".json"), result)
+        release_lease(queue_dir, claimed["id"], token)
+
+        if result["success"]:
+            completed += 1
+            arcpy.AddMessage("Completed " + claimed["id"] + " in " +
+                             str(datetime.timedelta(seconds=int(result["elapsed"]))))
+        else:
+            arcpy.AddError("Task " + claimed["id"] + " failed: " + result["message"])
+
+    arcpy.AddMessage("No tasks left, node " + node + " completed " + str(completed))
+    return completed
+
+
+def wait_for_results(queue_dir, kind, poll_interval=30):
+    """Blocks until every task of the kind has a result, returns (task, result) pairs in merge order."""
+
+    while True:
+        tasks = sorted(list_tasks(queue_dir, kind), key=lambda task: task["order"])
+        results = [get_result(queue_dir, task["id"]) for task in tasks]
+        if all(result is not None for result in results):
+            break
+        arcpy.AddMessage(str(results.count(None)) + " " + kind + " tasks still running")
+        time.sleep(poll_interval)
+
+    failedList = [task["id"] for task, result in zip(tasks, results) if not result["success"]]
+    if failedList:
+        raise RuntimeError("Tasks failed, fix and enqueue again: " + ", ".join(failedList))
+
+    return list(zip(tasks, results))
+
+
+def merge(in_workspace, queue_dir, kind, poll_interval=30):
+    """Brings the node scratch outputs into the normal output layout and finishes the script."""
+
+    taskResults = wait_for_results(queue_dir, kind, poll_interval)
+    if not taskResults:
+        raise RuntimeError("No " + kind + " tasks in " + queue_dir)
+
+    now = datetime.datetime.strptime(taskResults[0][0]["run_date"], dateFormat)
+    curYear = str(now.year)
+
+    arcpy.env.workspace = in_workspace
+    arcpy.env.overwriteOutput = True
+
+    if kind == "hydrology":
+        outputWorkspace, newHydroWorkSpace, outputProjGDB = \
+            hydrology_processing.create_hydro_workspace(in_workspace, curYear)
+        hydroCheckpoint = checkpoint.load_checkpoint(outputWorkspace + "hydrology_checkpoint.json")
+
+        selectDict = dict((waterFeature, []) for waterFeature in hydrology_processing.waterFeatureList)
+        rebuiltList = []
+        for task, result in taskResults:
+            selectDict[task["water_feature"]].extend(result["outputs"])
+            rebuiltList.extend(result["outputs"])
+
+        ownershipFC = in_workspace + "\\USFS_Ownership_LSRS\\" + curYear + \
+            "_USFS_Ownership_CAALB83.gdb\\USFS_OwnershipLSRS_" + curYear
+
+        geocompleteList = hydrology_processing.merge_and_buffer(outputProjGDB, selectDict, hydroCheckpoint,
+                                                                rebuiltList, ownershipFC)
+        checkpoint.clear_checkpoint(hydroCheckpoint)
+
+        return geocompleteList
+
+    if kind == "noaa":
+        layerWorkSpace, newProjectWorkSpace = noaa_esu_processing.create_noaa_workspace(in_workspace, curYear)
+        esuCheckpoint = checkpoint.load_checkpoint(layerWorkSpace + "NOAA_ESU_" + curYear + "_checkpoint.json")
+
+        geocompleteList = []
+        for task, result in taskResults:
+            interimfc = newProjectWorkSpace + noaa_esu_processing.esuFilenameDict.get(task["species"]) + "_geocomplete"
+            arcpy.AddMessage("Copying " + task["species"] + " from node " + result["node"])
+            arcpy.CopyFeatures_management(result["outputs"][0], interimfc)
+            checkpoint.mark_complete(esuCheckpoint, task["species"], [interimfc])
+            geocompleteList.append(interimfc)
+
+        checkpoint.clear_checkpoint(esuCheckpoint)
+
+        return geocompleteList
+
+    if kind == "wo":
+        tes_folder = in_workspace + "\\" + "WO" + "\\" + "TES_Submitted" + "\\"
+        if not os.path.exists(tes_folder):
+            os.makedirs(tes_folder)
+
+        forestList = []
+        for task, result in taskResults:
+            forestGDB = tes_folder + task["forest"]
+            arcpy.AddMessage("Copying " + task["forest"] + " from node " + result["node"])
+            if arcpy.Exists(forestGDB):
+                arcpy.Delete_management(forestGDB)
+            arcpy.Copy_management(result["outputs"][0], forestGDB)
+            forestList.append(forestGDB)
+
+        return forestList
+
+    raise ValueError("Unknown task kind " + kind)
+
+
+def status(queue_dir):
+
+    for kind in taskKindList:
+        tasks = list_tasks(queue_dir, kind)
+        if not tasks:
+            continue
+        results = [get_result(queue_dir, task["id"]) for task in tasks]
+        leased = [task for task, result in zip(tasks, results)
+                  if result is None and os.path.exists(lease_path(queue_dir, task["id"]))]
+        arcpy.AddMessage(kind + ": " + str(len(tasks)) + " tasks, " +
+                         str(len([result for result in results if result and result["success"]])) + " complete, " +
+                         str(len([result for result in results if result and not result["success"]])) + " failed, " +
+                         str(len(leased)) + " running")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Distributes FRA processing units over several machines")
+    parser.add_argument("command", choices=["enqueue", "work", "merge", "status"])
+    parser.add_argument("in_workspace")
+    parser.add_argument("queue_dir")
+    parser.add_argument("kind", nargs="?", choices=taskKindList)
+    parser.add_argument("--reset", action="store_true", help="queue tasks again even when they succeeded")
+    parser.add_argument("--node", default=None, help="name of this node, defaults to the host name")
+    parser.add_argument("--lease", type=int, default=900, help="lease length in seconds")
+    parser.add_argument("--region", default=None,
+                        help="region profile name or json file of enqueued tasks, defaults to Region 5")
+    args = parser.parse_args()
+
+    if args.command in ("enqueue", "merge") and args.kind is None:
+        parser.error(args.command + " needs a task kind")
+
+    try:
+        if args.command == "enqueue":
+            enqueue(args.in_workspace, args.queue_dir, args.kind, reset=args.reset, region=args.region)
+        elif args.command == "work":
+            work(args.in_workspace, args.queue_dir, args.node, args.lease)
+        elif args.command == "merge":
+            merge(args.in_workspace, args.queue_dir, args.kind)
+        else:
+            status(args.queue_dir)
+
+    except arcpy.ExecuteError:
+        arcpy.AddError(arcpy.GetMessages(2))
+        sys.exit(1)
+    except Exception as e:
+        arcpy.AddError(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()